@@ -6,16 +6,19 @@ a structured result to Cosmos DB for downstream analytics.
 """
 
 import os
-import time
 import azure.functions as func
-from services.logger import Logger
-from services.tracer import AppTracer
-from services.ocr_service import OcrService, OcrServiceError
-from services.debug_utils import write_debug_file, is_debug_mode
-from services.pdf_utils import PDFService
-from services.db_service import DbService
-from services.rag_llm.embedding_service import EmbeddingService
-from services.rag_llm.check_runner import run_llm_checks
+from services.logger import Logger, bind_invocation_context
+from services.tracer import AppTracer, stage
+from services.debug_utils import write_debug_file, is_debug_mode, debug_bundle
+from services.profiling import memory_profiling, cpu_profiling
+from services.pipeline import DocumentPipeline
+
+# NOTE: the processing stages live in services/pipeline.py so the bulk
+# backfill tool can reuse them. OCR, embedding and LLM-check services (and
+# with them `requests`, `openai`, `azure.search.documents`, `tiktoken` and
+# `langchain_text_splitters`) are imported at first use inside the pipeline.
+# Many invocations exit at the `is_pdf` or page-count gate and never need
+# them, so keeping them out of module load shortens cold starts.
 
 # Initialise the JSON logger for this function
 logger = Logger.get_logger("ProcessPDF", json_format=True)
@@ -29,234 +32,74 @@ instrumentation_key = os.environ.get(
 # Initialise the tracer with the instrumentation key
 tracer = AppTracer(instrumentation_key)
 
-def simulate_ml_classification(text):
-    """
-    Simulates a machine learning classification model.
-    """
-    return {
-        "is_valid_afs": True,
-        "afs_confidence": 0.95,
-        "ml_message": "The document is valid and meets the AFS requirements."
-    }
-
-def main(myblob: func.InputStream):
+def main(myblob: func.InputStream, context: func.Context):
     """
     Main entry point for the Azure Function.
     """
-    with tracer.span(name="ProcessPDFOperation") as span:
-
-        # Log the beginning of the blob processing operation, including extra context.
-        logger.info("Blob trigger function processed %s", myblob.name,
-        extra={
-            "blob_name": myblob.name
-            })
-
-        # Invoke DbService to store results
-        db = DbService()
-
-        # Invoke PDFService to extract embedded text
-        pdf_service = PDFService()
+    bind_invocation_context(context)
+    # Debug and profiling artefacts of this invocation go into one bundle,
+    # written in the background when the invocation ends
+    with debug_bundle(myblob.name, context.invocation_id) as bundle, \
+            tracer.invocation(name="ProcessPDFOperation") as (span, recorder), \
+            memory_profiling(myblob.name) as mem_profiler, \
+            cpu_profiling(myblob.name) as cpu_profiler:
+        recorder.document_name = myblob.name
+
+        # Attach blob attributes up front so they survive early returns
+        span.add_attribute("blob_name", myblob.name)
+        span.add_attribute("blob_size", myblob.length)
+        span.add_attribute("invocation_id", context.invocation_id)
 
-        # Read blob content (PDF bytes)
-        pdf_bytes = myblob.read()
+        try:
+            # Read blob content (PDF bytes)
+            with stage("BlobRead") as st:
+                pdf_bytes = myblob.read()
+                st.add_attribute("bytes", len(pdf_bytes))
 
-        # Check One: PDF validity check
-        is_pdf = pdf_service.is_pdf(pdf_bytes)
-        if not is_pdf:
-            logger.error(
-                "Blob is not a valid PDF file",
-                extra={"blob_name": myblob.name}
-            )
-            db.store_results(
+            DocumentPipeline().process(
                 document_name=myblob.name,
-                data={
-                    "isPDF": False,
-                    "blobUrl": myblob.uri
-                }
+                blob_url=myblob.uri,
+                pdf_bytes=pdf_bytes,
+                span=span
             )
-            return
-
-        logger.info("Blob is a valid PDF file", extra={"blob_name": myblob.name})
-
-        # DEBUG
-        if is_debug_mode():
-            write_debug_file(
-                {"isPDF": is_pdf},
-                prefix="debug_is_pdf"
-            )
-
-        # Check Two: PDF page count check
-        page_count = pdf_service.get_page_count(pdf_bytes)
-        logger.info(
-            "PDF page count",
-            extra={
-                "blob_name": myblob.name,
-                "pageCount": page_count
-            }
-        )
-        if page_count < 5 or page_count > 25:
-            logger.warning(
-                "Blob is unusually short or long with %d pages",
-                page_count,
+        finally:
+            span.add_attribute("total_ms", round(recorder.total_ms(), 3))
+
+            # Opt-in memory profile (PROFILE_MEMORY=true)
+            if mem_profiler is not None:
+                profile = mem_profiler.summary()
+                span.add_attribute("memory_peak_mb", round(profile["peakBytes"] / 2**20, 2))
+                span.add_attribute("memory_peak_stage", profile["peakStage"])
+                debug_file = write_debug_file(profile, prefix="memory_profile")
+                span.add_attribute("memory_profile_file", debug_file)
+                logger.info("Memory profile written",
                 extra={
-                    "blob_name": myblob.name,
-                    "pageCount": page_count
-                }
-            )
-            db.store_results(
-                document_name=myblob.name,
-                data={
-                    "isPDF": True,
-                    "pageCount": page_count,
-                    "blobUrl": myblob.uri
-                }
-            )
-            return
-
-        # DEBUG
-        if is_debug_mode():
-            write_debug_file(
-                {"pageCount": page_count},
-                prefix="debug_page_count"
-            )
-
-        # First attempt to extract embedded text for digitally generated PDFs
-        embedded_pages = pdf_service.extract_embedded_text(pdf_bytes)
-
-        if embedded_pages:
-            extraction_method = "embedded"
-            logger.info("Extraction complete using %s method",extraction_method,
-            extra={
-                "method": extraction_method,
-                })
-            extraction_pages = embedded_pages
-
-        else:
-            extraction_method = "OCR"
-            logger.info("No embedded text found. Falling back to OCR...")
+                    "debug_file": debug_file,
+                    "peak_bytes": profile["peakBytes"],
+                    "peak_stage": profile["peakStage"]
+                    })
 
-            # Extract using OCR
-            try:
-                ocr_pages = OcrService().extract_text(pdf_bytes)
-                logger.info("Extraction complete using %s method", extraction_method,
+            # Sampled CPU profile (PROFILE_CPU_RATE > 0)
+            if cpu_profiler is not None:
+                cpu_profiler.stop()
+                debug_file = cpu_profiler.write()
+                span.add_attribute("cpu_profile_file", debug_file)
+                span.add_attribute("cpu_profile_mode", cpu_profiler.mode)
+                logger.info("CPU profile written",
                 extra={
-                    "method": extraction_method,
+                    "debug_file": debug_file,
+                    "mode": cpu_profiler.mode,
+                    "profiled_ms": round(cpu_profiler.elapsed_ms, 3)
                     })
-                extraction_pages = ocr_pages
 
-            except OcrServiceError as e:
-                logger.error("Error extracting text from PDF using %s", extraction_method,
+            # DEBUG
+            if is_debug_mode():
+                # Dump the per-stage timing breakdown for this document
+                debug_file = write_debug_file(recorder.summary(), prefix="stage_timings")
+                logger.info("DEBUG ON - Stage timings written",
                 extra={
-                    "error": str(e)
+                    "debug_file": debug_file
                     })
-                return
 
-        # Check Three: ABN detection
-        full_text = "\n".join(extraction_pages.values())
-        abn_value = pdf_service.find_abn(full_text)
-        has_abn = abn_value is not None
-
-        logger.info(
-            "ABN detection complete",
-            extra={
-                "hasABN": has_abn,
-                "ABN": abn_value
-            }
-        )
-
-        # DEBUG
-        if is_debug_mode():
-            write_debug_file(
-                {"hasABN": has_abn, "ABN": abn_value},
-                prefix="debug_abn_detection"
-            )
-
-        # DEBUG
-        if is_debug_mode():
-            # Write the extracted text to a debug file
-            debug_file = write_debug_file(extraction_pages, prefix="ocr_output")
-            logger.info("DEBUG ON - Debug file written",
-            extra={
-                "method": extraction_method,
-                "debug_file": debug_file
-                })
-            logger.info("Extraction method used was %s", extraction_method)
-
-        logger.info("Continue processing...")
-        # Continue processing (e.g., parse text, send to ML, etc)
-
-        # Simulate ML model classification
-        classification_result = simulate_ml_classification(full_text)
-        logger.info(
-            "ML classification complete",
-            extra={"classification_result": classification_result})
-
-        # DEBUG
-        if is_debug_mode():
-            # Dump the ML payload to a file
-            debug_payload = {
-                "extractionMethod": extraction_method,
-                "classificationResult": classification_result
-            }
-            debug_file = write_debug_file(str(debug_payload), prefix="classification_payload")
-            logger.info("DEBUG ON - Classification payload written",
-            extra={
-                "debug_file": debug_file
-                })
-
-        # --- RAG+LLM INTEGRATION POINT --- #
-
-        embedding_service = EmbeddingService()
-        embedding_service.index_chunks(
-            document_name=myblob.name,
-            page_texts=extraction_pages
-            )
-
-        # Add a delay of 20 seconds to allow for indexing
-        # TODO: is this still needed?
-        time.sleep(20)
-
-
-        # Check Four: RAG Checks
-        # Run all checks via check_runner
-        llm_flags = run_llm_checks(
-            document_name=myblob.name,
-            system_prompt=None
-        )
-
-        # Construct the base payload
-        base_payload = {
-            "isPDF": is_pdf,
-            "pageCount": page_count,
-            "blobUrl": myblob.uri,
-            "extractionMethod": extraction_method,
-            "isValidAFS": classification_result["is_valid_afs"],
-            "afsConfidence": classification_result["afs_confidence"],
-            "hasABN": has_abn,
-            "ABN": abn_value
-        }
-
-        # Build final payload by merging RAG results with base payload
-        final_payload = {
-            **base_payload,
-            **llm_flags
-        }
-
-        # Write results to database
-        try:
-            db.store_results(
-                document_name=myblob.name,
-                data=final_payload
-            )
-        except Exception as e:
-            logger.error("Error storing results in Cosmos DB",
-            extra={
-                "error": str(e)
-                })
-            return
-
-        # Optionally, add more details to the span if needed.
-        span.add_attribute("blob_name", myblob.name)
-        span.add_attribute("blob_size", myblob.length)
-        span.add_attribute("page_count", page_count)
-        span.add_attribute("extraction_method", extraction_method)
+            if len(bundle):
+                span.add_attribute("debug_bundle", bundle.path)
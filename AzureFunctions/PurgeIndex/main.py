@@ -0,0 +1,26 @@
+"""
+PurgeIndex/main.py
+Timer-triggered Azure Function that deletes search index chunks of documents
+indexed longer ago than INDEX_RETENTION_DAYS (daily at 02:30 UTC).
+"""
+
+import azure.functions as func
+from services.logger import Logger, bind_invocation_context
+from services.rag_llm.index_maintenance import IndexMaintenance
+
+# Initialise the JSON logger for this function
+logger = Logger.get_logger("PurgeIndex", json_format=True)
+
+def main(timer: func.TimerRequest, context: func.Context):
+    """
+    Main entry point for the Azure Function.
+    """
+    bind_invocation_context(context)
+    if timer.past_due:
+        logger.info("Index purge is running late")
+
+    # Errors propagate so the failed run is visible; the next run catches up
+    stats = IndexMaintenance().purge_expired()
+    if stats["more"]:
+        logger.warning("Index purge reached INDEX_GC_MAX_DELETES; older chunks remain",
+                       extra=stats)
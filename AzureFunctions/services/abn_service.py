@@ -0,0 +1,345 @@
+"""
+services/abn_service.py
+Module for finding and validating Australian Business Numbers (ABNs).
+
+Financial reports quote many 9- to 11-digit numbers besides the entity's
+ABN: phone numbers, bank accounts, BSBs and table figures. The engine only
+accepts numbers that pass the official check digit algorithms:
+
+    - ABN: subtract 1 from the first digit, weight the 11 digits by
+      10, 1, 3, 5, ..., 19 and check that the sum is divisible by 89.
+    - ACN (and ARBN/ARSN): weight the first 8 digits by 8, 7, ..., 1; the
+      complement of the sum modulo 10 must equal the 9th digit.
+
+Candidates are ranked by their label ("ABN:", "A.B.N.", "Australian Business
+Number", or "ACN" for company numbers), whether an ABN ends in an ACN quoted
+in the same document, and position. Pages are scanned lazily in page order
+and the scan stops at the end of the first page with a labelled, valid ABN.
+That is usually the cover page, so the rest of the document is not read,
+while an ACN quoted after the ABN on the same page is still found.
+
+Classes:
+--------
+    AbnCandidate: A number found in the text that may be an ABN or ACN.
+    AbnResult: The chosen ABN and ACN with all candidates seen.
+    AbnEngine: Scans pages for ABN and ACN candidates.
+
+Functions:
+--------
+    is_valid_abn(): Returns True if an 11-digit number passes the ABN checksum.
+    is_valid_acn(): Returns True if a 9-digit number passes the ACN check digit.
+    validate_abns(): Validates many ABNs at once.
+    validate_acns(): Validates many ACNs at once.
+
+Module-level constants:
+    ABN_WEIGHTS: Weights of the ABN modulus 89 checksum.
+    ACN_WEIGHTS: Weights of the ACN check digit.
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+ABN_WEIGHTS = (10, 1, 3, 5, 7, 9, 11, 13, 15, 17, 19)
+ACN_WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 1)
+
+# 9 to 11 digits, optionally grouped by single spaces or hyphens, that do not
+# start inside a longer run. A 9- or 10-digit match must not be followed by
+# another group, as it may be the start of a column of table figures; an
+# 11-digit match is complete, so a separate number after it ("ABN 51 824 753
+# 556 2023") does not hide it
+_NUMBER_RE = re.compile(
+    # The first digit is matched before the lookbehinds, so the scan can skip
+    # to the next digit instead of testing them at every position
+    r"(\d(?<!\d\d)(?<!\d[ \u00a0-]\d)"
+    r"(?:(?:[ \u00a0-]?\d){10}|(?:[ \u00a0-]?\d){8,9}(?![ \u00a0-]\d)))(?!\d)"
+)
+_SEPARATORS_RE = re.compile(r"[ \u00a0-]")
+# A label directly before the number, e.g. "ABN: ", "A.B.N. ", "ACN No. "
+_LABEL_RE = re.compile(
+    r"(?:\b(?P<abn>A\.?\s?B\.?\s?N\.?|Australian\s+Business\s+Number)"
+    r"|\b(?P<acn>A\.?\s?C\.?\s?N\.?|AR[BS]N|Australian\s+Company\s+Number))"
+    r"[\s:#.(]*(?:No\.?|Number)?[\s:#.)]*$",
+    re.IGNORECASE
+)
+# Characters before a number searched for its label
+_LABEL_WINDOW = 40
+
+def _ascii_digits(number: str) -> str:
+    """
+    Returns a number with Unicode decimal digits (e.g. full-width ones from
+    OCR) replaced by ASCII digits; other characters are kept.
+    """
+    if number.isascii():
+        return number
+    return "".join(str(unicodedata.decimal(c)) if c.isdecimal() else c for c in number)
+
+def _is_digits(number: str, length: int) -> bool:
+    """
+    True if a number (after `_ascii_digits()`) is `length` ASCII digits.
+    """
+    return len(number) == length and number.isascii() and number.isdigit()
+
+def is_valid_abn(abn: str) -> bool:
+    """
+    Returns True if an 11-digit number passes the ABN modulus 89 checksum.
+
+    Args:
+        abn (str): Digits only; any Unicode decimal digits are accepted.
+
+    Returns:
+        bool: False for anything other than 11 digits.
+    """
+    abn = _ascii_digits(abn)
+    if not _is_digits(abn, 11):
+        return False
+    digits = [int(d) for d in abn]
+    digits[0] -= 1
+    return sum(w * d for w, d in zip(ABN_WEIGHTS, digits)) % 89 == 0
+
+def is_valid_acn(acn: str) -> bool:
+    """
+    Returns True if a 9-digit number passes the ACN check digit.
+
+    Args:
+        acn (str): Digits only; any Unicode decimal digits are accepted.
+
+    Returns:
+        bool: False for anything other than 9 digits.
+    """
+    acn = _ascii_digits(acn)
+    if not _is_digits(acn, 9):
+        return False
+    total = sum(w * int(d) for w, d in zip(ACN_WEIGHTS, acn))
+    return (10 - total % 10) % 10 == int(acn[8])
+
+def _validate(numbers: Sequence[str], weights: Tuple[int, ...], abn: bool) -> List[bool]:
+    """
+    Validates numbers of one kind as a single NumPy matrix product.
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    length = 11 if abn else 9
+    if not len(numbers):
+        return []
+    numbers = [_ascii_digits(n) for n in numbers]
+    # Fixed-width code points: one row per number, shorter numbers zero-padded
+    codes = np.array(numbers, dtype=f"<U{length}").view(np.uint32).reshape(-1, length)
+    digits = codes.astype(np.int64) - 48
+    ok = ((digits >= 0) & (digits <= 9)).all(axis=1)
+    # Longer strings were truncated by the fixed width
+    ok &= np.fromiter((len(n) == length for n in numbers), dtype=bool, count=len(numbers))
+    if abn:
+        digits[:, 0] -= 1
+        valid = digits @ np.array(weights, dtype=np.int64) % 89 == 0
+    else:
+        total = digits[:, :8] @ np.array(weights, dtype=np.int64)
+        valid = (10 - total % 10) % 10 == digits[:, 8]
+    return (ok & valid).tolist()
+
+def validate_abns(numbers: Sequence[str]) -> List[bool]:
+    """
+    Validates many ABNs at once, e.g. a backfill of stored results.
+
+    Args:
+        numbers (Sequence[str]): Digit strings (separators removed); any
+                                 Unicode decimal digits are accepted.
+
+    Returns:
+        list[bool]: Whether each number is a valid ABN, in order.
+    """
+    return _validate(numbers, ABN_WEIGHTS, abn=True)
+
+def validate_acns(numbers: Sequence[str]) -> List[bool]:
+    """
+    Validates many ACNs at once.
+
+    Args:
+        numbers (Sequence[str]): Digit strings (separators removed); any
+                                 Unicode decimal digits are accepted.
+
+    Returns:
+        list[bool]: Whether each number is a valid ACN, in order.
+    """
+    return _validate(numbers, ACN_WEIGHTS, abn=False)
+
+@dataclass
+class AbnCandidate:
+    """
+    A number found in the text that may be an ABN or ACN.
+
+    Attributes:
+    ----------
+        number (str): ASCII digits only.
+        kind (str): "ABN" (11 digits) or "ACN" (9 digits).
+        page (int): Page the number is on.
+        offset (int): Character offset of the number in the page text.
+        label (str | None): "ABN" or "ACN" if the number is labelled as one.
+        valid (bool): Whether the number passes its checksum.
+    """
+    number: str
+    kind: str
+    page: int
+    offset: int
+    label: Optional[str]
+    valid: bool
+
+    @property
+    def labelled(self) -> bool:
+        """
+        True if the label matches the kind of number.
+        """
+        return self.label == self.kind
+
+@dataclass
+class AbnResult:
+    """
+    The chosen ABN and ACN with all candidates seen.
+
+    Attributes:
+    ----------
+        abn (str | None): The best valid ABN, or None.
+        page (int | None): Page of the chosen ABN.
+        confidence (str | None): "high" for a labelled ABN, "medium" for an
+                                 unlabelled one, None without an ABN.
+        acn (str | None): The best valid ACN, or None.
+        candidates (list[AbnCandidate]): Every candidate seen, in page order.
+        pages_scanned (int): Pages read before the scan stopped.
+    """
+    abn: Optional[str] = None
+    page: Optional[int] = None
+    confidence: Optional[str] = None
+    acn: Optional[str] = None
+    candidates: List[AbnCandidate] = field(default_factory=list)
+    pages_scanned: int = 0
+
+    def to_dict(self) -> dict:
+        """
+        Returns the result as a JSON-serialisable dict (for debug files).
+        """
+        return {
+            "ABN": self.abn,
+            "page": self.page,
+            "confidence": self.confidence,
+            "ACN": self.acn,
+            "pagesScanned": self.pages_scanned,
+            "candidates": [vars(c) for c in self.candidates],
+        }
+
+class AbnEngine:
+    """
+    Scans pages for ABN and ACN candidates and picks the entity's ABN.
+
+    Attributes
+    ----------
+        early_exit (bool): Stop after the first page with a labelled, valid ABN.
+
+    Methods
+    -------
+        candidates(): Yields the candidates of the pages, lazily and in page order.
+        find(): Returns the best ABN, its page, and the candidates seen.
+    """
+
+    def __init__(self, early_exit: bool = True):
+        """
+        Initialises the engine.
+
+        Args:
+            early_exit (bool): Stop after the first page with a labelled,
+                               valid ABN. Pass False to collect every candidate.
+        """
+        self.early_exit = early_exit
+
+    @staticmethod
+    def _pages(pages) -> Iterable[Tuple[int, str]]:
+        """
+        Returns (page, text) pairs in page order for any supported input.
+        """
+        if isinstance(pages, str):
+            return [(1, pages)]
+        if isinstance(pages, Mapping):
+            return sorted(pages.items())
+        return pages
+
+    @staticmethod
+    def _label(text: str, start: int) -> Optional[str]:
+        """
+        Returns "ABN" or "ACN" if the number at `start` is directly preceded by a label.
+        """
+        match = _LABEL_RE.search(text, max(0, start - _LABEL_WINDOW), start)
+        if match is None:
+            return None
+        return "ABN" if match.group("abn") else "ACN"
+
+    def candidates(self, pages: Union[Mapping[int, str], Iterable[Tuple[int, str]], str]
+                   ) -> Iterator[AbnCandidate]:
+        """
+        Yields the candidates of the pages, lazily and in page order.
+
+        Args:
+            pages (Mapping[int, str] | Iterable[tuple[int, str]] | str): Page
+                number to text, (page, text) pairs (e.g. a generator over
+                pages as they are extracted), or a single text (page 1).
+
+        Yields:
+            AbnCandidate: Each 9- or 11-digit number, checked and labelled.
+        """
+        for page, text in self._pages(pages):
+            yield from self._page_candidates(page, text)
+
+    def _page_candidates(self, page: int, text: str) -> Iterator[AbnCandidate]:
+        """
+        Yields the candidates of one page.
+        """
+        if not text:
+            return
+        for match in _NUMBER_RE.finditer(text):
+            # Stored as ASCII digits whatever digits the text used
+            number = _ascii_digits(_SEPARATORS_RE.sub("", match.group(1)))
+            if len(number) == 11:
+                kind, valid = "ABN", is_valid_abn(number)
+            elif len(number) == 9:
+                kind, valid = "ACN", is_valid_acn(number)
+            else:
+                continue
+            yield AbnCandidate(number, kind, page, match.start(1),
+                               self._label(text, match.start(1)), valid)
+
+    def find(self, pages: Union[Mapping[int, str], Iterable[Tuple[int, str]], str]) -> AbnResult:
+        """
+        Returns the best ABN, its page, and the candidates seen.
+
+        Valid ABNs are ranked by label, then by whether they end in a valid
+        ACN quoted in the document, then by position. Numbers that fail
+        their checksum are reported as candidates but never chosen.
+
+        Args:
+            pages (Mapping[int, str] | Iterable[tuple[int, str]] | str): See `candidates()`.
+
+        Returns:
+            AbnResult: The chosen ABN (None if there is no valid one).
+        """
+        result = AbnResult()
+        for page, text in self._pages(pages):
+            result.pages_scanned += 1
+            hit = False
+            for candidate in self._page_candidates(page, text):
+                result.candidates.append(candidate)
+                hit = hit or (candidate.kind == "ABN" and candidate.valid and candidate.labelled)
+            # The rest of the page is scanned, e.g. for an ACN quoted after the ABN
+            if hit and self.early_exit:
+                break
+
+        acns = [c for c in result.candidates if c.kind == "ACN" and c.valid]
+        acn_numbers = {c.number for c in acns}
+        abns = [c for c in result.candidates if c.kind == "ABN" and c.valid]
+        if abns:
+            # Earlier candidates win ties; sorted() is stable
+            best = sorted(abns, key=lambda c: (not c.labelled, c.number[2:] not in acn_numbers))[0]
+            result.abn, result.page = best.number, best.page
+            result.confidence = "high" if best.labelled else "medium"
+        if acns:
+            result.acn = sorted(acns, key=lambda c: not c.labelled)[0].number
+        return result
@@ -0,0 +1,480 @@
+"""
+services/aggregate_service.py
+Module for maintaining pre-aggregated reporting rollups from the results container.
+
+Dashboards (ingestion volumes, pass rates, ABN detection success) would
+otherwise scan every `DocumentResult` item across partitions. This module
+turns each changed result item into counter increments on a small daily
+rollup document, so reports read one document per day instead.
+
+Each rollup document holds plain counters (documents, PDFs, extraction method
+mix, ABN detections, valid AFS, per-check evaluated/passed counts and the
+summed processing time). Rates and means are derived from them, e.g. pass
+rate = `profitLossPassed / profitLossEvaluated`, mean latency =
+`processingMsTotal / processingMsCount`; `with_rates()` adds them for readers
+that want them precomputed.
+
+Updates are incremental and idempotent. The change feed delivers the latest
+version of an item every time it is written (retries, stage updates,
+re-uploads), so a ledger entry per item and day records the contribution
+already applied to that day. A new version applies only the difference, and
+a redelivered version applies nothing. Each day's rollup update is committed
+together with the item's ledger entry for that day, so a failure part way
+through leaves every day either fully applied or untouched.
+
+Classes:
+--------
+    AggregateStore: Base class defining the rollup storage interface.
+    AggregateConflictError: A ledger entry changed between being read and committed.
+    LocalAggregateStore: Stores rollups and the ledger in a local JSON file.
+    CosmosAggregateStore: Stores rollups and the ledger in a Cosmos DB container.
+    AggregateService: Applies changed result items to the rollups.
+
+Functions:
+--------
+    contribution(): Returns the counters a result item adds to its rollup.
+    with_rates(): Returns a rollup document with derived rates and means.
+    get_aggregate_store(): Returns the rollup store configured by environment variables.
+"""
+
+import os
+import json
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Optional
+from services.logger import Logger
+from services.tracer import stage
+from services.rag_llm.checks import CHECKS
+
+# Cosmos DB allows at most 10 operations per partial document update
+MAX_PATCH_OPERATIONS = 10
+
+# Partition of the documents listing the days each item contributes to
+ITEMS_PARTITION = "items"
+
+def _camel(name: str) -> str:
+    return f"{name[0].lower()}{name[1:]}"
+
+def contribution(item: dict) -> dict:
+    """
+    Returns the counters a result item adds to its daily rollup.
+
+    Args:
+        item (dict): A `DocumentResult` item as stored in Cosmos DB.
+
+    Returns:
+        dict: `day` (YYYY-MM-DD of the item timestamp) and `counters`, a
+              mapping of counter name to increment.
+    """
+    counters: Dict[str, float] = {"documents": 1}
+    if item.get("isPDF"):
+        counters["pdfDocuments"] = 1
+
+    method = item.get("extractionMethod")
+    if method:
+        counters[f"extraction{method[0].upper()}{method[1:]}"] = 1
+
+    if item.get("hasABN") is not None:
+        counters["abnEvaluated"] = 1
+        counters["abnDetected"] = int(bool(item["hasABN"]))
+
+    if item.get("isValidAFS") is not None:
+        counters["afsEvaluated"] = 1
+        counters["validAFS"] = int(bool(item["isValidAFS"]))
+
+    for chk in CHECKS:
+        flag = item.get(f"has{chk.field_name}")
+        if flag is not None:
+            counters[f"{_camel(chk.field_name)}Evaluated"] = 1
+            counters[f"{_camel(chk.field_name)}Passed"] = int(bool(flag))
+
+    if item.get("processingMs") is not None:
+        counters["processingMsCount"] = 1
+        counters["processingMsTotal"] = round(float(item["processingMs"]), 3)
+
+    return {"day": str(item.get("timestamp", ""))[:10], "counters": counters}
+
+def with_rates(rollup: dict) -> dict:
+    """
+    Returns a copy of a rollup document with derived rates and means.
+
+    Args:
+        rollup (dict): A daily rollup document.
+
+    Returns:
+        dict: The rollup plus `abnDetectionRate`, `validAFSRate`, each check's
+              `<check>PassRate` and `meanProcessingMs` (None when undefined).
+    """
+    def ratio(numerator: str, denominator: str) -> Optional[float]:
+        total = rollup.get(denominator, 0)
+        return round(rollup.get(numerator, 0) / total, 4) if total else None
+
+    result = dict(rollup)
+    result["abnDetectionRate"] = ratio("abnDetected", "abnEvaluated")
+    result["validAFSRate"] = ratio("validAFS", "afsEvaluated")
+    for chk in CHECKS:
+        field = _camel(chk.field_name)
+        result[f"{field}PassRate"] = ratio(f"{field}Passed", f"{field}Evaluated")
+    result["meanProcessingMs"] = ratio("processingMsTotal", "processingMsCount")
+    return result
+
+class AggregateStore:
+    """
+    Base class defining the rollup storage interface.
+
+    The ledger is kept per day: for each day an item has contributed to, an
+    entry records the counters applied to that day's rollup. `commit()`
+    updates a rollup and the item's entry for that day together, so either
+    both change or neither does.
+
+    Methods
+    -------
+        add_day(): Records that an item contributes to a day and returns all its days.
+        get_ledger(): Returns an item's ledger entry for a day, or None.
+        commit(): Adds increments to a daily rollup and stores the item's
+                  ledger entry for that day, atomically.
+        get_rollup(): Returns a daily rollup document, or None.
+    """
+
+    def add_day(self, item_id: str, day: str) -> List[str]:
+        """
+        Records that a result item contributes to a day and returns every
+        day it has been recorded for, including `day`.
+        """
+        raise NotImplementedError
+
+    def get_ledger(self, day: str, item_id: str) -> Optional[dict]:
+        """
+        Returns the ledger entry of a result item for a day, or None.
+        """
+        raise NotImplementedError
+
+    def commit(self, day: str, item_id: str, increments: Dict[str, float], entry: dict,
+               previous: Optional[dict]):
+        """
+        Adds increments (which may be negative) to the counters of a daily
+        rollup and replaces the item's ledger entry for that day, atomically.
+
+        Args:
+            day (str): The rollup day.
+            item_id (str): The result item id.
+            increments (dict[str, float]): Counter increments.
+            entry (dict): The new ledger entry.
+            previous (dict | None): The entry returned by `get_ledger()`.
+
+        Raises:
+            AggregateConflictError: If the ledger entry changed since it was read.
+        """
+        raise NotImplementedError
+
+    def get_rollup(self, day: str) -> Optional[dict]:
+        """
+        Returns a daily rollup document, or None.
+        """
+        raise NotImplementedError
+
+class AggregateConflictError(Exception):
+    """
+    Raised when a ledger entry was changed by another writer between being
+    read and committed. Nothing was applied; the item can be applied again.
+    """
+
+class LocalAggregateStore(AggregateStore):
+    """
+    Stores rollups and the ledger in a local JSON file. Intended for local
+    development and offline runs (e.g. after a backfill).
+
+    Attributes
+    ----------
+        path (str): JSON file the state is written to.
+    """
+
+    def __init__(self, path: str):
+        """
+        Loads the state from `path` if it exists.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = {"rollups": {}, "ledgers": {}, "items": {}}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fh:
+                self._state.update(json.load(fh))
+
+    def add_day(self, item_id: str, day: str) -> List[str]:
+        with self._lock:
+            days = self._state["items"].setdefault(item_id, [])
+            if day not in days:
+                days.append(day)
+                self._save()
+            return list(days)
+
+    def get_ledger(self, day: str, item_id: str) -> Optional[dict]:
+        return self._state["ledgers"].get(day, {}).get(item_id)
+
+    def commit(self, day: str, item_id: str, increments: Dict[str, float], entry: dict,
+               previous: Optional[dict]):
+        with self._lock:
+            ledger = self._state["ledgers"].setdefault(day, {})
+            if ledger.get(item_id) != previous:
+                raise AggregateConflictError(f"Ledger entry of {item_id} for {day} changed")
+            rollup = self._state["rollups"].setdefault(
+                day, {"id": f"daily:{day}", "kind": "daily", "day": day}
+            )
+            for key, value in increments.items():
+                rollup[key] = rollup.get(key, 0) + value
+            ledger[item_id] = entry
+            # One write for both, so the file never holds one without the other
+            self._save()
+
+    def get_rollup(self, day: str) -> Optional[dict]:
+        return self._state["rollups"].get(day)
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(self._state, fh)
+        os.replace(tmp_path, self.path)
+
+class CosmosAggregateStore(AggregateStore):
+    """
+    Stores rollups and the ledger in a Cosmos DB container partitioned on
+    `/day`. A day's rollup (`daily:<day>`) and the ledger entries of the
+    items that contribute to it (`ledger:<id>`) share a logical partition, so
+    a rollup update and its ledger entry are written in one transactional
+    batch. The days each item has contributed to are kept in `item:<id>`
+    documents in the ITEMS_PARTITION partition.
+
+    Counters are updated with partial document update `incr` operations, so
+    concurrent updates to the same day never overwrite each other. Ledger
+    entries are replaced only if their etag is unchanged.
+
+    Attributes
+    ----------
+        container (ContainerProxy): The aggregates container.
+    """
+
+    def __init__(self, container=None):
+        """
+        Initialises the store on `container`, or on the container named by
+        COSMOS_AGGREGATES_CONTAINER in the results database.
+        """
+        if container is None:
+            # pylint: disable=import-outside-toplevel
+            from services.client_registry import get_client
+            container = (
+                get_client("cosmos")
+                .get_database_client(os.environ["COSMOS_DATABASE_NAME"])
+                .get_container_client(os.environ.get("COSMOS_AGGREGATES_CONTAINER", "Aggregates"))
+            )
+        self.container = container
+
+    def _read(self, item_id: str, partition_key: str) -> Optional[dict]:
+        from azure.cosmos import exceptions # pylint: disable=import-outside-toplevel
+        try:
+            return self.container.read_item(item=item_id, partition_key=partition_key)
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+
+    def add_day(self, item_id: str, day: str) -> List[str]:
+        # pylint: disable=import-outside-toplevel
+        from azure.core import MatchConditions
+        from azure.cosmos import exceptions
+
+        doc = self._read(f"item:{item_id}", ITEMS_PARTITION)
+        days = doc["days"] if doc else []
+        if day in days:
+            return days
+        body = {"id": f"item:{item_id}", "kind": "item", "day": ITEMS_PARTITION, "days": days + [day]}
+        try:
+            if doc is None:
+                self.container.create_item(body)
+            else:
+                self.container.replace_item(
+                    item=body["id"], body=body,
+                    etag=doc["_etag"], match_condition=MatchConditions.IfNotModified
+                )
+        except (exceptions.CosmosResourceExistsError, exceptions.CosmosAccessConditionFailedError) as e:
+            raise AggregateConflictError(f"Days of {item_id} changed") from e
+        return body["days"]
+
+    def get_ledger(self, day: str, item_id: str) -> Optional[dict]:
+        return self._read(f"ledger:{item_id}", day)
+
+    def commit(self, day: str, item_id: str, increments: Dict[str, float], entry: dict,
+               previous: Optional[dict]):
+        from azure.cosmos import exceptions # pylint: disable=import-outside-toplevel
+        rollup_id = f"daily:{day}"
+        increment_ops = [
+            {"op": "incr", "path": f"/{key}", "value": value}
+            for key, value in increments.items()
+        ]
+        # A batch may hold several patches, each within the per-patch limit
+        operations = [
+            ("patch", (rollup_id, increment_ops[i : i + MAX_PATCH_OPERATIONS]))
+            for i in range(0, len(increment_ops), MAX_PATCH_OPERATIONS)
+        ]
+        body = {"id": f"ledger:{item_id}", "kind": "ledger", "day": day, **entry}
+        if previous is None:
+            operations.append(("create", (body,)))
+        else:
+            operations.append(("replace", (body["id"], body), {"if_match_etag": previous["_etag"]}))
+
+        for attempt in range(2):
+            try:
+                self.container.execute_item_batch(batch_operations=operations, partition_key=day)
+                return
+            except exceptions.CosmosBatchOperationError as e:
+                failed = operations[e.error_index]
+                if failed[0] != "patch" and e.status_code in (409, 412):
+                    raise AggregateConflictError(
+                        f"Ledger entry of {item_id} for {day} changed"
+                    ) from e
+                if failed[0] != "patch" or e.status_code != 404 or attempt:
+                    raise
+            # First result of the day: create an empty rollup and run the batch again
+            try:
+                self.container.create_item({"id": rollup_id, "kind": "daily", "day": day})
+            except exceptions.CosmosResourceExistsError:
+                pass  # another writer created it first
+
+    def get_rollup(self, day: str) -> Optional[dict]:
+        return self._read(f"daily:{day}", day)
+
+class AggregateService:
+    """
+    Applies changed result items to the daily rollups.
+
+    Attributes
+    ----------
+        logger (Logger): Logger instance for logging messages.
+        store (AggregateStore): Where rollups and the ledger are kept.
+
+    Methods
+    -------
+        apply(): Applies one changed result item.
+        apply_changes(): Applies a batch of changed result items.
+
+    Environment variables:
+        AGGREGATE_CONFLICT_RETRIES: Times an item is re-applied after a ledger
+                                    conflict before the batch fails (default: 5).
+    """
+
+    def __init__(self, store: AggregateStore = None):
+        """
+        Initialises the service.
+
+        Args:
+            store (AggregateStore, optional): Defaults to `get_aggregate_store()`.
+        """
+        self.logger = Logger.get_logger("AggregateService", json_format=True)
+        self.store = store or get_aggregate_store()
+        self.conflict_retries = int(os.environ.get("AGGREGATE_CONFLICT_RETRIES", 5))
+
+    def apply(self, item: dict) -> bool:
+        """
+        Applies one changed result item, replacing the contribution of its
+        previously applied version.
+
+        Each day the item has contributed to is brought to its target (the
+        new counters for the item's day, nothing for any other day) in one
+        atomic commit, using the day's ledger entry to compute the
+        difference. If a commit fails, the change feed redelivers the item
+        and the days already committed have nothing left to apply.
+
+        Args:
+            item (dict): A `DocumentResult` item from the change feed.
+
+        Returns:
+            bool: True if any rollup changed, False if the version was
+                  already applied.
+        """
+        new = contribution(item)
+        # Recorded first, so a retry also revisits this day if a commit fails
+        days = self.store.add_day(item["id"], new["day"])
+
+        changed = False
+        for day in days:
+            target = new["counters"] if day == new["day"] else {}
+            previous = self.store.get_ledger(day, item["id"])
+            applied = previous["counters"] if previous else {}
+            if applied == target:
+                continue
+            increments = {
+                key: round(target.get(key, 0) - applied.get(key, 0), 3)
+                for key in set(target) | set(applied)
+            }
+            self.store.commit(day, item["id"], {k: v for k, v in increments.items() if v}, {
+                "documentName": item.get("documentName"),
+                "sourceEtag": item.get("_etag"),
+                "counters": target
+            }, previous)
+            changed = True
+        return changed
+
+    def apply_changes(self, items: Iterable[dict]) -> dict:
+        """
+        Applies a batch of changed result items.
+
+        An item whose ledger entry was changed by a concurrent update is
+        re-applied against the fresh ledger, so one conflict does not fail
+        (and redeliver) the whole batch.
+
+        Args:
+            items (Iterable[dict]): `DocumentResult` items from the change feed.
+
+        Returns:
+            dict: `received`, `applied`, `skipped` and `conflicts` counts.
+
+        Raises:
+            AggregateConflictError: If an item still conflicts after
+                                    `conflict_retries` re-applications.
+        """
+        stats = {"received": 0, "applied": 0, "skipped": 0, "conflicts": 0}
+        with stage("AggregateUpdate") as st:
+            for item in items:
+                stats["received"] += 1
+                if self._apply_with_retries(item, stats):
+                    stats["applied"] += 1
+                else:
+                    stats["skipped"] += 1
+            st.add_attribute("applied", stats["applied"])
+
+        self.logger.info("Rollups updated from change feed", extra=stats)
+        return stats
+
+    def _apply_with_retries(self, item: dict, stats: dict) -> bool:
+        """
+        Applies one item, re-applying it after ledger conflicts.
+        """
+        for attempt in range(self.conflict_retries + 1):
+            try:
+                return self.apply(item)
+            except AggregateConflictError as e:
+                stats["conflicts"] += 1
+                if attempt == self.conflict_retries:
+                    raise
+                self.logger.warning("Conflicting rollup update, re-applying: %s", str(e),
+                                    extra={"item": item.get("id"), "attempt": attempt + 1})
+        return False
+
+def get_aggregate_store() -> AggregateStore:
+    """
+    Returns the rollup store configured by environment variables.
+
+    Environment variables:
+        AGGREGATES_BACKEND: "cosmos" (default) or "local".
+        COSMOS_AGGREGATES_CONTAINER: Container for the cosmos backend (default: "Aggregates").
+        AGGREGATES_PATH: JSON file for the local backend
+                         (default: <system temp>/processpdf-aggregates.json).
+
+    Returns:
+        AggregateStore: The configured store.
+    """
+    if os.environ.get("AGGREGATES_BACKEND", "cosmos").lower() == "local":
+        return LocalAggregateStore(os.environ.get(
+            "AGGREGATES_PATH",
+            os.path.join(tempfile.gettempdir(), "processpdf-aggregates.json")
+        ))
+    return CosmosAggregateStore()
@@ -0,0 +1,250 @@
+"""
+services/checkpoint_store.py
+Module for persisting pipeline stage outputs between retries.
+
+When a late stage fails (e.g. the Cosmos upsert or a chat call), the blob
+trigger retries the whole invocation. Storing each completed stage's output
+lets the retry resume from the last completed stage instead of repeating
+text extraction, OCR, chunking and embedding.
+
+Checkpoints are keyed by the SHA-256 of the PDF content, a digest of the
+document name, the pipeline version and the stage name, and are stored as
+gzip-compressed JSON. The name is part of the key because stage outputs
+depend on it (chunk ids and index entries are scoped to the document name),
+so two blobs with the same content must not share checkpoints. Bump
+`PIPELINE_VERSION` whenever a stage's output format or logic changes, so
+checkpoints written by older code are ignored.
+
+Classes:
+--------
+    CheckpointStore: Base class defining the checkpoint interface (no-op).
+    LocalCheckpointStore: Stores checkpoints as files in a local directory.
+    BlobCheckpointStore: Stores checkpoints as blobs in a storage container.
+
+Functions:
+--------
+    content_hash(): Returns the SHA-256 hex digest of the document content.
+    checkpoint_id(): Returns the checkpoint id of a document.
+    get_checkpoint_store(): Returns the checkpoint store configured by environment variables.
+
+Module-level constants:
+    PIPELINE_VERSION: Version of the stage output format.
+"""
+
+import os
+import gzip
+import json
+import hashlib
+import tempfile
+from typing import Any, Optional
+from services.logger import Logger
+
+PIPELINE_VERSION = "4"
+
+def content_hash(pdf_bytes: bytes) -> str:
+    """
+    Returns the SHA-256 hex digest of the document content.
+
+    Args:
+        pdf_bytes (bytes): Document content.
+
+    Returns:
+        str: 64-character hex digest.
+    """
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+def checkpoint_id(document_name: str, doc_hash: str) -> str:
+    """
+    Returns the checkpoint id of a document: its content hash followed by a
+    digest of its name.
+
+    Args:
+        document_name (str): The name of the document (blob name).
+        doc_hash (str): Content hash of the document.
+
+    Returns:
+        str: The id checkpoints of the document are stored under.
+    """
+    name_digest = hashlib.sha256(document_name.encode("utf-8")).hexdigest()[:16]
+    return f"{doc_hash}/{name_digest}"
+
+class CheckpointStore:
+    """
+    Base class defining the checkpoint interface. The base implementation
+    stores nothing, which disables checkpointing.
+
+    Methods
+    -------
+        load(): Returns the stored output of a stage, or None.
+        save(): Stores the output of a stage.
+        clear(): Removes all checkpoints for a document.
+    """
+
+    def __init__(self):
+        """
+        Initialises the store's logger.
+        """
+        self.logger = Logger.get_logger("CheckpointStore", json_format=True)
+
+    @staticmethod
+    def _key(doc_id: str, stage_name: str) -> str:
+        return f"{doc_id}/v{PIPELINE_VERSION}/{stage_name}.json.gz"
+
+    def load(self, doc_id: str, stage_name: str) -> Optional[Any]:
+        """
+        Returns the stored output of a stage.
+
+        Args:
+            doc_id (str): Checkpoint id from `checkpoint_id()`.
+            stage_name (str): Name of the stage.
+
+        Returns:
+            Any | None: The stage output, or None if there is no checkpoint.
+        """
+        try:
+            raw = self._read(self._key(doc_id, stage_name))
+            if raw is None:
+                return None
+            value = json.loads(gzip.decompress(raw))
+        except Exception as e: # pylint: disable=broad-except
+            # A broken checkpoint must never fail the pipeline; recompute instead
+            self.logger.warning("Could not read checkpoint %s: %s", stage_name, str(e))
+            return None
+        self.logger.info("Resuming from checkpoint", extra={"stage": stage_name})
+        return value
+
+    def save(self, doc_id: str, stage_name: str, value: Any):
+        """
+        Stores the output of a stage. Failures are logged and ignored.
+
+        Args:
+            doc_id (str): Checkpoint id from `checkpoint_id()`.
+            stage_name (str): Name of the stage.
+            value (Any): JSON-serialisable stage output.
+        """
+        try:
+            data = gzip.compress(json.dumps(value).encode("utf-8"), compresslevel=5)
+            self._write(self._key(doc_id, stage_name), data)
+        except Exception as e: # pylint: disable=broad-except
+            self.logger.warning("Could not write checkpoint %s: %s", stage_name, str(e))
+
+    def clear(self, doc_id: str):
+        """
+        Removes all checkpoints for a document. Failures are logged and ignored.
+
+        Args:
+            doc_id (str): Checkpoint id from `checkpoint_id()`.
+        """
+        try:
+            self._delete_prefix(f"{doc_id}/")
+        except Exception as e: # pylint: disable=broad-except
+            self.logger.warning("Could not clear checkpoints: %s", str(e))
+
+    # Backend hooks; the base class is a no-op store
+    def _read(self, key: str) -> Optional[bytes]:
+        return None
+
+    def _write(self, key: str, data: bytes):
+        pass
+
+    def _delete_prefix(self, prefix: str):
+        pass
+
+class LocalCheckpointStore(CheckpointStore):
+    """
+    Stores checkpoints as files in a local directory. Writes are atomic
+    (temporary file + rename), so a crash never leaves a torn checkpoint.
+
+    Attributes
+    ----------
+        root (str): Directory checkpoints are written to.
+    """
+
+    def __init__(self, root: str):
+        """
+        Initialises the store under `root`.
+        """
+        super().__init__()
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def _read(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as fh:
+            return fh.read()
+
+    def _write(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+
+    def _delete_prefix(self, prefix: str):
+        directory = self._path(prefix.rstrip("/"))
+        for dirpath, _, filenames in os.walk(directory, topdown=False):
+            for name in filenames:
+                os.remove(os.path.join(dirpath, name))
+            os.rmdir(dirpath)
+
+class BlobCheckpointStore(CheckpointStore):
+    """
+    Stores checkpoints as blobs in a storage container, so a retry that
+    lands on a different instance can still resume.
+
+    Attributes
+    ----------
+        container (ContainerClient): Container checkpoints are written to.
+    """
+
+    def __init__(self, container_name: str):
+        """
+        Initialises the store on `container_name` of the `AzureWebJobsStorage` account.
+        """
+        super().__init__()
+        # pylint: disable=import-outside-toplevel
+        from services.client_registry import get_client
+        self.container = get_client("blob").get_container_client(container_name)
+
+    def _read(self, key: str) -> Optional[bytes]:
+        from azure.core.exceptions import ResourceNotFoundError # pylint: disable=import-outside-toplevel
+        try:
+            return self.container.download_blob(key).readall()
+        except ResourceNotFoundError:
+            return None
+
+    def _write(self, key: str, data: bytes):
+        self.container.upload_blob(key, data, overwrite=True)
+
+    def _delete_prefix(self, prefix: str):
+        names = [b.name for b in self.container.list_blobs(name_starts_with=prefix)]
+        if names:
+            self.container.delete_blobs(*names)
+
+def get_checkpoint_store() -> CheckpointStore:
+    """
+    Returns the checkpoint store configured by environment variables.
+
+    Environment variables:
+        CHECKPOINT_BACKEND: "local" (default), "blob" or "none".
+        CHECKPOINT_DIR: Directory for the local backend
+                        (default: <system temp>/processpdf-checkpoints).
+        CHECKPOINT_CONTAINER: Container for the blob backend (default: "pipeline-checkpoints").
+
+    Returns:
+        CheckpointStore: The configured store.
+    """
+    backend = os.environ.get("CHECKPOINT_BACKEND", "local").lower()
+    if backend == "blob":
+        return BlobCheckpointStore(os.environ.get("CHECKPOINT_CONTAINER", "pipeline-checkpoints"))
+    if backend == "local":
+        return LocalCheckpointStore(os.environ.get(
+            "CHECKPOINT_DIR",
+            os.path.join(tempfile.gettempdir(), "processpdf-checkpoints")
+        ))
+    return CheckpointStore()
@@ -1,29 +1,295 @@
 """
-    NOT IN USE
-    services/classification_service.py
-    Module for classification service to classify text using a pre-trained model.
+services/classification_service.py
+Module for classifying documents as annual financial statements (AFS).
+
+The classifier is a logistic regression over hashed word n-gram features,
+evaluated in NumPy. The model is a small `.npz` artefact produced by
+`Models/Classification/train.py` and loaded once per worker; a prediction
+takes a few milliseconds, so it runs in-process before the expensive RAG
+stage and lets the pipeline skip embeddings and LLM checks for documents
+that are clearly not financial statements.
+
+The artefact is not kept in the repository: `infra/retrain_pipeline.sh`
+installs it into `models/` before the function app is published. If it is
+missing, a warning is logged when the worker loads the service and documents
+are left unclassified (`is_valid_afs` None), so the RAG checks always run.
+
+Classes:
+--------
+    HashingFeaturizer: Turns text into hashed, L2-normalised n-gram features.
+    LinearClassifier: Logistic regression over hashed features.
+    ClassificationService: Classifies documents with the configured model.
+
+Functions:
+--------
+    get_classification_service(): Returns the worker's shared ClassificationService.
+
+Module-level constants:
+    DEFAULT_MODEL_PATH: Where the model artefact is looked for by default.
 """
 
+import os
+import re
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import Optional, Tuple
+import numpy as np
+from services.logger import Logger
+
+DEFAULT_MODEL_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "afs_classifier.npz"
+)
+
+# Numbers (amounts, years, note references) collapse to a single token
+_NUMBER_RE = re.compile(r"\d[\d,.]*")
+_TOKEN_RE = re.compile(r"[a-z0]+")
+
+class HashingFeaturizer:
+    """
+    Turns text into hashed, L2-normalised n-gram features.
+
+    Text is lower-cased, numbers are collapsed to "0", and word n-grams up to
+    `ngram_max` are hashed (CRC-32) into `n_features` buckets with
+    log-scaled counts. Only the first `max_chars` characters are used: the
+    cover, contents and first statements carry the signal, and the cap keeps
+    the cost of a prediction independent of document length.
+
+    The training pipeline imports this class, so training and serving always
+    use the same features.
+
+    Attributes
+    ----------
+        n_features (int): Number of hash buckets.
+        ngram_max (int): Longest word n-gram.
+        max_chars (int): Characters of text used.
+
+    Methods
+    -------
+        transform(): Returns the sparse feature vector of a text.
+    """
+
+    def __init__(self, n_features: int = 2**18, ngram_max: int = 2, max_chars: int = 30000):
+        """
+        Initialises the featurizer.
+
+        Args:
+            n_features (int): Number of hash buckets.
+            ngram_max (int): Longest word n-gram.
+            max_chars (int): Characters of text used.
+        """
+        self.n_features = n_features
+        self.ngram_max = ngram_max
+        self.max_chars = max_chars
+
+    def transform(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the sparse feature vector of a text.
+
+        Args:
+            text (str): Document text.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Bucket indices (int64) and values
+                (float32). Indices may repeat where n-grams collide.
+        """
+        tokens = _TOKEN_RE.findall(_NUMBER_RE.sub("0", text[:self.max_chars].lower()))
+        grams = Counter(tokens)
+        for n in range(2, self.ngram_max + 1):
+            grams.update(" ".join(gram) for gram in zip(*(tokens[i:] for i in range(n))))
+        if not grams:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        indices = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams),
+                              dtype=np.int64, count=len(grams)) % self.n_features
+        values = np.log1p(np.fromiter(grams.values(), dtype=np.float32, count=len(grams)))
+        values /= np.linalg.norm(values)
+        return indices, values
+
+class LinearClassifier:
+    """
+    Logistic regression over hashed features.
+
+    Attributes
+    ----------
+        weights (np.ndarray): One weight per hash bucket.
+        bias (float): Intercept.
+        featurizer (HashingFeaturizer): Featurizer the model was trained with.
+        threshold (float): Probability at or above which a document is an AFS.
+        version (str): Model version recorded at training time.
+
+    Methods
+    -------
+        load(): Loads a model artefact.
+        save(): Writes a model artefact.
+        predict_proba(): Returns the probability that a text is an AFS.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: float, featurizer: HashingFeaturizer,
+                 threshold: float = 0.5, version: str = None):
+        """
+        Initialises the classifier.
+
+        Args:
+            weights (np.ndarray): One weight per hash bucket.
+            bias (float): Intercept.
+            featurizer (HashingFeaturizer): Featurizer the model was trained with.
+            threshold (float): Probability at or above which a document is an AFS.
+            version (str, optional): Model version.
+        """
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.featurizer = featurizer
+        self.threshold = threshold
+        self.version = version
+
+    @classmethod
+    def load(cls, path: str) -> "LinearClassifier":
+        """
+        Loads a model artefact.
+
+        Args:
+            path (str): Path of the `.npz` artefact.
+
+        Returns:
+            LinearClassifier: The model.
+
+        Raises:
+            OSError: If the file cannot be read.
+            KeyError: If the artefact is missing a field.
+        """
+        with np.load(path, allow_pickle=False) as artefact:
+            featurizer = HashingFeaturizer(
+                n_features=int(artefact["n_features"]),
+                ngram_max=int(artefact["ngram_max"]),
+                max_chars=int(artefact["max_chars"])
+            )
+            return cls(
+                weights=artefact["weights"],
+                bias=float(artefact["bias"]),
+                featurizer=featurizer,
+                threshold=float(artefact["threshold"]),
+                version=str(artefact["version"])
+            )
+
+    def save(self, path: str, **metadata):
+        """
+        Writes a model artefact (compressed `.npz`). Weights are stored as
+        float32, the type they are used in, so a loaded model scores exactly
+        as the one that was evaluated after training.
+
+        Args:
+            path (str): Path of the `.npz` artefact.
+            **metadata: Extra scalar or string fields to store (e.g. metrics).
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(
+            path,
+            weights=self.weights.astype(np.float32),
+            bias=np.float64(self.bias),
+            n_features=np.int64(self.featurizer.n_features),
+            ngram_max=np.int64(self.featurizer.ngram_max),
+            max_chars=np.int64(self.featurizer.max_chars),
+            threshold=np.float64(self.threshold),
+            version=np.str_(self.version or ""),
+            **{key: np.asarray(value) for key, value in metadata.items()}
+        )
+
+    def predict_proba(self, text: str) -> float:
+        """
+        Returns the probability that a text is an AFS.
+
+        Args:
+            text (str): Document text.
+
+        Returns:
+            float: Probability between 0 and 1.
+        """
+        indices, values = self.featurizer.transform(text)
+        score = float(self.weights[indices] @ values) + self.bias
+        return float(1.0 / (1.0 + np.exp(-score)))
+
 class ClassificationService:
     """
     A service class to handle classification operations.
-    
-    Methods:
-        classify_text(text: str) -> str:
-            Classifies the given text using a pre-trained model.
+
+    Attributes
+    ----------
+        model (LinearClassifier | None): The loaded model, or None if no
+                                         artefact could be loaded.
+        threshold (float): Probability at or above which a document is an AFS.
+
+    Methods
+    -------
+        classify_document(): Classifies a document's text.
+
+    Environment variables:
+        CLASSIFIER_MODEL_PATH: Path of the model artefact (default: models/afs_classifier.npz).
+        CLASSIFIER_THRESHOLD: Overrides the threshold stored in the artefact.
     """
 
+    def __init__(self, model_path: str = None):
+        """
+        Initialises the service and loads the model.
+
+        Args:
+            model_path (str, optional): Path of the model artefact; defaults to
+                CLASSIFIER_MODEL_PATH or DEFAULT_MODEL_PATH.
+        """
+        self.logger = Logger.get_logger("ClassificationService", json_format=True)
+        model_path = model_path or os.environ.get("CLASSIFIER_MODEL_PATH", DEFAULT_MODEL_PATH)
+
+        self.model: Optional[LinearClassifier] = None
+        try:
+            self.model = LinearClassifier.load(model_path)
+            self.logger.info("Classifier model loaded",
+                             extra={"path": model_path, "version": self.model.version})
+        except (OSError, KeyError, ValueError) as e:
+            self.logger.warning(
+                "Classifier model not available, documents will not be classified: %s", str(e),
+                extra={"path": model_path}
+            )
+
+        self.threshold = float(os.environ.get(
+            "CLASSIFIER_THRESHOLD", self.model.threshold if self.model else 0.5
+        ))
+
     def classify_document(self, extracted_text: str) -> dict:
         """
-        Classifies the given text using a pre-trained model.
+        Classifies a document's text.
 
         Args:
             extracted_text (str): The text to be classified.
 
         Returns:
-            dict: The classification result containing the classification and confidence.
+            dict: `is_valid_afs`, `afs_confidence` (probability of AFS),
+                  `ml_message` and `model_version`; without a model,
+                  `is_valid_afs` and `afs_confidence` are None.
         """
+        if self.model is None:
+            return {
+                "is_valid_afs": None,
+                "afs_confidence": None,
+                "ml_message": "No classifier model; the document was not classified.",
+                "model_version": None
+            }
+
+        probability = round(self.model.predict_proba(extracted_text), 4)
+        is_afs = probability >= self.threshold
+        return {
+            "is_valid_afs": is_afs,
+            "afs_confidence": probability,
+            "ml_message": (
+                "The document is classified as an annual financial statement."
+                if is_afs else
+                "The document is not classified as an annual financial statement."
+            ),
+            "model_version": self.model.version
+        }
 
-        # Replace this with an actual call to your ML endpoint.
-        return {"isAFS": True, "confidence": 0.95}
-        
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_classification_service() -> ClassificationService:
+    """
+    Returns the worker's shared ClassificationService (the model is loaded once).
+    """
+    return ClassificationService()
@@ -0,0 +1,302 @@
+"""
+services/client_registry.py
+Module for a process-wide registry of SDK clients.
+
+Azure Functions keeps the Python worker alive between invocations, so
+clients created at module scope survive "warm" invocations. This module
+provides a thread-safe registry that creates each SDK client lazily, once
+per worker, and hands the same instance (and its connection pool) to every
+service that asks for it.
+
+Each registered client is built from a set of environment variables. The
+values of those variables form a fingerprint; when the fingerprint changes
+(e.g. a rotated key or a different endpoint) a new client is created on the
+next lookup. The old one may still be in use by invocations that looked it
+up earlier, so it is retired rather than closed: retired clients are closed
+once they have been replaced for a grace period, or on `reset()`.
+
+Classes:
+--------
+    ClientRegistry: A thread-safe, lazily initialised registry of SDK clients.
+
+Functions:
+--------
+    get_client(): Returns the shared client registered under the given name.
+
+Module-level constants:
+    registry: The process-wide ClientRegistry instance used by all services.
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from services.logger import Logger
+
+class ClientRegistry:
+    """
+    A thread-safe, lazily initialised registry of SDK clients.
+
+    Clients are registered by name with a factory and the environment
+    variables the factory depends on. The first call to `get()` builds
+    the client; later calls return the cached instance until the
+    configuration fingerprint changes.
+
+    Attributes
+    ----------
+        logger (Logger): Logger instance for logging messages.
+
+    Methods
+    -------
+        register(): Registers a client factory under a name.
+        get(): Returns the shared client for a name, creating it if needed.
+        override(): Replaces a client with a fake (intended for tests).
+        clear_overrides(): Removes all fakes injected via `override()`.
+        reset(): Closes and forgets every cached and retired client.
+        overridden(): Context manager that injects fakes for a block.
+
+    Environment variables:
+        CLIENT_RETIRE_GRACE_SECONDS: Seconds a replaced client is kept open
+                                     for invocations still using it (default: 600).
+    """
+
+    def __init__(self):
+        """
+        Initialises an empty registry.
+        """
+        self.logger = Logger.get_logger("ClientRegistry", json_format=True)
+        self.retire_grace = float(os.environ.get("CLIENT_RETIRE_GRACE_SECONDS", 600))
+        self._lock = threading.RLock()
+        self._factories: Dict[str, Tuple[Callable[[], Any], Tuple[str, ...]]] = {}
+        self._clients: Dict[str, Tuple[Tuple, Any]] = {}
+        self._overrides: Dict[str, Any] = {}
+        # Replaced clients still open: (name, client, time replaced)
+        self._retired: List[Tuple[str, Any, float]] = []
+
+    def register(self, name: str, factory: Callable[[], Any], config_keys: Iterable[str] = ()):
+        """
+        Registers a client factory under a name.
+
+        Args:
+            name (str): The name the client is looked up by.
+            factory (Callable[[], Any]): Zero-argument callable that builds the client.
+            config_keys (Iterable[str]): Environment variables the factory reads.
+                A change in any of their values causes the client to be rebuilt.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._factories[name] = (factory, tuple(config_keys))
+            self._retire(name)
+
+    def get(self, name: str) -> Any:
+        """
+        Returns the shared client for a name, creating it on first use or
+        when its configuration has changed since it was created.
+
+        Args:
+            name (str): The registered client name.
+
+        Returns:
+            Any: The client instance.
+
+        Raises:
+            KeyError: If no factory is registered under `name`.
+        """
+        # Fast path: overrides and warm clients are read without building anything
+        if name in self._overrides:
+            return self._overrides[name]
+
+        factory, config_keys = self._factories[name]
+        fingerprint = self._fingerprint(config_keys)
+        cached = self._clients.get(name)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        with self._lock:
+            # Re-check under the lock; another thread may have built it already
+            if name in self._overrides:
+                return self._overrides[name]
+            cached = self._clients.get(name)
+            if cached is not None and cached[0] == fingerprint:
+                return cached[1]
+
+            if cached is not None:
+                # Invocations that looked up the old client may still be using it
+                self.logger.info("Configuration changed, re-creating client '%s'", name)
+                self._retire(name)
+            self._close_retired(time.monotonic() - self.retire_grace)
+
+            client = factory()
+            self._clients[name] = (fingerprint, client)
+            self.logger.info("Created shared client '%s'", name)
+            return client
+
+    def override(self, name: str, client: Any):
+        """
+        Replaces a client with a fake. Intended for tests and benchmarks.
+
+        Args:
+            name (str): The registered client name.
+            client (Any): The object to return from `get(name)`.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._overrides[name] = client
+
+    def clear_overrides(self):
+        """
+        Removes all fakes injected via `override()`.
+        """
+        with self._lock:
+            self._overrides.clear()
+
+    @contextmanager
+    def overridden(self, **clients):
+        """
+        Context manager that injects fakes for the duration of a block.
+
+        Example
+        -------
+            >>> with registry.overridden(openai=FakeOpenAI()):
+                    EmbeddingService().index_chunks(...)
+        """
+        with self._lock:
+            previous = {k: self._overrides.get(k) for k in clients}
+            self._overrides.update(clients)
+        try:
+            yield self
+        finally:
+            with self._lock:
+                for key, value in previous.items():
+                    if value is None:
+                        self._overrides.pop(key, None)
+                    else:
+                        self._overrides[key] = value
+
+    def reset(self):
+        """
+        Closes and forgets every cached and retired client. Overrides are kept.
+        """
+        with self._lock:
+            for name in list(self._clients):
+                self._discard(name)
+            self._close_retired(float("inf"))
+
+    def _discard(self, name: str):
+        """
+        Removes a cached client, closing it if it exposes `close()`.
+        """
+        cached = self._clients.pop(name, None)
+        if cached is not None:
+            self._close(name, cached[1])
+
+    def _retire(self, name: str):
+        """
+        Removes a cached client without closing it; `_close_retired()` closes
+        it once the grace period has passed.
+        """
+        cached = self._clients.pop(name, None)
+        if cached is not None:
+            self._retired.append((name, cached[1], time.monotonic()))
+
+    def _close_retired(self, before: float):
+        """
+        Closes the retired clients replaced before the given monotonic time.
+        """
+        keep = []
+        for name, client, retired in self._retired:
+            if retired <= before:
+                self._close(name, client)
+            else:
+                keep.append((name, client, retired))
+        self._retired = keep
+
+    def _close(self, name: str, client: Any):
+        """
+        Closes a client if it exposes `close()`.
+        """
+        close = getattr(client, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e: # pylint: disable=broad-except
+                self.logger.warning("Error closing client '%s': %s", name, str(e))
+
+    @staticmethod
+    def _fingerprint(config_keys: Tuple[str, ...]) -> Tuple:
+        """
+        Returns the current values of the given environment variables.
+        """
+        return tuple(os.environ.get(k) for k in config_keys)
+
+# ---------------------------------------------------------------------- #
+# Factories. SDK imports are deferred so they are only paid for when the
+# client is first needed.
+# ---------------------------------------------------------------------- #
+
+def _cosmos_client():
+    from azure.cosmos import CosmosClient
+    return CosmosClient(
+        os.environ["COSMOS_ACCOUNT_URI"],
+        credential=os.environ.get("COSMOS_KEY")
+    )
+
+def _search_client():
+    from azure.search.documents import SearchClient
+    from azure.core.credentials import AzureKeyCredential
+    return SearchClient(
+        endpoint=os.environ["SEARCH_ENDPOINT"],
+        index_name=os.environ["SEARCH_INDEX"],
+        credential=AzureKeyCredential(os.environ["SEARCH_ADMIN_KEY"]),
+        api_version="2024-07-01"
+    )
+
+def _openai_client():
+    from openai import AzureOpenAI
+    return AzureOpenAI(
+        api_key=os.environ["AZURE_OPENAI_API_KEY"],
+        api_version=os.environ["AZURE_OPENAI_API_VERSION"],
+        azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"]
+    )
+
+def _blob_service_client():
+    from azure.storage.blob import BlobServiceClient
+    return BlobServiceClient.from_connection_string(os.environ["AzureWebJobsStorage"])
+
+def _http_session():
+    import requests
+    return requests.Session()
+
+registry = ClientRegistry()
+registry.register("cosmos", _cosmos_client, ("COSMOS_ACCOUNT_URI", "COSMOS_KEY"))
+registry.register(
+    "search",
+    _search_client,
+    ("SEARCH_ENDPOINT", "SEARCH_INDEX", "SEARCH_ADMIN_KEY")
+)
+registry.register(
+    "openai",
+    _openai_client,
+    ("AZURE_OPENAI_API_KEY", "AZURE_OPENAI_API_VERSION", "AZURE_OPENAI_ENDPOINT")
+)
+registry.register("blob", _blob_service_client, ("AzureWebJobsStorage",))
+registry.register("http", _http_session)
+
+def get_client(name: str) -> Any:
+    """
+    Returns the shared client registered under the given name.
+
+    Args:
+        name (str): One of "cosmos", "search", "openai", "blob" or "http", or any
+                    name registered later via `registry.register()`.
+
+    Returns:
+        Any: The shared client instance.
+    """
+    return registry.get(name)
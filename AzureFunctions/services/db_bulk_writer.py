@@ -0,0 +1,279 @@
+"""
+services/db_bulk_writer.py
+Module for writing many document results to Cosmos DB at once.
+
+`DbService.store_results` performs one synchronous upsert per document, which
+is fine for blob-triggered traffic but limits bulk reprocessing runs. The
+`BulkDbWriter` buffers validated `DocumentResult` items and flushes them with
+bounded concurrency. Items sharing a partition key are written together as
+transactional batches (at most 100 operations each); a batch rejected for a
+reason other than throttling falls back to individual upserts so one bad item
+does not fail its neighbours.
+
+The Cosmos SDK already retries throttled requests (HTTP 429) itself, by
+default up to 9 times within 30 seconds, waiting as long as the service asks.
+A 429 only reaches the writer once those retries are exhausted; it then waits
+for the `x-ms-retry-after-ms` delay of that last response and tries again, up
+to `max_retries` times. The request charge (RU) of every call is collected
+and reported per flush, and an optional callback receives each flush report,
+so callers can tell when an item has actually been written.
+
+Classes:
+--------
+    BulkDbWriter: Buffers validated results and flushes them in batches.
+
+Module-level constants:
+    MAX_BATCH_OPERATIONS: Cosmos DB limit on operations per transactional batch.
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from azure.cosmos import exceptions
+from services.logger import Logger
+from services.tracer import stage
+from services.db_service import DbService
+
+# Cosmos DB limit on operations per transactional batch
+MAX_BATCH_OPERATIONS = 100
+
+# Fallback delay when a 429 response carries no retry-after header
+DEFAULT_RETRY_AFTER_MS = 1000
+
+class BulkDbWriter:
+    """
+    Buffers validated results and flushes them to Cosmos DB in batches.
+
+    The writer has the same `store_results()` signature as `DbService`, so it
+    can be used as a result sink for `DocumentPipeline` and the backfill tool.
+    Items are validated when they are added; they are written when the buffer
+    reaches `flush_size`, when `flush()` is called, or on `close()`.
+
+    Attributes
+    ----------
+        logger (Logger): Logger instance for logging messages.
+        container (ContainerProxy): Cosmos DB container client.
+        flush_size (int): Number of buffered items that triggers a flush.
+        max_concurrency (int): Maximum number of batches written in parallel.
+        max_retries (int): Retries for a throttled (429) request.
+        reports (list[dict]): One report per completed flush.
+        on_flush (Callable[[dict], None] | None): Called with each flush report.
+
+    Methods
+    -------
+        store_results(): Validates a result and adds it to the buffer.
+        flush(): Writes all buffered items and returns a flush report.
+        close(): Flushes any remaining items.
+
+    Environment variables:
+        COSMOS_BULK_FLUSH_SIZE: Default `flush_size` (default: 500).
+        COSMOS_BULK_CONCURRENCY: Default `max_concurrency` (default: 4).
+    """
+
+    def __init__(
+        self,
+        container=None,
+        flush_size: int = None,
+        max_concurrency: int = None,
+        max_retries: int = 5,
+        on_flush: Optional[Callable[[dict], None]] = None):
+        """
+        Initialises the writer.
+
+        Args:
+            container (ContainerProxy, optional): Target container; defaults to
+                the container configured for `DbService`.
+            flush_size (int, optional): Buffered items that trigger a flush.
+            max_concurrency (int, optional): Batches written in parallel.
+            max_retries (int): Retries for a throttled request, after the
+                SDK's own throttling retries have been exhausted.
+            on_flush (Callable[[dict], None], optional): Called with the report
+                of every flush once its writes have completed.
+        """
+        self.logger = Logger.get_logger("BulkDbWriter", json_format=True)
+        self.container = container if container is not None else DbService().container
+        self.flush_size = flush_size or int(os.environ.get("COSMOS_BULK_FLUSH_SIZE", 500))
+        self.max_concurrency = max_concurrency or int(os.environ.get("COSMOS_BULK_CONCURRENCY", 4))
+        self.max_retries = max_retries
+        self.reports: List[dict] = []
+        self.on_flush = on_flush
+        self._buffer: List[dict] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def store_results(self, document_name: str, data: dict, content_hash: str = None) -> dict:
+        """
+        Validates a result and adds it to the buffer, flushing when full.
+
+        Args:
+            document_name (str): The name of the processed document (blob name).
+            data (dict): A dictionary containing the result data to store.
+            content_hash (str, optional): SHA-256 of the document content.
+
+        Returns:
+            dict: The validated item (not yet written).
+
+        Raises:
+            pydantic.ValidationError: If the data does not match `DocumentResult`.
+        """
+        item = DbService.build_item(document_name, data, content_hash)
+        with self._lock:
+            self._buffer.append(item)
+            full = len(self._buffer) >= self.flush_size
+        if full:
+            self.flush()
+        return item
+
+    def flush(self) -> dict:
+        """
+        Writes all buffered items and returns a flush report.
+
+        Returns:
+            dict: `items`, `batches`, `written`, `documents` (the document
+                  name of every flushed item), `failed` (document names that
+                  could not be written), `throttled` (429 responses),
+                  `requestCharge` (RU) and `durationMs`.
+        """
+        with self._flush_lock:
+            with self._lock:
+                items, self._buffer = self._buffer, []
+
+            report = {
+                "items": len(items),
+                "batches": 0,
+                "written": 0,
+                "documents": [item["documentName"] for item in items],
+                "failed": [],
+                "throttled": 0,
+                "requestCharge": 0.0,
+                "durationMs": 0.0
+            }
+            if not items:
+                return report
+
+            started = time.perf_counter()
+            batches = self._group(items)
+            report["batches"] = len(batches)
+
+            with stage("CosmosBulkFlush", items=len(items), batches=len(batches)) as st:
+                with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                    for outcome in pool.map(lambda b: self._write_batch(*b), batches):
+                        report["written"] += outcome["written"]
+                        report["failed"].extend(outcome["failed"])
+                        report["throttled"] += outcome["throttled"]
+                        report["requestCharge"] += outcome["requestCharge"]
+                st.add_attribute("request_charge", round(report["requestCharge"], 2))
+
+            report["requestCharge"] = round(report["requestCharge"], 2)
+            report["durationMs"] = round((time.perf_counter() - started) * 1000, 3)
+            self.reports.append(report)
+
+            log = self.logger.warning if report["failed"] else self.logger.info
+            log(
+                "Bulk flush to Cosmos DB complete",
+                extra={key: value for key, value in report.items()
+                       if key not in ("documents", "failed")}
+                | {"failedCount": len(report["failed"])}
+            )
+            if self.on_flush is not None:
+                self.on_flush(report)
+            return report
+
+    def close(self) -> dict:
+        """
+        Flushes any remaining items.
+
+        Returns:
+            dict: The report of the final flush.
+        """
+        return self.flush()
+
+    @staticmethod
+    def _group(items: List[dict]) -> List[tuple]:
+        """
+        Groups items by partition key into batches of at most
+        MAX_BATCH_OPERATIONS, keeping only the last item per id.
+        """
+        by_key: Dict[str, Dict[str, dict]] = {}
+        for item in items:
+            # A transactional batch may not touch the same id twice
+            by_key.setdefault(item["documentType"], {})[item["id"]] = item
+
+        batches = []
+        for partition_key, unique in by_key.items():
+            values = list(unique.values())
+            for i in range(0, len(values), MAX_BATCH_OPERATIONS):
+                batches.append((partition_key, values[i : i + MAX_BATCH_OPERATIONS]))
+        return batches
+
+    def _call(self, outcome: dict, func, *args, **kwargs):
+        """
+        Calls a container method, retrying 429 responses after the delay in
+        `x-ms-retry-after-ms`, and adds the request charge to `outcome`.
+
+        The SDK retries throttled requests before raising, so these retries
+        only start once the client's own throttling retries have run out.
+        """
+        def hook(headers, _):
+            outcome["requestCharge"] += float(headers.get("x-ms-request-charge", 0) or 0)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(*args, response_hook=hook, **kwargs)
+            except (exceptions.CosmosHttpResponseError, exceptions.CosmosBatchOperationError) as e:
+                if e.status_code != 429 or attempt == self.max_retries:
+                    raise
+                outcome["throttled"] += 1
+                headers = e.headers or {}
+                outcome["requestCharge"] += float(headers.get("x-ms-request-charge", 0) or 0)
+                delay_ms = float(headers.get("x-ms-retry-after-ms", DEFAULT_RETRY_AFTER_MS))
+                self.logger.warning(
+                    "Cosmos DB throttled the request, retrying in %.0f ms", delay_ms,
+                    extra={"attempt": attempt + 1}
+                )
+                time.sleep(delay_ms / 1000)
+        return None
+
+    def _write_batch(self, partition_key: str, items: List[dict]) -> dict:
+        """
+        Writes one batch of items sharing a partition key.
+        """
+        outcome = {"written": 0, "failed": [], "throttled": 0, "requestCharge": 0.0}
+        operations = [("upsert", (item,)) for item in items]
+        try:
+            self._call(
+                outcome,
+                self.container.execute_item_batch,
+                batch_operations=operations,
+                partition_key=partition_key
+            )
+            outcome["written"] = len(items)
+            return outcome
+        except (exceptions.CosmosHttpResponseError, exceptions.CosmosBatchOperationError) as e:
+            # Batches are atomic; retry item by item so one bad item only fails itself
+            self.logger.warning(
+                "Transactional batch failed, falling back to single upserts",
+                extra={
+                    "status_code": e.status_code,
+                    "error_index": getattr(e, "error_index", None),
+                    "items": len(items)
+                }
+            )
+
+        for item in items:
+            try:
+                self._call(outcome, self.container.upsert_item, item)
+                outcome["written"] += 1
+            except exceptions.CosmosHttpResponseError as e:
+                self.logger.error(
+                    "Failed to upsert item to Cosmos DB",
+                    extra={
+                        "documentName": item["documentName"],
+                        "status_code": e.status_code,
+                        "error": e.message
+                    }
+                )
+                outcome["failed"].append(item["documentName"])
+        return outcome
@@ -26,6 +26,10 @@ from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel, Field
 
+# Value of the container's partition key (`/documentType`, see
+# infra/bicep/cosmosdb.bicep) for every result item
+DEFAULT_DOCUMENT_TYPE = "financialStatement"
+
 class DocumentResult(BaseModel):
     """
     DocumentResult model to represent the result of a document processing operation.
@@ -46,6 +50,8 @@ class DocumentResult(BaseModel):
         >>> doc_result = DocumentResult(
                 id="12345",
                 documentName="example.pdf",
+                documentType="financialStatement",
+                contentHash="9f86d081884c7d65...",
                 isPDF=True,
                 pageCount=10,
                 blobUrl="https://example.com/blob",
@@ -60,12 +66,20 @@ class DocumentResult(BaseModel):
                 balanceSheetPages=[],
                 hasCashFlow=True,
                 cashFlowPages=[3],
+                hasAuditorSignature=True,
+                auditorSignaturePages=[14],
                 timestamp=datetime.now()
             )
   
     Notes
     -----
         - The model should include the names from CheckDef in checks.py.
+        - `id` is derived from `documentName` and `contentHash` (see
+          `services.db_service.document_id`), so re-processing the same
+          content overwrites the same item instead of creating a duplicate.
+        - `documentType` is the container's partition key.
+        - `hasAuditorSignature` is None when signature detection did not run
+          (disabled, RAG skipped, or the pages could not be rendered).
 
     See Also
     --------
@@ -74,6 +88,8 @@ class DocumentResult(BaseModel):
     """
     id: str
     documentName: str
+    documentType: str = DEFAULT_DOCUMENT_TYPE
+    contentHash: Optional[str] = None
     isPDF: bool
     pageCount: Optional[int] = None
     blobUrl: str
@@ -88,6 +104,9 @@ class DocumentResult(BaseModel):
     balanceSheetPages: Optional[list[int]] = None
     hasCashFlow: Optional[bool] = None
     cashFlowPages: Optional[list[int]] = None
+    hasAuditorSignature: Optional[bool] = None
+    auditorSignaturePages: Optional[list[int]] = None
+    processingMs: Optional[float] = None
     timestamp: datetime
 
     class Config:
@@ -6,19 +6,85 @@ This module provides a service class to interact with Azure Cosmos DB for
 storing and retrieving document processing results. It includes methods for
 upserting items into the database and handling exceptions.
 
+Items are written with deterministic ids derived from the document name and
+content hash, so retries and re-uploads of the same file overwrite one item.
+Individual stages can update their fields with a Cosmos DB partial document
+update (`patch_results`) instead of re-sending the whole item.
+
 Classes:
 --------
     DbService: A service class to handle database operations.
 
+Functions:
+--------
+    document_id(): Returns the deterministic Cosmos DB id for a document.
+    validate_fields(): Validates a partial set of DocumentResult fields.
+
 """
 
 import os
 import uuid
 from datetime import datetime
-from azure.cosmos import CosmosClient, exceptions
+from functools import lru_cache
+from pydantic import TypeAdapter
+from azure.cosmos import exceptions
 from services.logger import Logger
+from services.client_registry import get_client
+from services.tracer import stage
 from services.debug_utils import write_debug_file, is_debug_mode
-from services.db_models import DocumentResult
+from services.db_models import DocumentResult, DEFAULT_DOCUMENT_TYPE
+
+# Namespace for uuid5 ids; changing it would orphan every existing item
+DOCUMENT_ID_NAMESPACE = uuid.UUID("5b0c4f7e-3a5d-4b8e-9d0e-6c1f2a7b8e41")
+
+# Cosmos DB allows at most 10 operations per partial document update
+MAX_PATCH_OPERATIONS = 10
+
+# Fields that identify an item and must not be changed by a patch
+IMMUTABLE_FIELDS = {"id", "documentName", "documentType", "contentHash"}
+
+def document_id(document_name: str, content_hash: str = None) -> str:
+    """
+    Returns the deterministic Cosmos DB id for a document.
+
+    Args:
+        document_name (str): The name of the processed document (blob name).
+        content_hash (str, optional): SHA-256 of the document content. When
+            omitted the id depends on the name only.
+
+    Returns:
+        str: A UUID (version 5) string.
+    """
+    return str(uuid.uuid5(DOCUMENT_ID_NAMESPACE, f"{document_name}|{content_hash or ''}"))
+
+@lru_cache(maxsize=None)
+def _field_adapter(name: str) -> TypeAdapter:
+    """
+    Returns a cached TypeAdapter for one DocumentResult field.
+    """
+    return TypeAdapter(DocumentResult.model_fields[name].annotation)
+
+def validate_fields(fields: dict) -> dict:
+    """
+    Validates a partial set of DocumentResult fields.
+
+    Args:
+        fields (dict): Field name to value.
+
+    Returns:
+        dict: The validated values, serialised to JSON types.
+
+    Raises:
+        ValueError: If a field is unknown or may not be patched.
+        pydantic.ValidationError: If a value has the wrong type.
+    """
+    validated = {}
+    for name, value in fields.items():
+        if name not in DocumentResult.model_fields or name in IMMUTABLE_FIELDS:
+            raise ValueError(f"Field '{name}' cannot be patched on DocumentResult.")
+        adapter = _field_adapter(name)
+        validated[name] = adapter.dump_python(adapter.validate_python(value), mode="json")
+    return validated
 
 class DbService:
     """
@@ -33,7 +99,7 @@ class DbService:
         account_uri (str): URI of the Cosmos DB account.
         database_name (str): Name of the Cosmos DB database.
         container_name (str): Name of the Cosmos DB container.
-        client (CosmosClient): Cosmos DB client instance.
+        client (CosmosClient): Shared Cosmos DB client instance from the client registry.
         database (Database): Cosmos DB database client instance.
         container (Container): Cosmos DB container client instance.        
 
@@ -41,8 +107,12 @@ class DbService:
     ----------
         __init__():
             Initializes the DbService instance and connects to Cosmos DB.
-        store_results(document_name: str, data: dict) -> dict:
+        build_item(document_name: str, data: dict, content_hash: str) -> dict:
+            Builds and validates the Cosmos DB item for a document result.
+        store_results(document_name: str, data: dict, content_hash: str) -> dict:
             Stores the classification result in the Cosmos DB container.
+        patch_results(document_name: str, content_hash: str, fields: dict) -> dict:
+            Updates some fields of an existing result with a partial document update.
     """
     def __init__(self):
         """
@@ -51,9 +121,6 @@ class DbService:
         # Initialise the JSON logger for this service
         self.logger = Logger.get_logger("DbService", json_format=True)
 
-        # Get key
-        key = os.environ.get("COSMOS_KEY")
-
         # Read Cosmos DB configuration from environment variables
         self.account_uri = os.environ.get("COSMOS_ACCOUNT_URI")
         self.database_name = os.environ.get("COSMOS_DATABASE_NAME")
@@ -64,8 +131,8 @@ class DbService:
             self.logger.error("Missing Cosmos DB configuration. Check environment variables.")
             raise ValueError("Missing Cosmos DB configuration. Check environment variables.")
 
-        # Authenticate with Azure AD
-        self.client = CosmosClient(self.account_uri, credential=key)
+        # Reuse the worker-wide Cosmos client (and its connection pool)
+        self.client = get_client("cosmos")
         self.database = self.client.get_database_client(self.database_name)
         self.container = self.database.get_container_client(self.container_name)
         self.logger.info("Connected to Cosmos DB successfully.")
@@ -83,35 +150,28 @@ class DbService:
                     }
                     )
 
-    def store_results(self, document_name: str, data: dict) -> dict:
+    @staticmethod
+    def build_item(document_name: str, data: dict, content_hash: str = None) -> dict:
         """
-        Stores the classification result in the Cosmos DB container.
+        Builds and validates the Cosmos DB item for a document result.
 
         Args:
             document_name (str): The name of the processed document (blob name).
             data (dict): A dictionary containing the result data to store.
+            content_hash (str, optional): SHA-256 of the document content.
 
         Returns:
-            dict: The upserted item from Cosmos DB.
+            dict: The item validated against `DocumentResult`, serialised to JSON types.
 
         Raises:
-            exceptions.CosmosHttpResponseError: 
-                If there is an error during the upsert operation.
-            
+            pydantic.ValidationError: If the data does not match `DocumentResult`.
         """
-        # Log entry and key metadata
-        self.logger.info(
-            "Storing results to Cosmos DB",
-            extra={
-                "documentName": document_name,
-                "fields": data.keys(),
-            }
-        )
-
         # Build the raw payload
         raw = {
-            "id": str(uuid.uuid4()),  # Generate a unique ID for the document
+            # Deterministic, so upserts of the same document are idempotent
+            "id": document_id(document_name, content_hash),
             "documentName": document_name,
+            "contentHash": content_hash,
             "timestamp": datetime.utcnow(),
             **data
         }
@@ -120,19 +180,49 @@ class DbService:
         if is_debug_mode():
             write_debug_file(raw, prefix="cosmos_raw")
 
-       # Validate & coerce via Pydantic
-        validated_item = DocumentResult(**raw).model_dump(
+        # Validate & coerce via Pydantic
+        return DocumentResult(**raw).model_dump(
             mode="json",
             by_alias=True,
         )
 
+    def store_results(self, document_name: str, data: dict, content_hash: str = None) -> dict:
+        """
+        Stores the classification result in the Cosmos DB container.
+
+        Args:
+            document_name (str): The name of the processed document (blob name).
+            data (dict): A dictionary containing the result data to store.
+            content_hash (str, optional): SHA-256 of the document content, used
+                                          for the deterministic item id.
+
+        Returns:
+            dict: The upserted item from Cosmos DB.
+
+        Raises:
+            exceptions.CosmosHttpResponseError: 
+                If there is an error during the upsert operation.
+            
+        """
+        # Log entry and key metadata
+        self.logger.info(
+            "Storing results to Cosmos DB",
+            extra={
+                "documentName": document_name,
+                "fields": data.keys(),
+            }
+        )
+
+        validated_item = self.build_item(document_name, data, content_hash)
+
         # DEBUG
         if is_debug_mode():
             write_debug_file(validated_item, prefix="cosmos_validated")
 
         # 5) Upsert into Cosmos
         try:
-            result = self.container.upsert_item(validated_item)
+            with stage("CosmosUpsert", fields=len(validated_item)):
+                result = self.container.upsert_item(validated_item)
             self.logger.info(
                 "Successfully stored results to Cosmos DB",
                 extra={"documentName": document_name, "item_id": validated_item["id"]}
@@ -153,3 +243,57 @@ class DbService:
         # DEBUG
         if is_debug_mode():
             write_debug_file(result, prefix="cosmos_response")
+
+    def patch_results(self, document_name: str, content_hash: str, fields: dict) -> dict:
+        """
+        Updates some fields of an existing result with a Cosmos DB partial
+        document update, so a stage can write its fields without re-sending
+        the whole item.
+
+        Args:
+            document_name (str): The name of the processed document (blob name).
+            content_hash (str): SHA-256 of the document content.
+            fields (dict): DocumentResult field names and their new values.
+
+        Returns:
+            dict: The patched item from Cosmos DB.
+
+        Raises:
+            ValueError: If a field is unknown or identifies the item.
+            pydantic.ValidationError: If a value does not match DocumentResult.
+            exceptions.CosmosResourceNotFoundError: If the item has not been
+                created yet (use `store_results` first).
+            exceptions.CosmosHttpResponseError: If the patch fails.
+        """
+        validated = validate_fields({**fields, "timestamp": datetime.utcnow()})
+        item_id = document_id(document_name, content_hash)
+        operations = [
+            {"op": "set", "path": f"/{name}", "value": value}
+            for name, value in validated.items()
+        ]
+
+        self.logger.info(
+            "Patching results in Cosmos DB",
+            extra={"documentName": document_name, "fields": list(fields)}
+        )
+
+        result = None
+        try:
+            with stage("CosmosPatch", fields=len(operations)):
+                for i in range(0, len(operations), MAX_PATCH_OPERATIONS):
+                    result = self.container.patch_item(
+                        item=item_id,
+                        partition_key=DEFAULT_DOCUMENT_TYPE,
+                        patch_operations=operations[i : i + MAX_PATCH_OPERATIONS]
+                    )
+        except exceptions.CosmosHttpResponseError as e:
+            self.logger.exception(
+                "Failed to patch item in Cosmos DB",
+                extra={
+                    "documentName": document_name,
+                    "status_code": e.status_code,
+                    "error": e.message
+                }
+            )
+            raise
+        return result
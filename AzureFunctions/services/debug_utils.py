@@ -6,39 +6,306 @@ This module provides utility functions for debugging purposes.
 It includes a function to write debug information to a file
 and a function to check if the application is running in debug mode.
 
+Inside `debug_bundle()` (one per ProcessPDF invocation), `write_debug_file`
+does not write a file: the artefact is added to the invocation's DebugBundle
+in memory, and the bundle is written once at the end as a single
+`debug/<document>/<invocation id>.tar.gz` on a background thread. Outside a
+bundle (for example in the backfill tool) each call writes its own file.
+
+Classes:
+--------
+    DebugBundle: Collects the debug artefacts of one invocation.
+
 Functions:
 --------
-    write_debug_file(): Writes debug information to a file.
+    write_debug_file(): Writes debug information to a file (or the active bundle).
     is_debug_mode(): Checks if the application is running in debug mode.
+    debug_bundle(): Context manager that collects one invocation's artefacts.
+    current_debug_bundle(): Returns the DebugBundle of the current invocation.
+    flush_debug_bundles(): Waits for pending bundle writes.
 
 """
 
+import io
 import os
+import re
 import time
+import uuid
 import json
+import atexit
+import tarfile
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple, Union
+
+DEBUG_DIR = "debug"
+
+_current_bundle: ContextVar[Optional["DebugBundle"]] = ContextVar("debug_bundle", default=None)
+
+# One writer thread is enough: bundles are small and compressing them should
+# not compete with the invocations for CPU
+_writer: Optional[ThreadPoolExecutor] = None
+_writer_lock = threading.Lock()
+_pending: List = []
+
+def _serialise(content) -> Tuple[bytes, str]:
+    """
+    Converts an artefact to bytes and picks its file extension.
+    """
+    if isinstance(content, bytes):
+        return content, "bin"
+    if not isinstance(content, str):
+        try:
+            return json.dumps(content, separators=(",", ":")).encode("utf-8"), "json"
+        except (TypeError, ValueError):
+            content = str(content)
+    return content.encode("utf-8"), "txt"
+
+def _safe_name(name: str) -> str:
+    """
+    Turns a blob name into a single path component.
+    """
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name or "unknown").strip("_")[:120]
+
+class DebugBundle:
+    """
+    Collects the debug artefacts of one invocation and writes them as a
+    single compressed archive.
+
+    Artefacts are serialised (compact JSON for objects) when they are added,
+    so later changes to the objects do not leak into the bundle. Each artefact
+    is truncated to `max_artefact_bytes`; once the bundle holds `max_bytes`,
+    further artefacts are dropped and counted in the manifest.
+
+    Attributes
+    ----------
+        document_name (str): Document being processed.
+        invocation_id (str): Function invocation id (a random id if not given).
+        path (str): Where the bundle will be written.
+        max_bytes (int): Cap on the uncompressed size of all artefacts.
+        max_artefact_bytes (int): Cap on the size of one artefact.
+
+    Methods
+    -------
+        add(): Adds an artefact and returns its reference.
+        manifest(): Returns the bundle's manifest.
+        close(): Queues the bundle to be written.
+    """
+
+    def __init__(self,
+                 document_name: str,
+                 invocation_id: str = None,
+                 max_bytes: int = 20 * 2**20,
+                 max_artefact_bytes: int = 4 * 2**20
+                ):
+        """
+        Initialises the bundle.
+
+        Args:
+            document_name (str): Document being processed.
+            invocation_id (str, optional): Function invocation id.
+            max_bytes (int): Cap on the uncompressed size of all artefacts.
+            max_artefact_bytes (int): Cap on the size of one artefact.
+        """
+        self.document_name = document_name
+        self.invocation_id = invocation_id or uuid.uuid4().hex
+        self.path = os.path.join(
+            DEBUG_DIR, _safe_name(document_name), f"{_safe_name(self.invocation_id)}.tar.gz"
+        )
+        self.max_bytes = max_bytes
+        self.max_artefact_bytes = max_artefact_bytes
+        self.created = time.time()
+        self._artefacts: List[Tuple[str, bytes, dict]] = []
+        self._size = 0
+        self._dropped = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def add(self, content: Union[str, bytes, dict, list], prefix: str = "debug_output",
+            extension: str = None) -> str:
+        """
+        Adds an artefact to the bundle.
 
-def write_debug_file(content: str, prefix: str = "debug_output") -> str:
+        Args:
+            content: Text, bytes, or a JSON-serialisable object.
+            prefix (str): Artefact name.
+            extension (str, optional): File extension (default: from the content type).
+
+        Returns:
+            str: Reference to the artefact, "<bundle path>:<member name>".
+        """
+        data, default_extension = _serialise(content)
+        info = {"bytes": len(data)}
+        if len(data) > self.max_artefact_bytes:
+            data = data[:self.max_artefact_bytes]
+            info["truncated"] = True
+
+        with self._lock:
+            member = f"{len(self._artefacts) + self._dropped:03d}_{prefix}.{extension or default_extension}"
+            if self._closed or self._size + len(data) > self.max_bytes:
+                self._dropped += 1
+                return f"{self.path}:{member} (dropped)"
+            self._artefacts.append((member, data, info))
+            self._size += len(data)
+        return f"{self.path}:{member}"
+
+    def __len__(self) -> int:
+        return len(self._artefacts)
+
+    def manifest(self) -> dict:
+        """
+        Returns the bundle's manifest (also stored in the bundle as manifest.json).
+
+        Returns:
+            dict: Document, invocation id, creation time, artefacts and the
+                  number of artefacts dropped because of the size cap.
+        """
+        return {
+            "documentName": self.document_name,
+            "invocationId": self.invocation_id,
+            "created": self.created,
+            "artefacts": [{"name": member, **info} for member, _, info in self._artefacts],
+            "dropped": self._dropped,
+        }
+
+    def _write(self):
+        """
+        Writes the bundle (runs on the writer thread).
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        members = [("manifest.json", json.dumps(self.manifest(), indent=2).encode("utf-8"))]
+        members += [(member, data) for member, data, _ in self._artefacts]
+        with tarfile.open(tmp_path, "w:gz", compresslevel=6) as archive:
+            for member, data in members:
+                info = tarfile.TarInfo(member)
+                info.size = len(data)
+                info.mtime = int(self.created)
+                archive.addfile(info, io.BytesIO(data))
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        """
+        Queues the bundle to be written on the background writer thread.
+        Nothing is written if the bundle is empty.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if not self._artefacts:
+            return
+        global _writer # pylint: disable=global-statement
+        with _writer_lock:
+            if _writer is None:
+                _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="debug-bundle")
+                atexit.register(flush_debug_bundles)
+            _pending[:] = [f for f in _pending if not f.done()]
+            future = _writer.submit(self._write)
+            future.add_done_callback(self._log_failure)
+            _pending.append(future)
+
+    def _log_failure(self, future):
+        """
+        Logs a failed background write (debug output must never fail an invocation).
+        """
+        error = future.exception()
+        if error is not None:
+            # pylint: disable=import-outside-toplevel
+            from services.logger import Logger
+            Logger.get_logger("DebugUtils", json_format=True).warning(
+                "Debug bundle could not be written: %s", error,
+                extra={"bundle": self.path}
+            )
+
+@contextmanager
+def debug_bundle(document_name: str, invocation_id: str = None):
+    """
+    Collects the debug artefacts of one invocation into a single bundle,
+    written in the background when the context exits.
+
+    Args:
+        document_name (str): Document being processed.
+        invocation_id (str, optional): Function invocation id.
+
+    Yields:
+        DebugBundle: The active bundle.
+
+    Environment variables:
+        DEBUG_BUNDLE_MAX_MB: Cap on the uncompressed size of a bundle (default: 20).
+        DEBUG_ARTEFACT_MAX_MB: Cap on the size of one artefact (default: 4).
+    """
+    bundle = DebugBundle(
+        document_name,
+        invocation_id,
+        max_bytes=int(float(os.environ.get("DEBUG_BUNDLE_MAX_MB", 20)) * 2**20),
+        max_artefact_bytes=int(float(os.environ.get("DEBUG_ARTEFACT_MAX_MB", 4)) * 2**20)
+    )
+    token = _current_bundle.set(bundle)
+    try:
+        yield bundle
+    finally:
+        _current_bundle.reset(token)
+        bundle.close()
+
+def current_debug_bundle() -> Optional[DebugBundle]:
+    """
+    Returns the DebugBundle of the current invocation, or None outside one.
+    """
+    return _current_bundle.get()
+
+def flush_debug_bundles(timeout: float = 30.0):
+    """
+    Waits for pending bundle writes. Registered with `atexit`.
+
+    Args:
+        timeout (float): Seconds to wait for each pending write.
+    """
+    with _writer_lock:
+        pending = list(_pending)
+        _pending.clear()
+    for future in pending:
+        # Failures are logged by the bundle's done callback
+        future.exception(timeout=timeout)
+
+def write_debug_file(content: str, prefix: str = "debug_output", extension: str = None) -> str:
     """
     A utility function to write debug information to a file.
-    This function creates a directory named 'debug' if it does not exist,
-    and writes the provided content to a file with a timestamped name.
+    Inside `debug_bundle()` the content is added to the invocation's bundle
+    instead. Otherwise this function creates a directory named 'debug' if it
+    does not exist, and writes the provided content to a file with a
+    timestamped, unique name.
 
     Args:
         content (str): The content to be written to the debug file.
         prefix (str): The prefix for the debug file name (default is "debug_output").
+        extension (str, optional): File extension (default: "txt", or "bin" for bytes).
 
     Returns:
-        str: The path to the created debug file.
+        str: The path to the created debug file, or "<bundle path>:<member>"
+             inside a bundle.
 
     Raises:
         OSError: If there is an error creating the directory or writing to the file.
         TypeError: If the content is not a string and cannot be converted to a string.
         ValueError: If the content cannot be serialized to JSON.
     """
-    debug_dir = "debug"
-    os.makedirs(debug_dir, exist_ok=True)
+    bundle = current_debug_bundle()
+    if bundle is not None:
+        return bundle.add(content, prefix=prefix, extension=extension)
+
+    os.makedirs(DEBUG_DIR, exist_ok=True)
     timestamp = int(time.time())
-    file_path = f"{debug_dir}/{prefix}_{timestamp}.txt"
+    # The random suffix keeps concurrent invocations from overwriting each other
+    file_path = f"{DEBUG_DIR}/{prefix}_{timestamp}_{uuid.uuid4().hex[:8]}"
+    if isinstance(content, bytes):
+        file_path += f".{extension or 'bin'}"
+        with open(file_path, "wb") as f:
+            f.write(content)
+        return file_path
+    file_path += f".{extension or 'txt'}"
     if not isinstance(content, str):
         try:
             content = json.dumps(content, indent=2)
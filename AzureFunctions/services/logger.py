@@ -12,16 +12,251 @@ to log messages at different levels (DEBUG, INFO, WARNING, ERROR, CRITICAL)
 and can be easily integrated into other modules for consistent logging
 across the application.
 
+Handlers are asynchronous by default: loggers only put records on a queue,
+and a single background `QueueListener` formats them and writes them out, so
+log I/O and JSON formatting stay off the processing thread. When the root
+logger already has handlers (the Functions host installs one), records are
+handed to those handlers on the listener thread instead of to a console
+handler of our own, so every record is still written once. The host reads
+the invocation id from thread-local storage; `bind_invocation_context()`
+lets the listener restore it, so records stay correlated with their
+invocation in Application Insights. Levels, rate
+limits and sampling are configured through environment variables:
+
+    LOG_LEVEL           Level for every logger, e.g. "INFO" (default: the
+                        level passed to `get_logger`, DEBUG).
+    LOG_LEVELS          Per-logger levels, e.g. "RetrievalService=WARNING,OcrService=INFO".
+    LOG_RATE_LIMITS     Per-logger limit on records per second for each message
+                        template, e.g. "RetrievalService=5".
+    LOG_SAMPLE_RATES    Per-logger fraction of records kept, e.g. "OcrService=0.1".
+    LOG_ASYNC           "false" to write synchronously (default: "true").
+
+Rate limits and sampling only apply below WARNING; warnings and errors are
+always logged.
+
 Classes:
 --------
     Logger: A class that provides methods to create and configure loggers.
+    RateLimitFilter: Limits how often each message template is logged.
+    SamplingFilter: Keeps a random fraction of records.
+
+Functions:
+--------
+    bind_invocation_context(): Lets queued records keep their invocation id.
+    stop_logging(): Flushes queued records and stops the background listener.
 """
 
 import os
+import sys
+import copy
+import queue
+import atexit
+import random
 import logging
+import threading
+import time
+import traceback
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, Set
 from pythonjsonlogger import jsonlogger
 
+# Handlers of each logger, written to by the shared queue listener; a logger
+# in _ROOT_TARGETS (also) forwards to the root logger's current handlers
+_TARGETS: Dict[str, List[logging.Handler]] = {}
+_ROOT_TARGETS: Set[str] = set()
+# The Functions worker's thread-local invocation storage, if bound
+_INVOCATION_STORAGE = None
+_LISTENER: Optional[QueueListener] = None
+_LISTENER_LOCK = threading.Lock()
+_QUEUE: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+
+def _env_mapping(variable: str) -> Dict[str, str]:
+    """
+    Parses a "name=value,name=value" environment variable.
+    """
+    mapping = {}
+    for item in os.environ.get(variable, "").split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            mapping[name.strip()] = value.strip()
+    return mapping
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limits how often each message template is logged.
+
+    Each (logger, message template) pair gets a token bucket holding `burst`
+    tokens that refills at `rate` tokens per second. Records without a token
+    are dropped; the next record that gets through carries the number dropped
+    in its `suppressed` attribute. Records at WARNING or above always pass.
+
+    Attributes
+    ----------
+        rate (float): Records per second allowed per message template.
+        burst (float): Records allowed in a burst.
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        """
+        Initialises the filter.
+
+        Args:
+            rate (float): Records per second allowed per message template.
+            burst (float, optional): Records allowed in a burst (default: rate, at least 1).
+        """
+        super().__init__()
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self._buckets: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            # bucket is [tokens, last refill, suppressed since last pass]
+            bucket = self._buckets.setdefault(key, [self.burst, now, 0])
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+        return True
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a random fraction of records below WARNING.
+
+    Attributes
+    ----------
+        rate (float): Fraction of records kept (0 to 1).
+    """
+
+    def __init__(self, rate: float):
+        """
+        Initialises the filter.
+
+        Args:
+            rate (float): Fraction of records kept (0 to 1).
+        """
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+class _DispatchHandler(logging.Handler):
+    """
+    Runs on the listener thread and hands each record to its logger's handlers.
+    """
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        handlers = list(_TARGETS.get(record.name, ()))
+        if record.name in _ROOT_TARGETS:
+            handlers.extend(logging.getLogger().handlers)
+            if _INVOCATION_STORAGE is not None:
+                # The host's handler reads the invocation id from this thread
+                _INVOCATION_STORAGE.invocation_id = getattr(record, "invocation_id", None)
+        for handler in handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+class _RecordQueueHandler(QueueHandler):
+    """
+    Queues records without formatting them.
+
+    `QueueHandler.prepare()` formats every record on the calling thread; here
+    only the message is merged and the traceback rendered, so the logger's own
+    (JSON) formatter still runs on the listener thread with the record's
+    `extra` fields intact.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if _INVOCATION_STORAGE is not None and not hasattr(record, "invocation_id"):
+            record.invocation_id = getattr(_INVOCATION_STORAGE, "invocation_id", None)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+def _ensure_listener():
+    """
+    Starts the shared queue listener on first use.
+    """
+    global _LISTENER # pylint: disable=global-statement
+    with _LISTENER_LOCK:
+        if _LISTENER is None:
+            _LISTENER = QueueListener(_QUEUE, _DispatchHandler())
+            _LISTENER.start()
+            atexit.register(stop_logging)
+
+def bind_invocation_context(context):
+    """
+    Lets records queued during an invocation keep its invocation id.
+
+    The Functions host correlates a record with its invocation through
+    thread-local storage, which the listener thread does not share. Binding
+    the storage exposed on the function context (`context.thread_local_storage`)
+    lets each record carry the id from the calling thread to the listener.
+    The storage is shared by all invocations of the worker, so binding it
+    once is enough; contexts without it are ignored.
+
+    Args:
+        context (func.Context): The invocation context passed to `main`.
+    """
+    global _INVOCATION_STORAGE # pylint: disable=global-statement
+    storage = getattr(context, "thread_local_storage", None)
+    if storage is not None:
+        _INVOCATION_STORAGE = storage
+
+def stop_logging():
+    """
+    Flushes queued records and stops the background listener. Registered
+    with `atexit`; call it directly before a process exits some other way.
+    """
+    global _LISTENER # pylint: disable=global-statement
+    with _LISTENER_LOCK:
+        if _LISTENER is not None:
+            _LISTENER.stop()
+            _LISTENER = None
+
+def _after_fork_in_child():
+    """
+    Switches forked worker processes to synchronous handlers. They inherit
+    the queue handlers but not the listener thread, and multiprocessing
+    children exit without running atexit handlers, so queued records could
+    be lost.
+    """
+    global _LISTENER, _LISTENER_LOCK # pylint: disable=global-statement
+    _LISTENER_LOCK = threading.Lock()
+    _LISTENER = None
+    for name, handlers in _TARGETS.items():
+        logger = logging.getLogger(name)
+        for handler in list(logger.handlers):
+            if isinstance(handler, _RecordQueueHandler):
+                logger.removeHandler(handler)
+        for handler in handlers:
+            handler.createLock()
+            logger.addHandler(handler)
+    for name in _ROOT_TARGETS:
+        logging.getLogger(name).propagate = True
+    _TARGETS.clear()
+    _ROOT_TARGETS.clear()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
 class Logger:
     """
     A class that provides methods to create and configure loggers.
@@ -33,7 +268,7 @@ class Logger:
 
     Methods:
     -------
-        get_logger(): Returns a configured logger with either JSON formatted 
+        get_logger(): Returns a configured logger with either JSON formatted
         or plain text logs.
 
     """
@@ -50,7 +285,8 @@ class Logger:
 
         Args:
             name (str): The name of the logger.
-            level (int): The logging level (default is logging.DEBUG).
+            level (int): The logging level (default is logging.DEBUG); overridden
+                by LOG_LEVELS and LOG_LEVEL.
             log_to_file (bool): Whether to log to a file (default is False).
             log_file (str): The path to the log file (if log_to_file is True).
             json_format (bool): Whether to use JSON formatting for logs (default is True).
@@ -62,43 +298,83 @@ class Logger:
             ImportError: If jsonlogger is required but not installed.
             OSError: If there is an error creating the log directory or file.
             TypeError: If the logger name is not a string.
+            ValueError: If a configured level or rate is not valid.
         """
         logger = logging.getLogger(name)
+        level = _env_mapping("LOG_LEVELS").get(name) or os.environ.get("LOG_LEVEL") or level
+        if isinstance(level, str):
+            level = level.upper()
         logger.setLevel(level)
 
-        if not logger.hasHandlers():
-            # Create console handler
-            ch = logging.StreamHandler()
-            ch.setLevel(level)
-
-            # Choose formatter based on json_format flag
-            if json_format:
-                if jsonlogger is None:
-                    raise ImportError("jsonlogger is required for JSON logging.")
-                formatter = jsonlogger.JsonFormatter(
-                    '%(asctime)s %(name)s %(levelname)s %(message)s'
-                    )
-            else:
-                formatter = logging.Formatter(
-                    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        # Volume filters apply whichever handler ends up writing the record
+        # (ours, or the Functions host's root handler)
+        if not any(isinstance(f, (RateLimitFilter, SamplingFilter)) for f in logger.filters):
+            rate_limit = _env_mapping("LOG_RATE_LIMITS").get(name)
+            if rate_limit:
+                logger.addFilter(RateLimitFilter(float(rate_limit)))
+            sample_rate = _env_mapping("LOG_SAMPLE_RATES").get(name)
+            if sample_rate:
+                logger.addFilter(SamplingFilter(float(sample_rate)))
+
+        use_async = os.environ.get("LOG_ASYNC", "true").lower() == "true"
+        # `hasHandlers()` also sees the root logger's handlers, which the
+        # Functions host always installs; the queue is attached regardless
+        if use_async and not logger.handlers:
+            root_handlers = bool(logging.getLogger().handlers)
+            handlers = Logger._handlers(name, json_format, log_to_file, log_file,
+                                        console=not root_handlers)
+            # Format and write on the listener thread
+            _TARGETS[name] = handlers
+            if root_handlers:
+                # Hand records to the host's handlers from the listener, not
+                # from the calling thread as well
+                _ROOT_TARGETS.add(name)
+                logger.propagate = False
+            logger.addHandler(_RecordQueueHandler(_QUEUE))
+            _ensure_listener()
+        elif not use_async and not logger.hasHandlers():
+            for handler in Logger._handlers(name, json_format, log_to_file, log_file):
+                logger.addHandler(handler)
+
+        return logger
+
+    @staticmethod
+    def _handlers(name, json_format, log_to_file, log_file, console=True) -> List[logging.Handler]:
+        """
+        Returns the console (if `console`) and file handlers of a logger.
+        """
+        handlers = []
+
+        # Choose formatter based on json_format flag
+        if json_format:
+            if jsonlogger is None:
+                raise ImportError("jsonlogger is required for JSON logging.")
+            formatter = jsonlogger.JsonFormatter(
+                '%(asctime)s %(name)s %(levelname)s %(message)s'
                 )
+        else:
+            formatter = logging.Formatter(
+                '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+            )
 
+        # Create console handler
+        if console:
+            ch = logging.StreamHandler(sys.stderr)
             ch.setFormatter(formatter)
-            logger.addHandler(ch)
+            handlers.append(ch)
 
-            # Optional: log to file if log_to_file is True
-            if log_to_file:
+        # Optional: log to file if log_to_file is True
+        if log_to_file:
 
-                # Create a timestamped log file name if not provided
-                if log_file is None:
-                    log_file = f'{name}_{datetime.now().strftime("%Y%m%d%H%M%S")}.log'
+            # Create a timestamped log file name if not provided
+            if log_file is None:
+                log_file = f'{name}_{datetime.now().strftime("%Y%m%d%H%M%S")}.log'
 
-                # Ensure log directory exists
-                os.makedirs(os.path.dirname(log_file), exist_ok=True)
+            # Ensure log directory exists
+            os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
 
-                fh = logging.FileHandler(log_file)
-                fh.setLevel(level)
-                fh.setFormatter(formatter)
-                logger.addHandler(fh)
+            fh = logging.FileHandler(log_file)
+            fh.setFormatter(formatter)
+            handlers.append(fh)
 
-        return logger
+        return handlers
@@ -23,6 +23,7 @@ from typing import Dict
 import time
 import requests
 from services.logger import Logger
+from services.client_registry import get_client
 
 class OcrServiceError(Exception):
     """
@@ -44,6 +45,8 @@ class OcrService:
         logger (Logger): Logger instance for logging messages.
         read_api_url (str): The URL for the READ API of the OCR service.
         headers (dict): The headers to be used in the API requests.
+        session (requests.Session): Shared HTTP session, so keep-alive connections
+                                    to the OCR endpoint survive between invocations.
         
     Methods
     -------
@@ -72,6 +75,7 @@ class OcrService:
             "Ocp-Apim-Subscription-Key": self.subscription_key,
             "Content-Type": "application/octet-stream"
         }
+        self.session = get_client("http")
 
     def extract_text(
         self,
@@ -97,7 +101,7 @@ class OcrService:
         """
         try:
             # Initiate the OCR operation
-            response = requests.post(
+            response = self.session.post(
                 self.read_api_url,
                 headers=self.headers,
                 data=blob_data,
@@ -120,7 +124,7 @@ class OcrService:
             # Poll for the OCR result until the status is 'succeeded' or until timeout
             elapsed_time = 0.0
             while elapsed_time < timeout:
-                result_response = requests.get(
+                result_response = self.session.get(
                     operation_url,
                     headers={"Ocp-Apim-Subscription-Key": self.subscription_key},
                     timeout=10)
@@ -13,10 +13,10 @@ Classes:
 """
 
 import io
-import re
-from typing import Dict
+from typing import Dict, Mapping, Union
 from PyPDF2 import PdfReader
 from services.logger import Logger
+from services.abn_service import AbnEngine, AbnResult
 
 class PDFService:
     """
@@ -27,6 +27,7 @@ class PDFService:
     Attributes
     ----------
         logger (Logger): Logger instance for logging messages.
+        abn_engine (AbnEngine): Finds and validates ABNs page by page.
 
     Methods
     -------
@@ -37,6 +38,8 @@ class PDFService:
         get_page_count(): Returns the number of pages in the PDF.
         find_abn(): Searches the extracted text for an Australian Business 
         Number (ABN).
+        detect_abn(): Returns the ABN with its page, confidence and all
+        candidates.
 
     """
 
@@ -46,6 +49,7 @@ class PDFService:
         """
         # Initialise the JSON logger for this service
         self.logger = Logger.get_logger("PDFService", json_format=True)
+        self.abn_engine = AbnEngine()
 
     def is_pdf(self, pdf_bytes: bytes) -> bool:
         """
@@ -113,25 +117,45 @@ class PDFService:
             self.logger.error("Error counting PDF pages: %s", str(e))
             return None
 
-    def find_abn(self, text: str) -> str | None:
+    def find_abn(self, pages: Union[Mapping[int, str], str]) -> str | None:
         """
         Searches the extracted text for an Australian Business Number (ABN).
 
         Args:
-            text (str): The text extracted from the PDF.
+            pages (Mapping[int, str] | str): Page number to extracted text,
+                or the text of the whole document.
 
         Returns:
-            str | None: The ABN if found, or None if not found.
+            str | None: The ABN (digits only) if a valid one is found, or None.
 
         Raises:
             None
         """
-        # Look for patterns like "12 345 678 901" or "12345678901"
-        match = re.search(r"\b(\d{2}\s?\d{3}\s?\d{3}\s?\d{3})\b", text)
-        if not match:
-            return None
+        return self.detect_abn(pages).abn
+
+    def detect_abn(self, pages: Union[Mapping[int, str], str]) -> AbnResult:
+        """
+        Finds the document's ABN (see `AbnEngine`). Pages are scanned in order
+        and the scan stops after the first page with a labelled ABN that
+        passes the checksum.
+
+        Args:
+            pages (Mapping[int, str] | str): Page number to extracted text,
+                or the text of the whole document.
 
-        # Normalise by stripping out any spaces
-        abn = re.sub(r"\s+", "", match.group(1))
-        self.logger.info("PDFService.find_abn", extra={"abn": abn})
-        return abn
+        Returns:
+            AbnResult: The ABN, its page and confidence, the ACN, and every
+                       candidate seen.
+
+        Raises:
+            None
+        """
+        result = self.abn_engine.find(pages)
+        self.logger.info("PDFService.find_abn", extra={
+            "abn": result.abn,
+            "page": result.page,
+            "confidence": result.confidence,
+            "candidates": len(result.candidates),
+            "pagesScanned": result.pages_scanned
+        })
+        return result
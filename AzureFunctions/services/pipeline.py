@@ -0,0 +1,597 @@
+"""
+services/pipeline.py
+Module for the document processing pipeline.
+
+This module holds the processing stages run for each PDF: pre-flight checks
+(PDF validity and page count), text extraction (embedded or OCR), ABN
+detection, classification, page normalisation, chunking and embedding,
+RAG+LLM checks, auditor-signature detection, and storing the result. The
+blob-triggered `ProcessPDF` function and the bulk backfill tool
+(`tools/backfill.py`) both run documents through it.
+
+Classes:
+--------
+    DocumentPipeline: Runs the processing stages for one document and
+                      writes the result to a sink.
+"""
+
+import os
+import time
+from typing import Any, Optional
+from services.logger import Logger
+from services.tracer import stage, current_recorder
+from services.debug_utils import write_debug_file, is_debug_mode
+from services.pdf_utils import PDFService
+from services.checkpoint_store import (
+    CheckpointStore,
+    checkpoint_id,
+    content_hash,
+    get_checkpoint_store,
+)
+
+# Shared with ProcessPDF so log lines keep their existing logger name
+logger = Logger.get_logger("ProcessPDF", json_format=True)
+
+class DocumentPipeline:
+    """
+    Runs the processing stages for one document and writes the result to a sink.
+
+    Each stage is wrapped in `services.tracer.stage()`, so it is traced as a
+    child span when run inside `AppTracer.invocation()` and timed into the
+    current StageRecorder either way.
+
+    Attributes
+    ----------
+        sink: Object with a `store_results(document_name, data, content_hash)`
+              method, and optionally `patch_results(document_name, content_hash,
+              fields)`. Defaults to `DbService` (Cosmos DB), created on first use.
+        pdf_service (PDFService): PDF helper used for pre-flight and extraction.
+        checkpoints (CheckpointStore): Store for stage outputs, so a retried
+                                       invocation resumes after the last completed stage.
+        index_wait_seconds (float): Delay between indexing and the RAG checks.
+        stage_updates (bool): Whether stage results are patched into Cosmos DB
+                              as they complete.
+        skip_rag_below (float): AFS probability below which the RAG stage
+                                (embeddings and LLM checks) is skipped.
+        signature_detection (bool): Whether the auditor-signature stage runs.
+        normalise_pages (bool): Whether repeated headers and footers are
+                                stripped before chunking.
+
+    Methods
+    -------
+        __init__(): Initialises the pipeline with an optional result sink.
+        process(): Runs all stages for one document and stores the result.
+
+    Environment variables:
+        INDEX_WAIT_SECONDS: Seconds to wait for the search index to catch up
+                            before the RAG checks run (default: 20).
+        COSMOS_STAGE_UPDATES: "true" to write a partial item after pre-flight
+                              and patch each stage's fields as it completes,
+                              so progress is visible before the RAG checks
+                              finish (default: "false").
+        CLASSIFIER_SKIP_BELOW: Skip the RAG stage when the classifier's AFS
+                               probability is below this (default: 0.1; 0
+                               always runs it).
+        SIGNATURE_DETECTION: "true" to run auditor-signature detection
+                             (default: "false"; the default detector is a
+                             heuristic). See services/signature_service.py.
+        PAGE_NORMALISE: "false" to chunk pages without stripping repeated
+                        headers and footers (default: "true").
+    """
+
+    def __init__(
+        self,
+        sink=None,
+        pdf_service: PDFService = None,
+        checkpoints: CheckpointStore = None):
+        """
+        Initialises the pipeline with an optional result sink.
+
+        Args:
+            sink (optional): Result sink; defaults to `DbService()`.
+            pdf_service (PDFService, optional): PDF helper; defaults to `PDFService()`.
+            checkpoints (CheckpointStore, optional): Stage checkpoint store;
+                defaults to `get_checkpoint_store()`.
+        """
+        self._sink = sink
+        self.pdf_service = pdf_service or PDFService()
+        self.checkpoints = checkpoints or get_checkpoint_store()
+        self.index_wait_seconds = float(os.environ.get("INDEX_WAIT_SECONDS", 20))
+        self.stage_updates = os.environ.get("COSMOS_STAGE_UPDATES", "false").lower() == "true"
+        self.skip_rag_below = float(os.environ.get("CLASSIFIER_SKIP_BELOW", 0.1))
+        self.signature_detection = os.environ.get("SIGNATURE_DETECTION", "false").lower() == "true"
+        self.normalise_pages = os.environ.get("PAGE_NORMALISE", "true").lower() == "true"
+
+    @property
+    def sink(self):
+        """
+        Returns the result sink, creating the default `DbService` on first use.
+        """
+        if self._sink is None:
+            from services.db_service import DbService # pylint: disable=import-outside-toplevel
+            self._sink = DbService()
+        return self._sink
+
+    @staticmethod
+    def _annotate(span, key: str, value: Any):
+        """
+        Adds an attribute to the invocation span, if there is one.
+        """
+        if span is not None:
+            span.add_attribute(key, value)
+
+    @staticmethod
+    def _elapsed_ms() -> Optional[float]:
+        """
+        Returns milliseconds since the current invocation started, or None
+        when no StageRecorder is active.
+        """
+        recorder = current_recorder()
+        return round(recorder.total_ms(), 3) if recorder is not None else None
+
+    def _patch(self, document_name: str, doc_hash: str, fields: dict):
+        """
+        Patches one stage's fields into the stored result when stage updates
+        are enabled and the sink supports them. Failures are logged and
+        ignored; the final upsert writes every field again.
+
+        Args:
+            document_name (str): The name of the document.
+            doc_hash (str): Content hash of the document.
+            fields (dict): DocumentResult fields produced by the stage.
+        """
+        if not self.stage_updates or not hasattr(self.sink, "patch_results"):
+            return
+        try:
+            self.sink.patch_results(
+                document_name=document_name,
+                content_hash=doc_hash,
+                fields=fields
+            )
+        except Exception as e: # pylint: disable=broad-except
+            logger.warning("Stage update failed: %s", str(e),
+            extra={
+                "blob_name": document_name,
+                "fields": list(fields)
+                })
+
+    @staticmethod
+    def _normalise(page_texts: dict) -> dict:
+        """
+        Strips header and footer lines repeated across the pages, so they
+        are not chunked and embedded with every page.
+
+        Args:
+            page_texts (dict[int, str]): Page number to extracted text.
+
+        Returns:
+            dict[int, str]: Page number to normalised text.
+        """
+        # pylint: disable=import-outside-toplevel
+        from services.rag_llm.page_normaliser import PageNormaliser
+
+        with stage("Normalisation", pages=len(page_texts)) as st:
+            pages = PageNormaliser().normalise(page_texts)
+            st.add_attribute("lines_removed", sum(len(p.removed) for p in pages.values()))
+            st.add_attribute("chars_removed", sum(len(t) for t in page_texts.values())
+                             - sum(len(p.text) for p in pages.values()))
+        return {page: normalised.text for page, normalised in pages.items()}
+
+    def _index(self, document_name: str, doc_id: str, page_texts: dict):
+        """
+        Chunks, embeds and uploads the page texts, then waits for the index,
+        skipping any step already completed by a previous attempt. Chunks
+        already in the index for this document are deleted before the upload.
+
+        Args:
+            document_name (str): The name of the document.
+            doc_id (str): Checkpoint id of the document.
+            page_texts (dict[int, str]): Page number to extracted text.
+        """
+        # pylint: disable=import-outside-toplevel
+        from services.rag_llm.embedding_service import EmbeddingService
+        from services.rag_llm.index_maintenance import IndexMaintenance
+
+        indexed = self.checkpoints.load(doc_id, "indexed")
+        if indexed is not None and indexed.get("documentName") == document_name:
+            return
+
+        embedding_service = EmbeddingService()
+        embedded = self.checkpoints.load(doc_id, "embeddings")
+        if embedded is None:
+            if self.normalise_pages:
+                page_texts = self._normalise(page_texts)
+            chunks = embedding_service.filter_chunks(
+                document_name, embedding_service.chunk_pages(page_texts, document_name)
+            )
+            embedded, failed_batches = embedding_service.embed_chunks(document_name, chunks)
+            # Only checkpoint a complete set, so a retry re-embeds missing batches
+            if not failed_batches:
+                self.checkpoints.save(doc_id, "embeddings", embedded)
+
+        # Remove chunks of earlier versions (or attempts) of the document, so
+        # retrieval only sees the chunks uploaded below
+        IndexMaintenance(embedding_service.search_client).purge_document(document_name)
+        failed_uploads = embedding_service.upload_chunks(document_name, embedded)
+
+        # Add a delay (default 20 seconds) to allow for indexing
+        # TODO: is this still needed?
+        with stage("IndexWait", seconds=self.index_wait_seconds):
+            time.sleep(self.index_wait_seconds)
+
+        if not failed_uploads:
+            self.checkpoints.save(doc_id, "indexed", {
+                "documentName": document_name,
+                "chunks": len(embedded)
+            })
+
+    def _extract(self, pdf_bytes: bytes, page_count: int) -> Optional[dict]:
+        """
+        Extracts page texts, trying embedded text first and falling back to OCR.
+
+        Args:
+            pdf_bytes (bytes): The document content.
+            page_count (int): Number of pages (for stage attributes).
+
+        Returns:
+            dict | None: {"method": "embedded" | "OCR", "pages": {page: text}},
+                         or None if OCR failed.
+        """
+        # First attempt to extract embedded text for digitally generated PDFs
+        with stage("Extraction", bytes=len(pdf_bytes), pages=page_count) as st:
+            embedded_pages = self.pdf_service.extract_embedded_text(pdf_bytes)
+            st.add_attribute("chars", sum(len(t) for t in embedded_pages.values()))
+
+        # Scanned PDFs have pages but no text layer, so check for actual text
+        if any(text.strip() for text in embedded_pages.values()):
+            extraction_method = "embedded"
+            logger.info("Extraction complete using %s method",extraction_method,
+            extra={
+                "method": extraction_method,
+                })
+            extraction_pages = embedded_pages
+
+        else:
+            extraction_method = "OCR"
+            logger.info("No embedded text found. Falling back to OCR...")
+
+            # pylint: disable=import-outside-toplevel
+            from services.ocr_service import OcrService, OcrServiceError
+
+            # Extract using OCR
+            try:
+                with stage("OCR", bytes=len(pdf_bytes), pages=page_count) as st:
+                    ocr_pages = OcrService().extract_text(pdf_bytes)
+                    st.add_attribute("chars", sum(len(t) for t in ocr_pages.values()))
+                logger.info("Extraction complete using %s method", extraction_method,
+                extra={
+                    "method": extraction_method,
+                    })
+                extraction_pages = ocr_pages
+
+            except OcrServiceError as e:
+                logger.error("Error extracting text from PDF using %s", extraction_method,
+                extra={
+                    "error": str(e)
+                    })
+                return None
+
+        return {"method": extraction_method, "pages": extraction_pages}
+
+    def _detect_signature(self, doc_id: str, doc_hash: str, pdf_bytes: bytes,
+                          page_texts: dict) -> dict:
+        """
+        Looks for the auditor's signature on the candidate pages, reusing a
+        previous attempt's result if there is one.
+
+        Args:
+            doc_id (str): Checkpoint id of the document.
+            doc_hash (str): Content hash of the document.
+            pdf_bytes (bytes): The document content.
+            page_texts (dict[int, str]): Page number to extracted text.
+
+        Returns:
+            dict: `hasAuditorSignature` and `auditorSignaturePages`.
+        """
+        # pylint: disable=import-outside-toplevel
+        from services.signature_service import get_signature_service
+
+        signature = self.checkpoints.load(doc_id, "signature")
+        if signature is None:
+            with stage("SignatureDetection") as st:
+                signature = get_signature_service().detect(doc_hash, pdf_bytes, page_texts, st)
+                st.add_attribute("has_signature", signature["hasAuditorSignature"])
+            # An unrendered document is not checkpointed, so a retry tries again
+            if signature["hasAuditorSignature"] is not None:
+                self.checkpoints.save(doc_id, "signature", signature)
+        return signature
+
+    def process(
+        self,
+        document_name: str,
+        blob_url: str,
+        pdf_bytes: bytes,
+        span=None) -> Optional[dict]:
+        """
+        Runs all stages for one document and stores the result.
+
+        Args:
+            document_name (str): The name of the document (blob name).
+            blob_url (str): URL of the source document.
+            pdf_bytes (bytes): The document content.
+            span (Span, optional): Invocation span to annotate with document attributes.
+
+        Returns:
+            dict | None: The payload written to the sink, or None if text
+                         extraction failed.
+
+        Raises:
+            Exception: If storing the final result fails, so the trigger retries.
+                       Completed stages are checkpointed and are not repeated.
+        """
+        # Log the beginning of the blob processing operation, including extra context.
+        logger.info("Blob trigger function processed %s", document_name,
+        extra={
+            "blob_name": document_name
+            })
+
+        with stage("PreFlight") as st:
+            st.add_attribute("bytes", len(pdf_bytes))
+            doc_hash = content_hash(pdf_bytes)
+            doc_id = checkpoint_id(document_name, doc_hash)
+
+            # Check One: PDF validity check
+            is_pdf = self.pdf_service.is_pdf(pdf_bytes)
+            st.add_attribute("is_pdf", is_pdf)
+
+            # Check Two: PDF page count check
+            page_count = self.pdf_service.get_page_count(pdf_bytes) if is_pdf else None
+            if page_count is not None:
+                st.add_attribute("pages", page_count)
+                self._annotate(span, "page_count", page_count)
+
+        if not is_pdf:
+            logger.error(
+                "Blob is not a valid PDF file",
+                extra={"blob_name": document_name}
+            )
+            payload = {
+                "isPDF": False,
+                "blobUrl": blob_url,
+                "processingMs": self._elapsed_ms()
+            }
+            self.sink.store_results(
+                document_name=document_name,
+                data=payload,
+                content_hash=doc_hash
+            )
+            return payload
+
+        logger.info("Blob is a valid PDF file", extra={"blob_name": document_name})
+
+        # DEBUG
+        if is_debug_mode():
+            write_debug_file(
+                {"isPDF": is_pdf},
+                prefix="debug_is_pdf"
+            )
+
+        logger.info(
+            "PDF page count",
+            extra={
+                "blob_name": document_name,
+                "pageCount": page_count
+            }
+        )
+        if page_count is None or page_count < 5 or page_count > 25:
+            logger.warning(
+                "Blob is unusually short or long with %s pages",
+                page_count,
+                extra={
+                    "blob_name": document_name,
+                    "pageCount": page_count
+                }
+            )
+            payload = {
+                "isPDF": True,
+                "pageCount": page_count,
+                "blobUrl": blob_url,
+                "processingMs": self._elapsed_ms()
+            }
+            self.sink.store_results(
+                document_name=document_name,
+                data=payload,
+                content_hash=doc_hash
+            )
+            return payload
+
+        # DEBUG
+        if is_debug_mode():
+            write_debug_file(
+                {"pageCount": page_count},
+                prefix="debug_page_count"
+            )
+
+        if self.stage_updates and hasattr(self.sink, "patch_results"):
+            # Create the item now so later stages can patch their fields in
+            self.sink.store_results(
+                document_name=document_name,
+                data={"isPDF": True, "pageCount": page_count, "blobUrl": blob_url},
+                content_hash=doc_hash
+            )
+
+        # Resume from a previous attempt's extraction if there is one
+        extraction = self.checkpoints.load(doc_id, "extraction")
+        if extraction is None:
+            extraction = self._extract(pdf_bytes, page_count)
+            if extraction is None:
+                return None
+            self.checkpoints.save(doc_id, "extraction", extraction)
+
+        extraction_method = extraction["method"]
+        # JSON object keys are strings; restore integer page numbers
+        extraction_pages = {int(p): t for p, t in extraction["pages"].items()}
+
+        self._annotate(span, "extraction_method", extraction_method)
+        self._patch(document_name, doc_hash, {"extractionMethod": extraction_method})
+
+        # Check Three: ABN detection
+        with stage("ABNDetection", pages=len(extraction_pages)) as st:
+            abn_result = self.pdf_service.detect_abn(extraction_pages)
+            abn_value = abn_result.abn
+            has_abn = abn_value is not None
+            st.add_attribute("has_abn", has_abn)
+            st.add_attribute("pages_scanned", abn_result.pages_scanned)
+            st.add_attribute("candidates", len(abn_result.candidates))
+
+        logger.info(
+            "ABN detection complete",
+            extra={
+                "hasABN": has_abn,
+                "ABN": abn_value
+            }
+        )
+
+        # DEBUG
+        if is_debug_mode():
+            write_debug_file(
+                {"hasABN": has_abn, **abn_result.to_dict()},
+                prefix="debug_abn_detection"
+            )
+
+        # DEBUG
+        if is_debug_mode():
+            # Write the extracted text to a debug file
+            debug_file = write_debug_file(extraction_pages, prefix="ocr_output")
+            logger.info("DEBUG ON - Debug file written",
+            extra={
+                "method": extraction_method,
+                "debug_file": debug_file
+                })
+            logger.info("Extraction method used was %s", extraction_method)
+
+        logger.info("Continue processing...")
+        # Continue processing (e.g., parse text, send to ML, etc)
+
+        # Local AFS classifier (imported here: NumPy is only needed past the gates)
+        # pylint: disable=import-outside-toplevel
+        from services.classification_service import get_classification_service
+        full_text = "\n".join(extraction_pages.values())
+        with stage("Classification") as st:
+            classification_result = get_classification_service().classify_document(full_text)
+            st.add_attribute("afs_confidence", classification_result["afs_confidence"])
+        logger.info(
+            "ML classification complete",
+            extra={"classification_result": classification_result})
+        self._patch(document_name, doc_hash, {
+            "hasABN": has_abn,
+            "ABN": abn_value,
+            "isValidAFS": classification_result["is_valid_afs"],
+            "afsConfidence": classification_result["afs_confidence"]
+        })
+
+        # DEBUG
+        if is_debug_mode():
+            # Dump the ML payload to a file
+            debug_payload = {
+                "extractionMethod": extraction_method,
+                "classificationResult": classification_result
+            }
+            debug_file = write_debug_file(str(debug_payload), prefix="classification_payload")
+            logger.info("DEBUG ON - Classification payload written",
+            extra={
+                "debug_file": debug_file
+                })
+
+        # Documents the classifier is confident are not financial statements
+        # skip the RAG stage; their check fields stay unset (not evaluated)
+        afs_confidence = classification_result["afs_confidence"]
+        skip_rag = afs_confidence is not None and afs_confidence < self.skip_rag_below
+        self._annotate(span, "rag_skipped", skip_rag)
+        signature = {}
+
+        if skip_rag:
+            logger.info(
+                "Skipping RAG checks for a non-AFS document",
+                extra={
+                    "blob_name": document_name,
+                    "afsConfidence": afs_confidence,
+                    "skipBelow": self.skip_rag_below
+                }
+            )
+            llm_flags = {}
+        else:
+            # --- RAG+LLM INTEGRATION POINT --- #
+            from services.rag_llm.check_runner import run_llm_checks
+
+            # Chunking and each embedding batch are timed as their own stages.
+            # Completed steps are checkpointed, so a retry resumes after them.
+            self._index(document_name, doc_id, extraction_pages)
+
+            # Check Four: RAG Checks
+            # Run all checks via check_runner (each check is timed as its own stage)
+            llm_flags = self.checkpoints.load(doc_id, "checks")
+            if llm_flags is None:
+                failed_checks = []
+                llm_flags = run_llm_checks(
+                    document_name=document_name,
+                    system_prompt=None,
+                    failed=failed_checks
+                )
+                # A failed check reads as NO; only checkpoint real answers,
+                # so a retry asks again
+                if failed_checks:
+                    logger.warning("Checks failed, not checkpointing the answers",
+                                   extra={"blob_name": document_name, "checks": failed_checks})
+                else:
+                    self.checkpoints.save(doc_id, "checks", llm_flags)
+
+            # Check Five: auditor's signature on the audit report pages
+            if self.signature_detection:
+                signature = self._detect_signature(doc_id, doc_hash, pdf_bytes, extraction_pages)
+                logger.info("Signature detection complete", extra=signature)
+                self._patch(document_name, doc_hash, signature)
+
+                # DEBUG
+                if is_debug_mode():
+                    write_debug_file(signature, prefix="debug_signature_detection")
+
+        # Construct the base payload
+        base_payload = {
+            "isPDF": is_pdf,
+            "pageCount": page_count,
+            "blobUrl": blob_url,
+            "extractionMethod": extraction_method,
+            "isValidAFS": classification_result["is_valid_afs"],
+            "afsConfidence": classification_result["afs_confidence"],
+            "hasABN": has_abn,
+            "ABN": abn_value
+        }
+
+        # Build final payload by merging RAG results with base payload
+        final_payload = {
+            **base_payload,
+            **llm_flags,
+            **signature,
+            "processingMs": self._elapsed_ms()
+        }
+
+        # Write results to database (the upsert is timed inside DbService)
+        try:
+            self.sink.store_results(
+                document_name=document_name,
+                data=final_payload,
+                content_hash=doc_hash
+            )
+        except Exception as e:
+            logger.error("Error storing results in Cosmos DB",
+            extra={
+                "error": str(e)
+                })
+            # Re-raise so the blob trigger retries; the retry resumes from
+            # the checkpoints above and only repeats this write.
+            raise
+
+        # The document is done; its checkpoints are no longer needed
+        self.checkpoints.clear(doc_id)
+        return final_payload
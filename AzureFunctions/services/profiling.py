@@ -0,0 +1,527 @@
+"""
+services/profiling.py
+Module for opt-in per-invocation profiling.
+
+The memory profiler uses `tracemalloc` to record, for every pipeline stage,
+the memory in use at the stage boundaries, the peak reached during the stage
+and the allocation sites that grew the most. It hooks into
+`services.tracer.stage()`, so every stage is covered without extra code, and
+the per-stage figures are added to the stage's span attributes and timings.
+
+Profiling is off unless `PROFILE_MEMORY` is "true"; when it is off,
+`memory_profiling()` yields None and `stage()` does no extra work.
+
+tracemalloc traces the whole process, so figures are only attributable to one
+document when the worker runs one invocation at a time (the default for the
+Python worker with FUNCTIONS_WORKER_PROCESS_COUNT=1 and no extra threads).
+
+The CPU profiler wraps a sampled fraction of invocations (`PROFILE_CPU_RATE`)
+in either cProfile or a statistical stack sampler and renders the result as
+collapsed stacks ("frame;frame;frame count" lines), the input format of
+flamegraph.pl, speedscope and similar tools. When the rate is 0 (the default)
+`cpu_profiling()` returns a `nullcontext` and nothing else runs.
+
+Classes:
+--------
+    MemoryProfiler: Records memory use per stage for one invocation.
+    CpuProfiler: Profiles CPU use for one invocation.
+
+Functions:
+--------
+    is_memory_profiling_enabled(): Checks the PROFILE_MEMORY environment variable.
+    memory_profiling(): Context manager that profiles memory for one invocation.
+    current_memory_profiler(): Returns the MemoryProfiler of the current invocation.
+    cpu_profiling(): Context manager that profiles CPU for a sample of invocations.
+    collapse_pstats(): Converts cProfile statistics to collapsed stacks.
+"""
+
+import os
+import sys
+import time
+import random
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from services.logger import Logger
+
+_current_memory_profiler: ContextVar[Optional["MemoryProfiler"]] = ContextVar(
+    "memory_profiler", default=None
+)
+
+# Allocations made by tracemalloc, the import system and this module are not interesting
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+def is_memory_profiling_enabled() -> bool:
+    """
+    Checks the PROFILE_MEMORY environment variable.
+
+    Returns:
+        bool: True if PROFILE_MEMORY is "true".
+    """
+    return os.environ.get("PROFILE_MEMORY", "false").lower() == "true"
+
+class _StageFrame:
+    """
+    Open stage being profiled.
+    """
+
+    def __init__(self, name: str, start_bytes: int, snapshot):
+        self.name = name
+        self.start_bytes = start_bytes
+        self.peak_bytes = start_bytes
+        self.snapshot = snapshot
+
+class MemoryProfiler:
+    """
+    Records memory use per stage for one invocation.
+
+    At each stage start the current tracemalloc peak is folded into the
+    enclosing stages and the peak is reset, so nested stages report their own
+    peak while the enclosing stages still see the overall maximum.
+
+    Attributes
+    ----------
+        document_name (str): Document being processed.
+        top_n (int): Allocation sites reported per stage.
+        frames (int): Traceback depth stored by tracemalloc.
+        stages (list[dict]): One entry per completed stage.
+        peak_bytes (int): Highest traced memory seen during the invocation.
+        peak_stage (str): Stage during which `peak_bytes` was reached.
+
+    Methods
+    -------
+        start(): Starts tracing (if not already tracing).
+        stop(): Stops tracing if this profiler started it.
+        enter(): Called by `stage()` when a stage starts.
+        exit(): Called by `stage()` when a stage ends.
+        summary(): Returns a JSON-serialisable memory profile.
+    """
+
+    def __init__(self, document_name: str = None, top_n: int = 5, frames: int = 1):
+        """
+        Initialises the profiler.
+
+        Args:
+            document_name (str, optional): Document being processed.
+            top_n (int): Allocation sites reported per stage.
+            frames (int): Traceback depth stored by tracemalloc.
+        """
+        self.document_name = document_name
+        self.top_n = top_n
+        self.frames = frames
+        self.stages: List[dict] = []
+        self.peak_bytes = 0
+        self.peak_stage: Optional[str] = None
+        self._stack: List[_StageFrame] = []
+        self._started_tracing = False
+        self._start_bytes = 0
+
+    def start(self):
+        """
+        Starts tracing (if not already tracing) and resets the peak.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        tracemalloc.reset_peak()
+        self._start_bytes = tracemalloc.get_traced_memory()[0]
+
+    def stop(self):
+        """
+        Folds in the final peak and stops tracing if this profiler started it.
+        """
+        if tracemalloc.is_tracing():
+            self._note_peak(tracemalloc.get_traced_memory()[1], None)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+    def _note_peak(self, peak: int, stage_name: Optional[str]):
+        if peak > self.peak_bytes:
+            self.peak_bytes = peak
+            self.peak_stage = stage_name
+
+    def enter(self, name: str) -> _StageFrame:
+        """
+        Called by `stage()` when a stage starts.
+
+        Args:
+            name (str): Stage name.
+
+        Returns:
+            _StageFrame: Token to pass to `exit()`.
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        for open_frame in self._stack:
+            open_frame.peak_bytes = max(open_frame.peak_bytes, peak)
+        self._note_peak(peak, self._stack[-1].name if self._stack else None)
+
+        frame = _StageFrame(name, current, self._snapshot())
+        tracemalloc.reset_peak()
+        self._stack.append(frame)
+        return frame
+
+    def exit(self, frame: _StageFrame, handle=None):
+        """
+        Called by `stage()` when a stage ends. Records the stage and adds
+        `mem_peak_kb` and `mem_retained_kb` to the stage handle.
+
+        Args:
+            frame (_StageFrame): Token returned by `enter()`.
+            handle (StageHandle, optional): Handle of the stage.
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        frame.peak_bytes = max(frame.peak_bytes, peak)
+        if self._stack and self._stack[-1] is frame:
+            self._stack.pop()
+        for open_frame in self._stack:
+            open_frame.peak_bytes = max(open_frame.peak_bytes, frame.peak_bytes)
+        self._note_peak(frame.peak_bytes, frame.name)
+
+        top = self._snapshot().compare_to(frame.snapshot, "lineno")
+        sites = [
+            {
+                "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "sizeDiffBytes": stat.size_diff,
+                "countDiff": stat.count_diff,
+            }
+            for stat in sorted(top, key=lambda s: s.size_diff, reverse=True)[:self.top_n]
+            if stat.size_diff > 0
+        ]
+        entry = {
+            "stage": frame.name,
+            "startBytes": frame.start_bytes,
+            "endBytes": current,
+            "retainedBytes": current - frame.start_bytes,
+            "peakBytes": frame.peak_bytes,
+            "peakAboveStartBytes": frame.peak_bytes - frame.start_bytes,
+            "topAllocations": sites,
+        }
+        self.stages.append(entry)
+
+        if handle is not None:
+            handle.add_attribute("mem_peak_kb", round(frame.peak_bytes / 1024, 1))
+            handle.add_attribute("mem_retained_kb", round(entry["retainedBytes"] / 1024, 1))
+
+    def summary(self) -> dict:
+        """
+        Returns a JSON-serialisable memory profile.
+
+        Returns:
+            dict: `documentName`, `startBytes`, `peakBytes`, `peakStage`, the
+                  ordered `stages` list and `byStage` (highest peak per stage name).
+        """
+        by_stage: Dict[str, int] = {}
+        for entry in self.stages:
+            by_stage[entry["stage"]] = max(by_stage.get(entry["stage"], 0), entry["peakBytes"])
+        return {
+            "documentName": self.document_name,
+            "startBytes": self._start_bytes,
+            "peakBytes": self.peak_bytes,
+            "peakStage": self.peak_stage,
+            "stages": self.stages,
+            "byStage": by_stage,
+        }
+
+@contextmanager
+def memory_profiling(document_name: str = None):
+    """
+    Profiles memory for one invocation when PROFILE_MEMORY is "true".
+
+    Args:
+        document_name (str, optional): Document being processed.
+
+    Yields:
+        MemoryProfiler | None: The active profiler, or None when disabled.
+
+    Environment variables:
+        PROFILE_MEMORY: "true" to enable (default: "false").
+        PROFILE_MEMORY_TOP: Allocation sites reported per stage (default: 5).
+        PROFILE_MEMORY_FRAMES: Traceback depth stored by tracemalloc (default: 1).
+    """
+    if not is_memory_profiling_enabled():
+        yield None
+        return
+
+    profiler = MemoryProfiler(
+        document_name,
+        top_n=int(os.environ.get("PROFILE_MEMORY_TOP", 5)),
+        frames=int(os.environ.get("PROFILE_MEMORY_FRAMES", 1))
+    )
+    profiler.start()
+    token = _current_memory_profiler.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _current_memory_profiler.reset(token)
+        profiler.stop()
+
+def current_memory_profiler() -> Optional[MemoryProfiler]:
+    """
+    Returns the MemoryProfiler of the current invocation, or None.
+    """
+    return _current_memory_profiler.get()
+
+CPU_PROFILE_MODES = ("cprofile", "sampler")
+
+def _frame_label(filename: str, lineno: int, funcname: str) -> str:
+    """
+    Returns a short, stable label for a stack frame.
+    """
+    if filename == "~":
+        # cProfile's built-ins, e.g. "<built-in method builtins.sorted>"
+        return funcname.strip("<>")
+    # Keep "package/module.py" rather than the full path
+    parts = filename.replace("\\", "/").rsplit("/", 2)
+    return f"{'/'.join(parts[-2:])}:{funcname}:{lineno}"
+
+def collapse_pstats(stats, max_depth: int = 64) -> List[str]:
+    """
+    Converts cProfile statistics to collapsed stacks.
+
+    cProfile only records caller/callee pairs, not whole stacks, so each
+    function's time is split between its callers in proportion to the time
+    spent on each call edge. The result is an approximation; the sampler
+    mode records exact stacks.
+
+    Args:
+        stats (pstats.Stats): Statistics of the profiled code.
+        max_depth (int): Deepest stack rendered.
+
+    Returns:
+        list[str]: "frame;frame;frame <microseconds>" lines.
+    """
+    raw = stats.stats  # func -> (cc, nc, tt, ct, callers)
+    children: Dict[tuple, List[Tuple[tuple, float]]] = {}
+    roots = []
+    for func, (_, _, _, _, callers) in raw.items():
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            # edge is (cc, nc, tt, ct) for this caller -> func pair
+            children.setdefault(caller, []).append((func, edge[3]))
+
+    folded: Counter = Counter()
+
+    def walk(func: tuple, inclusive: float, path: List[str], on_path: set):
+        _, _, own, cumulative, _ = raw[func]
+        label = _frame_label(*func)
+        path = path + [label]
+        if cumulative <= 0 or inclusive <= 0:
+            return
+        share = inclusive / cumulative
+        self_time = own * share
+        if len(path) >= max_depth:
+            self_time = inclusive
+        else:
+            for callee, edge_time in children.get(func, []):
+                if callee in on_path or callee not in raw:
+                    continue  # recursion: the time is already in this frame
+                walk(callee, edge_time * share, path, on_path | {callee})
+        if self_time > 0:
+            folded[";".join(path)] += self_time
+
+    for root in roots:
+        walk(root, raw[root][3], [], {root})
+
+    return [f"{stack} {round(seconds * 1e6)}" for stack, seconds in folded.most_common()
+            if round(seconds * 1e6) > 0]
+
+class _StackSampler(threading.Thread):
+    """
+    Daemon thread that samples the stack of one thread at a fixed interval.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="cpu-profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id) # pylint: disable=protected-access
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(_frame_label(code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+class CpuProfiler:
+    """
+    Profiles CPU use for one invocation.
+
+    Modes
+    -----
+        cprofile: Deterministic profiling of every call with cProfile. Exact
+            call counts, but slows call-heavy code (regexes, Pydantic) down.
+        sampler: A background thread records the stack of the profiled
+            thread every `interval_ms`. Low overhead, statistical counts.
+
+    If cProfile cannot be enabled because another profiler is already active
+    (Python 3.12+ allows only one), the invocation is sampled instead and
+    `mode` is set to "sampler".
+
+    Only the thread that starts the profiler is profiled; work handed to
+    thread pools shows up as time spent waiting on their futures.
+
+    Attributes
+    ----------
+        document_name (str): Document being processed.
+        mode (str): "cprofile" or "sampler".
+        interval_ms (float): Sampling interval (sampler mode).
+        elapsed_ms (float): Wall time profiled.
+
+    Methods
+    -------
+        start(): Starts profiling the current thread.
+        stop(): Stops profiling.
+        collapsed(): Returns the profile as collapsed stacks.
+        write(): Writes the profile next to the debug files.
+    """
+
+    def __init__(self, document_name: str = None, mode: str = "sampler", interval_ms: float = 5.0):
+        """
+        Initialises the profiler.
+
+        Args:
+            document_name (str, optional): Document being processed.
+            mode (str): "cprofile" or "sampler".
+            interval_ms (float): Sampling interval (sampler mode).
+
+        Raises:
+            ValueError: If the mode is not supported.
+        """
+        if mode not in CPU_PROFILE_MODES:
+            raise ValueError(f"Unsupported CPU profile mode: {mode}")
+        self.document_name = document_name
+        self.mode = mode
+        self.interval_ms = interval_ms
+        self.elapsed_ms = 0.0
+        self._profile = None
+        self._sampler: Optional[_StackSampler] = None
+        self._start = None
+
+    def start(self):
+        """
+        Starts profiling the current thread.
+        """
+        self._start = time.perf_counter()
+        if self.mode == "cprofile":
+            import cProfile # pylint: disable=import-outside-toplevel
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                self._profile = profile
+            except ValueError as e:
+                # Python 3.12+ allows one active profiler (e.g. a debugger or
+                # another cProfile); sample this invocation instead
+                Logger.get_logger("CpuProfiler", json_format=True).warning(
+                    "cProfile unavailable, falling back to the sampler",
+                    extra={"documentName": self.document_name, "error": str(e)}
+                )
+                self.mode = "sampler"
+        if self.mode == "sampler":
+            self._sampler = _StackSampler(threading.get_ident(), self.interval_ms / 1000)
+            self._sampler.start()
+
+    def stop(self):
+        """
+        Stops profiling. Safe to call more than once.
+        """
+        if self._start is None or self.elapsed_ms:
+            return
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        self.elapsed_ms = (time.perf_counter() - self._start) * 1000
+
+    def collapsed(self) -> List[str]:
+        """
+        Returns the profile as collapsed stacks.
+
+        Returns:
+            list[str]: "frame;frame;frame <count>" lines, heaviest first. The
+                       count is microseconds in cprofile mode and samples in
+                       sampler mode.
+        """
+        if self._profile is not None:
+            import pstats # pylint: disable=import-outside-toplevel
+            return collapse_pstats(pstats.Stats(self._profile))
+        return [f"{stack} {count}" for stack, count in self._sampler.samples.most_common()]
+
+    def write(self) -> str:
+        """
+        Writes the collapsed stacks with the debug files (into the
+        invocation's debug bundle when there is one). In cprofile mode the raw
+        statistics are also written as a .prof artefact (for pstats or
+        snakeviz).
+
+        Returns:
+            str: Path (or bundle reference) of the collapsed-stack file.
+        """
+        # pylint: disable=import-outside-toplevel
+        import marshal
+        from services.debug_utils import write_debug_file
+
+        file_path = write_debug_file("\n".join(self.collapsed()) + "\n", prefix="cpu_profile")
+        if self._profile is not None:
+            # Same format as Profile.dump_stats()
+            self._profile.create_stats()
+            write_debug_file(marshal.dumps(self._profile.stats), prefix="cpu_profile",
+                             extension="prof")
+        return file_path
+
+@contextmanager
+def _cpu_profiler(document_name: str, mode: str, interval_ms: float):
+    profiler = CpuProfiler(document_name, mode=mode, interval_ms=interval_ms)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+
+def cpu_profiling(document_name: str = None):
+    """
+    Profiles CPU for a sampled fraction of invocations.
+
+    Args:
+        document_name (str, optional): Document being processed.
+
+    Returns:
+        ContextManager[CpuProfiler | None]: Yields the active profiler, or None
+            when profiling is disabled or this invocation was not sampled.
+
+    Environment variables:
+        PROFILE_CPU_RATE: Fraction of invocations profiled, 0 to 1 (default: 0).
+        PROFILE_CPU_MODE: "sampler" or "cprofile" (default: "sampler").
+        PROFILE_CPU_INTERVAL_MS: Sampling interval in sampler mode (default: 5).
+    """
+    rate = float(os.environ.get("PROFILE_CPU_RATE", 0))
+    if rate <= 0 or random.random() >= rate:
+        return nullcontext()
+    return _cpu_profiler(
+        document_name,
+        mode=os.environ.get("PROFILE_CPU_MODE", "sampler").lower(),
+        interval_ms=float(os.environ.get("PROFILE_CPU_INTERVAL_MS", 5))
+    )
@@ -15,8 +15,9 @@
 
 from services.rag_llm.checks import CHECKS
 from services.rag_llm.retrieval_service import RetrievalService
+from services.tracer import stage
 
-def run_llm_checks(document_name: str, system_prompt: str = None) -> dict:
+def run_llm_checks(document_name: str, system_prompt: str = None, failed: list = None) -> dict:
     """
     Runs all RAG+LLM yes/no checks and returns a dictionary of flags
     and citation lists.
@@ -31,6 +32,9 @@ def run_llm_checks(document_name: str, system_prompt: str = None) -> dict:
         system_prompt (str, optional): The system prompt to be used for
             the checks. If not provided, the default prompt from the
             CHECKS list will be used.
+        failed (list, optional): If given, receives the field names of the
+            checks whose retrieval or chat call failed. Those checks are
+            reported as NO.
 
     Returns:
         dict: A dictionary containing the results of the checks.
@@ -44,14 +48,19 @@ def run_llm_checks(document_name: str, system_prompt: str = None) -> dict:
     retrieval = RetrievalService()
     results = {}
     for chk in CHECKS:
-        res = retrieval.ask_with_citations(
-            document_name=document_name,
-            check_name=chk.name,
-            question=chk.question,
-            query=chk.query,
-            k=chk.k,
-            system_prompt=system_prompt or chk.system_prompt
-        )
+        with stage("Check", check=chk.field_name, k=chk.k) as st:
+            res = retrieval.ask_with_citations(
+                document_name=document_name,
+                check_name=chk.name,
+                question=chk.question,
+                query=chk.query,
+                k=chk.k,
+                system_prompt=system_prompt or chk.system_prompt
+            )
+            st.add_attribute("citations", len(res["citations"]))
+            st.add_attribute("error", res["error"])
+        if res["error"] and failed is not None:
+            failed.append(chk.field_name)
         # build the exact field names your Pydantic model expects:
         flag_key  = f"has{chk.field_name}" # e.g. "hasProfitLoss"
         pages_key = f"{chk.field_name[0].lower()}{chk.field_name[1:]}Pages"
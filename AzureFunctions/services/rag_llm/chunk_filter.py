@@ -0,0 +1,245 @@
+"""
+services/rag_llm/chunk_filter.py
+Module for dropping and merging low-information chunks before embedding.
+
+The chunker emits every block of a page: cover page lines, table-of-contents
+entries, bare numeric table fragments and the short stubs left by the
+all-caps heading split. Each is embedded and indexed like a paragraph, and
+each can be retrieved for a check in place of the paragraph it introduces.
+The filter scores every chunk and:
+
+    - drops chunks that are mostly digits and punctuation,
+    - drops table-of-contents chunks (most lines end in a page number),
+    - drops repeats of a chunk already seen on the same page,
+    - merges short chunks (headings, stubs) into the next chunk on the same
+      page, or the previous one, and drops them if neither fits.
+
+Chunks are only merged or deduplicated within a page, so citations keep
+their page numbers: a passage repeated on a later page is still indexed and
+retrievable with that page.
+
+Classes:
+--------
+    ChunkFilter: Drops and merges low-information chunks.
+"""
+
+import os
+import re
+from collections import Counter
+from typing import Callable, Dict, List, Tuple
+from services.rag_llm.chunk_service import chunk_id
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+class ChunkFilter:
+    """
+    Drops and merges low-information chunks.
+
+    Attributes
+    ----------
+        min_tokens (int): Chunks with fewer tokens are merged or dropped.
+        max_tokens (int): Largest chunk a merge may produce.
+        min_alpha (float): Chunks with a lower share of letters are dropped.
+        toc_share (float): Share of lines ending in a page number above which
+                           a chunk counts as a table of contents.
+        dedupe (bool): Drop repeats of a chunk already seen on the same page.
+        token_len (Callable[[str], int]): Counts the tokens of merged text.
+
+    Methods
+    -------
+        alpha_ratio(): Returns the share of letters among the non-space characters.
+        is_toc(): Returns True if the text looks like a table of contents.
+        apply(): Returns the kept chunks and the filter's statistics.
+
+    Environment variables:
+        CHUNK_MIN_TOKENS: Chunks with fewer tokens are merged or dropped (default: 12).
+        CHUNK_MIN_ALPHA: Chunks with a lower share of letters are dropped (default: 0.3).
+        CHUNK_TOC_SHARE: Share of lines ending in a page number that marks a
+                         table of contents (default: 0.6).
+        CHUNK_DEDUPE: "false" to keep repeated chunks (default: "true").
+    """
+
+    def __init__(self, token_len: Callable[[str], int], max_tokens: int,
+                 min_tokens: int = None, min_alpha: float = None,
+                 toc_share: float = None, dedupe: bool = None):
+        """
+        Initialises the filter.
+
+        Args:
+            token_len (Callable[[str], int]): Counts the tokens of merged text.
+            max_tokens (int): Largest chunk a merge may produce.
+            min_tokens (int, optional): Defaults to CHUNK_MIN_TOKENS.
+            min_alpha (float, optional): Defaults to CHUNK_MIN_ALPHA.
+            toc_share (float, optional): Defaults to CHUNK_TOC_SHARE.
+            dedupe (bool, optional): Defaults to CHUNK_DEDUPE.
+        """
+        self.token_len = token_len
+        self.max_tokens = max_tokens
+        self.min_tokens = (min_tokens if min_tokens is not None
+                           else int(os.environ.get("CHUNK_MIN_TOKENS", 12)))
+        self.min_alpha = (min_alpha if min_alpha is not None
+                          else float(os.environ.get("CHUNK_MIN_ALPHA", 0.3)))
+        self.toc_share = (toc_share if toc_share is not None
+                          else float(os.environ.get("CHUNK_TOC_SHARE", 0.6)))
+        self.dedupe = (dedupe if dedupe is not None
+                       else os.environ.get("CHUNK_DEDUPE", "true").lower() == "true")
+
+    @staticmethod
+    def alpha_ratio(text: str) -> float:
+        """
+        Returns the share of letters among the non-space characters.
+
+        Args:
+            text (str): Chunk text.
+
+        Returns:
+            float: 0 for text without visible characters.
+        """
+        visible = len("".join(text.split()))
+        if not visible:
+            return 0.0
+        return sum(map(str.isalpha, text)) / visible
+
+    @staticmethod
+    def _ends_in_page_number(line: str) -> bool:
+        """
+        Returns True for lines such as "Directors' report ...... 4" or
+        "Notes to the financial statements 12".
+        """
+        line = line.rstrip()
+        body = line.rstrip("0123456789")
+        return 0 < len(line) - len(body) <= 3 and body[-1:] in (" ", "\t", ".")
+
+    def is_toc(self, text: str) -> bool:
+        """
+        Returns True if most lines of the text end in a page number.
+
+        Args:
+            text (str): Chunk text.
+
+        Returns:
+            bool: True for chunks of three or more such lines.
+        """
+        lines = [line for line in text.splitlines() if line.strip()]
+        if len(lines) < 3:
+            return False
+        hits = sum(1 for line in lines if self._ends_in_page_number(line))
+        return hits >= self.toc_share * len(lines)
+
+    def _reason(self, chunk: dict, seen: set) -> str:
+        """
+        Returns why a chunk is dropped, or None to keep it.
+        """
+        text = chunk["text"]
+        if not text.strip():
+            return "empty"
+        if self.dedupe:
+            # Per page: a repeat on another page would lose that page's citation
+            signature = (chunk["page"], _WHITESPACE_RE.sub(" ", text).strip().casefold())
+            if signature in seen:
+                return "duplicate"
+            seen.add(signature)
+        if self.alpha_ratio(text) < self.min_alpha:
+            return "low_alpha"
+        if self.is_toc(text):
+            return "toc"
+        return None
+
+    def _merge(self, parts: List[dict], document_name: str) -> dict:
+        """
+        Joins chunks of one page into the first one, recounting its tokens
+        and re-deriving its id from the merged text.
+        """
+        first = parts[0]
+        text = "\n".join(part["text"] for part in parts)
+        seq = int(first["id"].split("_")[-2 if document_name else -1])
+        return {
+            **first,
+            "id": chunk_id(document_name, first["page"], seq, text) if document_name else first["id"],
+            "text": text,
+            "tokens": self.token_len(text),
+        }
+
+    def apply(self, chunks: List[dict], document_name: str = None) -> Tuple[List[dict], Dict]:
+        """
+        Returns the kept chunks and the filter's statistics.
+
+        Args:
+            chunks (list[dict]): Chunks from `EmbeddingService.chunk_pages()`,
+                                 in page order.
+            document_name (str, optional): The name of the document; merged
+                                           chunks get a new `chunk_id()`.
+
+        Returns:
+            tuple[list[dict], dict]: The kept (and merged) chunks in their
+                original order, and statistics: chunks and tokens before and
+                after, chunks dropped per reason, chunks merged, and the
+                dropped texts (`dropped_texts`, for debugging).
+        """
+        reasons: Counter = Counter()
+        dropped: List[Tuple[str, dict]] = []
+        seen: set = set()
+        kept: List[dict] = []
+        for chunk in chunks:
+            reason = self._reason(chunk, seen)
+            if reason:
+                reasons[reason] += 1
+                dropped.append((reason, chunk))
+            else:
+                kept.append(chunk)
+
+        out: List[dict] = []
+        merged = 0
+        # Short chunks waiting to be joined to the next chunk on their page
+        carry: List[dict] = []
+
+        def flush():
+            nonlocal merged
+            if not carry:
+                return
+            tokens = sum(c["tokens"] for c in carry)
+            previous = out[-1] if out and out[-1]["page"] == carry[0]["page"] else None
+            if previous is not None and previous["tokens"] + tokens <= self.max_tokens:
+                out[-1] = self._merge([previous] + carry, document_name)
+                merged += len(carry)
+            elif tokens >= self.min_tokens:
+                # Stubs that only make sense together, such as a cover page
+                out.append(self._merge(carry, document_name) if len(carry) > 1 else carry[0])
+                merged += len(carry) - 1
+            else:
+                reasons["short"] += len(carry)
+                dropped.extend(("short", c) for c in carry)
+            carry.clear()
+
+        for chunk in kept:
+            if carry and carry[0]["page"] != chunk["page"]:
+                flush()
+            if chunk["tokens"] < self.min_tokens:
+                carry.append(chunk)
+                continue
+            if carry:
+                if sum(c["tokens"] for c in carry) + chunk["tokens"] <= self.max_tokens:
+                    chunk = self._merge(carry + [chunk], document_name)
+                    merged += len(carry)
+                    carry.clear()
+                else:
+                    flush()
+            out.append(chunk)
+        flush()
+
+        tokens_in = sum(c["tokens"] for c in chunks)
+        tokens_out = sum(c["tokens"] for c in out)
+        stats = {
+            "chunks_in": len(chunks),
+            "chunks_out": len(out),
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "chunks_saved": len(chunks) - len(out),
+            "tokens_saved": tokens_in - tokens_out,
+            "merged": merged,
+            "dropped": dict(reasons),
+            "dropped_texts": [
+                {"reason": reason, "page": c["page"], "text": c["text"]} for reason, c in dropped
+            ],
+        }
+        return out, stats
@@ -11,15 +11,32 @@ Classes:
 --------
     DynamicChunker: A service class to handle text chunking operations.
 
+Functions:
+--------
+    chunk_id(): Returns the search index key of a chunk.
+
 Module-level constants:
     BLANK_LINE_RE: Regex to match blank lines.
     SHORT_CAPS_RE: Regex to match short all-caps lines.
+    TIKTOKEN_CACHE_DIR: Bundled tiktoken encoding cache shipped with the
+                        function app (populated by tools/bundle_tiktoken_cache.py).
 """
 
 import os
 import re
+import hashlib
+from functools import lru_cache
 from typing import List, Dict
 
+# Point tiktoken at the bundled encoding files before it is imported, so
+# cold starts read the BPE ranks from disk instead of downloading them.
+TIKTOKEN_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "tiktoken_cache"
+)
+if os.path.isdir(TIKTOKEN_CACHE_DIR):
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", TIKTOKEN_CACHE_DIR)
+
 import tiktoken
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
@@ -27,6 +44,44 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 BLANK_LINE_RE  = re.compile(r"\n\s*\n")          # paragraph gap
 SHORT_CAPS_RE  = re.compile(r"^\s*[A-Z &]{6,}$") # centred ALL‑CAPS line
 
+@lru_cache(maxsize=None)
+def get_encoding(model: str) -> "tiktoken.Encoding":
+    """
+    Return the tiktoken encoding for a model, loaded once per worker.
+
+    Args:
+        model (str): Model name for tokenization.
+
+    Returns:
+        tiktoken.Encoding: The (cached) encoding for the model.
+    """
+    return tiktoken.encoding_for_model(model)
+
+def chunk_id(document_name: str, page: int, seq: int, text: str) -> str:
+    """
+    Returns the search index key of a chunk.
+
+    The key starts with a hash of the document name, so documents sharing the
+    index never overwrite each other's chunks, and ends with a hash of the
+    chunk text, so re-indexing unchanged content writes the same keys. Keys
+    only use characters the index allows (letters, digits, "_" and "-").
+    Because keys depend on the name, chunks must never be reused across
+    documents; pipeline checkpoints are keyed by name and content for this
+    reason (see `checkpoint_store.checkpoint_id()`).
+
+    Args:
+        document_name (str): The name of the document.
+        page (int): Page number of the chunk.
+        seq (int): Position of the chunk on the page.
+        text (str): Chunk text.
+
+    Returns:
+        str: e.g. "3f2a9c0e4b1d7a66_3_0_9e107d9d372b".
+    """
+    doc = hashlib.sha256(document_name.encode("utf-8")).hexdigest()[:16]
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+    return f"{doc}_{page}_{seq}_{digest}"
+
 class DynamicChunker:
     """
     Split PDF-extracted text into ~300-token chunks with adaptive overlap.
@@ -62,7 +117,7 @@ class DynamicChunker:
                                "text-embedding-3-small")
 
         # Initialise helpers
-        self.enc = tiktoken.encoding_for_model(self.model)
+        self.enc = get_encoding(self.model)
         self.splitter = RecursiveCharacterTextSplitter(
             chunk_size   = self.chunk_tokens,
             chunk_overlap= int(self.chunk_tokens * overlap_frac),
@@ -107,13 +162,16 @@ class DynamicChunker:
             blocks.append("\n".join(buf).strip())
         return [b for b in blocks if b]  # drop empties
 
-    def chunk_page(self, text: str, page: int) -> List[Dict]:
+    def chunk_page(self, text: str, page: int, document_name: str = None) -> List[Dict]:
         """
         Return list of {id, page, text, tokens} ready for embedding.
         
         Args:
             text (str): The text string to chunk.
             page (int): The page number of the text.    
+            document_name (str, optional): The name of the document. When given,
+                chunk ids are index keys from `chunk_id()`; otherwise they are
+                "<page>_<seq>".
 
         Returns:
             List[Dict]: A list of dictionaries, each containing the chunk ID, page number,
@@ -127,7 +185,8 @@ class DynamicChunker:
             for piece in self.splitter.split_text(block):
                 chunks.append(
                     {
-                        "id":     f"{page}_{cid}",
+                        "id":     (chunk_id(document_name, page, cid, piece)
+                                   if document_name else f"{page}_{cid}"),
                         "page":   page,
                         "text":   piece,
                         "tokens": self._token_len(piece),
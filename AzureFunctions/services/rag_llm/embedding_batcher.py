@@ -0,0 +1,261 @@
+"""
+services/rag_llm/embedding_batcher.py
+Module for coalescing embedding requests from concurrent invocations.
+
+Each invocation embeds its own document's chunks in batches of `BATCH_SIZE`,
+so the last request of every document is usually only partly full. When
+many small documents arrive together, the Azure OpenAI deployment sees many
+underfilled requests, and its requests-per-minute limit is reached long
+before its tokens-per-minute limit.
+
+The batcher is shared by all invocations in a worker. Callers submit texts
+and get one future per text. A dispatcher thread collects submissions for up
+to a short window after the oldest one arrived, or until a request is full,
+then sends them as one request and resolves each caller's futures with its
+vectors. Identical texts in a request are sent once. A few requests may be
+in flight at a time; while they all are, new submissions keep accumulating
+into the next request.
+
+Classes:
+--------
+    EmbeddingBatcher: Coalesces embedding requests into full batches.
+
+Functions:
+--------
+    get_embedding_batcher(): Returns the worker's batcher for a model, or None when disabled.
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Deque, Dict, List, Optional, Sequence
+from services.logger import Logger
+from services.client_registry import get_client
+
+class _Pending:
+    """
+    A submitted text waiting for its vector.
+    """
+    __slots__ = ("text", "tokens", "future", "submitted")
+
+    def __init__(self, text: str, tokens: int):
+        self.text = text
+        self.tokens = tokens
+        self.future: Future = Future()
+        self.submitted = time.monotonic()
+
+class EmbeddingBatcher:
+    """
+    Coalesces embedding requests from concurrent callers into full batches.
+
+    Attributes
+    ----------
+        model (str): Embedding deployment the requests are sent to.
+        dimensions (int | None): Requested vector length; None for the default.
+        max_batch (int): Most texts per request.
+        max_tokens (int): Most tokens per request.
+        window (float): Seconds to wait for more texts after the oldest
+                        pending one was submitted.
+        concurrency (int): Requests in flight at a time.
+        stats (dict): Counters: `requests`, `texts`, `sent` (distinct texts),
+                      `full` (requests that reached `max_batch` or
+                      `max_tokens`) and `failed`.
+
+    Methods
+    -------
+        submit(): Queues texts and returns one future per text.
+        close(): Sends what is queued and stops the dispatcher.
+
+    Environment variables:
+        EMBEDDING_BATCH_MAX: Most texts per request (default: BATCH_SIZE, or 20).
+        EMBEDDING_BATCH_MAX_TOKENS: Most tokens per request (default: 100000).
+        EMBEDDING_BATCH_WINDOW_MS: Window for collecting texts (default: 50).
+        EMBEDDING_BATCH_CONCURRENCY: Requests in flight at a time (default: 4).
+    """
+
+    def __init__(self, model: str, dimensions: Optional[int] = None, max_batch: int = None,
+                 max_tokens: int = None, window_ms: float = None, concurrency: int = None):
+        """
+        Initialises the batcher. The dispatcher thread starts on the first submission.
+
+        Args:
+            model (str): Embedding deployment the requests are sent to.
+            dimensions (int, optional): Requested vector length.
+            max_batch (int, optional): Defaults to EMBEDDING_BATCH_MAX.
+            max_tokens (int, optional): Defaults to EMBEDDING_BATCH_MAX_TOKENS.
+            window_ms (float, optional): Defaults to EMBEDDING_BATCH_WINDOW_MS.
+            concurrency (int, optional): Defaults to EMBEDDING_BATCH_CONCURRENCY.
+        """
+        self.logger = Logger.get_logger("EmbeddingBatcher", json_format=True)
+        self.model = model
+        self.dimensions = dimensions
+        self.max_batch = max_batch or int(os.environ.get(
+            "EMBEDDING_BATCH_MAX", os.environ.get("BATCH_SIZE", 20)))
+        self.max_tokens = max_tokens or int(os.environ.get("EMBEDDING_BATCH_MAX_TOKENS", 100000))
+        self.window = (window_ms if window_ms is not None
+                       else float(os.environ.get("EMBEDDING_BATCH_WINDOW_MS", 50))) / 1000
+        self.concurrency = concurrency or int(os.environ.get("EMBEDDING_BATCH_CONCURRENCY", 4))
+        self.stats = {"requests": 0, "texts": 0, "sent": 0, "full": 0, "failed": 0}
+
+        self._queue: Deque[_Pending] = deque()
+        self._queued_tokens = 0
+        self._cond = threading.Condition()
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, texts: Sequence[str], tokens: Sequence[int] = None) -> List[Future]:
+        """
+        Queues texts and returns one future per text.
+
+        Args:
+            texts (Sequence[str]): Texts to embed.
+            tokens (Sequence[int], optional): Token count of each text, used
+                                              for the `max_tokens` limit.
+
+        Returns:
+            list[Future]: Futures resolving to each text's vector, in order.
+                A failed request sets the same exception (e.g. an OpenAIError)
+                on the futures of all its texts.
+
+        Raises:
+            RuntimeError: If the batcher has been closed.
+        """
+        items = [_Pending(text, tokens[i] if tokens else 0) for i, text in enumerate(texts)]
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EmbeddingBatcher is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="embedding-batcher", daemon=True
+                )
+                self._thread.start()
+            self._queue.extend(items)
+            self._queued_tokens += sum(item.tokens for item in items)
+            self.stats["texts"] += len(items)
+            self._cond.notify()
+        return [item.future for item in items]
+
+    def close(self, timeout: float = None):
+        """
+        Sends what is queued and stops the dispatcher.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the dispatcher.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        # Wait for requests still in flight
+        for _ in range(self.concurrency):
+            self._slots.acquire(timeout=timeout)  # pylint: disable=consider-using-with
+
+    def _full(self) -> bool:
+        """
+        Returns True if the queue holds a full request. Called with the lock held.
+        """
+        return len(self._queue) >= self.max_batch or self._queued_tokens >= self.max_tokens
+
+    def _take(self) -> Dict[str, List[_Pending]]:
+        """
+        Removes the next request's texts from the queue, grouping identical
+        texts. Called with the lock held.
+        """
+        batch: Dict[str, List[_Pending]] = {}
+        tokens = 0
+        while self._queue:
+            item = self._queue[0]
+            if item.text not in batch:
+                if batch and (len(batch) >= self.max_batch
+                              or tokens + item.tokens > self.max_tokens):
+                    break
+                batch[item.text] = []
+                tokens += item.tokens
+            batch[item.text].append(self._queue.popleft())
+            self._queued_tokens -= item.tokens
+        return batch
+
+    def _run(self):
+        """
+        Dispatcher loop: waits for texts, collects them for up to `window`,
+        and hands each request to a sender thread.
+        """
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+            # Wait for a free slot first, so texts submitted meanwhile join this request
+            self._slots.acquire()  # pylint: disable=consider-using-with
+            with self._cond:
+                deadline = self._queue[0].submitted + self.window
+                while not self._closed and not self._full():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take()
+            threading.Thread(
+                target=self._send, args=(batch,), name="embedding-request", daemon=True
+            ).start()
+
+    def _send(self, batch: Dict[str, List[_Pending]]):
+        """
+        Sends one request and resolves the futures of its texts.
+        """
+        texts = list(batch)
+        waiting = [item for items in batch.values() for item in items]
+        try:
+            started = time.monotonic()
+            resp = get_client("openai").embeddings.create(
+                model=self.model,
+                input=texts,
+                **({"dimensions": self.dimensions} if self.dimensions else {})
+            )
+            if len(resp.data) != len(texts):
+                raise ValueError(f"Expected {len(texts)} embeddings, got {len(resp.data)}")
+            for text, data in zip(texts, resp.data):
+                for item in batch[text]:
+                    item.future.set_result(data.embedding)
+            with self._cond:
+                self.stats["requests"] += 1
+                self.stats["sent"] += len(texts)
+                if (len(texts) >= self.max_batch
+                        or sum(batch[t][0].tokens for t in texts) >= self.max_tokens):
+                    self.stats["full"] += 1
+            self.logger.info(
+                "Embedded %d text(s) for %d submission(s)", len(texts), len(waiting),
+                extra={
+                    "waitMs": round((started - min(i.submitted for i in waiting)) * 1000, 1),
+                    "requestMs": round((time.monotonic() - started) * 1000, 1)
+                }
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            # Callers decide how to handle the error; the dispatcher keeps running
+            with self._cond:
+                self.stats["failed"] += 1
+            for item in waiting:
+                if not item.future.done():
+                    item.future.set_exception(e)
+        finally:
+            self._slots.release()
+
+@lru_cache(maxsize=None)
+def get_embedding_batcher(model: str, dimensions: Optional[int] = None) -> Optional[EmbeddingBatcher]:
+    """
+    Returns the worker's batcher for a model, or None when disabled.
+
+    Environment variables:
+        EMBEDDING_BATCHER: "false" to send each invocation's batches
+                           directly (default: "true").
+    """
+    if os.environ.get("EMBEDDING_BATCHER", "true").lower() != "true":
+        return None
+    return EmbeddingBatcher(model, dimensions)
@@ -0,0 +1,274 @@
+"""
+services/rag_llm/embedding_cache.py
+Module for caching chunk embeddings on disk.
+
+Much of an annual report is boilerplate shared with thousands of other
+filings (directors' declarations, accounting-policy notes, audit report
+templates), and the checks embed the same queries for every document. The
+cache stores each embedding under a hash of the normalised text, the model
+and the vector length, so repeated text is embedded once.
+
+Entries are kept in a SQLite file as float16 (or float32) blobs, a sixth
+(or a third) of their size as JSON. When the file grows past its budget, the
+least recently used entries are evicted. By default the file is in the
+instance's temp directory, and EMBEDDING_CACHE_PATH should stay on local
+disk: the file uses SQLite's WAL journal, which needs shared memory and does
+not work over network filesystems (SMB/Azure Files, NFS). A path on a
+network mount falls back to the rollback journal, which is safe for this
+instance's workers only; several instances must not share the file.
+
+Classes:
+--------
+    EmbeddingCache: SQLite-backed LRU cache of embeddings.
+
+Functions:
+--------
+    cache_key(): Returns the cache key of a text.
+    get_embedding_cache(): Returns the worker's shared cache, or None when disabled.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from services.logger import Logger
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def cache_key(text: str, model: str, dimensions: Optional[int]) -> str:
+    """
+    Returns the cache key of a text.
+
+    The text is NFKC-normalised and its whitespace collapsed, so layout
+    differences between PDFs (line breaks, double spaces, ligatures) map to
+    the same entry. Case and punctuation are kept; they change the embedding.
+
+    Args:
+        text (str): Text to embed.
+        model (str): Embedding deployment or model name.
+        dimensions (int, optional): Requested vector length (None for the default).
+
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    normalised = _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+    return hashlib.sha256(f"{model}\x00{dimensions or ''}\x00{normalised}".encode("utf-8")).hexdigest()
+
+# Filesystem types on which SQLite's WAL mode is unsafe
+_NETWORK_FILESYSTEMS = {"cifs", "smb3", "smbfs", "nfs", "nfs4", "fuse.sshfs"}
+
+def _on_network_filesystem(path: str, mounts_file: str = "/proc/mounts") -> bool:
+    """
+    Returns True if `path` is on a network mount (Linux only; False elsewhere).
+    """
+    try:
+        with open(mounts_file, encoding="utf-8") as fh:
+            mounts = [line.split()[1:3] for line in fh if len(line.split()) > 2]
+    except OSError:
+        return False
+    directory = os.path.realpath(os.path.dirname(os.path.abspath(path)))
+    best, fstype = "", None
+    for mount_point, mount_type in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        inside = directory == mount_point or directory.startswith(mount_point.rstrip("/") + "/")
+        if inside and len(mount_point) > len(best):
+            best, fstype = mount_point, mount_type
+    return fstype in _NETWORK_FILESYSTEMS
+
+class EmbeddingCache:
+    """
+    SQLite-backed LRU cache of embeddings.
+
+    Attributes
+    ----------
+        path (str): SQLite file.
+        max_bytes (int): Budget for stored vectors; older entries are evicted beyond it.
+        dtype (np.dtype): Storage type (float16 or float32).
+        hits (int): Lookups served by the cache.
+        misses (int): Lookups not in the cache.
+
+    Methods
+    -------
+        get_many(): Returns the cached embeddings of the given keys.
+        put_many(): Stores embeddings.
+        close(): Closes the database.
+    """
+
+    # Entries whose last-use time is updated per statement
+    _TOUCH_BATCH = 500
+
+    def __init__(self, path: str, max_bytes: int, dtype: str = "float16"):
+        """
+        Opens (or creates) the cache file.
+
+        Args:
+            path (str): SQLite file.
+            max_bytes (int): Budget for stored vectors.
+            dtype (str): "float16" or "float32".
+
+        Raises:
+            sqlite3.Error: If the file cannot be opened.
+        """
+        self.logger = Logger.get_logger("EmbeddingCache", json_format=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Several threads share the connection under the lock; WAL lets other
+        # processes on the instance read while one writes, but needs shared
+        # memory, which network filesystems do not provide
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False,
+                                   isolation_level=None)
+        if _on_network_filesystem(path):
+            self.logger.warning("Embedding cache is on a network filesystem; using the "
+                                "rollback journal. Do not share it between instances.",
+                                extra={"path": path})
+            self._db.execute("PRAGMA journal_mode=DELETE")
+        else:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, dtype TEXT NOT NULL, vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._size = self._db.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """
+        Returns the cached embeddings of the given keys.
+
+        Args:
+            keys (Sequence[str]): Keys from `cache_key()`.
+
+        Returns:
+            dict[str, list[float]]: Embeddings of the keys that were found.
+        """
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            # SQLite limits the number of bound parameters per statement
+            for i in range(0, len(unique), self._TOUCH_BATCH):
+                batch = unique[i:i + self._TOUCH_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    f"SELECT key, dtype, vector FROM embeddings WHERE key IN ({marks})", batch
+                ).fetchall()
+                for key, dtype, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=dtype).astype(np.float32).tolist()
+                if rows:
+                    self._db.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN "
+                        f"({','.join('?' * len(rows))})",
+                        [time.time()] + [key for key, _, _ in rows]
+                    )
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, items: Dict[str, Sequence[float]]):
+        """
+        Stores embeddings, evicting the least recently used entries if the
+        cache is over budget.
+
+        Args:
+            items (dict[str, Sequence[float]]): Key to embedding.
+        """
+        if not items:
+            return
+        now = time.time()
+        rows = [
+            (key, self.dtype.name, np.asarray(vector, dtype=self.dtype).tobytes(), now)
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, dtype, vector, last_used) "
+                    "VALUES (?, ?, ?, ?)", rows
+                )
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+            self._size += sum(len(row[2]) for row in rows)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """
+        Deletes the least recently used entries down to 90% of the budget.
+        Called with the lock held.
+        """
+        # Other processes may share the file, so recount before deleting
+        self._size = self._db.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+        excess = self._size - int(self.max_bytes * 0.9)
+        if excess <= 0:
+            return
+        freed, keys = 0, []
+        for key, size in self._db.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used"):
+            keys.append(key)
+            freed += size
+            if freed >= excess:
+                break
+        for i in range(0, len(keys), self._TOUCH_BATCH):
+            batch = keys[i:i + self._TOUCH_BATCH]
+            self._db.execute(
+                f"DELETE FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+            )
+        self._size -= freed
+        self.logger.info("Evicted %d embedding(s)", len(keys),
+                         extra={"freedBytes": freed, "sizeBytes": self._size})
+
+    def close(self):
+        """
+        Closes the database.
+        """
+        with self._lock:
+            self._db.close()
+
+@lru_cache(maxsize=None)
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Returns the worker's shared cache, or None when disabled or unavailable.
+
+    Environment variables:
+        EMBEDDING_CACHE: "false" to disable the cache (default: "true").
+        EMBEDDING_CACHE_PATH: SQLite file (default: <temp>/embedding-cache.sqlite3).
+        EMBEDDING_CACHE_MAX_MB: Budget for stored vectors (default: 512).
+        EMBEDDING_CACHE_DTYPE: "float16" or "float32" (default: "float16").
+    """
+    if os.environ.get("EMBEDDING_CACHE", "true").lower() != "true":
+        return None
+    path = os.environ.get("EMBEDDING_CACHE_PATH",
+                          os.path.join(tempfile.gettempdir(), "embedding-cache.sqlite3"))
+    try:
+        return EmbeddingCache(
+            path,
+            max_bytes=int(float(os.environ.get("EMBEDDING_CACHE_MAX_MB", 512)) * 2**20),
+            dtype=os.environ.get("EMBEDDING_CACHE_DTYPE", "float16")
+        )
+    except (sqlite3.Error, OSError, TypeError) as e:
+        # A cache that cannot be opened must not stop indexing
+        Logger.get_logger("EmbeddingCache", json_format=True).warning(
+            "Embedding cache unavailable: %s", str(e), extra={"path": path}
+        )
+        return None
@@ -15,15 +15,53 @@ Classes:
 --------
     EmbeddingService: A service class to handle embedding operations
                       using Azure OpenAI and Azure Cognitive Search.
+
+Functions:
+--------
+    request_timeout(): Returns the longest an OpenAI client call can take.
 """
 
 import os
+import time
+import sqlite3
 import datetime
-from openai import AzureOpenAI, OpenAIError
-from azure.search.documents import SearchClient
-from azure.core.credentials import AzureKeyCredential
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from openai import OpenAIError
 from services.logger import Logger
+from services.client_registry import get_client
+from services.tracer import stage
+from services.debug_utils import write_debug_file, is_debug_mode
 from services.rag_llm.chunk_service import DynamicChunker
+from services.rag_llm.chunk_filter import ChunkFilter
+from services.rag_llm.embedding_cache import cache_key, get_embedding_cache
+from services.rag_llm.embedding_batcher import get_embedding_batcher
+
+# The openai package's defaults, for clients that do not expose theirs
+DEFAULT_REQUEST_TIMEOUT = 600.0
+DEFAULT_MAX_RETRIES = 2
+
+def request_timeout(client) -> float:
+    """
+    Returns the longest a call on an OpenAI client can take: its per-attempt
+    timeout times the attempts its retries allow.
+
+    Args:
+        client (AzureOpenAI): The client; `timeout` may be a number or an
+                              httpx.Timeout.
+
+    Returns:
+        float: Seconds.
+    """
+    timeout = getattr(client, "timeout", None)
+    if hasattr(timeout, "read"):
+        # httpx.Timeout: connecting plus waiting for the response
+        timeout = sum(t for t in (timeout.connect, timeout.read) if t) or None
+    if not isinstance(timeout, (int, float)):
+        timeout = DEFAULT_REQUEST_TIMEOUT
+    retries = getattr(client, "max_retries", DEFAULT_MAX_RETRIES)
+    if not isinstance(retries, int):
+        retries = DEFAULT_MAX_RETRIES
+    return float(timeout) * (retries + 1)
 
 class EmbeddingService:
     """
@@ -43,10 +81,20 @@ class EmbeddingService:
     ----------
         logger (Logger): Logger instance for logging messages.
         batch_size (int): The number of text chunks to process in each batch.
-        search_client (SearchClient): Azure Search client instance for indexing documents.
-        oaiclient (AzureOpenAI): Azure OpenAI client instance for generating embeddings.
+        search_client (SearchClient): Shared Azure Search client instance for indexing documents.
+        oaiclient (AzureOpenAI): Shared Azure OpenAI client instance for generating embeddings.
         deployment_name (str): The name of the OpenAI deployment for embeddings.
+        dimensions (int | None): Requested embedding length (text-embedding-3
+                                 models only); None uses the model's default.
         chunker (DynamicChunker): Instance of the DynamicChunker class for chunking text.
+        chunk_filter (ChunkFilter | None): Drops and merges low-information
+                                           chunks, or None when disabled.
+        cache (EmbeddingCache | None): Shared embedding cache, or None when disabled.
+        batcher (EmbeddingBatcher | None): Worker-wide batcher that coalesces
+                                           requests across invocations, or None
+                                           when disabled.
+        wait_timeout (float): Seconds to wait for the batcher before sending
+                              the remaining chunks directly.
     
     Methods
     -------
@@ -54,6 +102,10 @@ class EmbeddingService:
         index_chunks(): Indexes each page's text (embedded or OCR) into the 
                         Cognitive Search vector index, batching embeddings
                         in a single API call for efficiency.
+        chunk_pages(): Builds a flat list of chunks for all pages.
+        filter_chunks(): Drops and merges low-information chunks before embedding.
+        embed_chunks(): Embeds uncached chunks in batches, one API call per batch.
+        upload_chunks(): Uploads embedded chunks to the search index.
     """
     def __init__(self):
         """
@@ -65,27 +117,37 @@ class EmbeddingService:
         self.batch_size = int(os.environ.get("BATCH_SIZE", 20))
         self.logger.info("Using embedding batch size %s", self.batch_size)
 
-        # Set up the Azure Search client
-        self.search_client = SearchClient(
-            endpoint=os.environ["SEARCH_ENDPOINT"],
-            index_name=os.environ["SEARCH_INDEX"],
-            credential=AzureKeyCredential(os.environ["SEARCH_ADMIN_KEY"]),
-            api_version="2024-07-01"
-            )
+        # Reuse the worker-wide Azure Search and OpenAI clients
+        self.search_client = get_client("search")
+        self.oaiclient = get_client("openai")
 
-        # Set up the OpenAI client
-        self.oaiclient = AzureOpenAI(
-            api_key=os.environ["AZURE_OPENAI_API_KEY"],
-            api_version=os.environ["AZURE_OPENAI_API_VERSION"],
-            azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"]
-        )
+        # The OpenAI client is shared with RetrievalService, so the embedding
+        # deployment is bound to this service rather than to the client.
+        self.deployment_name = os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"]
 
-        # Bind embedding deployment so the model doesn't need to be specified in each call
-        self.oaiclient.deployment_name = os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"]
+        # Must match the index's vector field (infra/scripts/create_search_index.py)
+        dimensions = os.environ.get("AZURE_OPENAI_EMBEDDING_DIMENSIONS")
+        self.dimensions = int(dimensions) if dimensions else None
 
         # Create a reusable chunker instance
         self.chunker = DynamicChunker()
 
+        # Cover pages, contents and numeric fragments are not worth a vector
+        self.chunk_filter = (
+            ChunkFilter(self.chunker._token_len, max_tokens=self.chunker.chunk_tokens)  # pylint: disable=protected-access
+            if os.environ.get("CHUNK_FILTER", "true").lower() == "true" else None
+        )
+
+        # Boilerplate shared across filings is only embedded once
+        self.cache = get_embedding_cache()
+
+        # Concurrent invocations share requests instead of each sending a partial last batch
+        self.batcher = get_embedding_batcher(self.deployment_name, self.dimensions)
+
+        # A request can take as long as the client allows, after the batcher's window
+        self.wait_timeout = request_timeout(self.oaiclient) + (
+            self.batcher.window if self.batcher is not None else 0)
+
         self.logger.info("Initialised AzureOpenAI & SearchClient")
 
     def index_chunks(self, document_name: str, page_texts: dict[int, str]):
@@ -99,65 +161,268 @@ class EmbeddingService:
                                          and values are the extracted text from each page.
 
         Returns:
-            None
+            list[dict]: The chunks that were embedded and uploaded.
 
         Raises:
-            OpenAIError: If there is an error with the OpenAI API call.
-            Exception: If there is an error with the Azure Search client.
+            None: Embedding and upload errors are logged per batch.
+        """
+        chunks = self.filter_chunks(document_name, self.chunk_pages(page_texts, document_name))
+        embedded, _ = self.embed_chunks(document_name, chunks)
+        self.upload_chunks(document_name, embedded)
+        return embedded
+
+    def chunk_pages(self, page_texts: dict[int, str], document_name: str = None) -> list[dict]:
+        """
+        Builds a flat list of chunks for all pages.
+
+        Args:
+            page_texts (dict[int, str]): Page number to extracted text.
+            document_name (str, optional): The name of the document; scopes
+                                           the chunk ids (see `chunk_id()`).
+
+        Returns:
+            list[dict]: Chunks as produced by `DynamicChunker.chunk_page()`.
         """
-        # 1) Build a flat list of all chunks
-        #chunks = []
-        #for page, text in page_texts.items():
-        #    chunks.extend(ChunkService.chunk_text(text, page))
         chunker = self.chunker
         chunks: list[dict] = []
-        for page, text in page_texts.items():
-            chunks.extend(chunker.chunk_page(text, page))
+        with stage("Chunking", pages=len(page_texts)) as st:
+            for page, text in page_texts.items():
+                chunks.extend(chunker.chunk_page(text, page, document_name))
+            st.add_attribute("chunks", len(chunks))
+            st.add_attribute("tokens", sum(c["tokens"] for c in chunks))
+        return chunks
+
+    def filter_chunks(self, document_name: str, chunks: list[dict]) -> list[dict]:
+        """
+        Drops and merges low-information chunks before embedding (see
+        `ChunkFilter`), and logs how many chunks and tokens were saved.
+
+        Args:
+            document_name (str): The name of the document being processed.
+            chunks (list[dict]): Chunks from `chunk_pages()`.
+
+        Returns:
+            list[dict]: The chunks to embed; `chunks` if the filter is disabled.
+        """
+        if self.chunk_filter is None or not chunks:
+            return chunks
+        with stage("ChunkFilter", chunks=len(chunks)) as st:
+            kept, stats = self.chunk_filter.apply(chunks, document_name)
+            dropped_texts = stats.pop("dropped_texts")
+            for name in ("chunks_saved", "tokens_saved", "merged"):
+                st.add_attribute(name, stats[name])
+
+        self.logger.info(
+            "Chunk filter saved %d chunk(s), %d token(s)",
+            stats["chunks_saved"], stats["tokens_saved"],
+            extra={"document": document_name, **stats}
+        )
+
+        # DEBUG
+        if is_debug_mode():
+            write_debug_file({**stats, "dropped_texts": dropped_texts}, prefix="chunk_filter")
+
+        return kept
+
+    def _cached(self, keys: list[str]) -> dict[str, list[float]]:
+        """
+        Returns the cached embeddings of the given keys; cache errors count as misses.
+        """
+        if self.cache is None:
+            return {}
+        try:
+            return self.cache.get_many(keys)
+        except sqlite3.Error as e:
+            self.logger.warning("Embedding cache lookup failed: %s", str(e))
+            return {}
+
+    def _remember(self, items: dict[str, list[float]]):
+        """
+        Stores new embeddings in the cache; errors are logged and ignored.
+        """
+        if self.cache is None or not items:
+            return
+        try:
+            self.cache.put_many(items)
+        except sqlite3.Error as e:
+            self.logger.warning("Embedding cache write failed: %s", str(e))
+
+    def embed_chunks(self, document_name: str, chunks: list[dict]) -> tuple[list[dict], int]:
+        """
+        Embeds chunks in batches of `batch_size`, one API call per batch.
+        Chunks whose text is in the embedding cache are not sent, and
+        identical texts within the document are sent once. With the shared
+        batcher enabled, the chunks are sent in requests coalesced with
+        those of concurrent invocations instead.
+
+        Args:
+            document_name (str): The name of the document being processed.
+            chunks (list[dict]): Chunks from `chunk_pages()`.
 
-        # 2) Process in batches
+        Returns:
+            tuple[list[dict], int]: The chunks that were embedded (each with an
+                                    added "embedding" key), in their original
+                                    order, and the number of batches (or
+                                    coalesced requests) that failed.
+
+        Raises:
+            None: Failed batches are logged and skipped.
+        """
+        keys = [cache_key(c["text"], self.deployment_name, self.dimensions) for c in chunks]
+        vectors = self._cached(keys)
+        cache_hits = sum(1 for key in keys if key in vectors)
+
+        # One request entry per distinct uncached text
+        pending: dict[str, dict] = {}
+        for key, chunk in zip(keys, chunks):
+            if key not in vectors:
+                pending.setdefault(key, chunk)
+        misses = list(pending.items())
+
+        if self.batcher is not None and misses:
+            failed_batches = self._embed_batched(document_name, misses, vectors)
+        else:
+            failed_batches = self._embed_direct(document_name, misses, vectors)
+
+        self.logger.info(
+            "Embedded %d chunk(s), %d from cache", len(chunks), cache_hits,
+            extra={"document": document_name, "sent": len(misses)}
+        )
+        embedded = [
+            {**c, "embedding": vectors[key]} for key, c in zip(keys, chunks) if key in vectors
+        ]
+        return embedded, failed_batches
+
+    def _embed_batched(self, document_name: str, misses: list[tuple[str, dict]],
+                       vectors: dict[str, list[float]]) -> int:
+        """
+        Embeds chunks through the worker's shared batcher, adding the vectors
+        to `vectors`; returns the number of failed requests. Chunks still
+        waiting after `wait_timeout` are embedded directly instead.
+        """
+        futures = self.batcher.submit([c["text"] for _, c in misses],
+                                      [c["tokens"] for _, c in misses])
+        fresh: dict[str, list[float]] = {}
+        errors: dict[int, Exception] = {}
+        late: list[tuple[str, dict]] = []
+        deadline = time.monotonic() + self.wait_timeout
+        with stage(
+            "EmbeddingWait",
+            chunks=len(misses),
+            tokens=sum(c["tokens"] for _, c in misses)
+        ) as st:
+            for (key, chunk), future in zip(misses, futures):
+                try:
+                    fresh[key] = future.result(timeout=max(deadline - time.monotonic(), 0))
+                except FuturesTimeoutError:
+                    # Left to the batcher; its result, if it comes, is discarded
+                    late.append((key, chunk))
+                except Exception as err: # pylint: disable=broad-except
+                    # The batcher sets any failure of a request (an OpenAIError, a
+                    # response of the wrong length, a client that cannot be built)
+                    # on the futures of all its texts, as the same exception object
+                    errors[id(err)] = err
+            st.add_attribute("failed_requests", len(errors))
+            st.add_attribute("timed_out", len(late))
+        vectors.update(fresh)
+        self._remember(fresh)
+
+        for err in errors.values():
+            self.logger.error(
+                "Batch embedding call failed: %s: %s", type(err).__name__, str(err),
+                extra={"document": document_name, "chunk_count": len(misses)}
+            )
+        if not late:
+            return len(errors)
+
+        self.logger.warning(
+            "Embedding batcher did not answer within %.0fs; sending %d chunk(s) directly",
+            self.wait_timeout, len(late),
+            extra={"document": document_name}
+        )
+        return len(errors) + self._embed_direct(document_name, late, vectors)
+
+    def _embed_direct(self, document_name: str, misses: list[tuple[str, dict]],
+                      vectors: dict[str, list[float]]) -> int:
+        """
+        Embeds chunks in batches of `batch_size`, one API call per batch,
+        adding the vectors to `vectors`; returns the number of failed batches.
+        """
+        failed_batches = 0
+        for i in range(0, len(misses), self.batch_size):
+            batch = misses[i : i + self.batch_size]
+            texts = [c["text"] for _, c in batch]
+
+            try:
+                with stage(
+                    "EmbeddingBatch",
+                    batch_index=i // self.batch_size,
+                    chunks=len(batch),
+                    tokens=sum(c["tokens"] for _, c in batch)
+                ):
+                    resp = self.oaiclient.embeddings.create(
+                        model=self.deployment_name,
+                        input=texts,
+                        **({"dimensions": self.dimensions} if self.dimensions else {})
+                    )
+                fresh = {key: d.embedding for (key, _), d in zip(batch, resp.data)}
+                vectors.update(fresh)
+                self._remember(fresh)
+
+            except OpenAIError as oai_err:
+                # Log at the batch level
+                failed_batches += 1
+                self.logger.error(
+                    "Batch embedding call failed: %s", str(oai_err),
+                    extra={"document": document_name, "chunk_count": len(misses)}
+                )
+        return failed_batches
+
+    def upload_chunks(self, document_name: str, chunks: list[dict]) -> int:
+        """
+        Uploads embedded chunks to the search index in batches of `batch_size`.
+
+        Args:
+            document_name (str): The name of the document being processed.
+            chunks (list[dict]): Chunks with an "embedding" key, from `embed_chunks()`.
+
+        Returns:
+            int: The number of batches that failed to upload.
+
+        Raises:
+            None: Upload errors are logged per batch.
+        """
+        failed_batches = 0
         for i in range(0, len(chunks), self.batch_size):
             batch = chunks[i : i + self.batch_size]
-            texts = [c["text"] for c in batch]
 
-            # 3) Embed + prepare docs
+            # Prepare Search documents
+            docs = []
+            for c in batch:
+                docs.append({
+                    "id":           c["id"],
+                    "documentName": document_name,
+                    "page":         c["page"],
+                    "tokens":       c["tokens"],
+                    "chunkText":    c["text"],
+                    "embedding":    c["embedding"],
+                    "createdAt":    datetime.datetime.utcnow().isoformat(),
+                })
+
+            # Upload and log each result
             try:
-                resp = self.oaiclient.embeddings.create(
-                    model=self.oaiclient.deployment_name,
-                    input=texts
-                )
-                embeddings_list = [d.embedding for d in resp.data]
-
-                # 3) Prepare Search documents
-                docs = []
-                for c, emb in zip(batch, embeddings_list):
-                    docs.append({
-                        "id":           c["id"],
-                        "documentName": document_name,
-                        "page":         c["page"],
-                        "tokens":       c["tokens"],
-                        "chunkText":    c["text"],
-                        "embedding":    emb,
-                        "createdAt":    datetime.datetime.utcnow().isoformat(),
-                    })
-
-                # 4) Upload and log each result
-                self.search_client.upload_documents(docs)
+                with stage("IndexUpload", chunks=len(batch)):
+                    self.search_client.upload_documents(docs)
                 self.logger.info(
                     "Indexed chunks %s - %s",
                     batch[0]["id"], batch[-1]["id"],
                     extra={"batchSize": len(batch), "document": document_name}
                 )
-
-
-            except OpenAIError as oai_err:
-                # Log at the batch level
-                self.logger.error(
-                    "Batch embedding call failed: %s", str(oai_err),
-                    extra={"document": document_name, "chunk_count": len(chunks)}
-                )
             except Exception as e:
                 # Catch any upload errors
+                failed_batches += 1
                 self.logger.error(
                     "Failed to index chunks to Search: %s", str(e),
                     extra={"document": document_name}
                 )
+        return failed_batches
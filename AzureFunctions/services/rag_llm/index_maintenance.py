@@ -0,0 +1,131 @@
+"""
+services/rag_llm/index_maintenance.py
+Module for removing chunks from the search index.
+
+Filtered vector search latency and Search cost grow with the index, and
+chunks are only needed while a document's checks run (or are re-run). Two
+kinds of deletion keep the index small:
+
+    - Before a document is indexed, its existing chunks are deleted, so
+      re-processed documents do not leave stale chunks behind.
+    - A scheduled collector (the `PurgeIndex` timer function) deletes the
+      chunks of documents indexed longer ago than a retention window.
+
+Deletes go through the same search client as uploads. Like uploads, they
+become visible to queries after a short delay.
+
+Classes:
+--------
+    IndexMaintenance: Deletes chunks by document or by age.
+"""
+
+import os
+import datetime
+from typing import Iterable, List
+from services.logger import Logger
+from services.client_registry import get_client
+from services.tracer import stage
+
+class IndexMaintenance:
+    """
+    Deletes chunks from the search index by document or by age.
+
+    Attributes
+    ----------
+        search_client (SearchClient): Shared Azure Search client.
+        batch_size (int): Keys per delete request.
+        retention_days (float): Age after which chunks are collected.
+        max_deletes (int): Most chunks deleted by one collection run.
+
+    Methods
+    -------
+        purge_document(): Deletes every chunk of a document.
+        purge_expired(): Deletes chunks indexed before the retention window.
+
+    Environment variables:
+        INDEX_RETENTION_DAYS: Days chunks are kept after indexing (default: 30).
+        INDEX_GC_MAX_DELETES: Most chunks deleted per collection run (default: 50000).
+    """
+
+    def __init__(self, search_client=None):
+        """
+        Initialises the service.
+
+        Args:
+            search_client (SearchClient, optional): Client to use instead of
+                the shared one.
+        """
+        self.logger = Logger.get_logger("IndexMaintenance", json_format=True)
+        self.search_client = search_client or get_client("search")
+        self.batch_size = 1000
+        self.retention_days = float(os.environ.get("INDEX_RETENTION_DAYS", 30))
+        self.max_deletes = int(os.environ.get("INDEX_GC_MAX_DELETES", 50000))
+
+    def _keys(self, odata_filter: str, limit: int = None) -> List[str]:
+        """
+        Returns the keys of the chunks matching a filter.
+        """
+        results = self.search_client.search(
+            search_text="*", filter=odata_filter, select=["id"], top=limit
+        )
+        return [r["id"] for r in results]
+
+    def _delete(self, keys: Iterable[str]) -> int:
+        """
+        Deletes chunks by key in batches; returns the number deleted.
+        """
+        keys = list(keys)
+        deleted = 0
+        for i in range(0, len(keys), self.batch_size):
+            batch = [{"id": key} for key in keys[i:i + self.batch_size]]
+            results = self.search_client.delete_documents(batch)
+            deleted += sum(1 for r in results if r.succeeded)
+        return deleted
+
+    def purge_document(self, document_name: str) -> int:
+        """
+        Deletes every chunk of a document.
+
+        Args:
+            document_name (str): The name of the document.
+
+        Returns:
+            int: The number of chunks deleted.
+
+        Raises:
+            AzureError: If the lookup or a delete request fails, so the
+                        caller does not index on top of stale chunks.
+        """
+        escaped = document_name.replace("'", "''")
+        with stage("IndexPurge") as st:
+            keys = self._keys(f"documentName eq '{escaped}'")
+            deleted = self._delete(keys) if keys else 0
+            st.add_attribute("chunks", deleted)
+        if deleted:
+            self.logger.info("Deleted %d existing chunk(s)", deleted,
+                             extra={"document": document_name})
+        return deleted
+
+    def purge_expired(self, now: datetime.datetime = None) -> dict:
+        """
+        Deletes chunks indexed before the retention window.
+
+        Chunks carry the time they were uploaded (`createdAt`, ISO 8601 UTC,
+        which sorts as text), and a document's chunks are replaced whenever
+        it is re-indexed, so this removes whole documents that have not been
+        processed within the window.
+
+        Args:
+            now (datetime, optional): Current UTC time (default: now).
+
+        Returns:
+            dict: `cutoff`, `deleted` and `more` (True if `max_deletes` was
+                  reached and older chunks remain).
+        """
+        now = now or datetime.datetime.utcnow()
+        cutoff = (now - datetime.timedelta(days=self.retention_days)).isoformat()
+        keys = self._keys(f"createdAt lt '{cutoff}'", limit=self.max_deletes)
+        deleted = self._delete(keys) if keys else 0
+        stats = {"cutoff": cutoff, "deleted": deleted, "more": len(keys) >= self.max_deletes}
+        self.logger.info("Expired chunks deleted", extra=stats)
+        return stats
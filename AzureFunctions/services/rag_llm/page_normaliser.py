@@ -0,0 +1,167 @@
+"""
+services/rag_llm/page_normaliser.py
+Module for stripping repeated headers and footers from page texts before chunking.
+
+Every page of a filing repeats the entity name, the ABN, running titles such
+as "Notes to the financial statements" and page footers. Chunked as-is, they
+add chunks and tokens to embed and pull unrelated chunks closer together in
+similarity search. The normaliser finds lines that repeat in the header or
+footer zone of at least a share of the pages and removes them, keeping the
+first occurrence so the text still appears once in the document.
+
+Lines are compared after lower-casing, collapsing whitespace and replacing
+digits, so "Page 3 of 20" and "Page 4 of 20" count as the same footer. Pages
+are normalised individually, so each chunk keeps its page number.
+
+Only the chunking input is normalised; ABN detection, classification and
+signature detection still read the extracted text.
+
+Classes:
+--------
+    NormalisedPage: A page's normalised text and the lines removed from it.
+    PageNormaliser: Finds and strips repeated header and footer lines.
+"""
+
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+_DIGITS_RE = re.compile(r"\d+")
+_SPACE_RE = re.compile(r"\s+")
+
+def _signature(line: str) -> str:
+    """
+    Returns the form of a line used to compare it across pages.
+    """
+    return _SPACE_RE.sub(" ", _DIGITS_RE.sub("#", line.lower())).strip()
+
+class NormalisedPage:
+    """
+    A page's normalised text and the lines removed from it.
+
+    Attributes
+    ----------
+        text (str): Text with repeated lines removed.
+        removed (list[str]): Lines removed from the page.
+    """
+
+    def __init__(self, text: str, removed: List[str]):
+        self.text = text
+        self.removed = removed
+
+class PageNormaliser:
+    """
+    Finds and strips repeated header and footer lines.
+
+    Attributes
+    ----------
+        min_share (float): Share of pages a line must appear on to be stripped.
+        edge_lines (int): Non-blank lines at the top and bottom of a page that
+                          are checked for repeats.
+        min_pages (int): Documents with fewer pages are left unchanged.
+        keep_first (bool): Keep the first occurrence of each repeated line.
+
+    Methods
+    -------
+        repeated_lines(): Returns the repeated (zone, line) signatures of a document.
+        normalise(): Returns the normalised pages of a document.
+
+    Environment variables:
+        PAGE_REPEAT_SHARE: Share of pages a header or footer line must appear
+                           on to be stripped (default: 0.5).
+        PAGE_EDGE_LINES: Lines at the top and bottom of a page checked for
+                         repeats (default: 3).
+    """
+
+    def __init__(self, min_share: float = None, edge_lines: int = None,
+                 min_pages: int = 3, keep_first: bool = True):
+        """
+        Initialises the normaliser.
+
+        Args:
+            min_share (float, optional): Defaults to PAGE_REPEAT_SHARE.
+            edge_lines (int, optional): Defaults to PAGE_EDGE_LINES.
+            min_pages (int): Documents with fewer pages are left unchanged.
+            keep_first (bool): Keep the first occurrence of each repeated line.
+        """
+        self.min_share = (min_share if min_share is not None
+                          else float(os.environ.get("PAGE_REPEAT_SHARE", 0.5)))
+        self.edge_lines = (edge_lines if edge_lines is not None
+                           else int(os.environ.get("PAGE_EDGE_LINES", 3)))
+        self.min_pages = min_pages
+        self.keep_first = keep_first
+
+    def _edges(self, text: str) -> List[Tuple[str, int, int, str]]:
+        """
+        Returns (zone, start, end, signature) of the header and footer lines
+        of a page; start and end are character offsets of the line.
+        """
+        lines, offset = [], 0
+        for line in text.splitlines(keepends=True):
+            if line.strip():
+                lines.append((offset, offset + len(line)))
+            offset += len(line)
+        top = lines[:self.edge_lines]
+        bottom = lines[max(len(lines) - self.edge_lines, self.edge_lines):]
+        return ([("top", start, end, _signature(text[start:end])) for start, end in top] +
+                [("bottom", start, end, _signature(text[start:end])) for start, end in bottom])
+
+    def repeated_lines(self, pages: Dict[int, str]) -> set:
+        """
+        Returns the repeated (zone, line) signatures of a document.
+
+        Args:
+            pages (dict[int, str]): Page number to extracted text.
+
+        Returns:
+            set[tuple[str, str]]: (zone, signature) pairs found on at least
+                `min_share` of the pages; empty for short documents.
+        """
+        return self._repeated({page: self._edges(text) for page, text in pages.items()})
+
+    def _repeated(self, edges: Dict[int, list]) -> set:
+        """
+        Returns the repeated (zone, signature) pairs, given each page's edges.
+        """
+        if len(edges) < self.min_pages:
+            return set()
+        counts = Counter()
+        for page_edges in edges.values():
+            counts.update({(zone, sig) for zone, _, _, sig in page_edges if sig})
+        needed = max(2, self.min_share * len(edges))
+        return {key for key, count in counts.items() if count >= needed}
+
+    def normalise(self, pages: Dict[int, str]) -> Dict[int, NormalisedPage]:
+        """
+        Returns the normalised pages of a document.
+
+        Args:
+            pages (dict[int, str]): Page number to extracted text.
+
+        Returns:
+            dict[int, NormalisedPage]: Page number to normalised page.
+        """
+        edges = {page: self._edges(text) for page, text in pages.items()}
+        repeated = self._repeated(edges)
+        seen = set()
+        result = {}
+        for page in sorted(pages):
+            text = pages[page]
+            cuts = []
+            for zone, start, end, sig in edges[page]:
+                if (zone, sig) not in repeated:
+                    continue
+                if self.keep_first and sig not in seen:
+                    seen.add(sig)
+                    continue
+                cuts.append((start, end))
+
+            parts, removed, position = [], [], 0
+            for start, end in sorted(set(cuts)):
+                parts.append(text[position:start])
+                removed.append(text[start:end].strip())
+                position = max(position, end)
+            parts.append(text[position:])
+            result[page] = NormalisedPage("".join(parts), removed)
+        return result
@@ -15,13 +15,16 @@ Classes:
 
 import re
 import os
-from azure.search.documents import SearchClient
+import logging
+import sqlite3
+from typing import Optional
 from azure.search.documents.models import VectorizedQuery
-from azure.core.credentials import AzureKeyCredential
 from azure.core.exceptions import AzureError
-from openai import AzureOpenAI, OpenAIError
+from openai import OpenAIError
 from services.logger import Logger
+from services.client_registry import get_client
 from services.rag_llm.prompts import DEFAULT_SYSTEM_PROMPT
+from services.rag_llm.embedding_cache import cache_key, get_embedding_cache
 
 class RetrievalService:
     """
@@ -31,10 +34,13 @@ class RetrievalService:
     Attributes
     ----------
         logger (Logger): Logger instance for logging messages.
-        search_client (SearchClient): Azure Search client instance for querying documents.
-        oaiclient (AzureOpenAI): Azure OpenAI client instance for generating embeddings and chat completions.
+        search_client (SearchClient): Shared Azure Search client instance for querying documents.
+        oaiclient (AzureOpenAI): Shared Azure OpenAI client instance for generating embeddings and chat completions.
         system_prompt (str): The default system prompt for the OpenAI chat deployment.
         deoployment_name (str): The name of the OpenAI deployment for chat completions.
+        dimensions (int | None): Query embedding length; must match the indexed vectors.
+        cache (EmbeddingCache | None): Shared embedding cache; check queries are
+                                       the same for every document.
 
     Methods
     -------
@@ -54,23 +60,18 @@ class RetrievalService:
         # Initialise the JSON logger for this service
         self.logger = Logger.get_logger("RetrievalService", json_format=True)
 
-        # Set up the Azure Search client
-        self.search_client = SearchClient(
-            endpoint=os.environ["SEARCH_ENDPOINT"],
-            index_name=os.environ["SEARCH_INDEX"],
-            credential=AzureKeyCredential(os.environ["SEARCH_ADMIN_KEY"]),
-            api_version="2024-07-01"
-            )
+        # Reuse the worker-wide Azure Search and OpenAI clients
+        self.search_client = get_client("search")
+        self.oaiclient = get_client("openai")
 
-        # Set up the OpenAI client
-        self.oaiclient = AzureOpenAI(
-            api_key=os.environ["AZURE_OPENAI_API_KEY"],
-            api_version=os.environ["AZURE_OPENAI_API_VERSION"],
-            azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"]
-        )
+        # The OpenAI client is shared with EmbeddingService, so the chat
+        # deployment is bound to this service rather than to the client.
+        self.deployment_name = os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"]
 
-        # Bind chat deployment so the model doesn't need to be specified in each call
-        self.oaiclient.deployment_name = os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"]
+        # Queries must be embedded at the same length as the indexed chunks
+        dimensions = os.environ.get("AZURE_OPENAI_EMBEDDING_DIMENSIONS")
+        self.dimensions = int(dimensions) if dimensions else None
+        self.cache = get_embedding_cache()
 
         # Set the default system prompt
         # Can override in env var deployment if needed.
@@ -100,23 +101,45 @@ class RetrievalService:
             OpenAIError: If the embedding generation fails.
             AzureError: If the vector search fails.
         """
+        return self._retrieve(document_name, query, k) or []
+
+    def _retrieve(self, document_name: str, query: str, k: int) -> Optional[list]:
+        """
+        Retrieves the top k chunks like `retrieve_chunks()`, but returns None
+        when the embedding call or the search failed, so callers can tell a
+        failure from a document without matching chunks.
+        """
 
         # 1) Embed the user query
         # `query` here is a semantic vector search, not a keyword search.
         # `query` is defined in the checks.py file in the CHECKS list.
+        model = os.environ["AZURE_OPENAI_EMBEDDING_MODEL"]
+        key = cache_key(query, model, self.dimensions)
         try:
-            resp = self.oaiclient.embeddings.create(
-                model=os.environ["AZURE_OPENAI_EMBEDDING_MODEL"],
-                input=[query]
-            )
-            qemb = resp.data[0].embedding
+            qemb = self.cache.get_many([key]).get(key) if self.cache is not None else None
+        except sqlite3.Error as e:
+            self.logger.warning("Embedding cache lookup failed: %s", str(e))
+            qemb = None
+        try:
+            if qemb is None:
+                resp = self.oaiclient.embeddings.create(
+                    model=model,
+                    input=[query],
+                    **({"dimensions": self.dimensions} if self.dimensions else {})
+                )
+                qemb = resp.data[0].embedding
+                if self.cache is not None:
+                    try:
+                        self.cache.put_many({key: qemb})
+                    except sqlite3.Error as e:
+                        self.logger.warning("Embedding cache write failed: %s", str(e))
 
         except OpenAIError as err:
             self.logger.error(
                 "Embedding call failed: %s", str(err),
                 extra={"document": document_name, "query": query}
             )
-            return []
+            return None
 
         # 2) build the vector query
         vquery = VectorizedQuery(
@@ -174,7 +197,7 @@ class RetrievalService:
                 "Vector search failed: %s", str(err),
                 extra={"document": document_name, "query": query}
             )
-            return []
+            return None
 
         # 5) (Optional) Debug each hit
         """
@@ -206,9 +229,16 @@ class RetrievalService:
         """
         Retrieve top-k chunks for `document_name` matching `query`, then
         ask the AzureOpenAI chat deployment to answer YES/NO + cite pages.
+
+        Returns:
+            dict: `answer`, `citations` (page numbers) and `error` (True if
+                  the retrieval or the chat call failed, so the answer is
+                  not the model's).
         """
         # 1) retrieve relevant chunks
-        chunks = self.retrieve_chunks(document_name, query, k)
+        chunks = self._retrieve(document_name, query, k)
+        error = chunks is None
+        chunks = chunks or []
         # print(f"DEBUG - Retrieved {len(chunks)} chunks for query '{query}'")
 
         # 2) build the prompt with inline citations
@@ -217,24 +247,31 @@ class RetrievalService:
             #print(c["text"])
             user_prompt += f"[Page {c['page']} | Chunk {c['id']}]\n{c['text']}\n\n"
         user_prompt += "Answer YES or NO. If YES, list the page number(s). Answer:"
-        print(f"DEBUG - {user_prompt}")
 
         # 3) Choose which system message to use
         sys_msg = system_prompt or self.system_prompt
-        print(f"DEBUG - Using system prompt: {sys_msg}")
 
+        # Full prompts are large; only log them when DEBUG is enabled
+        # (LOG_LEVEL / LOG_LEVELS, see services/logger.py)
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            self.logger.debug(
+                "Chat prompt",
+                extra={"check": check_name, "system_prompt": sys_msg, "user_prompt": user_prompt}
+            )
 
         # 4) call the chat completion endpoint
         try:
             chat_resp = self.oaiclient.chat.completions.create(
-                model=self.oaiclient.deployment_name,
+                model=self.deployment_name,
                 messages=[
                     {"role": "system", "content": sys_msg},
                     {"role": "user",   "content": user_prompt}
                 ]
             )
             answer = chat_resp.choices[0].message.content.strip()
-            print(f" DEBUG - Chat response: {answer}")
+            if debug:
+                self.logger.debug("Chat response", extra={"check": check_name, "answer": answer})
 
         except OpenAIError as err:
             self.logger.error(
@@ -242,6 +279,7 @@ class RetrievalService:
                 extra={"check": check_name}
             )
             answer = "NO — (error)"
+            error = True
 
         # 4) parse out any cited page numbers
         pages = [
@@ -249,5 +287,5 @@ class RetrievalService:
             for p in re.findall(r"page\s*(\d+)", answer, flags=re.IGNORECASE)
         ]
 
-        return {"answer": answer, "citations": sorted(set(pages))}
+        return {"answer": answer, "citations": sorted(set(pages)), "error": error}
 
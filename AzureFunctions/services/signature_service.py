@@ -0,0 +1,436 @@
+"""
+services/signature_service.py
+Module for detecting the auditor's signature on annual financial reports.
+
+Rendering every page of every PDF would dominate the cost of a document, so
+detection runs in three steps:
+
+    1. Candidate pages are picked from the extracted page text: the
+       Independent Auditor's Report, and pages where "signed", "partner" or
+       a firm designation appears near a date. This is cheap and usually
+       leaves one to three pages.
+    2. Only the candidate pages are rendered (pypdfium2, grayscale, at
+       `SIGNATURE_RENDER_DPI`) in a worker process pool, one job per
+       document. A pool broken by a crashed worker (e.g. pdfium failing
+       on a malformed file), or whose job exceeds `SIGNATURE_RENDER_TIMEOUT`
+       (a hung render), is replaced and the job retried once. Renders are cached
+       by document content hash, page and DPI, so retries and re-processing
+       do not render again.
+    3. Each render is scored by a pluggable detector, a callable
+       `(image, page_number, page_text) -> float` returning a 0-1 score.
+       The default `InkDensityDetector` is a layout heuristic that looks for
+       tall, sparse ink strokes (handwriting) below the text; it cannot tell
+       a signature from a logo, so the stage is opt-in (SIGNATURE_DETECTION
+       in services/pipeline.py). To use a trained model instead (for example
+       one built in Models/CustomVision), set `SIGNATURE_DETECTOR` to
+       "package.module:callable".
+
+pypdfium2 is imported lazily, in the render workers only. If it is not
+installed, or rendering or the detector fails, detection is skipped and the
+fields are left unset.
+
+Classes:
+--------
+    RenderCache: Size-bounded LRU cache of rendered pages.
+    InkDensityDetector: Default heuristic signature detector.
+    SignatureService: Picks, renders and scores candidate pages.
+
+Functions:
+--------
+    find_candidate_pages(): Ranks pages likely to carry the auditor's signature.
+    load_detector(): Returns the detector configured by SIGNATURE_DETECTOR.
+    get_signature_service(): Returns the worker's shared SignatureService.
+"""
+
+import os
+import re
+import importlib
+import threading
+import multiprocessing
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from services.logger import Logger
+
+# Page text patterns and their weights for candidate selection
+_REPORT_TITLE_RE = re.compile(r"independent\s+auditor'?s?['’]?s?\s+report", re.IGNORECASE)
+_AUDIT_CONTEXT_RE = re.compile(
+    r"auditor'?s?['’]?s?\s+(?:report|opinion|independence\s+declaration)|"
+    r"registered\s+company\s+auditor|chartered\s+accountants?", re.IGNORECASE
+)
+_SIGN_OFF_RE = re.compile(r"\b(?:signed|signature|partner|director)\b", re.IGNORECASE)
+_DATE_RE = re.compile(
+    r"\b\d{1,2}(?:st|nd|rd|th)?\s+(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+\d{4}\b"
+    r"|\b\d{1,2}/\d{1,2}/\d{2,4}\b",
+    re.IGNORECASE
+)
+# Characters between a sign-off word and a date for them to count as "near"
+_NEAR_CHARS = 200
+
+Detector = Callable[[np.ndarray, int, str], float]
+
+def find_candidate_pages(pages: Dict[int, str], max_pages: int = 3) -> List[Tuple[int, float]]:
+    """
+    Ranks pages likely to carry the auditor's signature.
+
+    The auditor's report usually runs over two or three pages with the
+    signature at the end, so the page after a report title page is also
+    considered when it continues the report.
+
+    Args:
+        pages (dict[int, str]): Page number to extracted text.
+        max_pages (int): Most candidates returned.
+
+    Returns:
+        list[tuple[int, float]]: (page number, score), best first. Pages with
+            no evidence are not returned.
+    """
+    scores: Dict[int, float] = {}
+    report_pages = []
+    for page, text in pages.items():
+        score = 0.0
+        if _REPORT_TITLE_RE.search(text):
+            score += 3
+            report_pages.append(page)
+        if _AUDIT_CONTEXT_RE.search(text):
+            score += 1
+        dates = [m.start() for m in _DATE_RE.finditer(text)]
+        if dates:
+            for sign_off in _SIGN_OFF_RE.finditer(text):
+                if any(abs(sign_off.start() - d) <= _NEAR_CHARS for d in dates):
+                    score += 2
+                    break
+        if score:
+            scores[page] = score
+
+    # The signature is at the end of the report: favour the last page of a run
+    for page in report_pages:
+        following = page + 1
+        if following in pages and following in scores:
+            scores[following] += 1
+
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return [(page, score) for page, score in ranked if score >= 2][:max_pages]
+
+def _render_pages(pdf_bytes: bytes, page_numbers: List[int], dpi: int) -> Dict[int, np.ndarray]:
+    """
+    Renders pages of one document as grayscale images (runs in a render
+    worker). The document is sent to the worker and opened once for all pages.
+    """
+    import pypdfium2 as pdfium # pylint: disable=import-outside-toplevel
+    document = pdfium.PdfDocument(pdf_bytes)
+    try:
+        images = {}
+        for page_number in page_numbers:
+            bitmap = document[page_number - 1].render(scale=dpi / 72, grayscale=True)
+            images[page_number] = np.ascontiguousarray(bitmap.to_numpy())
+        return images
+    finally:
+        document.close()
+
+class RenderCache:
+    """
+    Size-bounded LRU cache of rendered pages, keyed by
+    (document content hash, page number, DPI).
+
+    Attributes
+    ----------
+        max_bytes (int): Total image bytes kept.
+        hits (int): Lookups served from the cache.
+        misses (int): Lookups not in the cache.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Initialises the cache.
+
+        Args:
+            max_bytes (int): Total image bytes kept.
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[np.ndarray]:
+        """
+        Returns a cached render, or None.
+        """
+        with self._lock:
+            image = self._items.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key: tuple, image: np.ndarray):
+        """
+        Caches a render, evicting the least recently used ones beyond `max_bytes`.
+        """
+        if image.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._size -= self._items.pop(key).nbytes
+            self._items[key] = image
+            self._size += image.nbytes
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= evicted.nbytes
+
+class InkDensityDetector:
+    """
+    Default heuristic signature detector.
+
+    Printed text forms horizontal bands of ink of a regular height. A
+    handwritten signature forms a band that is much taller than the typical
+    text line, sparsely inked and narrower than the page. The score grows
+    with how much taller than a text line the tallest such band is.
+
+    This is a baseline until a trained detector is configured; it cannot tell
+    a signature from, for example, a logo with thin strokes.
+
+    Attributes
+    ----------
+        ink_level (int): Gray level below which a pixel counts as ink.
+        min_height_ratio (float): Band height, relative to the median text
+                                  line, from which a band can be a signature.
+    """
+
+    def __init__(self, ink_level: int = 160, min_height_ratio: float = 1.8):
+        """
+        Initialises the detector.
+
+        Args:
+            ink_level (int): Gray level below which a pixel counts as ink.
+            min_height_ratio (float): Band height, relative to the median text
+                                      line, from which a band can be a signature.
+        """
+        self.ink_level = ink_level
+        self.min_height_ratio = min_height_ratio
+
+    def __call__(self, image: np.ndarray, page_number: int = None, text: str = "") -> float:
+        ink = image < self.ink_level
+        height, width = ink.shape
+        rows = ink.mean(axis=1) > 0.001
+
+        # Runs of inked rows are the bands
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], rows.astype(np.int8), [0]))))
+        bands = list(zip(edges[::2], edges[1::2]))
+        if len(bands) < 2:
+            return 0.0
+        line_height = float(np.median([end - start for start, end in bands]))
+
+        best = 0.0
+        for start, end in bands:
+            band_height = end - start
+            # Signatures sit below the report text, in the lower part of the page
+            if band_height < self.min_height_ratio * line_height or start < height * 0.3:
+                continue
+            band = ink[start:end]
+            columns = np.flatnonzero(band.any(axis=0))
+            band_width = columns[-1] - columns[0] + 1
+            density = band[:, columns[0]:columns[-1] + 1].mean()
+            if band_width < 0.6 * width and 0.01 <= density <= 0.25:
+                best = max(best, min(1.0, band_height / (3 * line_height)))
+        return round(best, 4)
+
+def load_detector(spec: str = None) -> Detector:
+    """
+    Returns the detector configured by SIGNATURE_DETECTOR.
+
+    Args:
+        spec (str, optional): "ink" (default) or "package.module:callable". A
+            class is instantiated with no arguments.
+
+    Returns:
+        Callable: `(image, page_number, page_text) -> score`.
+
+    Raises:
+        ImportError: If the module cannot be imported.
+        AttributeError: If the callable does not exist.
+    """
+    spec = spec or os.environ.get("SIGNATURE_DETECTOR", "ink")
+    if spec == "ink":
+        return InkDensityDetector()
+    module_name, _, attribute = spec.partition(":")
+    detector = getattr(importlib.import_module(module_name), attribute)
+    return detector() if isinstance(detector, type) else detector
+
+class SignatureService:
+    """
+    Picks, renders and scores the candidate pages of a document.
+
+    Attributes
+    ----------
+        dpi (int): Render resolution.
+        max_pages (int): Most pages rendered per document.
+        threshold (float): Detector score from which a page is signed.
+        detector (Callable): The signature detector.
+        cache (RenderCache): Cache of rendered pages.
+        render_timeout (float): Seconds a document's render job may take.
+
+    Methods
+    -------
+        detect(): Returns the signature fields for one document.
+
+    Environment variables:
+        SIGNATURE_RENDER_DPI: Render resolution (default: 150).
+        SIGNATURE_MAX_PAGES: Most candidate pages rendered (default: 3).
+        SIGNATURE_THRESHOLD: Detector score from which a page is signed (default: 0.5).
+        SIGNATURE_DETECTOR: "ink" or "package.module:callable" (default: "ink").
+        SIGNATURE_RENDER_WORKERS: Render processes (default: 2).
+        SIGNATURE_RENDER_TIMEOUT: Seconds a document's render job may take (default: 60).
+        SIGNATURE_CACHE_MB: Render cache size (default: 64).
+    """
+
+    _pool: Optional[ProcessPoolExecutor] = None
+    _pool_lock = threading.Lock()
+
+    def __init__(self, detector: Detector = None):
+        """
+        Initialises the service.
+
+        Args:
+            detector (Callable, optional): Detector to use instead of SIGNATURE_DETECTOR.
+        """
+        self.logger = Logger.get_logger("SignatureService", json_format=True)
+        self.dpi = int(os.environ.get("SIGNATURE_RENDER_DPI", 150))
+        self.max_pages = int(os.environ.get("SIGNATURE_MAX_PAGES", 3))
+        self.threshold = float(os.environ.get("SIGNATURE_THRESHOLD", 0.5))
+        self.workers = int(os.environ.get("SIGNATURE_RENDER_WORKERS", 2))
+        self.render_timeout = float(os.environ.get("SIGNATURE_RENDER_TIMEOUT", 60))
+        self.detector = detector or load_detector()
+        self.cache = RenderCache(int(float(os.environ.get("SIGNATURE_CACHE_MB", 64)) * 2**20))
+
+    def _executor(self) -> ProcessPoolExecutor:
+        """
+        Returns the shared render pool, started on first use. Workers are
+        spawned rather than forked: the Functions worker runs threads, and
+        pdfium is not thread-safe.
+        """
+        with SignatureService._pool_lock:
+            if SignatureService._pool is None:
+                SignatureService._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return SignatureService._pool
+
+    @staticmethod
+    def _discard_executor(pool: ProcessPoolExecutor, terminate: bool = False):
+        """
+        Forgets a broken render pool so the next call starts a new one,
+        unless another thread has replaced it already. With `terminate`, its
+        worker processes are stopped too; a hung render ignores `shutdown()`.
+        """
+        with SignatureService._pool_lock:
+            if SignatureService._pool is pool:
+                SignatureService._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        if terminate:
+            # ProcessPoolExecutor has no public way to stop a busy worker
+            for process in list((getattr(pool, "_processes", None) or {}).values()):
+                process.terminate()
+
+    def _render(self, doc_hash: str, pdf_bytes: bytes, page_numbers: List[int]) -> Dict[int, np.ndarray]:
+        """
+        Returns the renders of the given pages, from the cache where possible.
+        The pages that are not cached are rendered by one job, so the PDF is
+        sent to a worker once.
+        """
+        images: Dict[int, np.ndarray] = {}
+        missing = []
+        for page in page_numbers:
+            cached = self.cache.get((doc_hash, page, self.dpi))
+            if cached is not None:
+                images[page] = cached
+            else:
+                missing.append(page)
+        if not missing:
+            return images
+
+        for attempt in range(2):
+            pool = self._executor()
+            try:
+                future = pool.submit(_render_pages, pdf_bytes, missing, self.dpi)
+                rendered = future.result(timeout=self.render_timeout)
+                break
+            except BrokenProcessPool:
+                # A worker died; the pool accepts no more jobs until it is replaced
+                self._discard_executor(pool)
+                if attempt:
+                    raise
+                self.logger.warning("Render pool broken; starting a new one and retrying")
+            except FuturesTimeoutError:
+                # A hung render keeps its worker busy; replace the pool like a broken one
+                self._discard_executor(pool, terminate=True)
+                if attempt:
+                    raise
+                self.logger.warning("Render timed out after %.0f s; starting a new pool and retrying",
+                                    self.render_timeout)
+        for page, image in rendered.items():
+            images[page] = image
+            self.cache.put((doc_hash, page, self.dpi), image)
+        return images
+
+    def detect(self, doc_hash: str, pdf_bytes: bytes, pages: Dict[int, str], handle=None) -> dict:
+        """
+        Returns the signature fields for one document.
+
+        Args:
+            doc_hash (str): Content hash of the document (the render cache key).
+            pdf_bytes (bytes): The PDF content.
+            pages (dict[int, str]): Page number to extracted text.
+            handle (StageHandle, optional): Stage to add timing attributes to.
+
+        Returns:
+            dict: `hasAuditorSignature` (None when detection could not run)
+                  and `auditorSignaturePages`.
+        """
+        candidates = find_candidate_pages(pages, self.max_pages)
+        if handle is not None:
+            handle.add_attribute("candidates", len(candidates))
+        if not candidates:
+            return {"hasAuditorSignature": False, "auditorSignaturePages": []}
+
+        page_numbers = [page for page, _ in candidates]
+        hits_before = self.cache.hits
+        try:
+            images = self._render(doc_hash, pdf_bytes, page_numbers)
+        except Exception as e: # pylint: disable=broad-except
+            # Missing pypdfium2, a broken pool or an unrenderable page
+            self.logger.warning("Page rendering failed; signature detection skipped: %s", str(e),
+                                extra={"pages": page_numbers})
+            return {"hasAuditorSignature": None, "auditorSignaturePages": None}
+
+        signed = []
+        for page in page_numbers:
+            try:
+                score = float(self.detector(images[page], page, pages.get(page, "")))
+            except Exception as e: # pylint: disable=broad-except
+                # A configured detector may fail on unexpected input, like a render can
+                self.logger.warning("Signature detector failed; signature detection skipped: %s",
+                                    str(e), extra={"page": page})
+                return {"hasAuditorSignature": None, "auditorSignaturePages": None}
+            self.logger.debug("Signature score", extra={"page": page, "score": score})
+            if score >= self.threshold:
+                signed.append(page)
+
+        if handle is not None:
+            handle.add_attribute("rendered", len(page_numbers) - (self.cache.hits - hits_before))
+            handle.add_attribute("signed_pages", len(signed))
+        return {"hasAuditorSignature": bool(signed), "auditorSignaturePages": sorted(signed)}
+
+@lru_cache(maxsize=None)
+def get_signature_service() -> SignatureService:
+    """
+    Returns the worker's shared SignatureService (one detector and render cache).
+    """
+    return SignatureService()
@@ -9,16 +9,146 @@
     Azure Application Insights to provide tracing capabilities, enabling you
     to track the performance of your application and diagnose issues.
 
+    The OpenCensus tracer and Azure exporter are built on the first call to
+    `span()` rather than at import time, so importing this module does not
+    pay for the OpenCensus/Azure exporter import chain.
+
+    Stages of an invocation are timed with `stage()`, which opens a child span
+    under the current invocation span (when tracing is active) and records the
+    duration into a per-invocation `StageRecorder`. The recorder works without
+    Application Insights, so stage timings are available locally and in debug
+    mode. When memory profiling is enabled (PROFILE_MEMORY, see
+    services/profiling.py) each stage also records its memory peak.
+
     Classes:
     --------
         AppTracer: A class to handle tracing operations.
+        StageRecorder: Collects stage timings and attributes for one invocation.
+        StageHandle: Handle yielded by `stage()` to attach attributes to a stage.
+
+    Functions:
+    --------
+        stage(): Context manager that times a pipeline stage as a child span.
+        current_recorder(): Returns the StageRecorder of the current invocation.
+        recording(): Makes a StageRecorder current without opening a span.
 """
 
-from opencensus.trace import config_integration
-from opencensus.trace.samplers import ProbabilitySampler
-from opencensus.ext.azure.trace_exporter import AzureExporter
-from opencensus.trace.tracer import Tracer as OCTTracer
-    # Alias to avoid conflict with built-in tracer
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from services.profiling import current_memory_profiler
+
+# Per-invocation state. ContextVars keep concurrent invocations in the same
+# worker (threads or asyncio tasks) from seeing each other's recorder.
+_current_tracer: ContextVar[Optional["AppTracer"]] = ContextVar("app_tracer", default=None)
+_current_recorder: ContextVar[Optional["StageRecorder"]] = ContextVar(
+    "stage_recorder", default=None
+)
+
+class StageRecorder:
+    """
+    Collects stage timings and attributes for one invocation.
+
+    Attributes
+    ----------
+        document_name (str): The document being processed (optional).
+        stages (list[dict]): One entry per completed stage, in completion order,
+                             with `name`, `startMs`, `durationMs` and `attributes`.
+
+    Methods
+    -------
+        record(): Records a completed stage.
+        total_ms(): Returns milliseconds elapsed since the recorder was created.
+        summary(): Returns a JSON-serialisable per-document stage breakdown.
+    """
+
+    def __init__(self, document_name: str = None):
+        """
+        Initialises an empty recorder and starts its clock.
+        """
+        self.document_name = document_name
+        self.stages: List[Dict[str, Any]] = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, name: str, start: float, duration_ms: float, attributes: dict):
+        """
+        Records a completed stage.
+
+        Args:
+            name (str): Stage name.
+            start (float): `time.perf_counter()` value when the stage started.
+            duration_ms (float): Stage duration in milliseconds.
+            attributes (dict): Attributes attached to the stage.
+        """
+        with self._lock:
+            self.stages.append({
+                "name": name,
+                "startMs": round((start - self._start) * 1000, 3),
+                "durationMs": round(duration_ms, 3),
+                "attributes": dict(attributes),
+            })
+
+    def total_ms(self) -> float:
+        """
+        Returns milliseconds elapsed since the recorder was created.
+        """
+        return (time.perf_counter() - self._start) * 1000
+
+    def summary(self) -> dict:
+        """
+        Returns a JSON-serialisable per-document stage breakdown.
+
+        Returns:
+            dict: `documentName`, `totalMs`, the ordered `stages` list and a
+                  `byStage` roll-up of count, total and max milliseconds.
+        """
+        with self._lock:
+            stages = list(self.stages)
+        by_stage: Dict[str, Dict[str, float]] = {}
+        for entry in stages:
+            agg = by_stage.setdefault(entry["name"], {"count": 0, "totalMs": 0.0, "maxMs": 0.0})
+            agg["count"] += 1
+            agg["totalMs"] = round(agg["totalMs"] + entry["durationMs"], 3)
+            agg["maxMs"] = max(agg["maxMs"], entry["durationMs"])
+        return {
+            "documentName": self.document_name,
+            "totalMs": round(self.total_ms(), 3),
+            "stages": stages,
+            "byStage": by_stage,
+        }
+
+class StageHandle:
+    """
+    Handle yielded by `stage()` to attach attributes to a stage.
+    Attributes are set on the span immediately, so they survive early returns.
+
+    Attributes
+    ----------
+        name (str): Stage name.
+        span (Span | None): The OpenCensus span, or None when tracing is inactive.
+        attributes (dict): Attributes recorded for the stage.
+    """
+
+    def __init__(self, name: str, span=None):
+        self.name = name
+        self.span = span
+        self.attributes: Dict[str, Any] = {}
+
+    def add_attribute(self, key: str, value: Any):
+        """
+        Adds an attribute to the stage and its span.
+
+        Args:
+            key (str): Attribute name.
+            value (Any): Attribute value (str, int, float or bool).
+        """
+        self.attributes[key] = value
+        if self.span is not None:
+            self.span.add_attribute(key, value)
 
 class AppTracer:
     """
@@ -36,20 +166,44 @@ class AppTracer:
     -------
         __init__(): Initialises the AppTracer with the given instrumentation key and sampler rate.
         span(): Creates a tracing span with the given name.
+        invocation(): Opens the root span of an invocation and its StageRecorder.
     """
 
     def __init__(self, instrumentation_key, sampler_rate=1.0):
         """
         Initialises the AppTracer with the given instrumentation key and sampler rate.
+        The underlying OpenCensus tracer is created lazily on first use.
+        """
+        self.instrumentation_key = instrumentation_key
+        self.sampler_rate = sampler_rate
+        self._tracer = None
+        self._lock = threading.Lock()
+
+    @property
+    def tracer(self):
         """
-        config_integration.trace_integrations(['logging'])
+        Returns the OpenCensus tracer, importing OpenCensus and creating the
+        Azure exporter on first access.
+        """
+        if self._tracer is None:
+            with self._lock:
+                if self._tracer is None:
+                    # pylint: disable=import-outside-toplevel
+                    from opencensus.trace import config_integration
+                    from opencensus.trace.samplers import ProbabilitySampler
+                    from opencensus.ext.azure.trace_exporter import AzureExporter
+                    from opencensus.trace.tracer import Tracer as OCTTracer
+                        # Alias to avoid conflict with built-in tracer
+
+                    config_integration.trace_integrations(['logging'])
 
-        self.tracer = OCTTracer(
-            sampler=ProbabilitySampler(sampler_rate),
-            exporter=AzureExporter(
-                connection_string=f'InstrumentationKey={instrumentation_key}'
-            )
-        )
+                    self._tracer = OCTTracer(
+                        sampler=ProbabilitySampler(self.sampler_rate),
+                        exporter=AzureExporter(
+                            connection_string=f'InstrumentationKey={self.instrumentation_key}'
+                        )
+                    )
+        return self._tracer
 
     def span(self, name):
         """
@@ -65,3 +219,103 @@ class AppTracer:
             None
         """
         return self.tracer.span(name=name)
+
+    @contextmanager
+    def invocation(self, name: str, recorder: StageRecorder = None):
+        """
+        Opens the root span of an invocation and makes it, together with a
+        StageRecorder, current for `stage()` calls made within the block.
+
+        Args:
+            name (str): The name of the root span.
+            recorder (StageRecorder, optional): Recorder to use; a new one is
+                created if not provided.
+
+        Yields:
+            tuple: The root span and the StageRecorder.
+        """
+        recorder = recorder or StageRecorder()
+        tracer_token = _current_tracer.set(self)
+        recorder_token = _current_recorder.set(recorder)
+        try:
+            with self.span(name=name) as span:
+                yield span, recorder
+        finally:
+            _current_recorder.reset(recorder_token)
+            _current_tracer.reset(tracer_token)
+
+@contextmanager
+def recording(recorder: StageRecorder = None):
+    """
+    Makes a StageRecorder current without opening a span. Used by offline
+    tools (backfill, benchmarks) that want stage timings without tracing.
+
+    Args:
+        recorder (StageRecorder, optional): Recorder to use; a new one is
+            created if not provided.
+
+    Yields:
+        StageRecorder: The current recorder.
+    """
+    recorder = recorder or StageRecorder()
+    token = _current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current_recorder.reset(token)
+
+def current_recorder() -> Optional[StageRecorder]:
+    """
+    Returns the StageRecorder of the current invocation, or None outside one.
+    """
+    return _current_recorder.get()
+
+@contextmanager
+def stage(name: str, **attributes):
+    """
+    Times a pipeline stage. Inside `AppTracer.invocation()` the stage is also
+    a child span of the invocation span; outside one it is only recorded (or
+    is a no-op if there is no recorder either).
+
+    Args:
+        name (str): Stage name, e.g. "Extraction" or "EmbeddingBatch".
+        **attributes: Attributes known when the stage starts (bytes, pages...).
+
+    Yields:
+        StageHandle: Handle to add attributes discovered during the stage.
+
+    Example
+    -------
+        >>> with stage("Chunking", pages=len(page_texts)) as st:
+                chunks = chunker.chunk(page_texts)
+                st.add_attribute("chunks", len(chunks))
+    """
+    tracer = _current_tracer.get()
+    recorder = _current_recorder.get()
+    span_cm = tracer.span(name=name) if tracer is not None else None
+    span = span_cm.__enter__() if span_cm is not None else None
+
+    handle = StageHandle(name, span)
+    for key, value in attributes.items():
+        handle.add_attribute(key, value)
+
+    # Only set when PROFILE_MEMORY is enabled (see services/profiling.py)
+    profiler = current_memory_profiler()
+    mem_frame = profiler.enter(name) if profiler is not None else None
+
+    start = time.perf_counter()
+    try:
+        yield handle
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        exc_info = sys.exc_info()
+        if exc_info[0] is not None:
+            handle.attributes["error"] = exc_info[0].__name__
+        if mem_frame is not None:
+            profiler.exit(mem_frame, handle)
+        if span is not None:
+            span.add_attribute("duration_ms", round(duration_ms, 3))
+        if recorder is not None:
+            recorder.record(name, start, duration_ms, handle.attributes)
+        if span_cm is not None:
+            span_cm.__exit__(*exc_info)
@@ -0,0 +1,4 @@
+"""
+tools/__init__.py
+Developer and operations tooling for the function app (not deployed).
+"""
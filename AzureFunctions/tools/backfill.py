@@ -0,0 +1,471 @@
+"""
+tools/backfill.py
+Bulk backfill runner that pushes a folder or blob container of PDFs through
+the same pipeline as the blob-triggered `ProcessPDF` function.
+
+Documents are processed concurrently in a thread or process pool. Progress
+and throughput (docs/s) are printed as the run goes, and per-stage p50/p95
+latencies are reported at the end. Completed documents are appended to a
+checkpoint file, so an interrupted run can be restarted and will skip them.
+With the buffered `bulk` sink a document is only checkpointed once the flush
+carrying its results has been written.
+
+Results go through the existing `DbService` (Cosmos DB, one upsert per
+document), the `BulkDbWriter` (Cosmos DB, buffered transactional batches) or
+to a local JSONL file validated against `DocumentResult`.
+
+Usage:
+------
+    cd AzureFunctions
+    # Local folder, 8 threads, results to a JSONL file
+    python -m tools.backfill --dir ./register --workers 8 --sink jsonl --output results.jsonl
+
+    # Blob container (uses AzureWebJobsStorage), 4 processes, results to Cosmos DB
+    python -m tools.backfill --container pdf-uploads --prefix 2023/ \\
+        --executor process --workers 4 --sink cosmos
+
+    # Reprocess the register with batched Cosmos DB writes
+    python -m tools.backfill --container pdf-uploads --workers 8 --sink bulk
+
+Classes:
+--------
+    JsonlResultSink: Writes validated results to a local JSONL file.
+    Checkpoint: Append-only record of documents already processed.
+    PendingWrites: Documents whose results are buffered in the bulk sink.
+
+Functions:
+--------
+    list_local(): Lists PDFs under a local directory.
+    list_blobs(): Lists blobs in a storage container.
+    process_item(): Runs one document through the pipeline (pool worker).
+    main(): Command-line entry point.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import Dict, Iterator, List
+
+# Allow `python tools/backfill.py` as well as `python -m tools.backfill`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from services.tracer import StageRecorder, recording
+from tools.stats import stage_durations, summarise
+
+class JsonlResultSink:
+    """
+    Writes validated results to a local JSONL file. Items are built and
+    validated exactly like the Cosmos DB items written by `DbService`.
+
+    Methods
+    -------
+        store_results(): Validates and appends one result.
+        close(): Closes the output file.
+    """
+
+    def __init__(self, path: str):
+        """
+        Opens `path` for appending.
+        """
+        from services.db_service import DbService # pylint: disable=import-outside-toplevel
+        self._build_item = DbService.build_item
+        self._lock = threading.Lock()
+        self._fh = open(path, "a", encoding="utf-8") # pylint: disable=consider-using-with
+
+    def store_results(self, document_name: str, data: dict, content_hash: str = None) -> dict:
+        """
+        Validates and appends one result.
+
+        Args:
+            document_name (str): The name of the processed document.
+            data (dict): The result data.
+            content_hash (str, optional): SHA-256 of the document content.
+
+        Returns:
+            dict: The validated item.
+        """
+        item = self._build_item(document_name, data, content_hash)
+        with self._lock:
+            self._fh.write(json.dumps(item) + "\n")
+            self._fh.flush()
+        return item
+
+    def close(self):
+        """
+        Closes the output file.
+        """
+        self._fh.close()
+
+class _CollectingSink:
+    """
+    Sink used inside pool workers: keeps results so the parent process can
+    write them through the real sink.
+    """
+
+    def __init__(self):
+        self.items: List[tuple] = []
+
+    def store_results(self, document_name: str, data: dict, content_hash: str = None) -> dict:
+        """
+        Keeps one result.
+        """
+        self.items.append((document_name, data, content_hash))
+        return data
+
+class Checkpoint:
+    """
+    Append-only record of documents already processed.
+
+    Each line is a JSON object with `documentName`, `status`, `totalMs` and
+    `error`. Documents whose latest status is "ok" are skipped on restart;
+    failed documents are retried.
+
+    Methods
+    -------
+        is_done(): Returns True if the document completed successfully before.
+        mark(): Records the outcome of one document.
+        close(): Closes the checkpoint file.
+    """
+
+    def __init__(self, path: str):
+        """
+        Loads an existing checkpoint (if any) and opens it for appending.
+        """
+        self.path = path
+        self._status: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # tolerate a torn last line after a crash
+                    self._status[entry["documentName"]] = entry["status"]
+        self._fh = open(path, "a", encoding="utf-8") # pylint: disable=consider-using-with
+
+    def is_done(self, document_name: str) -> bool:
+        """
+        Returns True if the document completed successfully before.
+        """
+        return self._status.get(document_name) == "ok"
+
+    def mark(self, result: dict):
+        """
+        Records the outcome of one document.
+        """
+        self._status[result["documentName"]] = result["status"]
+        self._fh.write(json.dumps({
+            "documentName": result["documentName"],
+            "status": result["status"],
+            "totalMs": result["timings"]["totalMs"],
+            "error": result["error"],
+        }) + "\n")
+        self._fh.flush()
+
+    def close(self):
+        """
+        Closes the checkpoint file.
+        """
+        self._fh.close()
+
+class PendingWrites:
+    """
+    Documents whose results are buffered in a `BulkDbWriter`. A document is
+    recorded in the checkpoint only once the flushes carrying all of its
+    results have completed, so a run interrupted before a flush retries it.
+
+    Attributes
+    ----------
+        failed (int): Documents whose results the writer failed to write.
+
+    Methods
+    -------
+        expect(): Holds a document until its results have been flushed.
+        release(): Stops holding a document.
+        on_flush(): Checkpoints the documents a flush completed (writer callback).
+    """
+
+    def __init__(self, checkpoint: Checkpoint):
+        """
+        Initialises an empty set of held documents.
+        """
+        self.checkpoint = checkpoint
+        self.failed = 0
+        # Document name -> [result, results not yet flushed]
+        self._waiting: Dict[str, list] = {}
+
+    def expect(self, result: dict):
+        """
+        Holds a document until its results have been flushed. Call before
+        storing its results, as storing may trigger a flush.
+        """
+        self._waiting[result["documentName"]] = [result, len(result["results"])]
+
+    def release(self, document_name: str):
+        """
+        Stops holding a document, e.g. when the sink rejected one of its results.
+        """
+        self._waiting.pop(document_name, None)
+
+    def on_flush(self, report: dict):
+        """
+        Checkpoints the documents whose last buffered result the flush wrote.
+        """
+        failed = set(report["failed"])
+        for name in report["documents"]:
+            entry = self._waiting.get(name)
+            if entry is None:
+                continue
+            result = entry[0]
+            if name in failed and result["status"] == "ok":
+                result["status"], result["error"] = "error", "sink: bulk write failed"
+                self.failed += 1
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._waiting[name]
+                self.checkpoint.mark(result)
+
+def list_local(directory: str, pattern: str = "*.pdf") -> Iterator[dict]:
+    """
+    Lists PDFs under a local directory (recursively).
+
+    Args:
+        directory (str): Root directory.
+        pattern (str): Glob pattern for files (default "*.pdf").
+
+    Yields:
+        dict: Work item with `name` (path relative to the root) and `path`.
+    """
+    root = Path(directory).resolve()
+    for path in sorted(root.rglob(pattern)):
+        if path.is_file():
+            yield {"name": path.relative_to(root).as_posix(), "path": str(path)}
+
+def list_blobs(container: str, prefix: str = None) -> Iterator[dict]:
+    """
+    Lists blobs in a storage container using the `AzureWebJobsStorage` connection.
+
+    Args:
+        container (str): Container name.
+        prefix (str, optional): Only list blobs whose name starts with this prefix.
+
+    Yields:
+        dict: Work item with `name` (in the blob trigger's "container/blob" form),
+              `container` and `blob`.
+    """
+    from services.client_registry import get_client # pylint: disable=import-outside-toplevel
+    container_client = get_client("blob").get_container_client(container)
+    for blob in container_client.list_blobs(name_starts_with=prefix):
+        yield {"name": f"{container}/{blob.name}", "container": container, "blob": blob.name}
+
+def _read_item(item: dict) -> tuple[bytes, str]:
+    """
+    Returns the content and URL of a work item.
+    """
+    if "path" in item:
+        return Path(item["path"]).read_bytes(), Path(item["path"]).as_uri()
+
+    from services.client_registry import get_client # pylint: disable=import-outside-toplevel
+    blob_client = get_client("blob").get_blob_client(item["container"], item["blob"])
+    return blob_client.download_blob().readall(), blob_client.url
+
+def process_item(item: dict) -> dict:
+    """
+    Runs one document through the pipeline. Executed inside pool workers.
+
+    Args:
+        item (dict): Work item from `list_local()` or `list_blobs()`.
+
+    Returns:
+        dict: `documentName`, `status` ("ok", "failed" or "error"), `error`,
+              the collected `results` and the StageRecorder `timings` summary.
+    """
+    from services.pipeline import DocumentPipeline # pylint: disable=import-outside-toplevel
+
+    sink = _CollectingSink()
+    status, error = "ok", None
+    with recording(StageRecorder(item["name"])) as recorder:
+        try:
+            pdf_bytes, url = _read_item(item)
+            payload = DocumentPipeline(sink=sink).process(
+                document_name=item["name"],
+                blob_url=url,
+                pdf_bytes=pdf_bytes
+            )
+            if payload is None:
+                status = "failed"
+        except Exception as e: # pylint: disable=broad-except
+            status, error = "error", f"{type(e).__name__}: {e}"
+    return {
+        "documentName": item["name"],
+        "status": status,
+        "error": error,
+        "results": sink.items,
+        "timings": recorder.summary(),
+    }
+
+def _print_bulk_report(sink):
+    """
+    Prints the request charge and failures of a buffered sink's flushes.
+    """
+    reports = getattr(sink, "reports", None)
+    if not reports:
+        return
+    failed = sum(len(report["failed"]) for report in reports)
+    charge = sum(report["requestCharge"] for report in reports)
+    throttled = sum(report["throttled"] for report in reports)
+    print(f"Bulk writer: {len(reports)} flush(es), {charge:.1f} RU, "
+          f"{throttled} throttled request(s), {failed} failed write(s)")
+
+def _print_progress(done: int, total: int, failed: int, started: float):
+    """
+    Prints a single progress line with throughput and ETA.
+    """
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    rate = done / elapsed
+    eta = (total - done) / rate if rate else float("inf")
+    print(f"[{done}/{total}] {rate:.2f} docs/s  failed={failed}  "
+          f"elapsed={elapsed:.0f}s  eta={eta:.0f}s", flush=True)
+
+def _print_report(durations: Dict[str, List[float]], totals: List[float], done: int,
+                  started: float):
+    """
+    Prints the end-of-run throughput and per-stage latency report.
+    """
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"\nProcessed {done} document(s) in {elapsed:.1f}s ({done / elapsed:.2f} docs/s)")
+    print(f"{'stage':<18}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'max ms':>12}")
+    for name, values in list(durations.items()) + [("(document total)", totals)]:
+        stats = summarise(values)
+        print(f"{name:<18}{stats['count']:>8}{stats['p50']:>12.1f}"
+              f"{stats['p95']:>12.1f}{stats['max']:>12.1f}")
+
+def main(argv=None) -> int:
+    """
+    Command-line entry point.
+
+    Args:
+        argv (list[str], optional): Command-line arguments.
+
+    Returns:
+        int: 0 if every document succeeded, 1 otherwise.
+    """
+    parser = argparse.ArgumentParser(description="Bulk backfill of PDFs through ProcessPDF.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dir", help="Local directory of PDFs (searched recursively).")
+    source.add_argument("--container", help="Blob container to list (AzureWebJobsStorage).")
+    parser.add_argument("--prefix", help="Blob name prefix when using --container.")
+    parser.add_argument("--pattern", default="*.pdf", help="File glob when using --dir.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--sink", choices=["cosmos", "bulk", "jsonl"], default="jsonl")
+    parser.add_argument("--output", default="backfill_results.jsonl",
+                        help="Output file for --sink jsonl.")
+    parser.add_argument("--checkpoint", default="backfill_checkpoint.jsonl")
+    parser.add_argument("--limit", type=int, help="Process at most this many documents.")
+    parser.add_argument("--index-wait", type=float,
+                        help="Override INDEX_WAIT_SECONDS for this run.")
+    parser.add_argument("--progress-every", type=float, default=5.0,
+                        help="Seconds between progress lines.")
+    args = parser.parse_args(argv)
+
+    if args.index_wait is not None:
+        # Inherited by pool workers
+        os.environ["INDEX_WAIT_SECONDS"] = str(args.index_wait)
+
+    checkpoint = Checkpoint(args.checkpoint)
+    items = list_local(args.dir, args.pattern) if args.dir else list_blobs(args.container, args.prefix)
+    todo = [item for item in items if not checkpoint.is_done(item["name"])]
+    if args.limit:
+        todo = todo[:args.limit]
+    print(f"{len(todo)} document(s) to process (checkpoint: {args.checkpoint})", flush=True)
+
+    pending_writes = None
+    if args.sink == "jsonl":
+        sink = JsonlResultSink(args.output)
+    elif args.sink == "bulk":
+        from services.db_bulk_writer import BulkDbWriter # pylint: disable=import-outside-toplevel
+        pending_writes = PendingWrites(checkpoint)
+        sink = BulkDbWriter(on_flush=pending_writes.on_flush)
+    else:
+        from services.db_service import DbService # pylint: disable=import-outside-toplevel
+        sink = DbService()
+
+    executor_cls = ProcessPoolExecutor if args.executor == "process" else ThreadPoolExecutor
+    durations: Dict[str, List[float]] = {}
+    totals: List[float] = []
+    done = failed = 0
+    started = last_progress = time.perf_counter()
+    pending = set()
+    queue = iter(todo)
+
+    with executor_cls(max_workers=args.workers) as pool:
+        # Keep a bounded number of documents in flight
+        for item in queue:
+            pending.add(pool.submit(process_item, item))
+            if len(pending) >= args.workers * 2:
+                break
+
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                # Buffered results are checkpointed by the flush that writes them
+                held = pending_writes is not None and bool(result["results"])
+                if held:
+                    pending_writes.expect(result)
+                for document_name, data, doc_hash in result["results"]:
+                    try:
+                        sink.store_results(
+                            document_name=document_name,
+                            data=data,
+                            content_hash=doc_hash
+                        )
+                    except Exception as e: # pylint: disable=broad-except
+                        result["status"], result["error"] = "error", f"sink: {e}"
+
+                if held and result["status"] != "ok":
+                    pending_writes.release(result["documentName"])
+                    held = False
+                if not held:
+                    checkpoint.mark(result)
+                done += 1
+                failed += result["status"] != "ok"
+                totals.append(result["timings"]["totalMs"])
+                for name, values in stage_durations([result["timings"]]).items():
+                    durations.setdefault(name, []).extend(values)
+
+                next_item = next(queue, None)
+                if next_item is not None:
+                    pending.add(pool.submit(process_item, next_item))
+
+            if time.perf_counter() - last_progress >= args.progress_every:
+                _print_progress(done, len(todo), failed, started)
+                last_progress = time.perf_counter()
+
+    close = getattr(sink, "close", None)
+    if callable(close):
+        close()
+    if pending_writes is not None:
+        failed += pending_writes.failed
+        _print_bulk_report(sink)
+
+    _print_progress(done, len(todo), failed, started)
+    _print_report(durations, totals, done, started)
+
+    checkpoint.close()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,4 @@
+"""
+tools/benchmark
+Offline end-to-end benchmark harness for the ProcessPDF function.
+"""
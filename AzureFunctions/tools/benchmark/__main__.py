@@ -0,0 +1,329 @@
+"""
+tools/benchmark/__main__.py
+Offline end-to-end benchmark of the ProcessPDF function.
+
+Runs `ProcessPDF.main` over a synthetic corpus with every external service
+(OCR, embeddings, chat, Search, Cosmos DB) replaced by in-process fakes from
+`tools.benchmark.fakes`. Reports throughput (docs/s), p50/p95/p99 per stage
+and peak memory, writes the results as JSON and optionally compares them
+against a stored baseline, exiting non-zero on a regression.
+
+Usage:
+------
+    cd AzureFunctions
+    # Record a baseline
+    python -m tools.benchmark --docs 40 --save-baseline tools/benchmark/baseline.json
+
+    # Compare against it with realistic service latencies and 1% search errors
+    python -m tools.benchmark --docs 40 --latency embeddings=60:15 --latency chat=450:120 \\
+        --error-rate search=0.01 --baseline tools/benchmark/baseline.json
+
+Fake service names for --latency and --error-rate: ocr, embeddings, chat,
+search, cosmos.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tracemalloc
+import uuid
+from contextlib import contextmanager, redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Dict, List
+
+# Allow `python tools/benchmark` as well as `python -m tools.benchmark`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# pylint: disable=wrong-import-position
+from services.tracer import AppTracer, StageRecorder, current_recorder, recording
+from tools.stats import stage_durations, summarise
+from tools.benchmark import corpus
+from tools.benchmark.fakes import (
+    FakeCosmosClient,
+    FakeOcrSession,
+    FakeOpenAI,
+    FakeSearchClient,
+    LatencyModel,
+)
+
+SERVICES = ("ocr", "embeddings", "chat", "search", "cosmos")
+
+# Settings the services read; dummies are enough because every client is faked
+BENCH_ENV = {
+    "AZURE_OPENAI_API_KEY": "bench",
+    "AZURE_OPENAI_API_VERSION": "2024-02-01",
+    "AZURE_OPENAI_ENDPOINT": "https://bench.invalid",
+    "AZURE_OPENAI_CHAT_DEPLOYMENT": "bench-chat",
+    "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "bench-embedding",
+    "AZURE_OPENAI_EMBEDDING_MODEL": "bench-embedding",
+    "SEARCH_ENDPOINT": "https://bench.invalid",
+    "SEARCH_INDEX": "bench",
+    "SEARCH_ADMIN_KEY": "bench",
+    "COSMOS_ACCOUNT_URI": "https://bench.invalid",
+    "COSMOS_DATABASE_NAME": "ResultsDb",
+    "COSMOS_CONTAINER_NAME": "Documents",
+    "COMPUTER_VISION_ENDPOINT": "https://bench.invalid",
+    "COMPUTER_VISION_KEY": "bench",
+}
+
+# Settings that change what is measured, so they are always overridden
+FORCED_ENV = {
+    "INDEX_WAIT_SECONDS": "0",
+    "CHECKPOINT_BACKEND": "none",
+    "DEBUG_MODE": "False",
+}
+
+class _NullSpan:
+    def add_attribute(self, key, value):
+        pass
+
+class _NullTracer:
+    @contextmanager
+    def span(self, name=None): # pylint: disable=unused-argument
+        yield _NullSpan()
+
+class BenchTracer(AppTracer):
+    """
+    AppTracer that exports nothing and records into the harness's StageRecorder.
+    """
+
+    def __init__(self):
+        super().__init__(instrumentation_key=None)
+        self._tracer = _NullTracer()
+
+    def invocation(self, name: str, recorder: StageRecorder = None):
+        return super().invocation(name, recorder or current_recorder())
+
+def _parse_service_values(values: List[str], option: str) -> Dict[str, str]:
+    parsed = {}
+    for value in values or []:
+        service, _, setting = value.partition("=")
+        if service not in SERVICES or not setting:
+            raise SystemExit(f"{option} expects <service>=<value> with service in {', '.join(SERVICES)}")
+        parsed[service] = setting
+    return parsed
+
+def build_fakes(latency: Dict[str, str], error_rate: Dict[str, str], seed: int,
+                documents: Dict[str, "corpus.SyntheticDocument"]) -> dict:
+    """
+    Creates the fakes and their latency models.
+
+    Args:
+        latency (dict): Service name to "mean_ms[:jitter_ms]".
+        error_rate (dict): Service name to an error probability.
+        seed (int): Seed for the latency and error draws.
+        documents (dict): Corpus by SHA-1 of the content, for OCR text.
+
+    Returns:
+        dict: `models` (LatencyModel per service) and `clients` (registry overrides).
+    """
+    models = {}
+    for offset, service in enumerate(SERVICES):
+        mean, _, jitter = latency.get(service, "0").partition(":")
+        models[service] = LatencyModel(
+            mean_ms=float(mean),
+            jitter_ms=float(jitter or 0),
+            error_rate=float(error_rate.get(service, 0)),
+            seed=seed + offset
+        )
+
+    def ocr_text(pdf_bytes: bytes, page: int) -> str:
+        import hashlib # pylint: disable=import-outside-toplevel
+        doc = documents.get(hashlib.sha1(pdf_bytes).hexdigest())
+        return doc.page_texts.get(page, "") if doc else ""
+
+    clients = {
+        "openai": FakeOpenAI(models["embeddings"], models["chat"]),
+        "search": FakeSearchClient(models["search"]),
+        "cosmos": FakeCosmosClient(models["cosmos"]),
+        "http": FakeOcrSession(models["ocr"], page_text=ocr_text),
+    }
+    return {"models": models, "clients": clients}
+
+def run(args) -> dict:
+    """
+    Runs the benchmark and returns the results.
+    """
+    os.environ.update({k: v for k, v in BENCH_ENV.items() if k not in os.environ})
+    os.environ.update(FORCED_ENV)
+
+    # pylint: disable=import-outside-toplevel
+    from services.client_registry import registry
+    import ProcessPDF.main as function_main
+
+    documents = list(corpus.generate(args.docs, seed=args.seed, scanned_rate=args.scanned_rate))
+    fakes = build_fakes(
+        _parse_service_values(args.latency, "--latency"),
+        _parse_service_values(args.error_rate, "--error-rate"),
+        args.seed,
+        {d.content_hash: d for d in documents}
+    )
+    function_main.tracer = BenchTracer()
+
+    def process(doc) -> dict:
+        blob = SimpleNamespace(
+            name=doc.name,
+            uri=f"https://bench.invalid/{doc.name}",
+            length=len(doc.pdf_bytes),
+            read=lambda: doc.pdf_bytes
+        )
+        status = "ok"
+        with recording(StageRecorder(doc.name)) as recorder:
+            try:
+                function_main.main(blob, SimpleNamespace(invocation_id=uuid.uuid4().hex))
+            except Exception: # pylint: disable=broad-except
+                status = "error"
+        return {"status": status, "timings": recorder.summary()}
+
+    if args.quiet:
+        logging.disable(logging.WARNING)
+    if args.trace_memory:
+        tracemalloc.start()
+
+    results = []
+    sink = io.StringIO() if args.quiet else sys.stdout
+    with registry.overridden(**fakes["clients"]), redirect_stdout(sink):
+        # Warm-up: imports, tokenizer and regex caches are not what we measure
+        for doc in documents[:args.warmup]:
+            process(doc)
+        if args.trace_memory:
+            tracemalloc.reset_peak()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(process, documents))
+        wall_s = time.perf_counter() - started
+
+    peak_mb = None
+    if args.trace_memory:
+        peak_mb = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        tracemalloc.stop()
+    logging.disable(logging.NOTSET)
+
+    timings = [r["timings"] for r in results]
+    stages = {name: summarise(values) for name, values in stage_durations(timings).items()}
+    return {
+        "config": {
+            "docs": args.docs,
+            "seed": args.seed,
+            "workers": args.workers,
+            "scannedRate": args.scanned_rate,
+            "latency": args.latency or [],
+            "errorRate": args.error_rate or [],
+            "python": platform.python_version(),
+        },
+        "documents": len(results),
+        "errors": sum(r["status"] != "ok" for r in results),
+        "wallSeconds": round(wall_s, 3),
+        "docsPerSecond": round(len(results) / wall_s, 3) if wall_s else None,
+        "document": summarise([t["totalMs"] for t in timings]),
+        "stages": stages,
+        "peakMemoryMB": peak_mb,
+        "fakes": {name: model.stats() for name, model in fakes["models"].items()},
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float, floor_ms: float) -> List[str]:
+    """
+    Compares results against a baseline.
+
+    Args:
+        results (dict): Results of this run.
+        baseline (dict): Results of the baseline run.
+        tolerance (float): Allowed relative slowdown, e.g. 0.15 for 15%.
+        floor_ms (float): Stage p95 changes below this many milliseconds are ignored.
+
+    Returns:
+        list[str]: One message per regression; empty if there is none.
+    """
+    regressions = []
+    if baseline.get("docsPerSecond") and results["docsPerSecond"] is not None:
+        if results["docsPerSecond"] < baseline["docsPerSecond"] * (1 - tolerance):
+            regressions.append(
+                f"throughput {results['docsPerSecond']:.2f} docs/s < baseline "
+                f"{baseline['docsPerSecond']:.2f} docs/s"
+            )
+
+    for name, stats in results["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if not base:
+            continue
+        limit = max(base["p95"] * (1 + tolerance), base["p95"] + floor_ms)
+        if stats["p95"] > limit:
+            regressions.append(f"{name} p95 {stats['p95']:.1f} ms > baseline {base['p95']:.1f} ms")
+
+    if baseline.get("peakMemoryMB") and results["peakMemoryMB"] is not None:
+        if results["peakMemoryMB"] > baseline["peakMemoryMB"] * (1 + tolerance):
+            regressions.append(
+                f"peak memory {results['peakMemoryMB']:.1f} MB > baseline {baseline['peakMemoryMB']:.1f} MB"
+            )
+    return regressions
+
+def _print_results(results: dict):
+    print(f"{results['documents']} document(s), {results['errors']} error(s), "
+          f"{results['wallSeconds']:.2f}s, {results['docsPerSecond']:.2f} docs/s, "
+          f"peak memory {results['peakMemoryMB']} MB")
+    print(f"{'stage':<18}{'count':>8}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'max ms':>11}")
+    rows = list(results["stages"].items()) + [("(document)", results["document"])]
+    for name, stats in rows:
+        print(f"{name:<18}{stats['count']:>8}{stats['p50']:>11.2f}{stats['p95']:>11.2f}"
+              f"{stats['p99']:>11.2f}{stats['max']:>11.2f}")
+
+def main(argv=None) -> int:
+    """
+    Command-line entry point.
+
+    Returns:
+        int: 0 on success, 1 if a regression against the baseline was found.
+    """
+    parser = argparse.ArgumentParser(description="Offline ProcessPDF benchmark with faked services.")
+    parser.add_argument("--docs", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Documents processed concurrently (threads).")
+    parser.add_argument("--warmup", type=int, default=2, help="Documents run before measuring.")
+    parser.add_argument("--scanned-rate", type=float, default=0.1,
+                        help="Share of image-only documents (OCR path).")
+    parser.add_argument("--latency", action="append",
+                        help="Fake latency, <service>=<mean_ms>[:<jitter_ms>] (repeatable).")
+    parser.add_argument("--error-rate", action="append",
+                        help="Fake error probability, <service>=<0-1> (repeatable).")
+    parser.add_argument("--no-trace-memory", dest="trace_memory", action="store_false",
+                        help="Skip tracemalloc (faster, but no peak memory).")
+    parser.add_argument("--verbose", dest="quiet", action="store_false",
+                        help="Keep service logs and prints.")
+    parser.add_argument("--output", help="Write the results JSON here.")
+    parser.add_argument("--baseline", help="Compare against this results JSON.")
+    parser.add_argument("--save-baseline", help="Write the results JSON as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Allowed relative regression (default 0.15).")
+    parser.add_argument("--floor-ms", type=float, default=1.0,
+                        help="Ignore stage p95 changes smaller than this.")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    _print_results(results)
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            regressions = compare(results, json.load(fh), args.tolerance, args.floor_ms)
+        if regressions:
+            print("FAIL: regression against baseline:")
+            for message in regressions:
+                print(f"  - {message}")
+            return 1
+        print(f"OK: within {args.tolerance:.0%} of baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
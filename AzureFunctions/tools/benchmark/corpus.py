@@ -0,0 +1,74 @@
+"""
+tools/benchmark/corpus.py
+Small synthetic corpus of financial-statement PDFs for the benchmark.
+
+Documents come from `tools.corpus_generator` (deterministic for a seed),
+restricted to in-range page counts so every document runs the full
+pipeline. A share of documents are image-only (scanned) so the OCR fallback
+is exercised; their page texts are kept so the fake OCR service can
+"recognise" them.
+
+Classes:
+--------
+    SyntheticDocument: One generated PDF and the text of its pages.
+
+Functions:
+--------
+    generate(): Yields synthetic documents.
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List
+
+from tools.corpus_generator import CorpusSpec, generate_document
+
+@dataclass
+class SyntheticDocument:
+    """
+    One generated PDF and the text of its pages.
+
+    Attributes
+    ----------
+        name (str): Blob-style name, e.g. "pdf-uploads/synthetic-000001.pdf".
+        pdf_bytes (bytes): The PDF content.
+        page_texts (dict[int, str]): Text of every page (also for scanned pages).
+        scanned (bool): True if the pages have no text layer.
+        sections (list[str]): Statements present in the document.
+    """
+    name: str
+    pdf_bytes: bytes
+    page_texts: Dict[int, str]
+    scanned: bool
+    sections: List[str] = field(default_factory=list)
+
+    @property
+    def content_hash(self) -> str:
+        """
+        Returns the SHA-1 of the PDF content (used to look up OCR text).
+        """
+        return hashlib.sha1(self.pdf_bytes).hexdigest()
+
+def generate(count: int, seed: int = 0, scanned_rate: float = 0.1) -> Iterator[SyntheticDocument]:
+    """
+    Yields synthetic documents.
+
+    Args:
+        count (int): Number of documents.
+        seed (int): Random seed; the same seed yields the same corpus.
+        scanned_rate (float): Share of image-only documents.
+
+    Yields:
+        SyntheticDocument: The next document.
+    """
+    spec = CorpusSpec(out_of_range_rate=0.0, scanned_rate=scanned_rate,
+                      partial_scan_rate=0.0, not_pdf_rate=0.0)
+    for index in range(count):
+        pdf_bytes, entry, page_texts = generate_document(index, seed, spec)
+        yield SyntheticDocument(
+            name=f"pdf-uploads/{entry['documentName']}",
+            pdf_bytes=pdf_bytes,
+            page_texts=page_texts,
+            scanned=entry["fullyScanned"],
+            sections=[s for s in spec.section_rates if entry[f"has{s}"]]
+        )
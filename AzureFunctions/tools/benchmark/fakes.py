@@ -0,0 +1,380 @@
+"""
+tools/benchmark/fakes.py
+In-process fakes for every external service the pipeline calls.
+
+Each fake has the subset of the SDK surface the services use and is injected
+through `services.client_registry.registry.overridden()`, so the production
+code paths run unchanged. Every fake takes a `LatencyModel` that sleeps for a
+sampled latency and raises the SDK's own error type at a configured rate.
+
+Classes:
+--------
+    LatencyModel: Sampled latency and error injection for one fake service.
+    FakeOpenAI: Embeddings (deterministic hashed vectors) and chat completions.
+    FakeSearchClient: In-memory vector index with exact cosine top-k search.
+    FakeCosmosClient: In-memory Cosmos DB account (database -> container).
+    FakeOcrSession: `requests.Session` stand-in for the Computer Vision Read API.
+
+Functions:
+--------
+    embed_text(): Returns the deterministic embedding of a text.
+"""
+
+import io
+import re
+import math
+import time
+import random
+import hashlib
+import threading
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+TOKEN_RE = re.compile(r"[a-z0-9&]+")
+STOP_WORDS = {
+    "does", "this", "doc", "contain", "the", "a", "an", "or", "and", "of",
+    "to", "is", "sometimes", "referred", "as", "statement", "statements"
+}
+
+class LatencyModel:
+    """
+    Sampled latency and error injection for one fake service.
+
+    Latency is drawn from a normal distribution (`mean_ms`, `jitter_ms`),
+    truncated at zero. With probability `error_rate` a call raises the
+    error produced by the fake's error factory instead of returning.
+
+    Attributes
+    ----------
+        mean_ms (float): Mean latency per call in milliseconds.
+        jitter_ms (float): Standard deviation of the latency.
+        error_rate (float): Probability (0-1) that a call fails.
+        calls (int): Number of calls made.
+        errors (int): Number of injected errors.
+    """
+
+    def __init__(self, mean_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 seed: int = 0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, error_factory: Callable[[], Exception]):
+        """
+        Sleeps for a sampled latency, then raises an injected error if one is drawn.
+        """
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self._rng.gauss(self.mean_ms, self.jitter_ms)) if self.mean_ms else 0.0
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+            self.errors += fail
+        if delay:
+            time.sleep(delay / 1000)
+        if fail:
+            raise error_factory()
+
+    def stats(self) -> dict:
+        """
+        Returns the call and error counts.
+        """
+        return {"calls": self.calls, "errors": self.errors}
+
+def _tokens(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+def embed_text(text: str, dimensions: int = 1536) -> List[float]:
+    """
+    Returns the deterministic embedding of a text: a normalised bag of hashed
+    word unigrams and bigrams, so texts sharing phrases are close in cosine space.
+
+    Args:
+        text (str): Input text.
+        dimensions (int): Vector length.
+
+    Returns:
+        list[float]: Unit-length vector.
+    """
+    vector = [0.0] * dimensions
+    words = _tokens(text)
+    for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dimensions
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+def _openai_error():
+    from openai import OpenAIError # pylint: disable=import-outside-toplevel
+    return OpenAIError("injected fault")
+
+class _Embeddings:
+    def __init__(self, latency: LatencyModel, dimensions: int):
+        self.latency = latency
+        self.dimensions = dimensions
+
+    def create(self, model: str, input: List[str], dimensions: int = None, **_): # pylint: disable=redefined-builtin
+        self.latency(_openai_error)
+        dims = dimensions or self.dimensions
+        return SimpleNamespace(
+            model=model,
+            data=[SimpleNamespace(index=i, embedding=embed_text(t, dims)) for i, t in enumerate(input)],
+            usage=SimpleNamespace(prompt_tokens=sum(len(_tokens(t)) for t in input))
+        )
+
+class _ChatCompletions:
+    """
+    Answers the YES/NO check prompt built by RetrievalService: YES (citing the
+    pages) when a retrieved chunk contains every keyword of the question.
+    """
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+
+    def create(self, model: str, messages: List[dict], **_):
+        self.latency(_openai_error)
+        prompt = messages[-1]["content"]
+        question = prompt.split("\n", 1)[0].removeprefix("QUESTION:")
+        keywords = {w for w in _tokens(question.split("?")[0]) if w not in STOP_WORDS}
+
+        pages = []
+        for match in re.finditer(r"\[Page (\d+) \| Chunk [^\]]*\]\n(.*?)(?=\n\n\[Page |\nAnswer YES)",
+                                 prompt, flags=re.DOTALL):
+            if keywords and keywords <= set(_tokens(match.group(2))):
+                pages.append(int(match.group(1)))
+
+        answer = (
+            "YES - " + ", ".join(f"page {p}" for p in sorted(set(pages)))
+            if pages else "NO"
+        )
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=answer))]
+        )
+
+class FakeOpenAI:
+    """
+    Stand-in for `openai.AzureOpenAI` with `embeddings.create` and
+    `chat.completions.create`.
+    """
+
+    def __init__(self, embedding_latency: LatencyModel = None, chat_latency: LatencyModel = None,
+                 dimensions: int = 1536):
+        self.embeddings = _Embeddings(embedding_latency or LatencyModel(), dimensions)
+        self.chat = SimpleNamespace(completions=_ChatCompletions(chat_latency or LatencyModel()))
+
+def _search_error():
+    from azure.core.exceptions import HttpResponseError # pylint: disable=import-outside-toplevel
+    return HttpResponseError(message="injected fault")
+
+class FakeSearchClient:
+    """
+    Stand-in for `azure.search.documents.SearchClient`: an in-memory index
+    with exact cosine top-k vector search and `documentName eq '...'` and
+    `createdAt lt '...'` filters.
+    """
+
+    FILTER_RE = re.compile(r"^documentName eq '((?:[^']|'')*)'$")
+    CREATED_BEFORE_RE = re.compile(r"^createdAt lt '([^']*)'$")
+
+    def __init__(self, latency: LatencyModel = None):
+        self.latency = latency or LatencyModel()
+        self.documents: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def upload_documents(self, documents: List[dict]):
+        self.latency(_search_error)
+        with self._lock:
+            for doc in documents:
+                self.documents[doc["id"]] = doc
+        return [SimpleNamespace(key=d["id"], succeeded=True, status_code=201) for d in documents]
+
+    def delete_documents(self, documents: List[dict]):
+        self.latency(_search_error)
+        with self._lock:
+            for doc in documents:
+                self.documents.pop(doc["id"], None)
+        return [SimpleNamespace(key=d["id"], succeeded=True, status_code=200) for d in documents]
+
+    def search(self, search_text: str = None, vector_queries=None, filter: str = None, # pylint: disable=redefined-builtin
+               select: List[str] = None, top: int = None, **_):
+        self.latency(_search_error)
+        with self._lock:
+            candidates = list(self.documents.values())
+
+        if filter:
+            match = self.FILTER_RE.match(filter.strip())
+            if match:
+                name = match.group(1).replace("''", "'")
+                candidates = [d for d in candidates if d.get("documentName") == name]
+            match = self.CREATED_BEFORE_RE.match(filter.strip())
+            if match:
+                candidates = [d for d in candidates if d.get("createdAt", "") < match.group(1)]
+
+        if vector_queries:
+            query = vector_queries[0]
+            k = getattr(query, "k_nearest_neighbors", None) or top or 50
+            scored = [
+                (sum(a * b for a, b in zip(query.vector, d["embedding"])), d)
+                for d in candidates
+            ]
+            scored.sort(key=lambda pair: pair[0], reverse=True)
+            hits = [dict(d, **{"@search.score": score}) for score, d in scored[:k]]
+        else:
+            hits = candidates
+
+        hits = hits[:top] if top else hits
+        if select:
+            hits = [{key: h.get(key) for key in select} for h in hits]
+        return iter(hits)
+
+def _cosmos_error(status: int = 503):
+    from azure.cosmos import exceptions # pylint: disable=import-outside-toplevel
+    return exceptions.CosmosHttpResponseError(status_code=status, message="injected fault")
+
+class FakeContainer:
+    """
+    In-memory Cosmos DB container with the item operations the services use.
+    """
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.items: Dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hook(kwargs: dict, result):
+        hook = kwargs.get("response_hook")
+        if hook is not None:
+            hook({"x-ms-request-charge": "10.0"}, result)
+
+    def upsert_item(self, body: dict, **kwargs) -> dict:
+        self.latency(_cosmos_error)
+        with self._lock:
+            self.items[(body.get("documentType"), body["id"])] = dict(body)
+        self._hook(kwargs, body)
+        return dict(body)
+
+    def create_item(self, body: dict, **kwargs) -> dict:
+        self.latency(_cosmos_error)
+        key = (body.get("documentType", body.get("kind")), body["id"])
+        with self._lock:
+            if key in self.items:
+                from azure.cosmos import exceptions # pylint: disable=import-outside-toplevel
+                raise exceptions.CosmosResourceExistsError(status_code=409, message="exists")
+            self.items[key] = dict(body)
+        self._hook(kwargs, body)
+        return dict(body)
+
+    def read_item(self, item: str, partition_key, **kwargs) -> dict:
+        self.latency(_cosmos_error)
+        with self._lock:
+            found = self.items.get((partition_key, item))
+        if found is None:
+            from azure.cosmos import exceptions # pylint: disable=import-outside-toplevel
+            raise exceptions.CosmosResourceNotFoundError(status_code=404, message="not found")
+        self._hook(kwargs, found)
+        return dict(found)
+
+    def patch_item(self, item: str, partition_key, patch_operations: List[dict], **kwargs) -> dict:
+        self.latency(_cosmos_error)
+        with self._lock:
+            found = self.items.get((partition_key, item))
+            if found is None:
+                from azure.cosmos import exceptions # pylint: disable=import-outside-toplevel
+                raise exceptions.CosmosResourceNotFoundError(status_code=404, message="not found")
+            for op in patch_operations:
+                key = op["path"].lstrip("/")
+                if op["op"] == "incr":
+                    found[key] = found.get(key, 0) + op["value"]
+                elif op["op"] in ("set", "add", "replace"):
+                    found[key] = op["value"]
+                elif op["op"] == "remove":
+                    found.pop(key, None)
+        self._hook(kwargs, found)
+        return dict(found)
+
+    def execute_item_batch(self, batch_operations, partition_key, **kwargs):
+        self.latency(_cosmos_error)
+        results = []
+        with self._lock:
+            for operation in batch_operations:
+                name, args = operation[0], operation[1]
+                if name not in ("upsert", "create"):
+                    raise NotImplementedError(f"Batch operation {name} is not faked")
+                self.items[(partition_key, args[0]["id"])] = dict(args[0])
+                results.append({"statusCode": 200, "resourceBody": args[0]})
+        self._hook(kwargs, results)
+        return results
+
+class FakeCosmosClient:
+    """
+    Stand-in for `azure.cosmos.CosmosClient`; containers are created on first access.
+    """
+
+    def __init__(self, latency: LatencyModel = None):
+        self.latency = latency or LatencyModel()
+        self.containers: Dict[tuple, FakeContainer] = {}
+
+    def get_database_client(self, database: str):
+        return SimpleNamespace(get_container_client=lambda name: self._container(database, name))
+
+    def _container(self, database: str, name: str) -> FakeContainer:
+        return self.containers.setdefault((database, name), FakeContainer(self.latency))
+
+    def all_items(self) -> List[dict]:
+        """
+        Returns every item in every container.
+        """
+        return [item for c in self.containers.values() for item in c.items.values()]
+
+class _Response:
+    def __init__(self, status_code: int, payload: dict = None, headers: dict = None):
+        self.status_code = status_code
+        self._payload = payload or {}
+        self.headers = headers or {}
+        self.text = ""
+
+    def json(self) -> dict:
+        return self._payload
+
+class FakeOcrSession:
+    """
+    Stand-in for the `requests.Session` used by OcrService against the
+    Computer Vision Read API. Page text comes from `page_text(document, page)`.
+    """
+
+    def __init__(self, latency: LatencyModel = None,
+                 page_text: Optional[Callable[[bytes, int], str]] = None):
+        self.latency = latency or LatencyModel()
+        self.page_text = page_text or (lambda _doc, page: f"Scanned page {page}")
+        self._operations: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def post(self, url: str, data: bytes = None, **_):
+        import requests # pylint: disable=import-outside-toplevel
+        self.latency(lambda: requests.ConnectionError("injected fault"))
+        operation = hashlib.sha1(data or b"").hexdigest()
+        with self._lock:
+            self._operations[operation] = data or b""
+        return _Response(202, headers={"Operation-Location": f"{url}Results/{operation}"})
+
+    def get(self, url: str, **_):
+        import requests # pylint: disable=import-outside-toplevel
+        self.latency(lambda: requests.ConnectionError("injected fault"))
+        with self._lock:
+            data = self._operations.get(url.rsplit("/", 1)[-1], b"")
+
+        from PyPDF2 import PdfReader # pylint: disable=import-outside-toplevel
+        page_count = len(PdfReader(io.BytesIO(data)).pages) if data else 0
+        read_results = [
+            {"page": p, "lines": [{"text": line} for line in self.page_text(data, p).splitlines()]}
+            for p in range(1, page_count + 1)
+        ]
+        return _Response(200, {"status": "succeeded", "analyzeResult": {"readResults": read_results}})
+
+    def close(self):
+        pass
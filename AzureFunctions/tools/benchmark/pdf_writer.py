@@ -0,0 +1,123 @@
+"""
+tools/benchmark/pdf_writer.py
+Minimal dependency-free PDF writer for synthetic test documents.
+
+Pages are either text pages (lines of Helvetica text that PyPDF2 can extract)
+or image-only pages (a greyscale image and no text layer), which exercise the
+OCR fallback like a scanned filing would.
+
+Functions:
+--------
+    build_pdf(): Returns the bytes of a PDF with the given pages.
+"""
+
+import zlib
+from typing import List, Optional
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+FONT_SIZE, LEADING, MARGIN = 9, 11, 50
+
+def _escape(text: str) -> str:
+    """
+    Escapes a string for use in a PDF literal string (Latin-1 only).
+    """
+    text = text.encode("latin-1", "replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _text_stream(lines: List[str]) -> bytes:
+    """
+    Returns a content stream that draws `lines` top to bottom.
+    """
+    max_lines = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+    ops = [f"BT /F1 {FONT_SIZE} Tf {LEADING} TL {MARGIN} {PAGE_HEIGHT - MARGIN} Td"]
+    for line in lines[:max_lines]:
+        ops.append(f"({_escape(line)}) Tj T*")
+    ops.append("ET")
+    return "\n".join(ops).encode("latin-1")
+
+def _image_stream() -> bytes:
+    """
+    Returns a content stream that paints the page image over the page.
+    """
+    width, height = PAGE_WIDTH - 2 * MARGIN, PAGE_HEIGHT - 2 * MARGIN
+    return f"q {width} 0 0 {height} {MARGIN} {MARGIN} cm /Im1 Do Q".encode("latin-1")
+
+def _scan_image(seed: int, size: int = 64) -> bytes:
+    """
+    Returns greyscale pixels resembling a scanned page: light paper with
+    darker horizontal bands where text lines would be.
+    """
+    pixels = bytearray()
+    for y in range(size):
+        ink = (y // 3) % 2 == 0 and 4 < y < size - 4
+        for x in range(size):
+            noise = (x * 31 + y * 17 + seed * 13) % 23
+            pixels.append(90 + noise if ink and 6 < x < size - 6 else 235 + noise // 2)
+    return bytes(pixels)
+
+def build_pdf(pages: List[Optional[List[str]]], title: str = None) -> bytes:
+    """
+    Returns the bytes of a PDF with the given pages.
+
+    Args:
+        pages (list): One entry per page: a list of text lines, or None for an
+            image-only (scanned) page without a text layer.
+        title (str, optional): Document title stored in the info dictionary.
+
+    Returns:
+        bytes: The PDF file content.
+    """
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    def stream(data: bytes, extra: str = "") -> bytes:
+        packed = zlib.compress(data)
+        head = f"<< /Length {len(packed)} /Filter /FlateDecode {extra}>>\nstream\n"
+        return head.encode("latin-1") + packed + b"\nendstream"
+
+    catalog = add(b"")  # placeholder, filled once the page tree exists
+    pages_obj = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for number, lines in enumerate(pages, start=1):
+        if lines is None:
+            size = 64
+            image = add(stream(
+                _scan_image(number, size),
+                f"/Type /XObject /Subtype /Image /Width {size} /Height {size} "
+                "/ColorSpace /DeviceGray /BitsPerComponent 8 "
+            ))
+            content = add(stream(_image_stream()))
+            resources = f"<< /XObject << /Im1 {image} 0 R >> >>"
+        else:
+            content = add(stream(_text_stream(lines)))
+            resources = f"<< /Font << /F1 {font} 0 R >> >>"
+        page_ids.append(add(
+            f"<< /Type /Page /Parent {pages_obj} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources {resources} /Contents {content} 0 R >>".encode("latin-1")
+        ))
+
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects[pages_obj - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode("latin-1")
+    objects[catalog - 1] = f"<< /Type /Catalog /Pages {pages_obj} 0 R >>".encode("latin-1")
+    info = add(f"<< /Title ({_escape(title or '')}) /Producer (synthetic) >>".encode("latin-1"))
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode("latin-1") + body + b"\nendobj\n"
+
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R /Info {info} 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n"
+    ).encode("latin-1")
+    return bytes(out)
@@ -0,0 +1,58 @@
+"""
+tools/bundle_tiktoken_cache.py
+Populates the bundled tiktoken encoding cache shipped with the function app.
+
+tiktoken downloads its BPE rank files on first use. On the Consumption plan
+that download happens on every cold start of a fresh instance. Running this
+script before publishing writes the files into `AzureFunctions/tiktoken_cache`,
+which `services/rag_llm/chunk_service.py` points `TIKTOKEN_CACHE_DIR` at.
+
+Usage:
+------
+    cd AzureFunctions
+    python -m tools.bundle_tiktoken_cache [--model text-embedding-3-small ...]
+"""
+
+import os
+import sys
+import argparse
+
+DEFAULT_MODELS = ["text-embedding-3-small", "text-embedding-3-large", "gpt-4o"]
+CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "tiktoken_cache"
+)
+
+def main(argv=None) -> int:
+    """
+    Downloads the encodings used by the given models into the bundled cache.
+
+    Args:
+        argv (list[str], optional): Command-line arguments.
+
+    Returns:
+        int: Process exit code.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model", action="append", dest="models",
+                        help="Model whose encoding should be bundled (repeatable).")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.cache_dir, exist_ok=True)
+    # Must be set before tiktoken loads any encoding
+    os.environ["TIKTOKEN_CACHE_DIR"] = args.cache_dir
+    import tiktoken # pylint: disable=import-outside-toplevel
+
+    for model in args.models or DEFAULT_MODELS:
+        enc = tiktoken.encoding_for_model(model)
+        print(f"{model}: bundled encoding '{enc.name}'")
+
+    print(f"Cache written to {args.cache_dir}:")
+    for name in sorted(os.listdir(args.cache_dir)):
+        size = os.path.getsize(os.path.join(args.cache_dir, name))
+        print(f"  {name}  {size / 1024:.0f} KiB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
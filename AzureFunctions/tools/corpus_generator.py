@@ -0,0 +1,384 @@
+"""
+tools/corpus_generator.py
+Generates a synthetic corpus of annual-report PDFs with a ground-truth manifest.
+
+Production filings cannot be shared with test environments, so this tool
+produces realistic stand-ins with known answers: the entity's ABN, which
+financial statements are present and on which pages, whether pages are
+scanned (image-only) and whether the page count is inside the range the
+pipeline accepts. The manifest uses `DocumentResult` field names, so results
+from the pipeline (or the backfill JSONL output) can be scored directly.
+
+Every document is generated from its own seed (corpus seed + index), so the
+corpus is reproducible and can be generated in parallel.
+
+Usage:
+------
+    cd AzureFunctions
+    python -m tools.corpus_generator --out ./corpus --count 10000 --workers 8
+
+    # Harder mix: more scans, more out-of-range page counts, dense tables
+    python -m tools.corpus_generator --out ./corpus-hard --count 2000 \\
+        --scanned-rate 0.3 --partial-scan-rate 0.2 --out-of-range-rate 0.15 --table-density 3
+
+Classes:
+--------
+    CorpusSpec: Parameters controlling the generated documents.
+
+Functions:
+--------
+    abn_check_digits(): Returns a valid ABN for a 9-digit body.
+    format_abn(): Formats an ABN in one of the supported layouts.
+    generate_document(): Generates one document and its ground truth.
+    main(): Command-line entry point.
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+from dataclasses import asdict, dataclass, field
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+
+# Allow `python tools/corpus_generator.py` as well as `python -m tools.corpus_generator`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from tools.benchmark.pdf_writer import build_pdf
+
+# Page-count gate applied by the pipeline (see services/pipeline.py)
+MIN_PAGES, MAX_PAGES = 5, 25
+
+ABN_WEIGHTS = [10, 1, 3, 5, 7, 9, 11, 13, 15, 17, 19]
+
+SECTION_TITLES = {
+    "ProfitLoss": [
+        "Statement of Profit or Loss and Other Comprehensive Income",
+        "Statement of Profit or Loss",
+        "Income Statement",
+        "Profit and Loss Statement",
+    ],
+    "BalanceSheet": [
+        "Statement of Financial Position",
+        "Balance Sheet",
+    ],
+    "CashFlow": [
+        "Statement of Cash Flows",
+        "Cash Flow Statement",
+    ],
+}
+
+SECTION_ITEMS = {
+    "ProfitLoss": ["Revenue from contracts with customers", "Other income", "Cost of sales",
+                   "Employee benefits expense", "Depreciation and amortisation",
+                   "Finance costs", "Profit before income tax", "Income tax expense",
+                   "Profit for the year", "Total comprehensive income"],
+    "BalanceSheet": ["Cash and cash equivalents", "Trade and other receivables", "Inventories",
+                     "Property, plant and equipment", "Total assets", "Trade and other payables",
+                     "Borrowings", "Provisions", "Total liabilities", "Net assets",
+                     "Retained earnings", "Total equity"],
+    "CashFlow": ["Receipts from customers", "Payments to suppliers and employees",
+                 "Interest paid", "Net cash from operating activities",
+                 "Purchase of property, plant and equipment",
+                 "Net cash used in investing activities", "Repayment of borrowings",
+                 "Net increase in cash held", "Cash at the end of the financial year"],
+}
+
+# Mentions of a statement in other pages; realistic hard negatives for the checks
+DECOYS = {
+    "ProfitLoss": "The profit or loss statement should be read in conjunction with the notes.",
+    "BalanceSheet": "Refer to the balance sheet for details of borrowings.",
+    "CashFlow": "Cash flows are presented on a gross basis in the cash flow statement.",
+}
+
+ENTITY_WORDS = ["Harbour", "Coastal", "Summit", "Eastern", "Pioneer", "Granite", "Wattle",
+                "Southern", "Redgum", "Bluewater", "Ironbark", "Meridian", "Kestrel",
+                "Banksia", "Outback", "Silverleaf", "Jacaranda", "Northgate"]
+ENTITY_SUFFIXES = ["Holdings Pty Ltd", "Group Limited", "Services Pty Ltd", "Foundation Ltd",
+                   "Co-operative Limited", "Trading Pty Ltd"]
+PROSE = ("the entity reported results for the financial year in accordance with australian "
+         "accounting standards and the corporations act 2001 the directors consider that the "
+         "company will be able to pay its debts as and when they become due and payable the "
+         "principal activities during the year were unchanged significant judgements include "
+         "impairment of assets and measurement of provisions").split()
+NOTE_TOPICS = ["Summary of significant accounting policies", "Revenue", "Income tax",
+               "Trade and other receivables", "Property, plant and equipment", "Leases",
+               "Borrowings", "Provisions", "Related party transactions",
+               "Events after the reporting period", "Auditor's remuneration"]
+
+@dataclass
+class CorpusSpec:
+    """
+    Parameters controlling the generated documents.
+
+    Attributes
+    ----------
+        min_pages (int): Fewest pages of an in-range document.
+        max_pages (int): Most pages of an in-range document.
+        out_of_range_rate (float): Share of documents with fewer than 5 or
+            more than 25 pages (rejected by the page-count gate).
+        section_rates (dict): Probability of each statement being present.
+        decoy_rate (float): Probability that an absent statement is still
+            mentioned in the notes.
+        abn_rate (float): Probability that the document states an ABN.
+        abn_formats (dict): Relative weight of each ABN layout
+            ("spaced", "compact", "hyphenated", "acn_only").
+        table_density (float): Tables per notes page (fractional part is a probability).
+        table_rows (tuple): Min and max rows per table.
+        scanned_rate (float): Share of fully image-only documents.
+        partial_scan_rate (float): Share of documents with some image-only pages.
+        not_pdf_rate (float): Share of files that are not PDFs at all.
+    """
+    min_pages: int = 6
+    max_pages: int = 20
+    out_of_range_rate: float = 0.05
+    section_rates: Dict[str, float] = field(default_factory=lambda: {
+        "ProfitLoss": 0.85, "BalanceSheet": 0.85, "CashFlow": 0.8
+    })
+    decoy_rate: float = 0.3
+    abn_rate: float = 0.9
+    abn_formats: Dict[str, float] = field(default_factory=lambda: {
+        "spaced": 6, "compact": 2, "hyphenated": 1, "acn_only": 1
+    })
+    table_density: float = 1.0
+    table_rows: Tuple[int, int] = (6, 14)
+    scanned_rate: float = 0.1
+    partial_scan_rate: float = 0.05
+    not_pdf_rate: float = 0.01
+
+def abn_check_digits(body: str) -> str:
+    """
+    Returns a valid ABN (modulus 89 checksum) for a 9-digit body.
+
+    Args:
+        body (str): Nine digits.
+
+    Returns:
+        str: Eleven digits with a valid checksum.
+    """
+    for prefix in range(10, 100):
+        digits = [int(d) for d in f"{prefix}{body}"]
+        digits[0] -= 1
+        if sum(w * d for w, d in zip(ABN_WEIGHTS, digits)) % 89 == 0:
+            return f"{prefix}{body}"
+    # Every body has a valid prefix in 10-99; this is unreachable
+    raise ValueError(f"No valid ABN prefix for {body}")
+
+def format_abn(abn: str, layout: str) -> str:
+    """
+    Formats an 11-digit ABN in one of the supported layouts.
+
+    Args:
+        abn (str): Eleven digits.
+        layout (str): "spaced" (51 824 753 556), "compact" (51824753556)
+            or "hyphenated" (51-824-753-556).
+
+    Returns:
+        str: The formatted ABN.
+    """
+    groups = [abn[:2], abn[2:5], abn[5:8], abn[8:]]
+    return {"spaced": " ".join(groups), "compact": abn, "hyphenated": "-".join(groups)}[layout]
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(PROSE) for _ in range(rng.randrange(10, 20))).capitalize() + "."
+
+def _prose(rng: random.Random, sentences: int) -> List[str]:
+    return [_sentence(rng) for _ in range(sentences)]
+
+def _table(rng: random.Random, items: List[str], rows: int) -> List[str]:
+    lines = [f"{'':48}{'2024 $':>14}{'2023 $':>14}"]
+    for item in rng.sample(items, k=min(rows, len(items))):
+        lines.append(f"{item:48}{rng.randrange(1_000, 9_000_000):>14,}{rng.randrange(1_000, 9_000_000):>14,}")
+    return lines
+
+def _page_count(rng: random.Random, spec: CorpusSpec) -> int:
+    if rng.random() < spec.out_of_range_rate:
+        return rng.choice([rng.randrange(1, MIN_PAGES), rng.randrange(MAX_PAGES + 1, MAX_PAGES + 15)])
+    return rng.randrange(spec.min_pages, spec.max_pages + 1)
+
+def generate_document(index: int, seed: int, spec: CorpusSpec) -> Tuple[bytes, dict, Dict[int, str]]:
+    """
+    Generates one document and its ground truth.
+
+    Args:
+        index (int): Position in the corpus (used in the name and the seed).
+        seed (int): Corpus seed.
+        spec (CorpusSpec): Generation parameters.
+
+    Returns:
+        tuple: The file content, the manifest entry, and the text of every
+               page (including pages rendered as images).
+    """
+    rng = random.Random(seed * 1_000_003 + index)
+    name = f"synthetic-{index:06d}.pdf"
+    entity = f"{rng.choice(ENTITY_WORDS)} {rng.choice(ENTITY_WORDS)} {rng.choice(ENTITY_SUFFIXES)}"
+
+    if rng.random() < spec.not_pdf_rate:
+        content = f"{entity}\nThis upload is a text file, not a PDF.\n".encode("utf-8")
+        return content, {"documentName": name, "isPDF": False, "entity": entity}, {}
+
+    target_pages = _page_count(rng, spec)
+
+    # Cover page with the ABN (or only an ACN)
+    abn = abn_check_digits(f"{rng.randrange(10**8, 10**9)}")
+    layout = rng.choices(list(spec.abn_formats), weights=list(spec.abn_formats.values()))[0]
+    cover = [entity]
+    stated_abn: Optional[str] = None
+    stated_layout: Optional[str] = None
+    if rng.random() < spec.abn_rate:
+        stated_layout = layout
+        if layout == "acn_only":
+            cover.append(f"ACN {abn[2:5]} {abn[5:8]} {abn[8:]}")
+        else:
+            cover.append(f"ABN {format_abn(abn, layout)}")
+            stated_abn = abn
+    cover += ["", "Annual Financial Report", "For the year ended 30 June 2024"]
+
+    pages: List[List[str]] = [cover, ["Directors' Report", ""] + _prose(rng, rng.randrange(20, 45))]
+    section_pages: Dict[str, List[int]] = {}
+    for section, rate in spec.section_rates.items():
+        if rng.random() < rate and len(pages) < target_pages:
+            title = rng.choice(SECTION_TITLES[section])
+            rows = rng.randrange(*spec.table_rows)
+            pages.append([title, "For the year ended 30 June 2024", ""]
+                         + _table(rng, SECTION_ITEMS[section], rows))
+            section_pages[section] = [len(pages)]
+
+    while len(pages) < target_pages - 1:
+        lines = [f"Note {len(pages) - 1}: {rng.choice(NOTE_TOPICS)}", ""]
+        tables = int(spec.table_density) + (rng.random() < spec.table_density % 1)
+        for _ in range(tables):
+            items = SECTION_ITEMS[rng.choice(list(SECTION_ITEMS))]
+            lines += _table(rng, items, rng.randrange(*spec.table_rows)) + [""]
+        lines += _prose(rng, rng.randrange(10, 40))
+        pages.append(lines)
+
+    if target_pages > len(pages):
+        pages.append(["Directors' Declaration", ""] + _prose(rng, 8))
+    pages = pages[:max(target_pages, 1)]
+    # Sections cut off by a short page count are not present
+    section_pages = {s: p for s, p in section_pages.items() if p[0] <= len(pages)}
+
+    # Hard negatives: absent statements mentioned in the notes
+    decoys = []
+    for section in spec.section_rates:
+        if section not in section_pages and len(pages) > 2 and rng.random() < spec.decoy_rate:
+            page = rng.randrange(3, len(pages) + 1)
+            pages[page - 1].insert(2, DECOYS[section])
+            decoys.append(section)
+    scanned_pages: List[int] = []
+    if rng.random() < spec.scanned_rate:
+        scanned_pages = list(range(1, len(pages) + 1))
+    elif rng.random() < spec.partial_scan_rate:
+        scanned_pages = sorted(rng.sample(range(1, len(pages) + 1), k=rng.randrange(1, len(pages) + 1)))
+
+    content = build_pdf(
+        [None if i in scanned_pages else lines for i, lines in enumerate(pages, start=1)],
+        title=entity
+    )
+    page_count = len(pages)
+    entry = {
+        "documentName": name,
+        "isPDF": True,
+        "pageCount": page_count,
+        "inPageRange": MIN_PAGES <= page_count <= MAX_PAGES,
+        "entity": entity,
+        "scannedPages": scanned_pages,
+        "fullyScanned": len(scanned_pages) == page_count,
+        "abnLayout": stated_layout,
+        "hasABN": stated_abn is not None,
+        "ABN": stated_abn,
+        "decoys": decoys,
+        "tableDensity": spec.table_density,
+    }
+    for section in spec.section_rates:
+        pages_key = f"{section[0].lower()}{section[1:]}Pages"
+        entry[f"has{section}"] = section in section_pages
+        entry[pages_key] = section_pages.get(section, [])
+
+    page_texts = {i: "\n".join(lines) for i, lines in enumerate(pages, start=1)}
+    return content, entry, page_texts
+
+def _write_one(job: tuple) -> dict:
+    """
+    Generates one document and writes it under the output directory (pool worker).
+    """
+    index, seed, spec, out_dir, shard_size = job
+    content, entry, _ = generate_document(index, seed, spec)
+    relative = os.path.join(f"{index // shard_size:04d}", entry["documentName"])
+    path = os.path.join(out_dir, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fh:
+        fh.write(content)
+    entry["path"] = relative.replace(os.sep, "/")
+    entry["bytes"] = len(content)
+    return entry
+
+def main(argv=None) -> int:
+    """
+    Command-line entry point.
+
+    Returns:
+        int: 0 on success.
+    """
+    defaults = CorpusSpec()
+    parser = argparse.ArgumentParser(description="Generate a synthetic annual-report corpus.")
+    parser.add_argument("--out", required=True, help="Output directory.")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--shard-size", type=int, default=1000, help="Files per subdirectory.")
+    parser.add_argument("--min-pages", type=int, default=defaults.min_pages)
+    parser.add_argument("--max-pages", type=int, default=defaults.max_pages)
+    parser.add_argument("--out-of-range-rate", type=float, default=defaults.out_of_range_rate)
+    parser.add_argument("--profit-loss-rate", type=float, default=defaults.section_rates["ProfitLoss"])
+    parser.add_argument("--balance-sheet-rate", type=float, default=defaults.section_rates["BalanceSheet"])
+    parser.add_argument("--cash-flow-rate", type=float, default=defaults.section_rates["CashFlow"])
+    parser.add_argument("--decoy-rate", type=float, default=defaults.decoy_rate)
+    parser.add_argument("--abn-rate", type=float, default=defaults.abn_rate)
+    parser.add_argument("--abn-formats", default="spaced=6,compact=2,hyphenated=1,acn_only=1",
+                        help="Comma-separated layout=weight pairs.")
+    parser.add_argument("--table-density", type=float, default=defaults.table_density)
+    parser.add_argument("--scanned-rate", type=float, default=defaults.scanned_rate)
+    parser.add_argument("--partial-scan-rate", type=float, default=defaults.partial_scan_rate)
+    parser.add_argument("--not-pdf-rate", type=float, default=defaults.not_pdf_rate)
+    args = parser.parse_args(argv)
+
+    spec = CorpusSpec(
+        min_pages=args.min_pages,
+        max_pages=args.max_pages,
+        out_of_range_rate=args.out_of_range_rate,
+        section_rates={
+            "ProfitLoss": args.profit_loss_rate,
+            "BalanceSheet": args.balance_sheet_rate,
+            "CashFlow": args.cash_flow_rate,
+        },
+        decoy_rate=args.decoy_rate,
+        abn_rate=args.abn_rate,
+        abn_formats={k: float(v) for k, v in (p.split("=") for p in args.abn_formats.split(","))},
+        table_density=args.table_density,
+        scanned_rate=args.scanned_rate,
+        partial_scan_rate=args.partial_scan_rate,
+        not_pdf_rate=args.not_pdf_rate,
+    )
+
+    os.makedirs(args.out, exist_ok=True)
+    manifest_path = os.path.join(args.out, "manifest.jsonl")
+    jobs = ((i, args.seed, spec, args.out, args.shard_size) for i in range(args.count))
+    written = 0
+    with open(manifest_path, "w", encoding="utf-8") as manifest, Pool(args.workers) as pool:
+        for entry in pool.imap(_write_one, jobs, chunksize=32):
+            manifest.write(json.dumps(entry) + "\n")
+            written += 1
+            if written % 1000 == 0:
+                print(f"{written}/{args.count} documents", flush=True)
+
+    with open(os.path.join(args.out, "corpus_spec.json"), "w", encoding="utf-8") as fh:
+        json.dump({"count": args.count, "seed": args.seed, **asdict(spec)}, fh, indent=2)
+    print(f"Wrote {written} documents and {manifest_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
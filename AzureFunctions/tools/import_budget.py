@@ -0,0 +1,127 @@
+"""
+tools/import_budget.py
+Measures the cold import time of the function entry point and enforces a budget.
+
+The script imports the target module in a fresh interpreter with
+`python -X importtime`, sums the reported self-times and prints the most
+expensive top-level imports. It exits non-zero when the median import time
+exceeds the budget, or when a module that should be imported lazily (e.g.
+`openai`, `tiktoken`) shows up at module load.
+
+Usage:
+------
+    cd AzureFunctions
+    python -m tools.import_budget --budget-ms 800 --runs 5
+
+Environment variables:
+    IMPORT_BUDGET_MS: Default budget in milliseconds (default: 1000).
+"""
+
+import os
+import re
+import sys
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+FUNCTION_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be imported when ProcessPDF/main.py is loaded
+DEFAULT_LAZY_MODULES = [
+    "openai",
+    "azure.search.documents",
+    "tiktoken",
+    "langchain_text_splitters",
+    "opencensus.ext.azure",
+    "numpy",
+]
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+def measure(module: str) -> tuple[int, dict[str, int], set[str]]:
+    """
+    Imports `module` in a fresh interpreter and parses the `-X importtime` report.
+
+    Args:
+        module (str): Dotted module name to import.
+
+    Returns:
+        tuple: Total self-time in microseconds, self-time in microseconds
+               summed per top-level package, and the set of every imported
+               module name.
+
+    Raises:
+        RuntimeError: If the import fails.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=FUNCTION_ROOT,
+        capture_output=True,
+        text=True,
+        check=False
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    total_us = 0
+    per_package: dict[str, int] = defaultdict(int)
+    imported: set[str] = set()
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, _, _, name = match.groups()
+        total_us += int(self_us)
+        imported.add(name)
+        per_package[name.split(".")[0]] += int(self_us)
+    return total_us, dict(per_package), imported
+
+def main(argv=None) -> int:
+    """
+    Runs the import-time measurement and compares it against the budget.
+
+    Args:
+        argv (list[str], optional): Command-line arguments.
+
+    Returns:
+        int: 0 when within budget, 1 otherwise.
+    """
+    parser = argparse.ArgumentParser(description="Cold import-time budget check.")
+    parser.add_argument("--module", default="ProcessPDF.main")
+    parser.add_argument("--budget-ms", type=float,
+                        default=float(os.environ.get("IMPORT_BUDGET_MS", 1000)))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--lazy", action="append",
+                        help="Module that must not be imported at load (repeatable).")
+    args = parser.parse_args(argv)
+
+    totals = []
+    per_package: dict[str, int] = {}
+    imported: set[str] = set()
+    for _ in range(args.runs):
+        total_us, per_package, imported = measure(args.module)
+        totals.append(total_us / 1000)
+
+    median_ms = statistics.median(totals)
+    print(f"Cold import of {args.module}: median {median_ms:.1f} ms "
+          f"(min {min(totals):.1f}, max {max(totals):.1f}, runs {args.runs})")
+    print(f"Top {args.top} top-level packages (ms, last run):")
+    for name, us in sorted(per_package.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f}  {name}")
+
+    failed = False
+    eager = sorted(m for m in (args.lazy or DEFAULT_LAZY_MODULES) if m in imported)
+    if eager:
+        print(f"FAIL: modules expected to be lazily imported were loaded: {', '.join(eager)}")
+        failed = True
+    if median_ms > args.budget_ms:
+        print(f"FAIL: median import time {median_ms:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print(f"OK: within budget of {args.budget_ms:.0f} ms")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""
+tools/microbench.py
+Microbenchmarks for the CPU-bound hot paths, with regression thresholds.
+
+Each benchmark times one function on small, typical and worst-case inputs
+built from the synthetic corpus generator:
+
+    pdf.extract_embedded_text   PDFService.extract_embedded_text on a whole PDF
+    pdf.find_abn                PDFService.find_abn on the pages of a document
+    chunker.page_blocks         DynamicChunker._page_blocks on one page
+    chunker.chunk_page          DynamicChunker.chunk_page on one page
+    models.document_result      DocumentResult validation and serialisation
+
+Every case is warmed up, then run in `--repeat` rounds of an auto-calibrated
+number of calls; statistics are per call. Results are appended to a JSONL
+history file and compared against a thresholds file, exiting non-zero when a
+case's median exceeds its threshold. Logging is disabled while timing, so the
+numbers reflect the computation only.
+
+Usage:
+------
+    cd AzureFunctions
+    # Record thresholds at 50% above the current medians
+    python -m tools.microbench --write-thresholds microbench_thresholds.json --headroom 0.5
+
+    # Check against them (e.g. in CI), appending to the history
+    python -m tools.microbench --thresholds microbench_thresholds.json \\
+        --history microbench_history.jsonl
+
+    # Only the ABN benchmarks
+    python -m tools.microbench -k find_abn
+
+Functions:
+--------
+    build_inputs(): Returns the small, typical and worst-case inputs.
+    benchmarks(): Returns the benchmark cases.
+    measure(): Times one callable.
+    main(): Command-line entry point.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Tuple
+
+# Allow `python tools/microbench.py` as well as `python -m tools.microbench`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from tools.stats import percentile
+from tools.benchmark.pdf_writer import build_pdf
+from tools.corpus_generator import CorpusSpec, generate_document
+
+SIZES = ("small", "typical", "worst")
+
+def build_inputs() -> Dict[str, dict]:
+    """
+    Returns the small, typical and worst-case inputs.
+
+    Returns:
+        dict: For each size, `pdf` (bytes), `pages` (page number to text),
+              `page` (the longest single page) and `result` (a result payload).
+    """
+    _, _, typical_pages = generate_document(3, 11, CorpusSpec(
+        min_pages=12, max_pages=12, out_of_range_rate=0, scanned_rate=0,
+        partial_scan_rate=0, not_pdf_rate=0
+    ))
+    _, _, dense_pages = generate_document(5, 11, CorpusSpec(
+        min_pages=25, max_pages=25, out_of_range_rate=0, scanned_rate=0,
+        partial_scan_rate=0, not_pdf_rate=0, table_density=4, table_rows=(12, 14),
+        abn_rate=0
+    ))
+
+    # Worst case: the densest page plus layouts that stress the regexes -
+    # many short capitalised lines, long digit runs with no ABN, one huge line
+    worst_page = "\n".join(
+        [dense_pages[max(dense_pages, key=lambda p: len(dense_pages[p]))]]
+        + [f"NOTE {i} BORROWINGS" for i in range(150)]
+        + [" ".join(f"{n:>12,}" for n in range(10_000, 10_600))]
+        + ["x" * 20_000]
+    )
+    worst_pages = {**dense_pages, len(dense_pages): worst_page}
+
+    small_pages = {1: "Coastal Holdings Pty Ltd\nABN 51 824 753 556\nAnnual Financial Report"}
+
+    def as_pdf(pages: Dict[int, str]) -> bytes:
+        return build_pdf([text.splitlines() for _, text in sorted(pages.items())])
+
+    def result(pages: Dict[int, str], pages_per_check: int) -> dict:
+        cited = list(range(1, pages_per_check + 1))
+        return {
+            "id": "0f1e2d3c", "documentName": "pdf-uploads/bench.pdf", "contentHash": "ab" * 32,
+            "isPDF": True, "pageCount": len(pages), "blobUrl": "https://bench.invalid/bench.pdf",
+            "extractionMethod": "embedded", "isValidAFS": True, "afsConfidence": 0.93,
+            "hasABN": True, "ABN": "51824753556",
+            "hasProfitLoss": True, "profitLossPages": cited,
+            "hasBalanceSheet": True, "balanceSheetPages": cited,
+            "hasCashFlow": True, "cashFlowPages": cited,
+            "processingMs": 1234.5, "timestamp": "2024-07-01T00:00:00",
+        }
+
+    return {
+        "small": {"pages": small_pages, "page": small_pages[1], "pdf": as_pdf(small_pages),
+                  "result": {"id": "1", "documentName": "x.pdf", "isPDF": False,
+                             "blobUrl": "https://bench.invalid/x.pdf",
+                             "timestamp": "2024-07-01T00:00:00"}},
+        "typical": {"pages": typical_pages,
+                    "page": typical_pages[max(typical_pages, key=lambda p: len(typical_pages[p]))],
+                    "pdf": as_pdf(typical_pages), "result": result(typical_pages, 2)},
+        "worst": {"pages": worst_pages, "page": worst_page, "pdf": as_pdf(worst_pages),
+                  "result": result(worst_pages, 25)},
+    }
+
+def benchmarks(inputs: Dict[str, dict]) -> List[Tuple[str, Callable[[], object]]]:
+    """
+    Returns the benchmark cases as (name, zero-argument callable) pairs.
+
+    Args:
+        inputs (dict): Output of `build_inputs()`.
+
+    Returns:
+        list[tuple[str, Callable]]: Cases named "<benchmark>[<size>]".
+    """
+    # pylint: disable=import-outside-toplevel
+    from services.pdf_utils import PDFService
+    from services.db_models import DocumentResult
+    from services.rag_llm.chunk_service import DynamicChunker
+
+    pdf = PDFService()
+    chunker = DynamicChunker()
+    cases = []
+    for size in SIZES:
+        data = inputs[size]
+        cases += [
+            (f"pdf.extract_embedded_text[{size}]",
+             lambda d=data: pdf.extract_embedded_text(d["pdf"])),
+            (f"pdf.find_abn[{size}]", lambda d=data: pdf.find_abn(d["pages"])),
+            (f"chunker.page_blocks[{size}]", lambda d=data: chunker._page_blocks(d["page"])), # pylint: disable=protected-access
+            (f"chunker.chunk_page[{size}]", lambda d=data: chunker.chunk_page(d["page"], 1)),
+            (f"models.document_result[{size}]",
+             lambda d=data: DocumentResult(**d["result"]).model_dump(mode="json", by_alias=True)),
+        ]
+    return cases
+
+def measure(func: Callable[[], object], repeat: int, min_time: float, warmup: int) -> dict:
+    """
+    Times one callable.
+
+    Args:
+        func (Callable): The code under test.
+        repeat (int): Number of timed rounds.
+        min_time (float): Minimum seconds per round; the number of calls per
+            round is calibrated to reach it.
+        warmup (int): Untimed calls before measuring.
+
+    Returns:
+        dict: Per-call microseconds: `min`, `median`, `mean`, `p95`, `stdev`,
+              plus `rounds` and `callsPerRound`.
+    """
+    for _ in range(warmup):
+        func()
+
+    # Calibrate: double the calls per round until a round takes min_time
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+
+    per_call = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        per_call.append((time.perf_counter() - start) / number * 1e6)
+
+    return {
+        "min": round(min(per_call), 3),
+        "median": round(statistics.median(per_call), 3),
+        "mean": round(statistics.fmean(per_call), 3),
+        "p95": round(percentile(per_call, 95), 3),
+        "stdev": round(statistics.stdev(per_call), 3) if len(per_call) > 1 else 0.0,
+        "rounds": repeat,
+        "callsPerRound": number,
+    }
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, timeout=5).stdout.strip()
+    except Exception: # pylint: disable=broad-except
+        return None
+
+def main(argv=None) -> int:
+    """
+    Command-line entry point.
+
+    Returns:
+        int: 0 when every case is within its threshold, 1 otherwise.
+    """
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the CPU hot paths.")
+    parser.add_argument("-k", dest="select", help="Only run cases whose name contains this.")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.05,
+                        help="Minimum seconds per timed round.")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--history", default="microbench_history.jsonl",
+                        help="JSONL file each run is appended to ('' to skip).")
+    parser.add_argument("--thresholds", help="JSON of case name to maximum median microseconds.")
+    parser.add_argument("--write-thresholds", help="Write thresholds from this run to this file.")
+    parser.add_argument("--headroom", type=float, default=0.5,
+                        help="Margin above the median for --write-thresholds (default 0.5).")
+    args = parser.parse_args(argv)
+
+    inputs = build_inputs()
+    cases = [(name, func) for name, func in benchmarks(inputs)
+             if not args.select or args.select in name]
+
+    results = {}
+    logging.disable(logging.CRITICAL)
+    try:
+        for name, func in cases:
+            results[name] = measure(func, args.repeat, args.min_time, args.warmup)
+            stats = results[name]
+            print(f"{name:<40}{stats['median']:>12.1f} us  (p95 {stats['p95']:.1f}, "
+                  f"stdev {stats['stdev']:.1f}, {stats['callsPerRound']} calls x {stats['rounds']})",
+                  flush=True)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    if args.history:
+        with open(args.history, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps({
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "commit": _git_commit(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            }) + "\n")
+
+    if args.write_thresholds:
+        with open(args.write_thresholds, "w", encoding="utf-8") as fh:
+            json.dump({name: round(stats["median"] * (1 + args.headroom), 1)
+                       for name, stats in results.items()}, fh, indent=2, sort_keys=True)
+        print(f"Thresholds written to {args.write_thresholds}")
+
+    if not args.thresholds:
+        return 0
+    with open(args.thresholds, encoding="utf-8") as fh:
+        thresholds = json.load(fh)
+    failures = [
+        f"{name}: median {stats['median']:.1f} us > threshold {thresholds[name]:.1f} us"
+        for name, stats in results.items()
+        if name in thresholds and stats["median"] > thresholds[name]
+    ]
+    if failures:
+        print("FAIL: cases over threshold:")
+        for message in failures:
+            print(f"  - {message}")
+        return 1
+    print(f"OK: {len(results)} case(s) within thresholds")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
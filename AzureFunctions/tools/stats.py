@@ -0,0 +1,62 @@
+"""
+tools/stats.py
+Small statistics helpers shared by the backfill and benchmark tools.
+
+Functions:
+--------
+    percentile(): Returns the nearest-rank percentile of a list of values.
+    summarise(): Returns count, mean, p50, p95, p99 and max of a list of values.
+    stage_durations(): Groups stage durations from StageRecorder summaries by stage name.
+"""
+
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Returns the nearest-rank percentile of a list of values.
+
+    Args:
+        values (list[float]): The values (need not be sorted).
+        pct (float): Percentile in the range 0-100.
+
+    Returns:
+        float: The percentile, or 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def summarise(values: List[float]) -> Dict[str, float]:
+    """
+    Returns count, mean, p50, p95, p99 and max of a list of values.
+    """
+    if not values:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 3),
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(max(values), 3),
+    }
+
+def stage_durations(summaries: Iterable[dict]) -> Dict[str, List[float]]:
+    """
+    Groups stage durations from StageRecorder summaries by stage name.
+
+    Args:
+        summaries (Iterable[dict]): Outputs of `StageRecorder.summary()`.
+
+    Returns:
+        dict[str, list[float]]: Stage name to the list of durations in milliseconds.
+    """
+    durations: Dict[str, List[float]] = defaultdict(list)
+    for summary in summaries:
+        for entry in summary.get("stages", []):
+            durations[entry["name"]].append(entry["durationMs"])
+    return dict(durations)
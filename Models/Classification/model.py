@@ -0,0 +1,232 @@
+"""
+Models/Classification/model.py
+Online logistic regression for the AFS document classifier.
+
+The model is trained on the hashed n-gram features of
+`services.classification_service.HashingFeaturizer` (imported from the
+function app, so training and serving use the same features) with mini-batch
+AdaGrad updates. It can be updated incrementally, one batch at a time or by
+continuing from an existing artefact, and exports the `LinearClassifier`
+artefact that `ClassificationService` loads.
+
+Classes:
+--------
+    SparseBatch: A mini-batch of hashed feature vectors.
+    OnlineLogisticRegression: Logistic regression trained with partial fits.
+
+Functions:
+--------
+    evaluate(): Returns classification metrics for a batch.
+"""
+
+import os
+import sys
+from typing import List, Sequence, Tuple
+import numpy as np
+
+# Reuse the featurizer and artefact format of the function app
+FUNCTION_ROOT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "AzureFunctions"
+)
+sys.path.insert(0, FUNCTION_ROOT)
+
+# pylint: disable=wrong-import-position
+from services.classification_service import HashingFeaturizer, LinearClassifier
+
+class SparseBatch:
+    """
+    A mini-batch of hashed feature vectors in compressed sparse row layout.
+
+    Attributes
+    ----------
+        indices (np.ndarray): Feature indices of all rows, concatenated.
+        values (np.ndarray): Feature values of all rows, concatenated.
+        rows (np.ndarray): Row number of each entry in `indices`.
+        size (int): Number of rows.
+    """
+
+    def __init__(self, vectors: Sequence[Tuple[np.ndarray, np.ndarray]]):
+        """
+        Builds the batch.
+
+        Args:
+            vectors (Sequence[tuple]): (indices, values) pairs from
+                `HashingFeaturizer.transform()`.
+        """
+        self.size = len(vectors)
+        lengths = np.fromiter((len(i) for i, _ in vectors), dtype=np.int64, count=self.size)
+        self.indices = np.concatenate([i for i, _ in vectors]) if self.size else np.zeros(0, np.int64)
+        self.values = np.concatenate([v for _, v in vectors]) if self.size else np.zeros(0, np.float32)
+        self.rows = np.repeat(np.arange(self.size), lengths)
+
+class OnlineLogisticRegression:
+    """
+    Logistic regression over hashed features, trained with mini-batch
+    AdaGrad (per-feature learning rates suit sparse, hashed n-grams) and L2
+    regularisation.
+
+    Attributes
+    ----------
+        n_features (int): Number of hash buckets.
+        learning_rate (float): AdaGrad base learning rate.
+        l2 (float): L2 regularisation strength.
+        weights (np.ndarray): One weight per hash bucket.
+        bias (float): Intercept.
+        samples_seen (int): Rows passed to `partial_fit()` so far.
+
+    Methods
+    -------
+        decision_function(): Returns the raw scores of a batch.
+        predict_proba(): Returns AFS probabilities for a batch.
+        partial_fit(): Updates the model with one mini-batch.
+        from_classifier(): Continues training from an exported model.
+        to_classifier(): Exports the model for ClassificationService.
+    """
+
+    def __init__(self, n_features: int, learning_rate: float = 0.5, l2: float = 1e-6):
+        """
+        Initialises an untrained model.
+
+        Args:
+            n_features (int): Number of hash buckets.
+            learning_rate (float): AdaGrad base learning rate.
+            l2 (float): L2 regularisation strength.
+        """
+        self.n_features = n_features
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.weights = np.zeros(n_features, dtype=np.float64)
+        self.bias = 0.0
+        self.samples_seen = 0
+        self._grad_sq = np.zeros(n_features, dtype=np.float64)
+        self._bias_grad_sq = 0.0
+
+    @classmethod
+    def from_classifier(cls, classifier: LinearClassifier, **kwargs) -> "OnlineLogisticRegression":
+        """
+        Continues training from an exported model (AdaGrad state restarts).
+
+        Args:
+            classifier (LinearClassifier): The exported model.
+            **kwargs: `learning_rate` and `l2`.
+
+        Returns:
+            OnlineLogisticRegression: A model with the classifier's weights.
+        """
+        model = cls(classifier.featurizer.n_features, **kwargs)
+        model.weights = classifier.weights.astype(np.float64)
+        model.bias = classifier.bias
+        return model
+
+    def decision_function(self, batch: SparseBatch) -> np.ndarray:
+        """
+        Returns the raw scores (log-odds) of a batch.
+        """
+        contributions = self.weights[batch.indices] * batch.values
+        return np.bincount(batch.rows, weights=contributions, minlength=batch.size) + self.bias
+
+    def predict_proba(self, batch: SparseBatch) -> np.ndarray:
+        """
+        Returns the AFS probability of every row in a batch.
+        """
+        return 1.0 / (1.0 + np.exp(-self.decision_function(batch)))
+
+    def partial_fit(self, batch: SparseBatch, labels: np.ndarray) -> float:
+        """
+        Updates the model with one mini-batch.
+
+        Args:
+            batch (SparseBatch): Feature vectors.
+            labels (np.ndarray): 1 for AFS, 0 otherwise.
+
+        Returns:
+            float: Mean log loss of the batch before the update.
+        """
+        if batch.size == 0:
+            return 0.0
+        labels = np.asarray(labels, dtype=np.float64)
+        probabilities = self.predict_proba(batch)
+        errors = probabilities - labels
+
+        # Gradient of the mean log loss, only on the features in the batch
+        touched = np.unique(batch.indices)
+        grad = np.bincount(batch.indices, weights=batch.values * errors[batch.rows],
+                           minlength=self.n_features)[touched] / batch.size
+        grad += self.l2 * self.weights[touched]
+        self._grad_sq[touched] += grad ** 2
+        self.weights[touched] -= self.learning_rate * grad / (np.sqrt(self._grad_sq[touched]) + 1e-8)
+
+        bias_grad = float(errors.mean())
+        self._bias_grad_sq += bias_grad ** 2
+        self.bias -= self.learning_rate * bias_grad / (np.sqrt(self._bias_grad_sq) + 1e-8)
+
+        self.samples_seen += batch.size
+        clipped = np.clip(probabilities, 1e-7, 1 - 1e-7)
+        return float(-np.mean(labels * np.log(clipped) + (1 - labels) * np.log(1 - clipped)))
+
+    def to_classifier(self, featurizer: HashingFeaturizer, threshold: float = 0.5,
+                      version: str = None) -> LinearClassifier:
+        """
+        Exports the model for ClassificationService.
+
+        Args:
+            featurizer (HashingFeaturizer): Featurizer used in training.
+            threshold (float): Probability at or above which a document is an AFS.
+            version (str, optional): Model version.
+
+        Returns:
+            LinearClassifier: The exported model.
+        """
+        return LinearClassifier(self.weights, self.bias, featurizer, threshold=threshold,
+                                version=version)
+
+def _auc(labels: np.ndarray, scores: np.ndarray) -> float:
+    """
+    Returns the ROC AUC (rank-based; ties share ranks).
+    """
+    positives = labels == 1
+    n_pos, n_neg = int(positives.sum()), int((~positives).sum())
+    if n_pos == 0 or n_neg == 0:
+        return float("nan")
+    order = np.argsort(scores, kind="mergesort")
+    ranks = np.empty(len(scores), dtype=np.float64)
+    ranks[order] = np.arange(1, len(scores) + 1)
+    # Average the ranks of tied scores
+    _, inverse, counts = np.unique(scores, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse, weights=ranks)
+    ranks = sums[inverse] / counts[inverse]
+    return float((ranks[positives].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg))
+
+def evaluate(model: OnlineLogisticRegression, batch: SparseBatch, labels: List[int],
+             threshold: float = 0.5) -> dict:
+    """
+    Returns classification metrics for a batch.
+
+    Args:
+        model (OnlineLogisticRegression): The model.
+        batch (SparseBatch): Feature vectors.
+        labels (list[int]): 1 for AFS, 0 otherwise.
+        threshold (float): Decision threshold.
+
+    Returns:
+        dict: `count`, `accuracy`, `precision`, `recall`, `f1`, `logLoss` and `auc`.
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    if batch.size == 0:
+        return {"count": 0}
+    probabilities = model.predict_proba(batch)
+    predicted = probabilities >= threshold
+    true_pos = int((predicted & (labels == 1)).sum())
+    precision = true_pos / max(int(predicted.sum()), 1)
+    recall = true_pos / max(int((labels == 1).sum()), 1)
+    clipped = np.clip(probabilities, 1e-7, 1 - 1e-7)
+    return {
+        "count": int(batch.size),
+        "accuracy": round(float((predicted == (labels == 1)).mean()), 4),
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+        "logLoss": round(float(-np.mean(labels * np.log(clipped)
+                                         + (1 - labels) * np.log(1 - clipped))), 4),
+        "auc": round(_auc(labels, probabilities), 4),
+    }
@@ -0,0 +1,99 @@
+"""
+Models/Classification/predict.py
+Scores documents with a trained AFS classifier artefact.
+
+Uses the same `LinearClassifier` as ClassificationService, so the scores
+match what the function would compute. Accepts PDF and text files, or a
+JSONL file in the training format (the label, if present, is echoed so
+predictions can be compared with it). Writes one JSON line per document.
+
+Usage:
+------
+    python Models/Classification/predict.py --model AzureFunctions/models/afs_classifier.npz \\
+        report1.pdf report2.pdf
+
+    python Models/Classification/predict.py --model afs_classifier.npz --jsonl labelled.jsonl \\
+        > predictions.jsonl
+
+Functions:
+--------
+    read_text(): Returns the text of a PDF or text file.
+    main(): Command-line entry point.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# pylint: disable=wrong-import-position
+from model import LinearClassifier
+
+def read_text(path: str) -> str:
+    """
+    Returns the text of a PDF (embedded text layer) or text file.
+
+    Args:
+        path (str): File path.
+
+    Returns:
+        str: The document text.
+    """
+    if not path.lower().endswith(".pdf"):
+        with open(path, encoding="utf-8", errors="replace") as fh:
+            return fh.read()
+    from PyPDF2 import PdfReader # pylint: disable=import-outside-toplevel
+    with open(path, "rb") as fh:
+        reader = PdfReader(io.BytesIO(fh.read()))
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+def main(argv=None) -> int:
+    """
+    Command-line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Score documents with the AFS classifier.")
+    parser.add_argument("--model", required=True, help="Path of the .npz artefact.")
+    parser.add_argument("--threshold", type=float, help="Override the artefact's threshold.")
+    parser.add_argument("--jsonl", help="Score the records of a JSONL file (training format).")
+    parser.add_argument("files", nargs="*", help="PDF or text files to score.")
+    args = parser.parse_args(argv)
+
+    # pylint: disable=import-outside-toplevel
+    from train import iter_records
+
+    model = LinearClassifier.load(args.model)
+    threshold = args.threshold if args.threshold is not None else model.threshold
+
+    def documents():
+        for path in args.files:
+            yield path, read_text, path, None
+        if args.jsonl:
+            for doc_id, text, _, label in iter_records(args.jsonl):
+                yield doc_id, str, text, label
+
+    for doc_id, loader, source, label in documents():
+        try:
+            text = loader(source)
+        except Exception as e: # pylint: disable=broad-except
+            print(json.dumps({"id": doc_id, "error": str(e)}), flush=True)
+            continue
+        started = time.perf_counter()
+        probability = model.predict_proba(text)
+        result = {
+            "id": doc_id,
+            "afsConfidence": round(probability, 4),
+            "isValidAFS": probability >= threshold,
+            "ms": round((time.perf_counter() - started) * 1000, 3),
+            "modelVersion": model.version,
+        }
+        if label is not None:
+            result["label"] = label
+        print(json.dumps(result), flush=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
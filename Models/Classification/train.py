@@ -0,0 +1,349 @@
+"""
+Models/Classification/train.py
+Trains the AFS document classifier used by ClassificationService.
+
+Training data is streamed, never loaded whole. The training source can be:
+
+    - a JSONL export, one document per line, with the text in "text" (or
+      "pages", a list or page-number map) and the label in "label" (1/0,
+      true/false, "afs"/"other") or "isValidAFS";
+    - a directory with one sub-directory per label ("afs" and "other"),
+      holding .txt or .pdf files (PDF text is extracted with PyPDF2).
+
+Documents are featurised in parallel by a process pool (PDF parsing and
+hashing are the expensive part), and the model is updated with one partial fit
+per mini-batch as vectors arrive. Online updates need the labels mixed within
+each batch: a directory source interleaves its label directories, and every
+source goes through a seeded shuffle buffer (`--shuffle-buffer` records). A
+stable hash of each document id sends `--holdout` of the documents to a
+held-out set. That set is scored after training, and the metrics are stored
+in the artefact.
+
+Usage:
+------
+    python Models/Classification/train.py --data labelled.jsonl \\
+        --out AzureFunctions/models/afs_classifier.npz --workers 8
+
+    # Continue training an existing model on new data
+    python Models/Classification/train.py --data new_labels.jsonl \\
+        --warm-start AzureFunctions/models/afs_classifier.npz --out afs_classifier_v2.npz
+
+Functions:
+--------
+    iter_records(): Streams labelled documents from a data path.
+    shuffled(): Shuffles a stream within a bounded buffer.
+    featurise(): Turns one record into a feature vector (pool worker).
+    train(): Trains a model and returns training statistics and held-out metrics.
+    main(): Command-line entry point.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+from datetime import datetime, timezone
+from itertools import islice
+from multiprocessing import Pool
+from typing import Iterable, Iterator, Optional, Tuple, TypeVar
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# pylint: disable=wrong-import-position
+from model import (
+    HashingFeaturizer, LinearClassifier, OnlineLogisticRegression, SparseBatch, evaluate
+)
+
+LABELS = {"1": 1, "true": 1, "afs": 1, "0": 0, "false": 0, "other": 0, "not_afs": 0}
+
+# Set in each pool worker by _init_worker
+_featurizer: Optional[HashingFeaturizer] = None
+
+T = TypeVar("T")
+
+def _label(value) -> Optional[int]:
+    """
+    Normalises a label value to 1 (AFS), 0 (other) or None (unlabelled).
+    """
+    if value is None:
+        return None
+    return LABELS.get(str(value).strip().lower())
+
+def _record_text(record: dict) -> str:
+    """
+    Returns the text of a JSONL record.
+    """
+    if "text" in record:
+        return record["text"] or ""
+    pages = record.get("pages") or []
+    if isinstance(pages, dict):
+        # Page-number keys are strings in JSON
+        pages = [text for _, text in sorted(pages.items(), key=lambda item: int(item[0]))]
+    return "\n".join(pages)
+
+def iter_records(path: str) -> Iterator[Tuple[str, str, bool, int]]:
+    """
+    Streams labelled documents from a data path.
+
+    Args:
+        path (str): JSONL file or labelled directory.
+
+    Yields:
+        tuple[str, str, bool, int]: Document id, the text (JSONL) or the file
+            path (directories), whether it is a file path, and the label. The
+            label directories of a directory source are interleaved.
+    """
+    if os.path.isdir(path):
+        streams = [
+            _iter_label_dir(path, label_dir, _label(label_dir))
+            for label_dir in sorted(os.listdir(path))
+            if _label(label_dir) is not None
+        ]
+        # Round robin, so neither label arrives in one long run
+        while streams:
+            for stream in list(streams):
+                record = next(stream, None)
+                if record is None:
+                    streams.remove(stream)
+                else:
+                    yield record
+        return
+
+    with open(path, encoding="utf-8") as fh:
+        for line_number, line in enumerate(fh, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            label = _label(record.get("label", record.get("isValidAFS")))
+            if label is None:
+                continue
+            doc_id = str(record.get("id") or record.get("documentName") or line_number)
+            yield doc_id, _record_text(record), False, label
+
+def _iter_label_dir(path: str, label_dir: str, label: int) -> Iterator[Tuple[str, str, bool, int]]:
+    """
+    Streams the .txt and .pdf files under one label directory.
+    """
+    for root, _, files in os.walk(os.path.join(path, label_dir)):
+        for name in sorted(files):
+            if name.lower().endswith((".txt", ".pdf")):
+                file_path = os.path.join(root, name)
+                yield os.path.relpath(file_path, path), file_path, True, label
+
+def shuffled(items: Iterable[T], buffer_size: int, seed: int = 0) -> Iterator[T]:
+    """
+    Shuffles a stream within a bounded buffer: each incoming item replaces a
+    random buffered one, which is yielded. Memory stays at `buffer_size` items.
+
+    Args:
+        items (Iterable): The stream.
+        buffer_size (int): Items held at a time; 0 or 1 keeps the order.
+        seed (int): Random seed, for reproducible runs.
+
+    Yields:
+        The items of the stream, in shuffled order.
+    """
+    rng = random.Random(seed)
+    buffer = []
+    for item in items:
+        if len(buffer) < buffer_size:
+            buffer.append(item)
+            continue
+        if not buffer:
+            yield item
+            continue
+        index = rng.randrange(len(buffer))
+        yield buffer[index]
+        buffer[index] = item
+    rng.shuffle(buffer)
+    yield from buffer
+
+def _read_text(source: str) -> str:
+    """
+    Reads a .txt file, or extracts the embedded text of a .pdf file.
+    """
+    if not source.lower().endswith(".pdf"):
+        with open(source, encoding="utf-8", errors="replace") as fh:
+            return fh.read()
+    from PyPDF2 import PdfReader # pylint: disable=import-outside-toplevel
+    with open(source, "rb") as fh:
+        reader = PdfReader(io.BytesIO(fh.read()))
+    texts = []
+    for page in reader.pages:
+        texts.append(page.extract_text() or "")
+        # The featurizer only reads the first max_chars characters
+        if sum(len(t) for t in texts) >= _featurizer.max_chars:
+            break
+    return "\n".join(texts)
+
+def _init_worker(n_features: int, ngram_max: int, max_chars: int):
+    global _featurizer # pylint: disable=global-statement
+    _featurizer = HashingFeaturizer(n_features, ngram_max, max_chars)
+
+def featurise(job: Tuple[str, str, bool, int, float]):
+    """
+    Turns one record into a feature vector (pool worker).
+
+    Args:
+        job (tuple): A record from `iter_records()` plus the holdout share.
+
+    Returns:
+        tuple: (indices, values), label and whether the document is held out,
+               or None if the file could not be read.
+    """
+    doc_id, source, is_path, label, holdout = job
+    try:
+        text = _read_text(source) if is_path else source
+    except Exception: # pylint: disable=broad-except
+        # Unreadable or corrupt files are counted and skipped
+        return None
+    held_out = zlib.crc32(doc_id.encode("utf-8")) % 10_000 < holdout * 10_000
+    return _featurizer.transform(text), label, held_out
+
+def _bounded_imap(pool: Pool, func, iterable, window: int, chunksize: int):
+    """
+    `pool.imap()` over at most `window` items at a time. Plain `imap()` reads
+    its whole input ahead, which would hold a large export in memory.
+    """
+    iterator = iter(iterable)
+    while True:
+        items = list(islice(iterator, window))
+        if not items:
+            return
+        yield from pool.imap(func, items, chunksize=chunksize)
+
+def train(data: str,
+          featurizer: HashingFeaturizer,
+          model: OnlineLogisticRegression,
+          epochs: int = 2,
+          batch_size: int = 256,
+          holdout: float = 0.1,
+          max_holdout: int = 20000,
+          workers: int = None,
+          threshold: float = 0.5,
+          shuffle_buffer: int = 4096,
+          seed: int = 0,
+          log_every: int = 50):
+    """
+    Trains a model on a streamed data source.
+
+    Args:
+        data (str): JSONL file or labelled directory.
+        featurizer (HashingFeaturizer): Featurizer settings (sent to the workers).
+        model (OnlineLogisticRegression): Model to update.
+        epochs (int): Passes over the data (each pass streams it again).
+        batch_size (int): Documents per partial fit.
+        holdout (float): Share of documents held out for evaluation.
+        max_holdout (int): Cap on held-out vectors kept in memory.
+        workers (int, optional): Featurisation processes (default: all cores).
+        threshold (float): Decision threshold for the metrics.
+        shuffle_buffer (int): Records held by the shuffle buffer.
+        seed (int): Shuffle seed (each epoch uses `seed + epoch`).
+        log_every (int): Batches between progress lines.
+
+    Returns:
+        dict: Training statistics and held-out metrics.
+    """
+    workers = workers or os.cpu_count() or 1
+    holdout_vectors, holdout_labels = [], []
+    stats = {"documents": 0, "trainDocuments": 0, "unreadable": 0, "batches": 0}
+    started = time.perf_counter()
+
+    with Pool(workers, initializer=_init_worker,
+              initargs=(featurizer.n_features, featurizer.ngram_max, featurizer.max_chars)) as pool:
+        for epoch in range(1, epochs + 1):
+            records = shuffled(iter_records(data), shuffle_buffer, seed + epoch)
+            jobs = (record + (holdout,) for record in records)
+            vectors, labels, losses = [], [], []
+            for result in _bounded_imap(pool, featurise, jobs, window=workers * 256, chunksize=16):
+                if result is None:
+                    stats["unreadable"] += epoch == 1
+                    continue
+                vector, label, held_out = result
+                if epoch == 1:
+                    stats["documents"] += 1
+                if held_out:
+                    if epoch == 1 and len(holdout_vectors) < max_holdout:
+                        holdout_vectors.append(vector)
+                        holdout_labels.append(label)
+                    continue
+                vectors.append(vector)
+                labels.append(label)
+                if len(vectors) == batch_size:
+                    losses.append(model.partial_fit(SparseBatch(vectors), labels))
+                    stats["batches"] += 1
+                    stats["trainDocuments"] += len(vectors)
+                    vectors, labels = [], []
+                    if stats["batches"] % log_every == 0:
+                        elapsed = time.perf_counter() - started
+                        print(f"epoch {epoch} batch {stats['batches']}: "
+                              f"loss {sum(losses[-log_every:]) / len(losses[-log_every:]):.4f}, "
+                              f"{stats['trainDocuments'] / elapsed:.0f} docs/s", flush=True)
+            if vectors:
+                losses.append(model.partial_fit(SparseBatch(vectors), labels))
+                stats["batches"] += 1
+                stats["trainDocuments"] += len(vectors)
+            print(f"epoch {epoch} done: mean loss {sum(losses) / max(len(losses), 1):.4f}",
+                  flush=True)
+
+    elapsed = time.perf_counter() - started
+    stats.update({
+        "epochs": epochs,
+        "seconds": round(elapsed, 2),
+        "docsPerSecond": round(stats["trainDocuments"] / elapsed, 1) if elapsed else None,
+        "holdout": evaluate(model, SparseBatch(holdout_vectors), holdout_labels, threshold),
+    })
+    return stats
+
+def main(argv=None) -> int:
+    """
+    Command-line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Train the AFS document classifier.")
+    parser.add_argument("--data", required=True, help="JSONL export or labelled directory.")
+    parser.add_argument("--out", required=True, help="Path of the .npz artefact to write.")
+    parser.add_argument("--warm-start", help="Continue from this artefact's weights.")
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--learning-rate", type=float, default=0.5)
+    parser.add_argument("--l2", type=float, default=1e-6)
+    parser.add_argument("--holdout", type=float, default=0.1)
+    parser.add_argument("--max-holdout", type=int, default=20000)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--shuffle-buffer", type=int, default=4096,
+                        help="Records held by the shuffle buffer (0 keeps the source order).")
+    parser.add_argument("--seed", type=int, default=0, help="Shuffle seed.")
+    parser.add_argument("--n-features", type=int, default=2**18)
+    parser.add_argument("--ngram-max", type=int, default=2)
+    parser.add_argument("--max-chars", type=int, default=30000)
+    parser.add_argument("--workers", type=int, default=None, help="Default: all cores.")
+    parser.add_argument("--version", help="Model version (default: a UTC timestamp).")
+    args = parser.parse_args(argv)
+
+    if args.warm_start:
+        previous = LinearClassifier.load(args.warm_start)
+        featurizer = previous.featurizer
+        model = OnlineLogisticRegression.from_classifier(
+            previous, learning_rate=args.learning_rate, l2=args.l2
+        )
+    else:
+        featurizer = HashingFeaturizer(args.n_features, args.ngram_max, args.max_chars)
+        model = OnlineLogisticRegression(featurizer.n_features, args.learning_rate, args.l2)
+
+    stats = train(args.data, featurizer, model, epochs=args.epochs, batch_size=args.batch_size,
+                  holdout=args.holdout, max_holdout=args.max_holdout, workers=args.workers,
+                  threshold=args.threshold, shuffle_buffer=args.shuffle_buffer, seed=args.seed)
+
+    version = args.version or datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    model.to_classifier(featurizer, threshold=args.threshold, version=version).save(
+        args.out, metrics=json.dumps(stats), trained_on=os.path.basename(args.data)
+    )
+    print(json.dumps(stats, indent=2))
+    print(f"Model {version} written to {args.out} ({os.path.getsize(args.out) / 1024:.0f} KiB)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
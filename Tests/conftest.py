@@ -0,0 +1,12 @@
+"""
+Tests/conftest.py
+Makes the function app's `services` package and the `Models` folder importable
+from the tests, the same way the function host and the tools do.
+"""
+
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "AzureFunctions"))
+sys.path.insert(0, REPO_ROOT)
@@ -0,0 +1,105 @@
+"""
+Tests for services/abn_service.py.
+"""
+
+import pytest
+from services.abn_service import (
+    AbnEngine,
+    is_valid_abn,
+    is_valid_acn,
+    validate_abns,
+    validate_acns,
+)
+
+# ABN 53 004 085 616 ends in ACN 004 085 616; 51 824 753 556 is the ATO's example ABN
+ABN, ACN = "53004085616", "004085616"
+OTHER_ABN = "51824753556"
+
+@pytest.mark.parametrize("number, expected", [
+    (ABN, True),
+    (OTHER_ABN, True),
+    ("51824753557", False),   # wrong check digits
+    ("5182475355", False),    # 10 digits
+    ("518247535560", False),  # 12 digits
+    ("5182475355a", False),
+    ("", False),
+])
+def test_is_valid_abn(number, expected):
+    assert is_valid_abn(number) is expected
+
+@pytest.mark.parametrize("number, expected", [
+    (ACN, True),
+    ("000000019", True),
+    ("004085617", False),
+    ("00408561", False),
+    ("0040856160", False),
+    ("00408561x", False),
+])
+def test_is_valid_acn(number, expected):
+    assert is_valid_acn(number) is expected
+
+def test_batch_validation_matches_scalar():
+    abns = [ABN, OTHER_ABN, "51824753557", "5182475355", "518247535560", "5182475355a", "", "١٢٣"]
+    assert validate_abns(abns) == [is_valid_abn(n) for n in abns]
+    acns = [ACN, "000000019", "004085617", "00408561", "0040856160", "00408561x"]
+    assert validate_acns(acns) == [is_valid_acn(n) for n in acns]
+
+def test_full_width_digits_are_accepted_by_both_validators():
+    full_width = OTHER_ABN.translate({ord(d): 0xFF10 + int(d) for d in "0123456789"})
+    numbers = [full_width, ACN, "５１８２４７５３５５７", "²" * 11]
+    assert [is_valid_abn(n) for n in numbers] == [True, False, False, False]
+    assert validate_abns(numbers) == [is_valid_abn(n) for n in numbers]
+
+def test_batch_validation_of_empty_list():
+    assert validate_abns([]) == []
+    assert validate_acns([]) == []
+
+def test_acn_after_abn_on_same_page_is_found():
+    result = AbnEngine().find("ABN: 53 004 085 616 ACN 004 085 616")
+    assert result.abn == ABN and result.confidence == "high"
+    assert result.acn == ACN
+
+def test_labelled_abn_outranks_earlier_unlabelled_one():
+    text = "Ref 51 824 753 556. Australian Business Number: 53-004-085-616"
+    result = AbnEngine().find(text)
+    assert result.abn == ABN and result.confidence == "high"
+
+def test_unlabelled_abn_ending_in_acn_is_preferred():
+    text = "Numbers 51 824 753 556 and 53 004 085 616. A.C.N. 004 085 616"
+    result = AbnEngine().find(text)
+    assert result.abn == ABN and result.confidence == "medium"
+
+def test_abn_followed_by_another_number_is_found():
+    result = AbnEngine().find("ABN 51 824 753 556 2023 annual report")
+    assert result.abn == OTHER_ABN and result.confidence == "high"
+
+def test_nine_digits_followed_by_another_group_are_not_a_candidate():
+    # The start of a run of table figures, not an ACN
+    result = AbnEngine().find("Totals 004 085 616 1 234")
+    assert result.candidates == [] and result.acn is None
+
+def test_full_width_abn_is_stored_as_ascii():
+    result = AbnEngine().find("ABN ５１ ８２４ ７５３ ５５６")
+    assert result.abn == OTHER_ABN
+
+def test_invalid_numbers_are_never_chosen():
+    result = AbnEngine().find("ABN: 51 824 753 557, phone 02 9123 4567")
+    assert result.abn is None and result.confidence is None
+    assert [c.valid for c in result.candidates] == [False]
+
+def test_early_exit_stops_at_page_boundary():
+    read = []
+
+    def pages():
+        for page, text in [(1, "Cover"), (2, f"ABN 53 004 085 616 and ACN {ACN}"),
+                           (3, f"ABN {OTHER_ABN}")]:
+            read.append(page)
+            yield page, text
+
+    result = AbnEngine().find(pages())
+    assert read == [1, 2] and result.pages_scanned == 2
+    assert result.abn == ABN and result.acn == ACN
+
+    read.clear()
+    result = AbnEngine(early_exit=False).find(pages())
+    assert read == [1, 2, 3] and len(result.candidates) == 3
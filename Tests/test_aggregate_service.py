@@ -0,0 +1,218 @@
+"""
+Tests for services/aggregate_service.py: rollups stay exact when updates
+fail part way through and the change feed redelivers the item.
+"""
+
+import copy
+import itertools
+
+import pytest
+from azure.cosmos import exceptions
+from services.rag_llm.checks import CHECKS
+from services.aggregate_service import (
+    AggregateConflictError,
+    AggregateService,
+    CosmosAggregateStore,
+    LocalAggregateStore,
+)
+
+def result_item(item_id="doc-1", day="2024-05-01", valid=True, ms=100.0, **fields):
+    return {
+        **fields,
+        "id": item_id,
+        "documentName": f"{item_id}.pdf",
+        "timestamp": f"{day}T10:00:00",
+        "isPDF": True,
+        "extractionMethod": "text",
+        "hasABN": True,
+        "isValidAFS": valid,
+        "processingMs": ms,
+    }
+
+class FakeContainer:
+    """
+    In-memory Cosmos container with etags and atomic transactional batches.
+    `fail_batches` lists the (1-based) execute_item_batch calls that fail.
+    """
+
+    def __init__(self, fail_batches=()):
+        self.docs = {}
+        self.etags = itertools.count(1)
+        self.batches = 0
+        self.fail_batches = set(fail_batches)
+
+    def _store(self, pk, body):
+        doc = dict(body, _etag=f"etag-{next(self.etags)}")
+        self.docs[(pk, body["id"])] = doc
+        return doc
+
+    def read_item(self, item, partition_key):
+        try:
+            return copy.deepcopy(self.docs[(partition_key, item)])
+        except KeyError:
+            raise exceptions.CosmosResourceNotFoundError(status_code=404, message="not found")
+
+    def create_item(self, body):
+        if (body["day"], body["id"]) in self.docs:
+            raise exceptions.CosmosResourceExistsError(status_code=409, message="exists")
+        return self._store(body["day"], body)
+
+    def replace_item(self, item, body, etag=None, match_condition=None):
+        if self.docs[(body["day"], item)]["_etag"] != etag:
+            raise exceptions.CosmosAccessConditionFailedError(status_code=412, message="etag")
+        return self._store(body["day"], body)
+
+    def execute_item_batch(self, batch_operations, partition_key):
+        self.batches += 1
+        self.last_batch = batch_operations
+        staged = copy.deepcopy(self.docs)
+
+        def fail(index, status):
+            raise exceptions.CosmosBatchOperationError(
+                error_index=index, headers={}, status_code=status, message="batch failed",
+                operation_responses=[]
+            )
+
+        if self.batches in self.fail_batches:
+            fail(0, 503)
+        for index, operation in enumerate(batch_operations):
+            kind, args = operation[0], operation[1]
+            options = operation[2] if len(operation) > 2 else {}
+            if kind == "patch":
+                doc = staged.get((partition_key, args[0]))
+                if doc is None:
+                    fail(index, 404)
+                for op in args[1]:
+                    key = op["path"].lstrip("/")
+                    doc[key] = doc.get(key, 0) + op["value"]
+            elif kind == "create":
+                if (partition_key, args[0]["id"]) in staged:
+                    fail(index, 409)
+                staged[(partition_key, args[0]["id"])] = dict(args[0])
+            elif kind == "replace":
+                current = staged.get((partition_key, args[0]))
+                if current is None or current["_etag"] != options.get("if_match_etag"):
+                    fail(index, 412)
+                staged[(partition_key, args[0])] = dict(args[1])
+        # All or nothing
+        for key, doc in staged.items():
+            if doc != self.docs.get(key):
+                doc["_etag"] = f"etag-{next(self.etags)}"
+        self.docs = staged
+
+def counters(store, day):
+    rollup = store.get_rollup(day) or {}
+    return {k: v for k, v in rollup.items() if not k.startswith("_") and k not in ("id", "kind", "day")}
+
+@pytest.fixture(params=["local", "cosmos"])
+def make_store(request, tmp_path):
+    def make(container=None):
+        if request.param == "local":
+            return LocalAggregateStore(str(tmp_path / "aggregates.json"))
+        return CosmosAggregateStore(container or FakeContainer())
+    return make
+
+def test_redelivery_is_a_no_op(make_store):
+    service = AggregateService(make_store())
+    assert service.apply(result_item())
+    assert not service.apply(result_item())
+    rollup = counters(service.store, "2024-05-01")
+    assert rollup["documents"] == 1 and rollup["validAFS"] == 1
+    assert rollup["processingMsTotal"] == 100.0
+
+def test_new_version_applies_difference(make_store):
+    service = AggregateService(make_store())
+    service.apply(result_item(valid=True))
+    service.apply(result_item(valid=False, ms=40.0))
+    rollup = counters(service.store, "2024-05-01")
+    assert rollup["documents"] == 1 and rollup["validAFS"] == 0
+    assert rollup["processingMsTotal"] == 40.0
+
+def test_moving_day_subtracts_from_old_day(make_store):
+    service = AggregateService(make_store())
+    service.apply(result_item(day="2024-05-01"))
+    service.apply(result_item(day="2024-05-02"))
+    assert counters(service.store, "2024-05-01")["documents"] == 0
+    assert counters(service.store, "2024-05-02")["documents"] == 1
+
+def test_rollup_and_ledger_written_in_one_batch():
+    container = FakeContainer()
+    service = AggregateService(CosmosAggregateStore(container))
+    # Enough counters to need more than one patch of 10 operations
+    item = result_item(**{f"has{chk.field_name}": True for chk in CHECKS})
+    service.apply(item)
+    assert container.batches == 2  # first attempt finds no rollup, second commits
+    kinds = [operation[0] for operation in container.last_batch]
+    assert kinds.count("patch") >= 2 and kinds[-1] == "create"
+    service.apply(result_item(item_id="doc-2"))
+    assert container.batches == 3
+    assert counters(service.store, "2024-05-01")["documents"] == 2
+
+def test_failure_part_way_through_does_not_double_count():
+    # Batches: 1-2 apply doc-1 on 05-01, 3 removes it from 05-01 and fails,
+    # so only the locator of 05-02 has been written
+    container = FakeContainer(fail_batches={3})
+    service = AggregateService(CosmosAggregateStore(container))
+    service.apply(result_item(day="2024-05-01"))
+
+    with pytest.raises(exceptions.CosmosBatchOperationError):
+        service.apply(result_item(day="2024-05-02"))
+    assert counters(service.store, "2024-05-01")["documents"] == 1
+
+    # Redelivered by the change feed, then delivered again
+    assert service.apply(result_item(day="2024-05-02"))
+    assert not service.apply(result_item(day="2024-05-02"))
+    assert counters(service.store, "2024-05-01")["documents"] == 0
+    assert counters(service.store, "2024-05-02")["documents"] == 1
+    assert counters(service.store, "2024-05-02")["validAFS"] == 1
+
+def test_failure_on_second_day_keeps_first_day_applied():
+    # The removal from 05-01 commits, then the add to 05-02 fails
+    container = FakeContainer(fail_batches={4})
+    service = AggregateService(CosmosAggregateStore(container))
+    service.apply(result_item(day="2024-05-01"))
+
+    with pytest.raises(exceptions.CosmosBatchOperationError):
+        service.apply(result_item(day="2024-05-02"))
+    assert counters(service.store, "2024-05-01")["documents"] == 0
+    assert counters(service.store, "2024-05-02") == {}
+
+    service.apply(result_item(day="2024-05-02"))
+    assert counters(service.store, "2024-05-01")["documents"] == 0
+    assert counters(service.store, "2024-05-02")["documents"] == 1
+
+class ConflictingStore(LocalAggregateStore):
+    """
+    Local store where another writer updates the ledger of `item_id` just
+    before each of its first `conflicts` commits.
+    """
+
+    def __init__(self, path, item_id, conflicts):
+        super().__init__(path)
+        self.item_id = item_id
+        self.conflicts = conflicts
+
+    def commit(self, day, item_id, increments, entry, previous):
+        if item_id == self.item_id and self.conflicts:
+            self.conflicts -= 1
+            super().commit(day, item_id, {} if previous else {"documents": 1}, {
+                "sourceEtag": f"other-{self.conflicts}", "counters": {"documents": 1}
+            }, previous)
+        super().commit(day, item_id, increments, entry, previous)
+
+def test_conflict_is_reapplied_without_failing_the_batch(tmp_path):
+    service = AggregateService(ConflictingStore(str(tmp_path / "a.json"), "doc-1", conflicts=2))
+
+    stats = service.apply_changes([result_item("doc-1"), result_item("doc-2")])
+
+    assert stats == {"received": 2, "applied": 2, "skipped": 0, "conflicts": 2}
+    # doc-1 counted once, on top of the concurrent writer's entry it replaced
+    assert counters(service.store, "2024-05-01")["documents"] == 2
+    assert counters(service.store, "2024-05-01")["validAFS"] == 2
+
+def test_persistent_conflict_fails_the_batch(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGGREGATE_CONFLICT_RETRIES", "2")
+    service = AggregateService(ConflictingStore(str(tmp_path / "a.json"), "doc-1", conflicts=10))
+
+    with pytest.raises(AggregateConflictError):
+        service.apply_changes([result_item("doc-1")])
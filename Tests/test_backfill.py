@@ -0,0 +1,74 @@
+"""
+Tests for the bulk sink checkpointing in tools/backfill.py.
+"""
+
+from azure.cosmos import exceptions
+from services.db_service import DbService
+from services.db_bulk_writer import BulkDbWriter
+from tools.backfill import Checkpoint, PendingWrites
+
+class FakeContainer:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.items = {}
+
+    def execute_item_batch(self, batch_operations, partition_key, response_hook=None):
+        if any(op[1][0]["documentName"] in self.fail for op in batch_operations):
+            raise exceptions.CosmosHttpResponseError(status_code=400, message="bad item")
+        for _, (item,) in batch_operations:
+            self.items[item["id"]] = item
+
+    def upsert_item(self, item, response_hook=None):
+        if item["documentName"] in self.fail:
+            raise exceptions.CosmosHttpResponseError(status_code=400, message="bad item")
+        self.items[item["id"]] = item
+
+def fake_item(document_name, data, content_hash=None):
+    return {"id": document_name, "documentName": document_name, "documentType": "afs", **data}
+
+def result(name, results=1):
+    return {
+        "documentName": name,
+        "status": "ok",
+        "error": None,
+        "results": [(name, {"n": i}, None) for i in range(results)],
+        "timings": {"totalMs": 1.0},
+    }
+
+def store(sink, pending, res):
+    pending.expect(res)
+    for document_name, data, doc_hash in res["results"]:
+        sink.store_results(document_name=document_name, data=data, content_hash=doc_hash)
+
+def test_documents_checkpointed_only_after_flush(tmp_path, monkeypatch):
+    monkeypatch.setattr(DbService, "build_item", staticmethod(fake_item))
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.jsonl"))
+    pending = PendingWrites(checkpoint)
+    sink = BulkDbWriter(container=FakeContainer(), flush_size=3, on_flush=pending.on_flush)
+
+    store(sink, pending, result("a.pdf"))
+    store(sink, pending, result("b.pdf"))
+    # Buffered, not written: an interrupted run must process them again
+    assert not checkpoint.is_done("a.pdf") and not checkpoint.is_done("b.pdf")
+
+    store(sink, pending, result("c.pdf"))
+    assert all(checkpoint.is_done(n) for n in ("a.pdf", "b.pdf", "c.pdf"))
+    checkpoint.close()
+
+def test_failed_writes_are_checkpointed_as_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(DbService, "build_item", staticmethod(fake_item))
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.jsonl"))
+    pending = PendingWrites(checkpoint)
+    sink = BulkDbWriter(container=FakeContainer(fail={"bad.pdf"}), flush_size=100,
+                        on_flush=pending.on_flush)
+
+    store(sink, pending, result("good.pdf"))
+    store(sink, pending, result("bad.pdf"))
+    sink.close()
+
+    assert checkpoint.is_done("good.pdf")
+    assert not checkpoint.is_done("bad.pdf")
+    assert pending.failed == 1
+    checkpoint.close()
+    # A restart retries the failed document
+    assert not Checkpoint(str(tmp_path / "checkpoint.jsonl")).is_done("bad.pdf")
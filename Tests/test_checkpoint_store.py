@@ -0,0 +1,127 @@
+"""
+Tests for services/checkpoint_store.py: the three backends, the key layout
+and clearing one document's checkpoints.
+"""
+
+import os
+from types import SimpleNamespace
+
+import pytest
+from azure.core.exceptions import ResourceNotFoundError
+from services.client_registry import registry
+from services.checkpoint_store import (
+    PIPELINE_VERSION,
+    BlobCheckpointStore,
+    CheckpointStore,
+    LocalCheckpointStore,
+    checkpoint_id,
+    content_hash,
+    get_checkpoint_store,
+)
+
+DOC_HASH = content_hash(b"%PDF-1.4 same bytes")
+
+class FakeContainer:
+    """
+    In-memory stand-in for a blob ContainerClient.
+    """
+
+    def __init__(self):
+        self.blobs = {}
+
+    def download_blob(self, name):
+        if name not in self.blobs:
+            raise ResourceNotFoundError("not found")
+        return SimpleNamespace(readall=lambda: self.blobs[name])
+
+    def upload_blob(self, name, data, overwrite=False):
+        assert overwrite
+        self.blobs[name] = data
+
+    def list_blobs(self, name_starts_with=""):
+        return [SimpleNamespace(name=n) for n in self.blobs if n.startswith(name_starts_with)]
+
+    def delete_blobs(self, *names):
+        for name in names:
+            del self.blobs[name]
+
+@pytest.fixture(params=["local", "blob"])
+def store(request, tmp_path):
+    if request.param == "local":
+        yield LocalCheckpointStore(str(tmp_path))
+        return
+    container = FakeContainer()
+    service = SimpleNamespace(get_container_client=lambda name: container)
+    with registry.overridden(blob=service):
+        yield BlobCheckpointStore("pipeline-checkpoints")
+
+def test_checkpoint_id_depends_on_name_and_content():
+    doc_id = checkpoint_id("a.pdf", DOC_HASH)
+
+    assert doc_id == checkpoint_id("a.pdf", DOC_HASH)
+    assert doc_id.startswith(f"{DOC_HASH}/")
+    assert doc_id != checkpoint_id("b.pdf", DOC_HASH)
+    assert doc_id != checkpoint_id("a.pdf", content_hash(b"other"))
+
+def test_key_layout():
+    key = CheckpointStore._key(checkpoint_id("a.pdf", DOC_HASH), "embeddings") # pylint: disable=protected-access
+
+    doc_hash, name_digest, version, stage = key.split("/")
+    assert doc_hash == DOC_HASH
+    assert len(name_digest) == 16
+    assert version == f"v{PIPELINE_VERSION}"
+    assert stage == "embeddings.json.gz"
+
+def test_round_trip(store): # pylint: disable=redefined-outer-name
+    doc_id = checkpoint_id("a.pdf", DOC_HASH)
+    value = {"method": "text", "pages": {"1": "Directors' declaration"}}
+
+    assert store.load(doc_id, "extraction") is None
+    store.save(doc_id, "extraction", value)
+
+    assert store.load(doc_id, "extraction") == value
+    assert store.load(doc_id, "checks") is None
+
+def test_clear_removes_only_that_document(store): # pylint: disable=redefined-outer-name
+    a, b = checkpoint_id("a.pdf", DOC_HASH), checkpoint_id("b.pdf", DOC_HASH)
+    for doc_id in (a, b):
+        store.save(doc_id, "extraction", {"doc": doc_id})
+        store.save(doc_id, "embeddings", [{"id": doc_id}])
+
+    store.clear(a)
+
+    assert store.load(a, "extraction") is None
+    assert store.load(a, "embeddings") is None
+    assert store.load(b, "extraction") == {"doc": b}
+    assert store.load(b, "embeddings") == [{"id": b}]
+
+def test_clear_without_checkpoints_is_harmless(store): # pylint: disable=redefined-outer-name
+    store.clear(checkpoint_id("never-saved.pdf", DOC_HASH))
+
+def test_broken_checkpoint_reads_as_missing(tmp_path):
+    store = LocalCheckpointStore(str(tmp_path))
+    doc_id = checkpoint_id("a.pdf", DOC_HASH)
+    path = os.path.join(str(tmp_path), *store._key(doc_id, "checks").split("/")) # pylint: disable=protected-access
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as fh:
+        fh.write(b"not gzip")
+
+    assert store.load(doc_id, "checks") is None
+
+def test_base_store_keeps_nothing():
+    store = CheckpointStore()
+    doc_id = checkpoint_id("a.pdf", DOC_HASH)
+
+    store.save(doc_id, "checks", {"hasProfitLoss": True})
+
+    assert store.load(doc_id, "checks") is None
+
+@pytest.mark.parametrize("backend, expected", [
+    ("local", LocalCheckpointStore),
+    ("none", CheckpointStore),
+])
+def test_backend_selection(monkeypatch, tmp_path, backend, expected):
+    monkeypatch.setenv("CHECKPOINT_BACKEND", backend)
+    monkeypatch.setenv("CHECKPOINT_DIR", str(tmp_path))
+
+    assert type(get_checkpoint_store()) is expected # pylint: disable=unidiomatic-typecheck
@@ -0,0 +1,81 @@
+"""
+Tests for services/rag_llm/chunk_filter.py.
+"""
+
+from services.rag_llm.chunk_filter import ChunkFilter
+from services.rag_llm.chunk_service import chunk_id
+
+DOC = "report.pdf"
+PARAGRAPH = ("The directors present their report on the company for the financial "
+             "year ended 30 June 2024 together with the audited financial statements.")
+
+def word_count(text):
+    return len(text.split())
+
+def make_chunks(*pages):
+    """
+    Builds chunks like `EmbeddingService.chunk_pages()` from (page, [texts]) pairs.
+    """
+    chunks = []
+    for page, texts in pages:
+        for seq, text in enumerate(texts):
+            chunks.append({"id": chunk_id(DOC, page, seq, text), "page": page,
+                           "text": text, "tokens": word_count(text)})
+    return chunks
+
+def make_filter(**kwargs):
+    settings = {"min_tokens": 5, "min_alpha": 0.3, "toc_share": 0.6, "dedupe": True}
+    settings.update(kwargs)
+    return ChunkFilter(word_count, max_tokens=60, **settings)
+
+def test_low_information_chunks_are_dropped():
+    toc = "Directors' report 2\nAuditor's report 5\nNotes to the accounts 9"
+    numbers = "2024 2023 1,204 3,411 (52) 17.5% 9,000 12,345"
+    chunks = make_chunks((1, [PARAGRAPH, toc, numbers, "   "]))
+    out, stats = make_filter().apply(chunks, DOC)
+    assert [c["text"] for c in out] == [PARAGRAPH]
+    assert stats["dropped"] == {"toc": 1, "low_alpha": 1, "empty": 1}
+
+def test_repeats_are_dropped_only_within_a_page():
+    quote = PARAGRAPH.upper().replace(" ", "  ")
+    chunks = make_chunks((1, [PARAGRAPH, quote]), (3, [PARAGRAPH]))
+    out, stats = make_filter().apply(chunks, DOC)
+    # The copy on page 3 is kept, so a citation of page 3 is still possible
+    assert [c["page"] for c in out] == [1, 3]
+    assert stats["dropped"] == {"duplicate": 1}
+
+    out, _ = make_filter(dedupe=False).apply(chunks, DOC)
+    assert len(out) == 3
+
+def test_short_chunks_merge_into_next_chunk_on_same_page():
+    chunks = make_chunks((1, ["DIRECTORS' REPORT", PARAGRAPH]), (2, ["NOTES", PARAGRAPH + " Notes."]))
+    out, stats = make_filter().apply(chunks, DOC)
+    assert [c["page"] for c in out] == [1, 2]
+    assert out[0]["text"] == "DIRECTORS' REPORT\n" + PARAGRAPH
+    assert out[0]["tokens"] == word_count(out[0]["text"])
+    assert out[0]["id"] == chunk_id(DOC, 1, 0, out[0]["text"])
+    assert stats["merged"] == 2
+
+def test_short_chunk_at_end_of_page_merges_into_previous():
+    chunks = make_chunks((1, [PARAGRAPH, "Signed: J Smith"]), (2, [PARAGRAPH + " Again."]))
+    out, _ = make_filter().apply(chunks, DOC)
+    assert out[0]["text"] == PARAGRAPH + "\nSigned: J Smith"
+    assert out[1]["page"] == 2
+
+def test_short_chunks_that_fit_nowhere_are_dropped():
+    chunks = make_chunks((1, ["Page one"]), (2, [PARAGRAPH]))
+    out, stats = make_filter().apply(chunks, DOC)
+    assert [c["page"] for c in out] == [2]
+    assert stats["dropped"] == {"short": 1}
+    assert stats["dropped_texts"] == [{"reason": "short", "page": 1, "text": "Page one"}]
+
+def test_stats_report():
+    chunks = make_chunks((1, ["COVER", "Annual report", PARAGRAPH, PARAGRAPH]))
+    out, stats = make_filter().apply(chunks, DOC)
+    tokens_in = sum(c["tokens"] for c in chunks)
+    tokens_out = sum(c["tokens"] for c in out)
+    assert stats["chunks_in"] == 4 and stats["chunks_out"] == len(out) == 1
+    assert stats["tokens_in"] == tokens_in and stats["tokens_out"] == tokens_out
+    assert stats["chunks_saved"] == 3 and stats["tokens_saved"] == tokens_in - tokens_out
+    assert stats["merged"] == 2 and stats["dropped"] == {"duplicate": 1}
+    assert [d["reason"] for d in stats["dropped_texts"]] == ["duplicate"]
@@ -0,0 +1,77 @@
+"""
+Tests for services/classification_service.py: the model artefact and what is
+reported when there is none.
+"""
+
+import logging
+
+import numpy as np
+from services.classification_service import (
+    ClassificationService,
+    HashingFeaturizer,
+    LinearClassifier,
+)
+
+AFS_TEXT = "Statement of profit or loss. Statement of financial position. Directors' declaration."
+OTHER_TEXT = "Tax invoice. Amount due 120.00. Thank you for your business."
+
+def make_model(threshold=0.5):
+    featurizer = HashingFeaturizer(n_features=2**12)
+    weights = np.zeros(featurizer.n_features, dtype=np.float32)
+    for text, sign in ((AFS_TEXT, 1.0), (OTHER_TEXT, -1.0)):
+        indices, values = featurizer.transform(text)
+        np.add.at(weights, indices, sign * 4.0 * values)
+    return LinearClassifier(weights, bias=0.0, featurizer=featurizer,
+                            threshold=threshold, version="test-1")
+
+class RecordingHandler(logging.Handler):
+    """
+    Keeps the records it is given.
+    """
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+def test_missing_model_leaves_the_document_unclassified(tmp_path):
+    # The service logger does not propagate to the root logger, so listen on it directly
+    handler = RecordingHandler()
+    logger = logging.getLogger("ClassificationService")
+    logger.addHandler(handler)
+    try:
+        service = ClassificationService(str(tmp_path / "missing.npz"))
+    finally:
+        logger.removeHandler(handler)
+
+    result = service.classify_document(AFS_TEXT)
+
+    assert result["is_valid_afs"] is None
+    assert result["afs_confidence"] is None
+    assert result["model_version"] is None
+    assert any("not be classified" in r.getMessage() for r in handler.records)
+
+def test_loaded_model_classifies(tmp_path):
+    path = str(tmp_path / "afs_classifier.npz")
+    make_model().save(path)
+
+    service = ClassificationService(path)
+
+    afs, other = service.classify_document(AFS_TEXT), service.classify_document(OTHER_TEXT)
+    assert afs["is_valid_afs"] is True and afs["afs_confidence"] > 0.5
+    assert other["is_valid_afs"] is False and other["afs_confidence"] < 0.5
+    assert afs["model_version"] == "test-1"
+
+def test_save_and_load_keep_the_weights_exactly(tmp_path):
+    model = make_model()
+    model.weights += np.float32(1e-4)  # values float16 cannot represent
+    path = str(tmp_path / "afs_classifier.npz")
+    model.save(path)
+
+    loaded = LinearClassifier.load(path)
+
+    assert loaded.weights.dtype == np.float32
+    np.testing.assert_array_equal(loaded.weights, model.weights)
+    assert loaded.predict_proba(AFS_TEXT) == model.predict_proba(AFS_TEXT)
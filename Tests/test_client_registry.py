@@ -0,0 +1,65 @@
+"""
+Tests for services/client_registry.py.
+"""
+
+from services.client_registry import ClientRegistry
+
+class FakeClient:
+    def __init__(self, key):
+        self.key = key
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+def make_registry(monkeypatch, grace=600):
+    monkeypatch.setenv("CLIENT_RETIRE_GRACE_SECONDS", str(grace))
+    monkeypatch.setenv("TEST_CLIENT_KEY", "one")
+    registry = ClientRegistry()
+    built = []
+
+    def factory():
+        import os
+        built.append(FakeClient(os.environ["TEST_CLIENT_KEY"]))
+        return built[-1]
+
+    registry.register("fake", factory, ("TEST_CLIENT_KEY",))
+    return registry, built
+
+def test_client_is_shared(monkeypatch):
+    registry, built = make_registry(monkeypatch)
+    assert registry.get("fake") is registry.get("fake")
+    assert len(built) == 1
+
+def test_recreate_keeps_old_client_open(monkeypatch):
+    registry, built = make_registry(monkeypatch)
+    old = registry.get("fake")
+
+    monkeypatch.setenv("TEST_CLIENT_KEY", "two")
+    new = registry.get("fake")
+
+    assert new is not old and new.key == "two"
+    # An invocation holding the old client can keep using it
+    assert not old.closed
+    assert registry.get("fake") is new
+
+    registry.reset()
+    assert old.closed and new.closed
+
+def test_retired_client_closed_after_grace(monkeypatch):
+    registry, built = make_registry(monkeypatch, grace=0)
+    first = registry.get("fake")
+    monkeypatch.setenv("TEST_CLIENT_KEY", "two")
+    second = registry.get("fake")
+    assert not second.closed
+
+    monkeypatch.setenv("TEST_CLIENT_KEY", "three")
+    registry.get("fake")
+    assert first.closed and second.closed
+
+def test_override_wins(monkeypatch):
+    registry, built = make_registry(monkeypatch)
+    fake = object()
+    with registry.overridden(fake=fake):
+        assert registry.get("fake") is fake
+    assert isinstance(registry.get("fake"), FakeClient)
@@ -0,0 +1,80 @@
+"""
+Tests for services/db_service.py: deterministic item ids and partial
+document updates split into Cosmos DB sized batches.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from services.client_registry import registry
+from services.db_models import DEFAULT_DOCUMENT_TYPE
+from services.db_service import MAX_PATCH_OPERATIONS, DbService, document_id
+
+SHA_A = "a" * 64
+SHA_B = "b" * 64
+
+class FakeContainer:
+    """
+    Records patch_item calls and returns the patched paths.
+    """
+
+    def __init__(self):
+        self.patches = []
+
+    def patch_item(self, item, partition_key, patch_operations):
+        self.patches.append({"item": item, "partition_key": partition_key,
+                             "operations": patch_operations})
+        return {"id": item, "paths": [op["path"] for op in patch_operations]}
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("COSMOS_ACCOUNT_URI", "https://cosmos.invalid")
+    monkeypatch.setenv("COSMOS_DATABASE_NAME", "results")
+    monkeypatch.setenv("COSMOS_CONTAINER_NAME", "documents")
+    container = FakeContainer()
+    database = SimpleNamespace(get_container_client=lambda name: container)
+    client = SimpleNamespace(get_database_client=lambda name: database)
+    with registry.overridden(cosmos=client):
+        yield DbService()
+
+def test_document_id_is_stable():
+    assert document_id("a.pdf", SHA_A) == document_id("a.pdf", SHA_A)
+
+@pytest.mark.parametrize("name, content_hash", [
+    ("b.pdf", SHA_A),
+    ("a.pdf", SHA_B),
+    ("a.pdf", None),
+])
+def test_document_id_changes_with_name_or_hash(name, content_hash):
+    assert document_id(name, content_hash) != document_id("a.pdf", SHA_A)
+
+def test_build_item_uses_the_document_id():
+    item = DbService.build_item("a.pdf", {"isPDF": True, "blobUrl": "https://x/a.pdf"}, SHA_A)
+
+    assert item["id"] == document_id("a.pdf", SHA_A)
+    assert item["documentType"] == DEFAULT_DOCUMENT_TYPE
+
+def test_patch_is_split_into_batches_of_ten(service): # pylint: disable=redefined-outer-name
+    fields = {
+        "pageCount": 12, "extractionMethod": "text", "isValidAFS": True,
+        "afsConfidence": 0.93, "hasABN": True, "ABN": "51824753556",
+        "hasProfitLoss": True, "profitLossPages": [3], "hasBalanceSheet": True,
+        "balanceSheetPages": [4], "hasCashFlow": False, "processingMs": 812.5,
+    }
+
+    result = service.patch_results("a.pdf", SHA_A, fields)
+
+    patches = service.container.patches
+    # The fields plus the timestamp, at most ten operations per call
+    assert [len(p["operations"]) for p in patches] == [MAX_PATCH_OPERATIONS, 3]
+    assert {p["item"] for p in patches} == {document_id("a.pdf", SHA_A)}
+    assert {p["partition_key"] for p in patches} == {DEFAULT_DOCUMENT_TYPE}
+    paths = [op["path"] for p in patches for op in p["operations"]]
+    assert sorted(paths) == sorted([f"/{name}" for name in fields] + ["/timestamp"])
+    assert result["paths"] == [op["path"] for op in patches[-1]["operations"]]
+
+def test_patch_of_an_identifying_field_is_rejected(service): # pylint: disable=redefined-outer-name
+    with pytest.raises(ValueError):
+        service.patch_results("a.pdf", SHA_A, {"documentName": "b.pdf"})
+
+    assert service.container.patches == []
@@ -0,0 +1,120 @@
+"""
+Smoke test of the ProcessPDF pipeline: a few synthetic documents run through
+the benchmark harness with every external service faked.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+import services.rag_llm.chunk_service as chunk_service
+from services.rag_llm.embedding_cache import get_embedding_cache
+from tools.benchmark import __main__ as bench
+
+@pytest.fixture
+def bench_env(monkeypatch):
+    # run() writes these into os.environ; setting them here restores them afterwards
+    for key, value in {**bench.BENCH_ENV, **bench.FORCED_ENV}.items():
+        monkeypatch.setenv(key, value)
+    monkeypatch.setenv("EMBEDDING_CACHE", "false")
+    # The tokenizer files are downloaded on first use; keep the test offline
+    monkeypatch.setattr(chunk_service, "get_encoding",
+                        lambda model: SimpleNamespace(encode=lambda text: text.split()))
+    get_embedding_cache.cache_clear()
+    yield
+    get_embedding_cache.cache_clear()
+
+def _args(**overrides):
+    args = dict(docs=4, seed=7, workers=1, warmup=0, scanned_rate=0.25,
+                latency=None, error_rate=None, trace_memory=False, quiet=True)
+    args.update(overrides)
+    return SimpleNamespace(**args)
+
+def test_documents_run_end_to_end(bench_env): # pylint: disable=unused-argument,redefined-outer-name
+    results = bench.run(_args())
+
+    assert results["documents"] == 4
+    assert results["errors"] == 0
+    assert results["document"]["count"] == 4
+    assert results["stages"], "no pipeline stages were recorded"
+    # Every document reached the fakes: embeddings were requested and results stored
+    assert results["fakes"]["embeddings"]["calls"] > 0
+    assert results["fakes"]["cosmos"]["calls"] >= 4
+
+def test_results_compare_cleanly_against_themselves(bench_env): # pylint: disable=unused-argument,redefined-outer-name
+    results = bench.run(_args(docs=2, workers=2))
+
+    assert bench.compare(results, results, tolerance=0.15, floor_ms=1.0) == []
+
+class FlakySink:
+    """
+    Result sink that fails the first write of the given documents.
+    """
+
+    def __init__(self, fail_once=()):
+        self.fail_once = set(fail_once)
+        self.results = {}
+
+    def store_results(self, document_name, data, content_hash):
+        if document_name in self.fail_once:
+            self.fail_once.discard(document_name)
+            raise RuntimeError("Cosmos DB unavailable")
+        self.results[document_name] = data
+
+def test_same_content_under_two_names_keeps_both_indexes(bench_env, tmp_path): # pylint: disable=unused-argument,redefined-outer-name
+    # pylint: disable=import-outside-toplevel
+    from services.client_registry import registry
+    from services.checkpoint_store import LocalCheckpointStore
+    from services.pipeline import DocumentPipeline
+    from tools.benchmark import corpus
+
+    doc = next(corpus.generate(1, seed=3, scanned_rate=0.0))
+    fakes = bench.build_fakes({}, {}, 3, {doc.content_hash: doc})
+    search = fakes["clients"]["search"]
+    sink = FlakySink(fail_once={"a.pdf"})
+    pipeline = DocumentPipeline(sink=sink, checkpoints=LocalCheckpointStore(str(tmp_path)))
+
+    def chunks_of(name):
+        return {k for k, d in search.documents.items() if d["documentName"] == name}
+
+    with registry.overridden(**fakes["clients"]):
+        # The first attempt of a.pdf fails after indexing and keeps its checkpoints
+        with pytest.raises(RuntimeError):
+            pipeline.process("a.pdf", "https://bench.invalid/a.pdf", doc.pdf_bytes)
+        pipeline.process("b.pdf", "https://bench.invalid/b.pdf", doc.pdf_bytes)
+        a_chunks, b_chunks = chunks_of("a.pdf"), chunks_of("b.pdf")
+        # The retry of a.pdf resumes from its own checkpoints
+        pipeline.process("a.pdf", "https://bench.invalid/a.pdf", doc.pdf_bytes)
+
+    assert a_chunks and b_chunks
+    assert not a_chunks & b_chunks
+    assert chunks_of("a.pdf") == a_chunks
+    assert chunks_of("b.pdf") == b_chunks
+    assert set(sink.results) == {"a.pdf", "b.pdf"}
+
+def test_failed_checks_are_not_checkpointed(bench_env, tmp_path): # pylint: disable=unused-argument,redefined-outer-name
+    # pylint: disable=import-outside-toplevel
+    from services.client_registry import registry
+    from services.checkpoint_store import LocalCheckpointStore, checkpoint_id, content_hash
+    from services.pipeline import DocumentPipeline
+    from tools.benchmark import corpus
+
+    doc = next(corpus.generate(1, seed=3, scanned_rate=0.0))
+    fakes = bench.build_fakes({}, {"chat": "1.0"}, 3, {doc.content_hash: doc})
+    store = LocalCheckpointStore(str(tmp_path))
+    sink = FlakySink(fail_once={"a.pdf"})
+    pipeline = DocumentPipeline(sink=sink, checkpoints=store)
+    doc_id = checkpoint_id("a.pdf", content_hash(doc.pdf_bytes))
+
+    with registry.overridden(**fakes["clients"]):
+        with pytest.raises(RuntimeError):
+            pipeline.process("a.pdf", "https://bench.invalid/a.pdf", doc.pdf_bytes)
+        # Indexing completed, but the answers of the failed chat calls are not kept
+        assert store.load(doc_id, "embeddings") is not None
+        assert store.load(doc_id, "checks") is None
+
+        # The retry asks again once the chat deployment recovers
+        fakes["models"]["chat"].error_rate = 0.0
+        pipeline.process("a.pdf", "https://bench.invalid/a.pdf", doc.pdf_bytes)
+
+    assert any(value is True for key, value in sink.results["a.pdf"].items()
+               if key.startswith("has") and key != "hasABN")
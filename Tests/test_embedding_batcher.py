@@ -0,0 +1,165 @@
+"""
+Tests for services/rag_llm/embedding_batcher.py and how EmbeddingService
+handles the batcher's failures.
+"""
+
+import threading
+from contextlib import ExitStack
+from functools import partial
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from services.client_registry import registry
+from services.logger import Logger
+from services.rag_llm.embedding_batcher import EmbeddingBatcher
+from services.rag_llm.embedding_service import EmbeddingService, request_timeout
+
+class FakeEmbeddings:
+    """
+    Returns one vector per input text ([len(text)]) and records each request.
+    """
+
+    def __init__(self, error=None, drop=0, hang=None):
+        self.error = error
+        self.drop = drop
+        self.hang = hang
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def create(self, model, input, **kwargs): # pylint: disable=redefined-builtin
+        with self.lock:
+            self.requests.append(list(input))
+        if self.hang is not None:
+            self.hang.wait()
+        if self.error is not None:
+            raise self.error
+        data = [SimpleNamespace(embedding=[float(len(text))]) for text in input]
+        return SimpleNamespace(data=data[:len(data) - self.drop])
+
+@pytest.fixture
+def fake_openai():
+    with ExitStack() as stack:
+        def install(**kwargs):
+            embeddings = FakeEmbeddings(**kwargs)
+            stack.enter_context(registry.overridden(openai=SimpleNamespace(embeddings=embeddings)))
+            return embeddings
+        yield install
+
+def make_batcher(**kwargs):
+    settings = {"max_batch": 20, "max_tokens": 100000, "window_ms": 100, "concurrency": 2}
+    settings.update(kwargs)
+    return EmbeddingBatcher("embedding-model", **settings)
+
+def test_concurrent_submissions_are_coalesced(fake_openai):
+    embeddings = fake_openai()
+    batcher = make_batcher(window_ms=200)
+    results = {}
+
+    def submit(name, texts):
+        results[name] = [f.result(timeout=5) for f in batcher.submit(texts, [1] * len(texts))]
+
+    threads = [threading.Thread(target=submit, args=(f"doc{i}", [f"doc{i} chunk {j}" for j in range(3)]))
+               for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close(timeout=5)
+
+    assert len(embeddings.requests) == 1 and len(embeddings.requests[0]) == 9
+    assert results["doc1"] == [[float(len(f"doc1 chunk {j}"))] for j in range(3)]
+    assert batcher.stats["requests"] == 1 and batcher.stats["texts"] == 9
+
+def test_identical_texts_are_sent_once(fake_openai):
+    embeddings = fake_openai()
+    batcher = make_batcher()
+    futures = batcher.submit(["same", "same", "other"], [1, 1, 1])
+    assert [f.result(timeout=5) for f in futures] == [[4.0], [4.0], [5.0]]
+    batcher.close(timeout=5)
+    assert embeddings.requests == [["same", "other"]]
+    assert batcher.stats["sent"] == 2
+
+def test_requests_split_at_max_batch(fake_openai):
+    embeddings = fake_openai()
+    batcher = make_batcher(max_batch=4)
+    futures = batcher.submit([f"text {i}" for i in range(10)], [1] * 10)
+    [f.result(timeout=5) for f in futures]
+    batcher.close(timeout=5)
+    assert sorted(len(r) for r in embeddings.requests) == [2, 4, 4]
+    assert batcher.stats["full"] == 2
+
+def test_requests_split_at_max_tokens(fake_openai):
+    embeddings = fake_openai()
+    batcher = make_batcher(max_tokens=100)
+    futures = batcher.submit([f"text {i}" for i in range(5)], [40, 40, 40, 90, 10])
+    [f.result(timeout=5) for f in futures]
+    batcher.close(timeout=5)
+    # 40+40 fits, 40+90 does not, 90+10 fits
+    assert [len(r) for r in embeddings.requests] == [2, 1, 2]
+
+@pytest.mark.parametrize("kwargs, error", [
+    ({"error": RuntimeError("deployment not found")}, RuntimeError),
+    ({"drop": 1}, ValueError),
+])
+def test_failure_is_set_on_every_waiting_future(fake_openai, kwargs, error):
+    fake_openai(**kwargs)
+    batcher = make_batcher(window_ms=200)
+    first = batcher.submit(["a", "b"], [1, 1])
+    second = batcher.submit(["c"], [1])
+    for future in first + second:
+        with pytest.raises(error):
+            future.result(timeout=5)
+    batcher.close(timeout=5)
+    assert batcher.stats["failed"] == 1
+    # Every future carries the same exception object
+    assert len({id(f.exception()) for f in first + second}) == 1
+
+def test_embedding_service_counts_each_failed_request_once(fake_openai):
+    fake_openai(drop=1)
+    service = SimpleNamespace(
+        batcher=make_batcher(max_batch=2),
+        logger=Logger.get_logger("EmbeddingServiceTest"),
+        wait_timeout=5,
+        _remember=lambda fresh: None,
+    )
+    misses = [(f"key{i}", {"text": f"text {i}", "tokens": 1}) for i in range(4)]
+    vectors = {}
+    failed = EmbeddingService._embed_batched(service, "doc.pdf", misses, vectors)
+    service.batcher.close(timeout=5)
+    assert failed == 2 and vectors == {}
+
+def test_embedding_service_sends_timed_out_chunks_directly(fake_openai):
+    hang = threading.Event()
+    hung = fake_openai(hang=hang)
+    direct = FakeEmbeddings()
+    service = SimpleNamespace(
+        batcher=make_batcher(max_batch=2, window_ms=10),
+        logger=Logger.get_logger("EmbeddingServiceTest"),
+        wait_timeout=0.2,
+        batch_size=3,
+        oaiclient=SimpleNamespace(embeddings=direct),
+        deployment_name="embedding-model",
+        dimensions=None,
+        _remember=lambda fresh: None,
+    )
+    service._embed_direct = partial(EmbeddingService._embed_direct, service) # pylint: disable=protected-access
+    misses = [(f"key{i}", {"text": f"text {i}", "tokens": 1}) for i in range(4)]
+    vectors = {}
+    try:
+        failed = EmbeddingService._embed_batched(service, "doc.pdf", misses, vectors)
+    finally:
+        hang.set()
+        service.batcher.close(timeout=5)
+
+    assert failed == 0
+    assert vectors == {f"key{i}": [float(len(f"text {i}"))] for i in range(4)}
+    assert hung.requests and direct.requests == [["text 0", "text 1", "text 2"], ["text 3"]]
+
+@pytest.mark.parametrize("client, expected", [
+    (SimpleNamespace(timeout=30.0, max_retries=2), 90.0),
+    (SimpleNamespace(timeout=httpx.Timeout(60.0, connect=5.0), max_retries=0), 65.0),
+    (SimpleNamespace(embeddings=None), 1800.0),
+])
+def test_request_timeout_allows_for_every_attempt(client, expected):
+    assert request_timeout(client) == expected
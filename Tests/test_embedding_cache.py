@@ -0,0 +1,115 @@
+"""
+Tests for services/rag_llm/embedding_cache.py.
+"""
+
+import numpy as np
+import pytest
+from services.rag_llm.embedding_cache import EmbeddingCache, _on_network_filesystem, cache_key
+
+DIMENSIONS = 64
+
+def _vector(seed):
+    return np.random.default_rng(seed).uniform(-1, 1, DIMENSIONS).tolist()
+
+@pytest.fixture
+def make_cache(tmp_path):
+    caches = []
+
+    def make(max_bytes=2**20, dtype="float16", name="cache.sqlite3"):
+        cache = EmbeddingCache(str(tmp_path / name), max_bytes=max_bytes, dtype=dtype)
+        caches.append(cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        cache.close()
+
+def test_cache_key_ignores_layout_but_not_model_or_dimensions():
+    key = cache_key("Directors'  declaration\n", "embed", 256)
+    assert key == cache_key("Directors' declaration", "embed", 256)
+    assert key != cache_key("directors' declaration", "embed", 256)
+    assert key != cache_key("Directors' declaration", "other", 256)
+    assert key != cache_key("Directors' declaration", "embed", None)
+
+def test_round_trip_float32_is_exact(make_cache):
+    cache = make_cache(dtype="float32")
+    vectors = {f"k{i}": _vector(i) for i in range(5)}
+    cache.put_many(vectors)
+
+    found = cache.get_many(list(vectors) + ["missing"])
+
+    assert set(found) == set(vectors)
+    for key, vector in vectors.items():
+        assert found[key] == np.asarray(vector, dtype=np.float32).tolist()
+    assert (cache.hits, cache.misses) == (5, 1)
+
+def test_round_trip_survives_reopen(make_cache):
+    make_cache(name="shared.sqlite3").put_many({"k": _vector(1)})
+
+    reopened = make_cache(name="shared.sqlite3")
+
+    assert list(reopened.get_many(["k"])) == ["k"]
+
+def test_float16_is_within_tolerance(make_cache):
+    cache = make_cache(dtype="float16")
+    vector = _vector(7)
+    cache.put_many({"k": vector})
+
+    restored = np.asarray(cache.get_many(["k"])["k"])
+
+    # float16 keeps ~3 significant digits; cosine similarity is unaffected
+    np.testing.assert_allclose(restored, vector, rtol=1e-3, atol=1e-3)
+    cosine = restored @ np.asarray(vector) / (np.linalg.norm(restored) * np.linalg.norm(vector))
+    assert cosine > 0.99999
+
+def test_eviction_drops_least_recently_used(make_cache, monkeypatch):
+    entry = DIMENSIONS * 2  # float16 bytes per vector
+    cache = make_cache(max_bytes=entry * 10)
+    clock = iter(range(1000))
+    monkeypatch.setattr("services.rag_llm.embedding_cache.time.time", lambda: next(clock))
+
+    for i in range(10):
+        cache.put_many({f"k{i}": _vector(i)})
+    cache.get_many(["k0", "k1"])  # refresh the two oldest
+    cache.put_many({"k10": _vector(10)})
+
+    found = cache.get_many([f"k{i}" for i in range(11)])
+    # Over budget by one entry: evicted down to 90%, i.e. the two least recently used
+    assert "k2" not in found and "k3" not in found
+    assert {"k0", "k1", "k10"} <= set(found)
+    assert len(found) == 9
+    assert cache._size <= cache.max_bytes * 0.9 # pylint: disable=protected-access
+
+MOUNTS = """\
+/dev/sda1 / ext4 rw,relatime 0 0
+tmpfs /tmp tmpfs rw 0 0
+//account.file.core.windows.net/cache /mnt/cache cifs rw,vers=3.0 0 0
+server:/export /mnt/nfs\\040share nfs4 rw 0 0
+"""
+
+@pytest.mark.parametrize("path, network", [
+    ("/tmp/embedding-cache.sqlite3", False),
+    ("/home/site/cache.sqlite3", False),
+    ("/mnt/cache/embedding-cache.sqlite3", True),
+    ("/mnt/cache/sub/dir/cache.sqlite3", True),
+    ("/mnt/cachefile.sqlite3", False),
+    ("/mnt/nfs share/cache.sqlite3", True),
+])
+def test_network_filesystem_detection(tmp_path, path, network):
+    mounts = tmp_path / "mounts"
+    mounts.write_text(MOUNTS)
+
+    assert _on_network_filesystem(path, str(mounts)) is network
+
+def test_network_mount_uses_the_rollback_journal(make_cache, monkeypatch):
+    monkeypatch.setattr("services.rag_llm.embedding_cache._on_network_filesystem", lambda path: True)
+    cache = make_cache(dtype="float32")
+
+    assert cache._db.execute("PRAGMA journal_mode").fetchone()[0] == "delete" # pylint: disable=protected-access
+    cache.put_many({"k": _vector(1)})
+    assert list(cache.get_many(["k"])) == ["k"]
+
+def test_local_disk_uses_wal(make_cache):
+    cache = make_cache()
+
+    assert cache._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal" # pylint: disable=protected-access
@@ -0,0 +1,69 @@
+"""
+Tests for services/rag_llm/index_maintenance.py.
+"""
+
+import datetime
+from types import SimpleNamespace
+
+import pytest
+from services.rag_llm.index_maintenance import IndexMaintenance
+
+class FakeSearchClient:
+    """
+    Returns the given keys for any query and records searches and deletes.
+    """
+
+    def __init__(self, keys=(), fail_keys=()):
+        self.keys = list(keys)
+        self.fail_keys = set(fail_keys)
+        self.searches = []
+        self.deletes = []
+
+    def search(self, search_text=None, filter=None, select=None, top=None, **_): # pylint: disable=redefined-builtin
+        self.searches.append({"filter": filter, "select": select, "top": top})
+        keys = self.keys[:top] if top else self.keys
+        return iter({"id": key} for key in keys)
+
+    def delete_documents(self, documents):
+        self.deletes.append([d["id"] for d in documents])
+        return [SimpleNamespace(key=d["id"], succeeded=d["id"] not in self.fail_keys)
+                for d in documents]
+
+def test_purge_document_escapes_quotes_in_the_filter():
+    client = FakeSearchClient(keys=["k1"])
+
+    IndexMaintenance(client).purge_document("O'Brien's report.pdf")
+
+    assert client.searches[0]["filter"] == "documentName eq 'O''Brien''s report.pdf'"
+    assert client.searches[0]["select"] == ["id"]
+
+def test_purge_document_deletes_in_batches_of_1000():
+    keys = [f"k{i}" for i in range(2500)]
+    client = FakeSearchClient(keys=keys, fail_keys={"k7"})
+
+    deleted = IndexMaintenance(client).purge_document("a.pdf")
+
+    assert [len(batch) for batch in client.deletes] == [1000, 1000, 500]
+    assert [key for batch in client.deletes for key in batch] == keys
+    # Only successful deletes are counted
+    assert deleted == 2499
+
+def test_purge_document_without_chunks_sends_no_delete():
+    client = FakeSearchClient()
+
+    assert IndexMaintenance(client).purge_document("a.pdf") == 0
+    assert client.deletes == []
+
+@pytest.mark.parametrize("expired, more", [(5, True), (3, True), (2, False), (0, False)])
+def test_purge_expired_reports_more_when_the_limit_is_reached(monkeypatch, expired, more):
+    monkeypatch.setenv("INDEX_RETENTION_DAYS", "30")
+    monkeypatch.setenv("INDEX_GC_MAX_DELETES", "3")
+    client = FakeSearchClient(keys=[f"k{i}" for i in range(expired)])
+
+    stats = IndexMaintenance(client).purge_expired(now=datetime.datetime(2024, 3, 31, 12))
+
+    assert stats["cutoff"] == "2024-03-01T12:00:00"
+    assert client.searches[0]["filter"] == "createdAt lt '2024-03-01T12:00:00'"
+    assert client.searches[0]["top"] == 3
+    assert stats["deleted"] == min(expired, 3)
+    assert stats["more"] is more
@@ -0,0 +1,102 @@
+"""
+Tests for services/logger.py: the queue handler is attached under a host
+that already has a root handler, and records reach that handler once, from
+the listener thread, with their invocation id.
+"""
+
+import logging
+import logging.handlers
+import threading
+import uuid
+from types import SimpleNamespace
+
+import pytest
+import services.logger as logger_module
+from services.logger import Logger, bind_invocation_context, stop_logging
+
+class HostHandler(logging.Handler):
+    """
+    Stands in for the Functions host's root handler: records each message
+    with the thread it was emitted on and the invocation id it sees there.
+    """
+
+    def __init__(self, storage=None):
+        super().__init__()
+        self.storage = storage
+        self.emitted = []
+
+    def emit(self, record):
+        self.emitted.append((
+            record.getMessage(),
+            threading.current_thread().name,
+            getattr(self.storage, "invocation_id", None),
+        ))
+
+@pytest.fixture
+def host(monkeypatch):
+    monkeypatch.setenv("LOG_ASYNC", "true")
+    storage = threading.local()
+    handler = HostHandler(storage)
+    root = logging.getLogger()
+    root.addHandler(handler)
+    names = []
+
+    def get_logger():
+        name = f"test-{uuid.uuid4().hex[:8]}"
+        names.append(name)
+        return Logger.get_logger(name, level=logging.INFO)
+
+    yield SimpleNamespace(handler=handler, storage=storage, get_logger=get_logger)
+
+    root.removeHandler(handler)
+    monkeypatch.setattr(logger_module, "_INVOCATION_STORAGE", None)
+    for name in names:
+        logger = logging.getLogger(name)
+        logger.handlers.clear()
+        logger.propagate = True
+        logger_module._TARGETS.pop(name, None) # pylint: disable=protected-access
+        logger_module._ROOT_TARGETS.discard(name) # pylint: disable=protected-access
+
+def _flush():
+    # Stopping the listener drains the queue; the next logger restarts it
+    stop_logging()
+    logger_module._ensure_listener() # pylint: disable=protected-access
+
+def test_queue_handler_attached_when_root_has_a_handler(host): # pylint: disable=redefined-outer-name
+    logger = host.get_logger()
+
+    assert any(isinstance(h, logging.handlers.QueueHandler) for h in logger.handlers)
+    # No console handler of our own; records are handed to the root's handlers
+    assert logger_module._TARGETS[logger.name] == [] # pylint: disable=protected-access
+    assert logger.propagate is False
+
+def test_records_reach_the_root_handler_once_from_the_listener(host): # pylint: disable=redefined-outer-name
+    logger = host.get_logger()
+
+    logger.info("processed %s", "a.pdf")
+    _flush()
+
+    assert len(host.handler.emitted) == 1
+    message, thread, _ = host.handler.emitted[0]
+    assert message == "processed a.pdf"
+    assert thread != threading.current_thread().name
+
+def test_invocation_id_is_restored_on_the_listener(host): # pylint: disable=redefined-outer-name
+    bind_invocation_context(SimpleNamespace(thread_local_storage=host.storage))
+    logger = host.get_logger()
+
+    host.storage.invocation_id = "inv-1"
+    logger.info("first")
+    host.storage.invocation_id = "inv-2"
+    logger.warning("second")
+    _flush()
+
+    assert [(m, inv) for m, _, inv in host.handler.emitted] == [("first", "inv-1"), ("second", "inv-2")]
+
+def test_get_logger_twice_attaches_one_queue_handler(host): # pylint: disable=redefined-outer-name
+    logger = host.get_logger()
+
+    again = Logger.get_logger(logger.name)
+
+    assert again is logger
+    assert sum(isinstance(h, logging.handlers.QueueHandler) for h in logger.handlers) == 1
@@ -0,0 +1,62 @@
+"""
+Tests for Models/Classification: the record stream and training on a toy
+labelled corpus.
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "Models", "Classification"))
+
+# pylint: disable=wrong-import-position
+import train as training
+from model import HashingFeaturizer, OnlineLogisticRegression
+
+AFS_WORDS = ("statement of financial position", "profit or loss", "total equity",
+             "independent auditor's report", "directors' declaration", "retained earnings",
+             "notes to the financial statements", "cash flows from operating activities",
+             "comprehensive income", "accounting policies")
+OTHER_WORDS = ("tax invoice", "receipt", "thank you for your order", "quantity", "unit price",
+               "delivery address", "menu", "boarding pass", "gate closes", "subtotal")
+
+def write_corpus(root, per_label=120, seed=1):
+    rng = random.Random(seed)
+    for label, words in (("afs", AFS_WORDS), ("other", OTHER_WORDS)):
+        os.makedirs(root / label)
+        for i in range(per_label):
+            # Shared filler words, so single words do not decide the label
+            text = " ".join(rng.choice(words + ("the", "and", "2024", "page", "total"))
+                            for _ in range(40))
+            (root / label / f"{label}-{i:04d}.txt").write_text(text, encoding="utf-8")
+
+def test_directory_labels_are_interleaved(tmp_path):
+    write_corpus(tmp_path, per_label=5)
+    labels = [label for *_, label in training.iter_records(str(tmp_path))]
+    assert labels == [1, 0] * 5
+
+def test_shuffled_is_a_seeded_permutation():
+    items = list(range(1000))
+    first = list(training.shuffled(items, buffer_size=64, seed=3))
+    assert sorted(first) == items and first != items
+    assert first == list(training.shuffled(items, buffer_size=64, seed=3))
+    assert list(training.shuffled(items, buffer_size=0)) == items
+
+def test_shuffle_mixes_a_sorted_stream():
+    # A run of one label shorter than the buffer is spread from the start
+    stream = [1] * 300 + [0] * 300
+    head = list(training.shuffled(stream, buffer_size=400, seed=0))[:100]
+    assert 20 < sum(head) < 95
+
+@pytest.mark.parametrize("shuffle_buffer", [0, 256])
+def test_training_on_toy_corpus(tmp_path, shuffle_buffer):
+    write_corpus(tmp_path)
+    featurizer = HashingFeaturizer(n_features=2**14, ngram_max=2, max_chars=5000)
+    model = OnlineLogisticRegression(featurizer.n_features, learning_rate=0.5)
+    stats = training.train(str(tmp_path), featurizer, model, epochs=3, batch_size=16,
+                           holdout=0.25, workers=2, shuffle_buffer=shuffle_buffer)
+    assert stats["holdout"]["count"] > 20
+    assert stats["holdout"]["accuracy"] >= 0.9
@@ -0,0 +1,82 @@
+"""
+Tests for services/rag_llm/page_normaliser.py: which header and footer lines
+are stripped before chunking and which are kept.
+"""
+
+from services.rag_llm.page_normaliser import PageNormaliser
+
+HEADER = "Acme Holdings Pty Ltd ABN 51 824 753 556"
+
+def _page(number, body, header=HEADER, total=5):
+    return "\n".join([header, "Notes to the financial statements", *body,
+                      f"Page {number} of {total}"]) + "\n"
+
+WORDS = ["revenue", "expenses", "assets", "liabilities", "equity", "cash", "tax"]
+
+def _document(pages=5):
+    # Body lines differ in words, not only in digits, so they never match
+    return {n: _page(n, [f"Note on {WORDS[n]}.", f"Balance of {WORDS[n - 1]}.",
+                         f"Movement in {WORDS[n + 1]}."], total=pages)
+            for n in range(1, pages + 1)}
+
+def test_repeated_lines_are_removed_with_digits_masked():
+    pages = _document()
+
+    result = PageNormaliser(min_share=0.5, edge_lines=3, keep_first=False).normalise(pages)
+
+    for number, page in result.items():
+        assert HEADER not in page.text
+        assert "Notes to the financial statements" not in page.text
+        # The page footers differ only in their number
+        assert f"Page {number} of 5" not in page.text
+        assert f"Balance of {WORDS[number - 1]}." in page.text
+        assert f"Page {number} of 5" in page.removed
+
+def test_keep_first_keeps_the_first_occurrence():
+    pages = _document()
+
+    result = PageNormaliser(min_share=0.5, edge_lines=3, keep_first=True).normalise(pages)
+
+    assert result[1].text == pages[1]
+    assert result[1].removed == []
+    for number in range(2, 6):
+        assert HEADER not in result[number].text
+        assert f"Page {number} of 5" not in result[number].text
+
+def test_line_on_a_minority_of_pages_is_kept():
+    pages = _document()
+    for number in (1, 2):
+        pages[number] = _page(number, ["Body."], header="Directors' report")
+
+    result = PageNormaliser(min_share=0.5, edge_lines=3, keep_first=False).normalise(pages)
+
+    assert "Directors' report" in result[1].text
+    assert "Directors' report" in result[2].text
+    assert HEADER not in result[3].text
+
+def test_line_outside_the_edge_zone_is_kept():
+    middle = "Refer to note 2 for the basis of preparation."
+    pages = {n: _page(n, [f"{WORDS[(n + i) % 7]} line" for i in range(3)] + [middle]
+                      + [f"{WORDS[(n + i) % 7]} total" for i in range(3, 6)])
+             for n in range(1, 6)}
+
+    result = PageNormaliser(min_share=0.5, edge_lines=3, keep_first=False).normalise(pages)
+
+    for page in result.values():
+        assert middle in page.text
+        assert HEADER not in page.text
+
+def test_single_page_document_is_unchanged():
+    pages = {1: _page(1, ["Only page."], total=1)}
+
+    result = PageNormaliser(min_share=0.5, edge_lines=3).normalise(pages)
+
+    assert result[1].text == pages[1]
+    assert result[1].removed == []
+
+def test_pages_without_repeats_are_unchanged():
+    pages = {n: f"Heading {chr(64 + n)}\nText of page {chr(64 + n)}.\n" for n in range(1, 5)}
+
+    result = PageNormaliser(min_share=0.5, edge_lines=3).normalise(pages)
+
+    assert {n: p.text for n, p in result.items()} == pages
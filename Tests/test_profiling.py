@@ -0,0 +1,44 @@
+"""
+Tests for services/profiling.py: the CPU profiler falls back to the sampler
+when cProfile cannot be enabled.
+"""
+
+import cProfile
+import time
+
+from services.profiling import CpuProfiler
+
+class BusyProfile:
+    """
+    cProfile.Profile as on Python 3.12+ when another profiler is active.
+    """
+
+    def enable(self):
+        raise ValueError("Another profiling tool is already active")
+
+    def disable(self):
+        raise AssertionError("a profile that was never enabled was disabled")
+
+def test_cprofile_falls_back_to_the_sampler_when_busy(monkeypatch):
+    monkeypatch.setattr(cProfile, "Profile", BusyProfile)
+    profiler = CpuProfiler("a.pdf", mode="cprofile", interval_ms=1.0)
+
+    profiler.start()
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        pass
+    profiler.stop()
+
+    assert profiler.mode == "sampler"
+    assert profiler.elapsed_ms > 0
+    assert profiler.collapsed(), "the sampler recorded no stacks"
+
+def test_cprofile_mode_profiles_calls():
+    profiler = CpuProfiler("a.pdf", mode="cprofile")
+
+    profiler.start()
+    sorted(range(1000), key=lambda n: -n)
+    profiler.stop()
+
+    assert profiler.mode == "cprofile"
+    assert any("<lambda>" in line for line in profiler.collapsed())
@@ -0,0 +1,122 @@
+"""
+Tests for services/signature_service.py: rendering jobs, a broken or hung
+render pool and a failing detector.
+"""
+
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from services.signature_service import SignatureService, _render_pages
+from tools.benchmark.pdf_writer import build_pdf
+
+PAGES = {
+    1: "Directors' report",
+    2: "Independent Auditor's Report to the members",
+    3: "Signed in Sydney on 12 March 2024. Partner, Chartered Accountants",
+}
+
+class FakeProcess:
+    def __init__(self):
+        self.terminated = False
+
+    def terminate(self):
+        self.terminated = True
+
+class FakePool:
+    """
+    Records submitted jobs; the first `broken` submissions fail like a pool
+    whose worker died, and the next `hung` never complete.
+    """
+
+    def __init__(self, broken=0, hung=0):
+        self.broken = broken
+        self.hung = hung
+        self.jobs = []
+        self.shut_down = False
+        self._processes = {1: FakeProcess()}
+
+    def submit(self, fn, pdf_bytes, page_numbers, dpi):
+        self.jobs.append(list(page_numbers))
+        future = Future()
+        if self.broken:
+            self.broken -= 1
+            future.set_exception(BrokenProcessPool("worker died"))
+        elif self.hung:
+            self.hung -= 1
+        else:
+            future.set_result({page: np.full((10, 10), 255, dtype=np.uint8) for page in page_numbers})
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+def make_service(monkeypatch, pools, detector=lambda image, page, text: 0.9):
+    service = SignatureService(detector=detector)
+    started = []
+
+    def executor():
+        if SignatureService._pool is None:
+            SignatureService._pool = pools[len(started)]
+            started.append(SignatureService._pool)
+        return SignatureService._pool
+
+    monkeypatch.setattr(SignatureService, "_pool", None)
+    monkeypatch.setattr(service, "_executor", executor)
+    return service, started
+
+def test_one_render_job_per_document(monkeypatch):
+    pool = FakePool()
+    service, _ = make_service(monkeypatch, [pool])
+    result = service.detect("hash", b"%PDF", PAGES)
+    assert result["hasAuditorSignature"] is True
+    assert len(pool.jobs) == 1 and sorted(pool.jobs[0]) == [2, 3]
+
+    # Cached renders are not sent again
+    service.detect("hash", b"%PDF", PAGES)
+    assert len(pool.jobs) == 1
+
+def test_broken_pool_is_replaced_and_retried(monkeypatch):
+    broken, fresh = FakePool(broken=1), FakePool()
+    service, started = make_service(monkeypatch, [broken, fresh])
+    result = service.detect("hash", b"%PDF", PAGES)
+    assert result["hasAuditorSignature"] is True
+    assert started == [broken, fresh] and broken.shut_down
+    assert SignatureService._pool is fresh
+
+def test_pool_broken_twice_skips_detection(monkeypatch):
+    service, _ = make_service(monkeypatch, [FakePool(broken=1), FakePool(broken=1)])
+    result = service.detect("hash", b"%PDF", PAGES)
+    assert result == {"hasAuditorSignature": None, "auditorSignaturePages": None}
+    assert SignatureService._pool is None
+
+def test_hung_render_times_out_and_is_retried(monkeypatch):
+    monkeypatch.setenv("SIGNATURE_RENDER_TIMEOUT", "0.01")
+    hung, fresh = FakePool(hung=1), FakePool()
+    service, started = make_service(monkeypatch, [hung, fresh])
+    result = service.detect("hash", b"%PDF", PAGES)
+    assert result["hasAuditorSignature"] is True
+    assert started == [hung, fresh] and hung.shut_down
+    # The hung worker is stopped, not left rendering
+    assert hung._processes[1].terminated
+    assert not fresh._processes[1].terminated
+
+def test_render_hung_twice_skips_detection(monkeypatch):
+    monkeypatch.setenv("SIGNATURE_RENDER_TIMEOUT", "0.01")
+    service, _ = make_service(monkeypatch, [FakePool(hung=1), FakePool(hung=1)])
+    result = service.detect("hash", b"%PDF", PAGES)
+    assert result == {"hasAuditorSignature": None, "auditorSignaturePages": None}
+
+def test_detector_failure_skips_detection(monkeypatch):
+    def detector(image, page, text):
+        raise ValueError("unexpected image shape")
+
+    service, _ = make_service(monkeypatch, [FakePool()], detector=detector)
+    result = service.detect("hash", b"%PDF", PAGES)
+    assert result == {"hasAuditorSignature": None, "auditorSignaturePages": None}
+
+def test_render_pages_renders_requested_pages():
+    pdf = build_pdf([["Page one"], ["Page two"], ["Page three"]])
+    images = _render_pages(pdf, [1, 3], dpi=36)
+    assert sorted(images) == [1, 3]
+    assert all(image.ndim == 2 and image.dtype == np.uint8 for image in images.values())
@@ -0,0 +1,50 @@
+#!/bin/bash
+
+# Stop on first error
+set -euo pipefail
+
+# Bash script to retrain the AFS document classifier
+# Trains on a labelled export, checks the held-out accuracy and installs the
+# artefact into the function app (AzureFunctions/models), ready to publish.
+#
+# Usage: bash infra/retrain_pipeline.sh <labelled JSONL or directory> [train.py options]
+#   MODEL_OUT     Where to install the artefact (default: AzureFunctions/models/afs_classifier.npz)
+#   MIN_ACCURACY  Held-out accuracy required to install it (default: 0.95)
+#   WARM_START    Continue from this artefact instead of training from scratch
+
+DATA="${1:?Usage: bash infra/retrain_pipeline.sh <labelled JSONL or directory> [train.py options]}"
+shift
+MODEL_OUT="${MODEL_OUT:-AzureFunctions/models/afs_classifier.npz}"
+MIN_ACCURACY="${MIN_ACCURACY:-0.95}"
+WORK_DIR="$(mktemp -d)"
+CANDIDATE="${WORK_DIR}/afs_classifier.npz"
+trap 'rm -rf "$WORK_DIR"' EXIT
+
+EXTRA_ARGS=("$@")
+if [[ -n "${WARM_START:-}" ]]; then
+    EXTRA_ARGS+=(--warm-start "$WARM_START")
+fi
+
+echo "Installing training requirements"
+python -m pip install --quiet -r Models/Classification/requirements.txt
+
+echo "Training classifier on ${DATA}"
+python Models/Classification/train.py --data "$DATA" --out "$CANDIDATE" "${EXTRA_ARGS[@]}"
+
+echo "Checking held-out accuracy (minimum ${MIN_ACCURACY})"
+python - "$CANDIDATE" "$MIN_ACCURACY" <<'PY'
+import json
+import sys
+import numpy as np
+
+with np.load(sys.argv[1]) as artefact:
+    holdout = json.loads(str(artefact["metrics"]))["holdout"]
+accuracy = holdout.get("accuracy")
+print(f"Held-out documents: {holdout.get('count', 0)}, accuracy: {accuracy}")
+if accuracy is None or accuracy < float(sys.argv[2]):
+    sys.exit("Held-out accuracy is below the minimum; the model was not installed.")
+PY
+
+mkdir -p "$(dirname "$MODEL_OUT")"
+cp "$CANDIDATE" "$MODEL_OUT"
+echo "Model installed at ${MODEL_OUT}; publish the function app to deploy it."
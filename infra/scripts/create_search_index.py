@@ -1,10 +1,65 @@
 """
 infra/scripts/create_search_index.py
+Creates, updates and migrates the chunk search index.
+
+The vector field's settings decide most of the index size and query latency:
+
+    - `--dimensions`: text-embedding-3 models can return shorter vectors
+      (e.g. 512 or 1024 instead of 1536). Set AZURE_OPENAI_EMBEDDING_DIMENSIONS
+      in the function app to the same value.
+    - `--compression scalar|binary`: keeps int8 (4x smaller) or 1-bit (32x
+      smaller) vectors in the HNSW graph. `--oversampling` fetches more
+      candidates, which are re-ranked with the full-precision vectors.
+    - `--no-stored-vectors`: the full-precision vectors are not kept for
+      retrieval (the function never reads them back), removing their copy.
+    - `--m`, `--ef-construction`, `--ef-search`: HNSW graph parameters.
+
+Use infra/scripts/evaluate_index.py to measure the recall and latency of a
+setting before applying it.
+
+Without flags the script creates the index, or updates it in place when it
+exists. Only efSearch can change in place; dimensions, compression, storage,
+m, efConstruction and the metric are fixed when the index is created. For
+those, create a new index with `--migrate-from <current index>`. The chunks
+are copied across (vectors are truncated or re-embedded as needed) and the
+current index is left untouched until SEARCH_INDEX is switched over. The
+switch-over is only suggested once both indexes report the same number of
+documents.
+`--recreate` deletes and recreates the index instead, losing its documents.
+
+Usage:
+------
+    # Create or update the index named by SEARCH_INDEX
+    python infra/scripts/create_search_index.py
+
+    # New, compressed index with the existing chunks copied in
+    python infra/scripts/create_search_index.py --index chunks-v2 --dimensions 512 \\
+        --compression scalar --no-stored-vectors --migrate-from chunks
+
+    # Print the index definition without calling the service
+    python infra/scripts/create_search_index.py --compression binary --dry-run
+
+Functions:
+--------
+    build_index(): Returns the index definition for the given settings.
+    check_compatible(): Lists the settings that cannot change in place.
+    read_all(): Streams every matching document of an index.
+    migrate(): Copies the chunks of one index into another.
+    verify_counts(): Waits for two indexes to report the same document count.
+    main(): Command-line entry point.
 """
 
 import os
+import sys
+import json
+import math
+import time
+import argparse
+from typing import Iterator, List, Optional
 from dotenv import load_dotenv
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError
+from azure.search.documents import SearchClient
 from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.indexes.models import (
     SearchIndex,
@@ -15,55 +70,397 @@ from azure.search.documents.indexes.models import (
     VectorSearch,
     VectorSearchProfile,
     HnswAlgorithmConfiguration,
+    HnswParameters,
+    ScalarQuantizationCompression,
+    ScalarQuantizationParameters,
+    BinaryQuantizationCompression,
 )
 
-# Load environment variables from .env file
-load_dotenv()
-endpoint = os.environ["SEARCH_ENDPOINT"]
-admin_key = os.environ["SEARCH_ADMIN_KEY"]
-index_name = os.environ["SEARCH_INDEX"]
-
-client = SearchIndexClient(endpoint, credential=AzureKeyCredential(admin_key))
-
-# 1) Delete existing index if it exists
-if index_name in client.list_index_names():
-    client.delete_index(index_name)  # Deletes the index and all its documents :contentReference[oaicite:2]{index=2}
-
-# 2) Define fields and VectorSearch exactly as before
-fields = [
-    SimpleField(name="id",            type=SearchFieldDataType.String, key=True),
-    SimpleField(name="documentName",  type=SearchFieldDataType.String, filterable=True),
-    SimpleField(name="createdAt",     type=SearchFieldDataType.String, filterable=True),
-    SimpleField(name="page",          type=SearchFieldDataType.Int32,  filterable=True, sortable=True), # added sortable=True
-    SimpleField(name="tokens",       type=SearchFieldDataType.Int32,  filterable=True, sortable=True), # added
-    SearchableField(name="chunkText", type=SearchFieldDataType.String),
-    SearchField(
-        name="embedding",
-        type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
-        searchable=True,
-        vector_search_dimensions=1536,
-        vector_search_profile_name="hnsw-config",
-    )
-]
+PROFILE_NAME = "hnsw-config"
+ALGORITHM_NAME = "hnsw-config"
+COMPRESSION_NAME = "vector-compression"
+VECTOR_FIELD = "embedding"
+CHUNK_FIELDS = ["id", "documentName", "createdAt", "page", "tokens", "chunkText"]
 
-vector_search = VectorSearch(
-    profiles=[
-        VectorSearchProfile(
-            name="hnsw-config",
-            algorithm_configuration_name="hnsw-config"
+def build_index(name: str,
+                dimensions: int = 1536,
+                m: int = 4,
+                ef_construction: int = 400,
+                ef_search: int = 500,
+                metric: str = "cosine",
+                compression: str = "none",
+                oversampling: Optional[float] = None,
+                rerank: bool = True,
+                stored_vectors: bool = True) -> SearchIndex:
+    """
+    Returns the index definition for the given settings.
+
+    Args:
+        name (str): Index name.
+        dimensions (int): Vector length.
+        m (int): HNSW links per node.
+        ef_construction (int): HNSW candidate list size at build time.
+        ef_search (int): HNSW candidate list size at query time.
+        metric (str): "cosine", "dotProduct" or "euclidean".
+        compression (str): "none", "scalar" (int8) or "binary".
+        oversampling (float, optional): Candidates fetched per result before
+            re-ranking with full-precision vectors (compressed indexes only).
+        rerank (bool): Re-rank compressed results with the full-precision vectors.
+        stored_vectors (bool): Keep a retrievable copy of the vectors.
+
+    Returns:
+        SearchIndex: The index definition.
+    """
+    fields = [
+        # Filterable and sortable so the index can be read in key order
+        SimpleField(name="id",            type=SearchFieldDataType.String, key=True,
+                    filterable=True, sortable=True),
+        SimpleField(name="documentName",  type=SearchFieldDataType.String, filterable=True),
+        SimpleField(name="createdAt",     type=SearchFieldDataType.String, filterable=True),
+        SimpleField(name="page",          type=SearchFieldDataType.Int32,  filterable=True, sortable=True),
+        SimpleField(name="tokens",        type=SearchFieldDataType.Int32,  filterable=True, sortable=True),
+        SearchableField(name="chunkText", type=SearchFieldDataType.String),
+        SearchField(
+            name=VECTOR_FIELD,
+            type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
+            searchable=True,
+            # Non-stored vectors cannot be returned, so they must not be retrievable
+            hidden=not stored_vectors,
+            stored=stored_vectors,
+            vector_search_dimensions=dimensions,
+            vector_search_profile_name=PROFILE_NAME,
         )
-    ],
-    algorithms=[
-        HnswAlgorithmConfiguration(name="hnsw-config")
-        ]
+    ]
+
+    compressions = []
+    if compression == "scalar":
+        compressions.append(ScalarQuantizationCompression(
+            compression_name=COMPRESSION_NAME,
+            rerank_with_original_vectors=rerank,
+            default_oversampling=oversampling,
+            parameters=ScalarQuantizationParameters(quantized_data_type="int8")
+        ))
+    elif compression == "binary":
+        compressions.append(BinaryQuantizationCompression(
+            compression_name=COMPRESSION_NAME,
+            rerank_with_original_vectors=rerank,
+            default_oversampling=oversampling
+        ))
+
+    vector_search = VectorSearch(
+        profiles=[
+            VectorSearchProfile(
+                name=PROFILE_NAME,
+                algorithm_configuration_name=ALGORITHM_NAME,
+                compression_name=COMPRESSION_NAME if compressions else None
+            )
+        ],
+        algorithms=[
+            HnswAlgorithmConfiguration(
+                name=ALGORITHM_NAME,
+                parameters=HnswParameters(
+                    m=m, ef_construction=ef_construction, ef_search=ef_search, metric=metric
+                )
+            )
+        ],
+        compressions=compressions or None
     )
 
-index = SearchIndex(
-    name=index_name,
-    fields=fields,
-    vector_search=vector_search
-)
+    return SearchIndex(name=name, fields=fields, vector_search=vector_search)
+
+def _vector_settings(index: SearchIndex) -> dict:
+    """
+    Returns the settings of an index's vector field that are fixed at creation.
+    """
+    field = next(f for f in index.fields if f.name == VECTOR_FIELD)
+    search = index.vector_search
+    profile = next(p for p in search.profiles if p.name == field.vector_search_profile_name)
+    algorithm = next(a for a in search.algorithms if a.name == profile.algorithm_configuration_name)
+    compression = next(
+        (c for c in (search.compressions or []) if c.compression_name == profile.compression_name),
+        None
+    )
+    params = algorithm.parameters or HnswParameters()
+    return {
+        "dimensions": field.vector_search_dimensions,
+        "stored": field.stored is not False,
+        "compression": str(getattr(compression, "kind", None) or "none"),
+        "m": params.m,
+        "efConstruction": params.ef_construction,
+        # The service returns enum members, definitions may hold plain strings
+        "metric": str(getattr(params.metric, "value", params.metric) or "cosine"),
+    }
+
+def check_compatible(existing: SearchIndex, wanted: SearchIndex) -> List[str]:
+    """
+    Lists the settings that differ between two definitions and cannot change
+    in place.
+
+    Args:
+        existing (SearchIndex): The index as it is on the service.
+        wanted (SearchIndex): The requested definition.
+
+    Returns:
+        list[str]: "setting: current -> requested" entries; empty if the
+                   index can be updated in place.
+    """
+    current, requested = _vector_settings(existing), _vector_settings(wanted)
+    return [
+        f"{key}: {current[key]} -> {requested[key]}"
+        for key in requested
+        if str(current[key]).lower() != str(requested[key]).lower()
+    ]
+
+def read_all(client: SearchClient, select: List[str], odata_filter: str = None,
+             page_size: int = 1000) -> Iterator[dict]:
+    """
+    Streams every matching document of an index.
+
+    The service will not skip past 100,000 results, so documents are read in
+    key order, each request continuing after the last id seen. Indexes
+    created before the key field was filterable and sortable are read one
+    `page` value at a time instead.
+
+    Args:
+        client (SearchClient): Index to read.
+        select (list[str]): Fields to return.
+        odata_filter (str, optional): OData filter the documents must match.
+        page_size (int): Documents per request (at most 1000).
+
+    Yields:
+        dict: Each matching document.
+
+    Raises:
+        RuntimeError: If an older index holds more than 100,000 matching
+                      documents with the same `page` value.
+    """
+    last = None
+    while True:
+        clauses = [f"({odata_filter})"] if odata_filter else []
+        if last is not None:
+            escaped = last.replace("'", "''")
+            clauses.append(f"id gt '{escaped}'")
+        try:
+            results = list(client.search(
+                search_text="*", select=select, filter=" and ".join(clauses) or None,
+                order_by=["id asc"], top=page_size
+            ))
+        except HttpResponseError:
+            if last is not None:
+                raise
+            # The key field is not filterable and sortable
+            yield from _read_by_page(client, select, odata_filter)
+            return
+        if not results:
+            return
+        yield from results
+        last = results[-1]["id"]
+
+def _read_by_page(client: SearchClient, select: List[str],
+                  odata_filter: str = None) -> Iterator[dict]:
+    """
+    Streams the matching documents of an index one `page` value at a time,
+    up to the highest page in the index.
+    """
+    top = next(iter(client.search(search_text="*", select=["page"], order_by=["page desc"],
+                                  top=1)), None)
+    last_page = (top or {}).get("page") or 0
+    for page in range(0, last_page + 1):
+        clause = f"page eq {page}" + (f" and ({odata_filter})" if odata_filter else "")
+        results = client.search(search_text="*", select=select, filter=clause,
+                                include_total_count=True)
+        if results.get_count() > 100000:
+            raise RuntimeError(
+                f"Page {page} has more than 100,000 documents; the index cannot be read in full"
+            )
+        yield from results
+
+def verify_counts(source: SearchClient, target: SearchClient, timeout: float = 120) -> tuple:
+    """
+    Waits for the target index to report as many documents as the source.
+    Document counts lag behind uploads by a few seconds.
+
+    Args:
+        source (SearchClient): Index copied from.
+        target (SearchClient): Index copied into.
+        timeout (float): Seconds to wait for the counts to match.
+
+    Returns:
+        tuple[int, int]: The source and target counts at the last check.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        counts = source.get_document_count(), target.get_document_count()
+        if counts[0] == counts[1] or time.monotonic() >= deadline:
+            return counts
+        time.sleep(5)
+
+def _fit_vector(vector: List[float], dimensions: int) -> List[float]:
+    """
+    Shortens a text-embedding-3 vector to `dimensions` (the model's embeddings
+    can be truncated and re-normalised, which is what the API does for
+    shorter vectors).
+    """
+    vector = vector[:dimensions]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+def migrate(source: SearchClient, target: SearchClient, dimensions: int,
+            batch_size: int = 500) -> dict:
+    """
+    Copies the chunks of one index into another.
+
+    Vectors are reused when the source returns them and is at least as long
+    as the target (longer ones are truncated); otherwise the chunk texts are
+    embedded again with the AZURE_OPENAI_* settings.
+
+    Args:
+        source (SearchClient): Index to copy from (not modified).
+        target (SearchClient): Index to copy into.
+        dimensions (int): Vector length of the target.
+        batch_size (int): Documents per upload.
+
+    Returns:
+        dict: Counts of copied, re-embedded and failed chunks.
+    """
+    stats = {"copied": 0, "reembedded": 0, "failed": 0}
+    embedder = None
+    batch: List[dict] = []
+
+    def flush():
+        nonlocal embedder
+        missing = [d for d in batch if len(d.get(VECTOR_FIELD) or []) < dimensions]
+        if missing:
+            if embedder is None:
+                from openai import AzureOpenAI # pylint: disable=import-outside-toplevel
+                embedder = AzureOpenAI(
+                    api_key=os.environ["AZURE_OPENAI_API_KEY"],
+                    api_version=os.environ["AZURE_OPENAI_API_VERSION"],
+                    azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"]
+                )
+            for i in range(0, len(missing), 16):
+                group = missing[i:i + 16]
+                resp = embedder.embeddings.create(
+                    model=os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"],
+                    input=[d["chunkText"] for d in group],
+                    dimensions=dimensions
+                )
+                for doc, item in zip(group, resp.data):
+                    doc[VECTOR_FIELD] = item.embedding
+            stats["reembedded"] += len(missing)
+        for doc in batch:
+            doc[VECTOR_FIELD] = _fit_vector(doc[VECTOR_FIELD], dimensions)
+        results = target.merge_or_upload_documents(batch)
+        failed = sum(1 for r in results if not r.succeeded)
+        stats["failed"] += failed
+        stats["copied"] += len(batch) - failed
+        print(f"Copied {stats['copied']} chunk(s)", flush=True)
+        batch.clear()
+
+    with_vectors = True
+    try:
+        # Fails on indexes whose vectors are not retrievable
+        next(iter(source.search(search_text="*", select=[VECTOR_FIELD], top=1)), None)
+    except Exception: # pylint: disable=broad-except
+        with_vectors = False
+        print("Source vectors are not retrievable; chunks will be re-embedded.", flush=True)
+
+    select = CHUNK_FIELDS + ([VECTOR_FIELD] if with_vectors else [])
+    for chunk in read_all(source, select):
+        batch.append({key: chunk.get(key) for key in CHUNK_FIELDS + [VECTOR_FIELD]})
+        if len(batch) == batch_size:
+            flush()
+    if batch:
+        flush()
+    return stats
+
+def main(argv=None) -> int:
+    """
+    Command-line entry point.
+    """
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Create, update or migrate the chunk search index.")
+    parser.add_argument("--index", default=os.environ.get("SEARCH_INDEX"),
+                        help="Index to create or update (default: SEARCH_INDEX).")
+    parser.add_argument("--dimensions", type=int,
+                        default=int(os.environ.get("AZURE_OPENAI_EMBEDDING_DIMENSIONS") or 1536))
+    parser.add_argument("--m", type=int, default=4)
+    parser.add_argument("--ef-construction", type=int, default=400)
+    parser.add_argument("--ef-search", type=int, default=500)
+    parser.add_argument("--metric", default="cosine", choices=["cosine", "dotProduct", "euclidean"])
+    parser.add_argument("--compression", default="none", choices=["none", "scalar", "binary"])
+    parser.add_argument("--oversampling", type=float,
+                        help="Default oversampling of compressed queries (e.g. 4 for binary).")
+    parser.add_argument("--no-rerank", action="store_true",
+                        help="Do not re-rank compressed results with full-precision vectors.")
+    parser.add_argument("--no-stored-vectors", action="store_true",
+                        help="Do not keep a retrievable copy of the vectors.")
+    parser.add_argument("--migrate-from", help="Copy the chunks of this index into the new one.")
+    parser.add_argument("--recreate", action="store_true",
+                        help="Delete and recreate the index (its documents are lost).")
+    parser.add_argument("--dry-run", action="store_true", help="Print the definition and exit.")
+    args = parser.parse_args(argv)
+
+    if not args.index:
+        parser.error("--index or SEARCH_INDEX is required")
+    if args.migrate_from == args.index:
+        parser.error("--migrate-from must name a different index")
+
+    index = build_index(
+        args.index, dimensions=args.dimensions, m=args.m, ef_construction=args.ef_construction,
+        ef_search=args.ef_search, metric=args.metric, compression=args.compression,
+        oversampling=args.oversampling, rerank=not args.no_rerank,
+        stored_vectors=not args.no_stored_vectors
+    )
+    if args.dry_run:
+        print(json.dumps(index.serialize(keep_readonly=False), indent=2))
+        return 0
+
+    endpoint = os.environ["SEARCH_ENDPOINT"]
+    credential = AzureKeyCredential(os.environ["SEARCH_ADMIN_KEY"])
+    client = SearchIndexClient(endpoint, credential=credential)
+
+    exists = args.index in client.list_index_names()
+    if exists and args.recreate:
+        client.delete_index(args.index)
+        print(f"Index '{args.index}' deleted.")
+    elif exists:
+        existing = client.get_index(args.index)
+        changes = check_compatible(existing, index)
+        # The attributes of the key field cannot change in place either
+        index.fields[0] = next(f for f in existing.fields if f.key)
+        if changes:
+            print(f"Index '{args.index}' cannot be updated in place:", file=sys.stderr)
+            for change in changes:
+                print(f"  {change}", file=sys.stderr)
+            print("Create a new index with --migrate-from, or use --recreate.", file=sys.stderr)
+            return 2
+
+    client.create_or_update_index(index)
+    print(f"Index '{args.index}' is ready.")
+
+    if args.migrate_from:
+        stats = migrate(
+            SearchClient(endpoint, args.migrate_from, credential),
+            SearchClient(endpoint, args.index, credential),
+            args.dimensions
+        )
+        print(json.dumps(stats))
+        if stats["failed"]:
+            return 1
+        source_count, target_count = verify_counts(
+            SearchClient(endpoint, args.migrate_from, credential),
+            SearchClient(endpoint, args.index, credential)
+        )
+        if source_count != target_count:
+            print(f"Index '{args.index}' holds {target_count} chunk(s) but '{args.migrate_from}' "
+                  f"holds {source_count}; do not switch over.", file=sys.stderr)
+            return 1
+        print(f"Both indexes hold {target_count} chunk(s).")
+        print(f"Set SEARCH_INDEX={args.index} (and AZURE_OPENAI_EMBEDDING_DIMENSIONS="
+              f"{args.dimensions}) in the function app to switch over.")
+        return 0
+    return 0
 
-client = SearchIndexClient(endpoint, credential=AzureKeyCredential(admin_key))
-client.create_or_update_index(index)
-print(f"Index '{index_name}' is ready.")
+if __name__ == "__main__":
+    sys.exit(main())
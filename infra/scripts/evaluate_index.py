@@ -0,0 +1,386 @@
+"""
+infra/scripts/evaluate_index.py
+Measures the recall and latency of vector index settings on a sample of chunks.
+
+The evaluator compares approximate top-k results with exact top-k results
+from brute-force NumPy search over the same sample:
+
+    - Offline, for every combination of `--dimensions`, `--compression` and
+      `--oversampling`, it simulates what the service stores: shortened
+      text-embedding-3 vectors (truncated and re-normalised), int8 scalar or
+      1-bit binary quantisation, and re-ranking of the oversampled candidates
+      with the full-precision vectors. It reports recall@k, vector bytes and
+      NumPy query time. No service calls are needed.
+    - Live, for every `--index`, it runs the same queries against the
+      service and reports recall@k against the exact results, with p50/p95
+      latency. This covers the HNSW graph approximation, which is not simulated.
+
+By default each query is scoped to its own document, like the function's
+checks (`documentName eq ...`). `--scope global` searches the whole sample,
+which stresses the index harder; for live runs this is only meaningful if
+the sample holds the whole index. Query vectors are chunk vectors from the
+sample, and each query's own chunk is excluded from both result lists.
+
+Usage:
+------
+    # Export a sample (the source index must keep retrievable vectors)
+    python infra/scripts/evaluate_index.py --export-from chunks --documents 200 \\
+        --save sample.npz
+
+    # Offline comparison of settings
+    python infra/scripts/evaluate_index.py --sample sample.npz \\
+        --dimensions 1536,1024,512 --compression none,scalar,binary --oversampling 1,4
+
+    # Live recall and latency of two indexes holding the same chunks
+    python infra/scripts/evaluate_index.py --sample sample.npz --index chunks,chunks-v2
+
+Classes:
+--------
+    Sample: Chunk vectors with their ids and documents.
+
+Functions:
+--------
+    export_sample(): Reads whole documents' chunks and vectors from an index.
+    load_sample(): Loads a sample saved by `--save`.
+    exact_top_k(): Returns exact top-k neighbours by cosine similarity.
+    simulate(): Returns top-k neighbours under simulated index settings.
+    evaluate_offline(): Scores simulated settings against exact search.
+    evaluate_live(): Scores live indexes against exact search.
+    main(): Command-line entry point.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Dict, List
+import numpy as np
+from dotenv import load_dotenv
+
+# Bits per value for each compression, as stored in the vector index
+BITS = {"none": 32, "scalar": 8, "binary": 1}
+
+class Sample:
+    """
+    Chunk vectors with their ids and documents.
+
+    Attributes
+    ----------
+        ids (np.ndarray): Chunk ids.
+        documents (np.ndarray): Document name of each chunk.
+        vectors (np.ndarray): Unit-length float32 vectors, one row per chunk.
+    """
+
+    def __init__(self, ids, documents, vectors):
+        self.ids = np.asarray(ids)
+        self.documents = np.asarray(documents)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def save(self, path: str):
+        """
+        Writes the sample as a compressed `.npz` file.
+        """
+        np.savez_compressed(path, ids=self.ids, documents=self.documents, vectors=self.vectors)
+
+    def candidates(self, query: int, scope: str) -> np.ndarray:
+        """
+        Returns the rows a query searches, without the query's own chunk.
+        """
+        if scope == "document":
+            rows = np.flatnonzero(self.documents == self.documents[query])
+        else:
+            rows = np.arange(len(self.ids))
+        return rows[rows != query]
+
+def export_sample(client, documents: int, seed: int = 0) -> Sample:
+    """
+    Reads whole documents' chunks and vectors from an index.
+
+    Args:
+        client (SearchClient): Client of an index with retrievable vectors.
+        documents (int): Number of documents to export (chosen at random).
+        seed (int): Random seed.
+
+    Returns:
+        Sample: The exported chunks.
+    """
+    # Reads past the service's 100,000 result limit (same folder as this script)
+    from create_search_index import read_all # pylint: disable=import-outside-toplevel
+
+    names = sorted({r["documentName"] for r in read_all(client, ["id", "documentName"])})
+    rng = np.random.default_rng(seed)
+    chosen = rng.choice(names, size=min(documents, len(names)), replace=False)
+    ids, docs, vectors = [], [], []
+    for name in chosen:
+        escaped = name.replace("'", "''")
+        for r in read_all(client, ["id", "documentName", "embedding"],
+                          f"documentName eq '{escaped}'"):
+            ids.append(r["id"])
+            docs.append(r["documentName"])
+            vectors.append(r["embedding"])
+    print(f"Exported {len(ids)} chunk(s) from {len(chosen)} document(s)", flush=True)
+    return Sample(ids, docs, vectors)
+
+def load_sample(path: str) -> Sample:
+    """
+    Loads a sample saved by `--save`.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        return Sample(data["ids"], data["documents"], data["vectors"])
+
+def _shorten(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    """
+    Truncates vectors to `dimensions` and re-normalises them, as the
+    text-embedding-3 API does for shorter embeddings.
+    """
+    short = vectors[:, :dimensions]
+    return short / np.maximum(np.linalg.norm(short, axis=1, keepdims=True), 1e-12)
+
+def _top(scores: np.ndarray, rows: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the `k` rows with the highest scores, best first.
+    """
+    k = min(k, len(rows))
+    best = np.argpartition(-scores, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+    return rows[best[np.argsort(-scores[best], kind="stable")]]
+
+def exact_top_k(sample: Sample, queries: np.ndarray, k: int, scope: str) -> List[np.ndarray]:
+    """
+    Returns exact top-k neighbours by cosine similarity.
+
+    Args:
+        sample (Sample): The chunks.
+        queries (np.ndarray): Row numbers of the query chunks.
+        k (int): Neighbours per query.
+        scope (str): "document" or "global".
+
+    Returns:
+        list[np.ndarray]: Neighbour row numbers of each query, best first.
+    """
+    results = []
+    for query in queries:
+        rows = sample.candidates(query, scope)
+        results.append(_top(sample.vectors[rows] @ sample.vectors[query], rows, k))
+    return results
+
+def simulate(sample: Sample, queries: np.ndarray, k: int, scope: str, dimensions: int,
+             compression: str, oversampling: float = 1.0, rerank: bool = True) -> List[np.ndarray]:
+    """
+    Returns top-k neighbours under simulated index settings.
+
+    Args:
+        sample (Sample): The chunks.
+        queries (np.ndarray): Row numbers of the query chunks.
+        k (int): Neighbours per query.
+        scope (str): "document" or "global".
+        dimensions (int): Vector length kept.
+        compression (str): "none", "scalar" or "binary".
+        oversampling (float): Candidates fetched per result before re-ranking.
+        rerank (bool): Re-rank the candidates with full-precision vectors.
+
+    Returns:
+        list[np.ndarray]: Neighbour row numbers of each query, best first.
+    """
+    full = _shorten(sample.vectors, dimensions)
+    if compression == "scalar":
+        # int8 over each dimension's range in the sample
+        low, high = full.min(axis=0), full.max(axis=0)
+        scale = np.maximum(high - low, 1e-12) / 255
+        coded = (np.round((full - low) / scale) - 128).astype(np.int8)
+        stored = (coded.astype(np.float32) + 128) * scale + low
+    elif compression == "binary":
+        stored = np.packbits(full > 0, axis=1)
+    else:
+        stored = full
+
+    fetch = max(k, int(np.ceil(k * oversampling))) if compression != "none" else k
+    results = []
+    for query in queries:
+        rows = sample.candidates(query, scope)
+        if compression == "binary":
+            # Smaller Hamming distance ranks higher
+            distance = np.unpackbits(stored[rows] ^ stored[query], axis=1).sum(axis=1)
+            scores = -distance.astype(np.float32)
+        else:
+            scores = stored[rows] @ full[query]
+        found = _top(scores, rows, fetch)
+        if compression != "none" and rerank:
+            found = _top(full[found] @ full[query], found, k)
+        results.append(found[:k])
+    return results
+
+def _recall(found: List[np.ndarray], exact: List[np.ndarray]) -> float:
+    """
+    Returns the mean share of exact neighbours that were found.
+    """
+    shares = [len(set(f.tolist()) & set(e.tolist())) / len(e) for f, e in zip(found, exact) if len(e)]
+    return float(np.mean(shares)) if shares else float("nan")
+
+def evaluate_offline(sample: Sample, queries: np.ndarray, k: int, scope: str,
+                     dimensions: List[int], compressions: List[str],
+                     oversampling: List[float], rerank: bool = True) -> List[dict]:
+    """
+    Scores simulated settings against exact search.
+
+    Returns:
+        list[dict]: One row per setting with recall, vector bytes and query time.
+    """
+    exact = exact_top_k(sample, queries, k, scope)
+    rows = []
+    for dims in dimensions:
+        if dims > sample.vectors.shape[1]:
+            continue
+        for compression in compressions:
+            for factor in (oversampling if compression != "none" else [1.0]):
+                started = time.perf_counter()
+                found = simulate(sample, queries, k, scope, dims, compression, factor, rerank)
+                elapsed = time.perf_counter() - started
+                rows.append({
+                    "dimensions": dims,
+                    "compression": compression,
+                    "oversampling": factor,
+                    f"recall@{k}": round(_recall(found, exact), 4),
+                    "vectorBytes": dims * BITS[compression] // 8,
+                    "queryMs": round(elapsed * 1000 / len(queries), 3),
+                })
+    return rows
+
+def evaluate_live(sample: Sample, queries: np.ndarray, k: int, scope: str, endpoint: str,
+                  credential, index_name: str, exhaustive: bool = False) -> dict:
+    """
+    Scores a live index against exact search over the sample.
+
+    Args:
+        sample (Sample): The chunks (must be in the index).
+        queries (np.ndarray): Row numbers of the query chunks.
+        k (int): Neighbours per query.
+        scope (str): "document" or "global".
+        endpoint (str): Search service endpoint.
+        credential: Search credential.
+        index_name (str): Index to query.
+        exhaustive (bool): Ask the service for exhaustive search.
+
+    Returns:
+        dict: Recall@k and latency percentiles.
+    """
+    # pylint: disable=import-outside-toplevel
+    from azure.search.documents import SearchClient
+    from azure.search.documents.indexes import SearchIndexClient
+    from azure.search.documents.models import VectorizedQuery
+
+    definition = SearchIndexClient(endpoint, credential).get_index(index_name)
+    dims = next(f for f in definition.fields if f.name == "embedding").vector_search_dimensions
+    vectors = _shorten(sample.vectors, dims)
+    client = SearchClient(endpoint, index_name, credential)
+    row_of = {chunk_id: row for row, chunk_id in enumerate(sample.ids.tolist())}
+
+    exact = exact_top_k(sample, queries, k, scope)
+    found, latencies = [], []
+    for query in queries:
+        odata_filter = None
+        if scope == "document":
+            escaped = str(sample.documents[query]).replace("'", "''")
+            odata_filter = f"documentName eq '{escaped}'"
+        vector_query = VectorizedQuery(vector=vectors[query].tolist(), fields="embedding",
+                                       k_nearest_neighbors=k + 1, exhaustive=exhaustive)
+        started = time.perf_counter()
+        results = list(client.search(search_text=None, vector_queries=[vector_query],
+                                     filter=odata_filter, select=["id"], top=k + 1))
+        latencies.append((time.perf_counter() - started) * 1000)
+        rows = [row_of.get(r["id"]) for r in results]
+        found.append(np.array([r for r in rows if r is not None and r != query][:k], dtype=np.int64))
+
+    return {
+        "index": index_name,
+        "dimensions": dims,
+        f"recall@{k}": round(_recall(found, exact), 4),
+        "p50Ms": round(float(np.percentile(latencies, 50)), 1),
+        "p95Ms": round(float(np.percentile(latencies, 95)), 1),
+    }
+
+def _print_table(rows: List[dict]):
+    """
+    Prints rows as an aligned table.
+    """
+    if not rows:
+        return
+    keys = list(rows[0])
+    widths = [max(len(key), *(len(str(r[key])) for r in rows)) for key in keys]
+    print("  ".join(key.rjust(w) for key, w in zip(keys, widths)))
+    for row in rows:
+        print("  ".join(str(row[key]).rjust(w) for key, w in zip(keys, widths)))
+
+def _list(value: str, cast) -> list:
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+def main(argv=None) -> int:
+    """
+    Command-line entry point.
+    """
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Evaluate vector index settings on a sample.")
+    parser.add_argument("--sample", help="Sample file written by --save.")
+    parser.add_argument("--export-from", help="Export a sample from this index.")
+    parser.add_argument("--documents", type=int, default=200, help="Documents to export.")
+    parser.add_argument("--save", help="Write the exported sample to this .npz file.")
+    parser.add_argument("--queries", type=int, default=500, help="Query chunks (random).")
+    parser.add_argument("--k", type=int, default=3, help="Neighbours per query (the checks use 3).")
+    parser.add_argument("--scope", default="document", choices=["document", "global"])
+    parser.add_argument("--dimensions", default="1536,1024,512")
+    parser.add_argument("--compression", default="none,scalar,binary")
+    parser.add_argument("--oversampling", default="1,2,4")
+    parser.add_argument("--no-rerank", action="store_true")
+    parser.add_argument("--index", help="Comma-separated indexes to query live.")
+    parser.add_argument("--exhaustive", action="store_true", help="Exhaustive live queries.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args(argv)
+
+    credential = endpoint = None
+    if args.export_from or args.index:
+        # pylint: disable=import-outside-toplevel
+        from azure.core.credentials import AzureKeyCredential
+        from azure.search.documents import SearchClient
+        endpoint = os.environ["SEARCH_ENDPOINT"]
+        credential = AzureKeyCredential(os.environ["SEARCH_ADMIN_KEY"])
+
+    if args.export_from:
+        sample = export_sample(SearchClient(endpoint, args.export_from, credential),
+                               args.documents, args.seed)
+        if args.save:
+            sample.save(args.save)
+    elif args.sample:
+        sample = load_sample(args.sample)
+    else:
+        parser.error("--sample or --export-from is required")
+
+    rng = np.random.default_rng(args.seed)
+    queries = rng.choice(len(sample.ids), size=min(args.queries, len(sample.ids)), replace=False)
+    print(f"{len(sample.ids)} chunk(s), {sample.vectors.shape[1]} dimensions, "
+          f"{len(queries)} queries, k={args.k}, scope={args.scope}")
+
+    report: Dict[str, list] = {}
+    report["offline"] = evaluate_offline(
+        sample, queries, args.k, args.scope, _list(args.dimensions, int),
+        _list(args.compression, str), _list(args.oversampling, float), not args.no_rerank
+    )
+    _print_table(report["offline"])
+
+    if args.index:
+        report["live"] = [
+            evaluate_live(sample, queries, args.k, args.scope, endpoint, credential, name,
+                          args.exhaustive)
+            for name in _list(args.index, str)
+        ]
+        print()
+        _print_table(report["live"])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())